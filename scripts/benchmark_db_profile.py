@@ -0,0 +1,141 @@
+"""
+SQLite Runtime Profile Benchmark - Compare "legacy" vs "tuned" connection settings
+
+Runs a mixed workload (readers browsing the directory while writers post reviews
+and toggle favorites) against a throwaway copy of the schema, once per profile,
+and reports read/write throughput plus "database is locked" errors.
+
+Usage: python scripts/benchmark_db_profile.py [--seconds 5] [--readers 6] [--writers 2]
+"""
+import sys
+import os
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.database import db
+
+BUSINESS_COUNT = 2000
+USER_COUNT = 200
+
+
+def _prepare_database(database_path, profile):
+    """
+    Create the schema and a synthetic catalog to read from.
+
+    The file is built with the profile under test: journal_mode=WAL is stored
+    in the database file, so a file prepared with "tuned" would stay in WAL
+    for the "legacy" run too.
+    """
+    db.DATABASE_PATH = database_path
+    db.DB_PROFILE = profile
+    db.init_db()
+    connection = db.get_connection()
+    connection.executemany(
+        "INSERT INTO businesses (name, category, description, average_rating, total_reviews) VALUES (?, ?, ?, ?, ?)",
+        [
+            (f"Business {i}", random.choice(["Food", "Retail", "Services"]), "Synthetic row", round(random.uniform(1, 5), 1), random.randint(0, 500))
+            for i in range(BUSINESS_COUNT)
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO users (username, email, password_hash, email_verified) VALUES (?, ?, 'x', 1)",
+        [(f"user{i}", f"user{i}@example.com") for i in range(USER_COUNT)],
+    )
+    connection.commit()
+    connection.close()
+    db.close_all_connections()
+
+
+def _run_workload(database_path, profile, seconds, readers, writers):
+    """Hammer one database with concurrent readers and writers; return counters."""
+    pool = db.ConnectionPool(database_path, size=readers + writers, max_overflow=0, profile=profile)
+    counters = {"reads": 0, "writes": 0, "locked": 0}
+    connection = pool.acquire()
+    counters["journal_mode"] = connection.execute("PRAGMA journal_mode").fetchone()[0]
+    connection.close()
+    counter_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        connection = pool.acquire()
+        reads = locked = 0
+        while time.perf_counter() < deadline:
+            try:
+                connection.execute(
+                    "SELECT * FROM businesses WHERE category = ? ORDER BY average_rating DESC LIMIT 12",
+                    (random.choice(["Food", "Retail", "Services"]),),
+                ).fetchall()
+                reads += 1
+            except sqlite3.OperationalError:
+                locked += 1
+        connection.close()
+        with counter_lock:
+            counters["reads"] += reads
+            counters["locked"] += locked
+
+    def writer():
+        connection = pool.acquire()
+        writes = locked = 0
+        while time.perf_counter() < deadline:
+            business_id = random.randint(1, BUSINESS_COUNT)
+            user_id = random.randint(1, USER_COUNT)
+            try:
+                connection.execute(
+                    "INSERT INTO reviews (business_id, user_id, rating, review_text, created_date, created_time) VALUES (?, ?, ?, 'bench', date('now'), time('now'))",
+                    (business_id, user_id, random.randint(1, 5)),
+                )
+                connection.execute(
+                    "INSERT OR IGNORE INTO favorites (user_id, business_id) VALUES (?, ?)",
+                    (user_id, business_id),
+                )
+                connection.commit()
+                writes += 1
+            except sqlite3.OperationalError:
+                connection.rollback()
+                locked += 1
+        connection.close()
+        with counter_lock:
+            counters["writes"] += writes
+            counters["locked"] += locked
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close_all()
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite runtime profiles")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"Workload: {args.readers} readers, {args.writers} writers, {args.seconds:.1f}s per profile")
+    print(f"{'profile':<8} {'journal':>8} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    for profile in ("legacy", "tuned"):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            database_path = os.path.join(temp_dir, "bench.db")
+            _prepare_database(database_path, profile)
+            counters = _run_workload(database_path, profile, args.seconds, args.readers, args.writers)
+        print(
+            f"{profile:<8} {counters['journal_mode']:>8} {counters['reads'] / args.seconds:>10.0f} "
+            f"{counters['writes'] / args.seconds:>10.0f} {counters['locked']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
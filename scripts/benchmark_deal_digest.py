@@ -0,0 +1,175 @@
+"""
+Deal Digest Benchmark - Time and peak memory of one digest run at scale
+
+Builds a throwaway database with --users verified users who each favorite
+--favorites businesses out of --businesses, adds a new deal to a share of the
+businesses, and runs the digest twice: once timed, then again from the same
+watermark under tracemalloc for the peak Python memory. The outbox keeps its
+default cap (EMAIL_OUTBOX_MAX_PENDING), so with more users than that the
+digest pauses whenever the outbox is full, as the job does in production;
+the benchmark then empties the outbox and runs it again, and reports how
+many runs it took. The run fails (exit status 1) if the peak is over
+--memory-budget-mb. With --drain the outbox is emptied by sending through
+the local stand-in transport, to count the API calls a real provider would
+see; otherwise the queued rows are just marked sent.
+
+Usage: python scripts/benchmark_deal_digest.py [--users 100000] [--businesses 10000] [--favorites 20] [--deal-share 0.2] [--drain]
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.database import db, queries
+from src.logic import deal_digest, email_outbox, email_sender, jobs
+from src.logic.email_transport import LocalTransport
+
+
+def build_database(users, businesses, favorites_per_user, deal_share):
+    """Deterministic users, businesses and favorites; every 10th user has turned deal emails off."""
+    rng = random.Random(2026)
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO businesses (id, name, category, description) VALUES (?, ?, 'Food', 'benchmark')",
+        ((business_id, f"Spot {business_id}") for business_id in range(1, businesses + 1))
+    )
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, email_verified, user_preferences) VALUES (?, ?, ?, 'x', 1, ?)",
+        (
+            (user_id, f"user{user_id}", f"user{user_id}@example.com",
+             '{"deal_notifications": false}' if user_id % 10 == 0 else None)
+            for user_id in range(1, users + 1)
+        )
+    )
+    conn.executemany(
+        "INSERT INTO favorites (user_id, business_id) VALUES (?, ?)",
+        (
+            (user_id, business_id)
+            for user_id in range(1, users + 1)
+            for business_id in rng.sample(range(1, businesses + 1), favorites_per_user)
+        )
+    )
+    conn.commit()
+    # Deals added before the first run are never sent, so start the watermark here
+    queries.set_meta(deal_digest.WATERMARK_KEY, "0")
+    deal_businesses = rng.sample(range(1, businesses + 1), int(businesses * deal_share))
+    conn.executemany(
+        "INSERT INTO deals (business_id, description) VALUES (?, ?)",
+        ((business_id, f"{rng.randint(10, 50)}% off this week") for business_id in sorted(deal_businesses))
+    )
+    conn.commit()
+    conn.close()
+    return len(deal_businesses)
+
+
+def reset_digest():
+    """Rewind the watermark and empty the outbox so the digest can run again."""
+    queries.set_meta(deal_digest.WATERMARK_KEY, "0")
+    queries.set_meta(deal_digest.PROGRESS_KEY, "")
+    conn = db.get_connection()
+    conn.execute("DELETE FROM email_outbox")
+    conn.commit()
+    conn.close()
+
+
+def mark_outbox_sent():
+    """Stand-in for the email workers: mark everything queued as sent."""
+    conn = db.get_connection()
+    conn.execute("UPDATE email_outbox SET status = 'sent' WHERE status IN ('queued', 'sending')")
+    conn.commit()
+    conn.close()
+
+
+def count_queued_emails():
+    conn = db.get_connection()
+    queued = conn.execute("SELECT COUNT(*) FROM email_outbox").fetchone()[0]
+    conn.close()
+    return queued
+
+
+def run_until_done(empty_outbox):
+    """
+    Run the digest until it finishes, calling `empty_outbox()` each time it pauses.
+
+    Returns:
+        tuple: (seconds spent in the digest itself, runs)
+    """
+    seconds, runs = 0.0, 0
+    while True:
+        runs += 1
+        start = time.perf_counter()
+        try:
+            deal_digest.run_deal_digest()
+            return seconds + time.perf_counter() - start, runs
+        except jobs.RetryLater:
+            seconds += time.perf_counter() - start
+            empty_outbox()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deal digest at scale")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--businesses", type=int, default=10_000)
+    parser.add_argument("--favorites", type=int, default=20, help="favorites per user")
+    parser.add_argument("--deal-share", type=float, default=0.2, help="share of businesses with a new deal")
+    parser.add_argument("--memory-budget-mb", type=float, default=64)
+    parser.add_argument("--drain", action="store_true", help="send the queued emails through the local transport")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.DATABASE_PATH = os.path.join(temp_dir, "bench.db")
+        db.init_db()
+        email_sender.EMAIL_TRANSPORT = "local"
+        transport = LocalTransport()
+        email_sender._transport_state["transport"] = transport
+        email_outbox.start_email_workers = lambda transport: []
+
+        start = time.perf_counter()
+        deals = build_database(args.users, args.businesses, args.favorites, args.deal_share)
+        print(f"setup: {args.users:,} users, {args.businesses:,} businesses, "
+              f"{args.users * args.favorites:,} favorites, {deals:,} new deals in {time.perf_counter() - start:.1f} s")
+
+        drained = {"sent": 0, "calls": 0, "seconds": 0.0}
+
+        def drain():
+            start = time.perf_counter()
+            sent = email_outbox.process_outbox(transport)
+            drained["seconds"] += time.perf_counter() - start
+            drained["sent"] += sent["sent"]
+            drained["calls"] += sent["calls"]
+            # Keep only the count: the messages themselves would skew later runs
+            transport.sent.clear()
+
+        seconds, runs = run_until_done(drain if args.drain else mark_outbox_sent)
+        if args.drain:
+            drain()
+        emailed = count_queued_emails()
+        print(f"digest: {emailed:,} emails queued in {seconds:.2f} s over {runs} run(s) "
+              f"at an outbox cap of {email_outbox.MAX_PENDING:,} ({emailed / seconds:,.0f} emails/s)")
+        if args.drain:
+            print(f"drain: {drained['sent']:,} emails in {drained['calls']:,} API calls, {drained['seconds']:.1f} s")
+
+        reset_digest()
+        tracemalloc.start()
+        run_until_done(mark_outbox_sent)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / (1024 * 1024)
+        print(f"peak memory: {peak_mb:.1f} MB (budget {args.memory_budget_mb:.0f} MB)")
+        db.close_all_connections()
+
+    if peak_mb > args.memory_budget_mb:
+        print("FAIL: peak memory over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Ingestion Benchmark - Yelp sync throughput and row parsing, offline
+
+Serves Yelp Business Search fixtures from a local replay server (see
+scripts/yelp_replay_server.py) and runs the full sync against a throwaway
+database: first into an empty catalog, then again with nothing changed.
+It also times yelp_api._business_to_row on every recorded business. Without
+--fixtures a deterministic synthetic set is generated, so runs are
+comparable across machines and commits.
+
+Usage: python scripts/benchmark_ingestion.py [--fixtures DIR] [--per-category 240] [--repeat 5]
+"""
+import sys
+import os
+import argparse
+import glob
+import json
+import random
+import tempfile
+import threading
+import time
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.database import db, seed
+from src.logic import throttle, yelp_api
+from src.logic.response_cache import ResponseCache, make_replay_server
+
+STREETS = ["E Broad St", "W Cary St", "E Main St", "Hull St", "Monument Ave", "Brook Rd"]
+ALIASES = ["restaurants", "coffee", "shopping", "bookstores", "nightlife", "gyms", "spas", "localservices"]
+
+
+def _synthetic_business(rng, category, number):
+    return {
+        "id": f"{category}-{number}",
+        "name": f"{category.title()} Spot {number}",
+        "is_closed": False,
+        "rating": rng.choice([3.5, 4.0, 4.5, 5.0]),
+        "review_count": rng.randint(1, 900),
+        "price": "$" * rng.randint(1, 4),
+        "phone": f"+1804555{number:04d}",
+        "url": f"https://www.yelp.com/biz/{category}-{number}",
+        "image_url": f"https://example.com/{category}/{number}.jpg",
+        "categories": [{"alias": category}, {"alias": rng.choice(ALIASES)}],
+        "coordinates": {"latitude": round(rng.uniform(37.45, 37.6), 6), "longitude": round(rng.uniform(-77.5, -77.35), 6)},
+        "location": {"display_address": [f"{rng.randint(1, 3000)} {rng.choice(STREETS)}", "Richmond, VA 23219"]},
+        "attributes": {"outdoor_seating": rng.random() < 0.5, "wifi": rng.random() < 0.5},
+    }
+
+
+def write_synthetic_fixtures(directory, per_category):
+    """Record a deterministic page set for every category search the sync makes."""
+    rng = random.Random(2026)
+    fixtures = ResponseCache(directory, match_url=False)
+    max_results = min(per_category, yelp_api.MAX_SEARCH_RESULTS)
+    for category, _ in yelp_api.SEARCHES:
+        businesses = [_synthetic_business(rng, category, number) for number in range(max_results)]
+        for offset in range(0, max_results, yelp_api.PAGE_SIZE):
+            limit = min(yelp_api.PAGE_SIZE, max_results - offset)
+            params = {"location": yelp_api.LOCATION, "limit": limit, "offset": offset, "sort_by": "rating", "categories": category}
+            fixtures.put("", params, {"total": max_results, "businesses": businesses[offset:offset + limit]})
+
+
+def _recorded_businesses(directory):
+    businesses = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path) as fixture_file:
+            businesses.extend(json.load(fixture_file)["data"].get("businesses") or [])
+    return businesses
+
+
+def _time_sync(database_path):
+    db.DATABASE_PATH = database_path
+    db.init_db()
+    first = seed._sync_richmond_from_yelp()
+    second = seed._sync_richmond_from_yelp()
+    db.close_all_connections()
+    return first, second
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Yelp ingestion against recorded fixtures")
+    parser.add_argument("--fixtures", help="recorded fixture directory (default: generate a synthetic set)")
+    parser.add_argument("--per-category", type=int, default=yelp_api.MAX_SEARCH_RESULTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixture_dir = args.fixtures
+        if not fixture_dir:
+            fixture_dir = os.path.join(temp_dir, "fixtures")
+            write_synthetic_fixtures(fixture_dir, args.per_category)
+
+        businesses = _recorded_businesses(fixture_dir)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for business in businesses:
+                yelp_api._business_to_row(business)
+            timings.append(time.perf_counter() - start)
+        parse_seconds = sorted(timings)[len(timings) // 2]
+        print(f"_business_to_row: {len(businesses)} businesses in {parse_seconds * 1000:.1f} ms "
+              f"({len(businesses) / parse_seconds:,.0f} rows/s)")
+
+        server = make_replay_server(fixture_dir)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yelp_api.BASE_URL = f"http://127.0.0.1:{server.server_port}/v3/businesses/search"
+        yelp_api.MAX_PER_CATEGORY = args.per_category
+        yelp_api.RESPONSE_CACHE_TTL_SECONDS = 0
+        yelp_api._get_api_key = lambda: "replay"
+        # Measure the client and database, not the production request quota
+        yelp_api._rate_limiter = throttle.TokenBucket(10_000)
+        try:
+            print(f"{'run':<5} {'sync':<10} {'added':>6} {'updated':>8} {'unchanged':>10} {'seconds':>8} {'rows/s':>8}")
+            for run in range(1, args.repeat + 1):
+                first, second = _time_sync(os.path.join(temp_dir, f"bench-{run}.db"))
+                for label, stats in (("empty", first), ("no-change", second)):
+                    rows = stats["added"] + stats["updated"] + stats["unchanged"]
+                    seconds = stats["elapsed_seconds"] or float("nan")
+                    print(f"{run:<5} {label:<10} {stats['added']:>6} {stats['updated']:>8} {stats['unchanged']:>10} "
+                          f"{seconds:>8.3f} {rows / seconds:>8.0f}")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Nearby Search Benchmark - R*Tree radius search vs loading every row
+
+Fills a throwaway database with synthetic businesses scattered around
+Richmond and times "businesses within N km of a point, nearest first" two
+ways: the old approach (SELECT every business, compute haversine distance in
+Python) and queries.get_businesses_nearby (R*Tree bounding box, then exact
+distances for the candidates only). It then times building the map's
+cluster grids and answering whole-city viewports from them at a few zoom
+levels, against fetching every marker in the same viewport.
+
+Usage: python scripts/benchmark_nearby.py [--points 100000] [--radius 2] [--repeat 10]
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.database import db, queries
+from src.logic.clustering import ClusterGrid
+
+# Greater Richmond, roughly
+SOUTH, NORTH = 37.40, 37.70
+WEST, EAST = -77.65, -77.30
+
+
+def _prepare_database(database_path, points):
+    """Create the schema and `points` businesses with random coordinates."""
+    db.DATABASE_PATH = database_path
+    db.init_db()
+    rng = random.Random(points)
+    connection = db.get_connection()
+    connection.executemany(
+        "INSERT INTO businesses (name, category, description, latitude, longitude) VALUES (?, ?, 'Synthetic row', ?, ?)",
+        [
+            (f"Business {i}", rng.choice(["Food", "Retail", "Services"]), rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST))
+            for i in range(points)
+        ],
+    )
+    connection.commit()
+    connection.close()
+
+
+def _nearby_full_scan(latitude, longitude, radius_km, limit=50):
+    """The pre-index approach: every row into Python, distance for each."""
+    connection = db.get_connection()
+    rows = connection.execute("SELECT * FROM businesses WHERE latitude IS NOT NULL AND longitude IS NOT NULL").fetchall()
+    connection.close()
+    nearby = []
+    for row in rows:
+        distance = queries.haversine_km(latitude, longitude, row["latitude"], row["longitude"])
+        if distance <= radius_km:
+            business = dict(row)
+            business["distance_km"] = distance
+            nearby.append(business)
+    nearby.sort(key=lambda business: (business["distance_km"], business["id"]))
+    return nearby[:limit]
+
+
+def _median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _benchmark_clusters(repeat):
+    """Grid build time, then whole-city viewports as clusters vs every marker."""
+    start = time.perf_counter()
+    grid = ClusterGrid()
+    grid.load(queries.get_business_locations())
+    build_ms = (time.perf_counter() - start) * 1000
+    print()
+    print(f"cluster grids for {len(grid)} businesses built in {build_ms:.0f} ms")
+    print(f"{'zoom':>4} {'clusters':>9} {'cluster ms':>11} {'markers':>8} {'marker ms':>10}")
+    for zoom in (8, 11, 13, 15):
+        clusters = grid.clusters(SOUTH, WEST, NORTH, EAST, zoom)
+        cluster_ms = _median_ms(lambda: grid.clusters(SOUTH, WEST, NORTH, EAST, zoom), repeat)
+        markers = queries.get_businesses_in_bbox(SOUTH, WEST, NORTH, EAST, columns=queries.MAP_MARKER_COLUMNS)
+        marker_ms = _median_ms(lambda: queries.get_businesses_in_bbox(SOUTH, WEST, NORTH, EAST, columns=queries.MAP_MARKER_COLUMNS), repeat)
+        print(f"{zoom:>4} {len(clusters):>9} {cluster_ms:>11.2f} {len(markers):>8} {marker_ms:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark R*Tree nearby search")
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--radius", type=float, default=2.0, help="search radius in km")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _prepare_database(os.path.join(temp_dir, "bench.db"), args.points)
+        if not queries.location_index_available():
+            print("This SQLite build has no R*Tree; get_businesses_nearby uses the lat/lng index.")
+        rng = random.Random(1)
+        centers = [(rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)) for _ in range(5)]
+
+        print(f"{args.points} businesses, radius {args.radius:g} km")
+        print(f"{'center':<22} {'hits':>6} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+        for latitude, longitude in centers:
+            indexed = queries.get_businesses_nearby(latitude, longitude, args.radius)
+            scanned = _nearby_full_scan(latitude, longitude, args.radius)
+            assert [b["id"] for b in indexed] == [b["id"] for b in scanned], "index and scan disagree"
+            scan_ms = _median_ms(lambda: _nearby_full_scan(latitude, longitude, args.radius), args.repeat)
+            index_ms = _median_ms(lambda: queries.get_businesses_nearby(latitude, longitude, args.radius), args.repeat)
+            print(f"{latitude:>9.4f},{longitude:>10.4f}  {len(indexed):>6} {scan_ms:>9.1f} {index_ms:>9.2f} {scan_ms / index_ms:>7.0f}x")
+        _benchmark_clusters(args.repeat)
+        db.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
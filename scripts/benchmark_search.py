@@ -0,0 +1,162 @@
+"""
+Search Benchmark - Compare LIKE name matching vs the FTS5 index
+
+Builds throwaway catalogs of 1k/10k/100k synthetic businesses and times the
+old `lower(name) LIKE '%q%'` query against the FTS5 MATCH + BM25 query used by
+queries.search_businesses for a handful of typical searches, then times the
+in-memory trigram index (typo-tolerant search and "did you mean") on
+misspelled searches and the autocomplete prefix index on partial words.
+
+Usage: python scripts/benchmark_search.py [--sizes 1000 10000 100000] [--repeat 20]
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.database import db, queries
+from src.logic.search_index import PrefixIndex, TrigramIndex
+
+SEARCHES = ["pizza", "coff", "bike repair", "vintage books", "yoga"]
+MISSPELLED_SEARCHES = ["pizzza", "cofee", "bakry", "yogga studoi", "hardwear"]
+PREFIXES = ["p", "pi", "piz", "golden b", "carytown yoga st"]
+# Both queries return at most this many rows, as one page of search results would
+RESULT_LIMIT = 50
+NAME_WORDS = ["Golden", "Corner", "River", "Fan", "Church Hill", "Carytown", "Main Street", "Southside", "Union", "Blue"]
+KIND_WORDS = ["Pizza", "Coffee", "Books", "Cycles", "Yoga Studio", "Bakery", "Tacos", "Barber", "Gallery", "Hardware"]
+DESCRIPTION_WORDS = [
+    "family owned", "vintage", "repair", "locally roasted", "vegan options", "live music",
+    "outdoor seating", "gluten free", "handmade", "late night", "craft beer", "bike friendly",
+]
+
+
+def _prepare_database(database_path, size):
+    """Create the schema (with the FTS5 index) and `size` synthetic businesses."""
+    db.DATABASE_PATH = database_path
+    db.init_db()
+    rng = random.Random(size)
+    connection = db.get_connection()
+    connection.executemany(
+        "INSERT INTO businesses (name, category, description, average_rating, total_reviews) VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                f"{rng.choice(NAME_WORDS)} {rng.choice(KIND_WORDS)} {i}",
+                rng.choice(["Food", "Retail", "Services"]),
+                ", ".join(rng.sample(DESCRIPTION_WORDS, 3)),
+                round(rng.uniform(1, 5), 1),
+                rng.randint(0, 500),
+            )
+            for i in range(size)
+        ],
+    )
+    connection.commit()
+    connection.close()
+
+
+def _time_query(connection, sql, parameters, repeat):
+    """Median milliseconds to run and fetch a query."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(sql, parameters).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _time_call(function, repeat):
+    """Median milliseconds for one call of `function`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _benchmark_trigram_index(size, repeat):
+    """Time typo-tolerant lookups against a trigram index of the current catalog."""
+    start = time.perf_counter()
+    index = TrigramIndex()
+    for business_id, name, category, _ in queries.get_business_search_rows():
+        index.add(business_id, name, category)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{size:>8} {'(build)':<14} {build_ms:>9.1f}")
+    for search in MISSPELLED_SEARCHES:
+        search_ms = _time_call(lambda: index.search(search, limit=12), repeat)
+        suggest_ms = _time_call(lambda: index.suggest(search), repeat)
+        print(f"{size:>8} {search:<14} {search_ms:>9.2f} {suggest_ms:>9.2f}  -> {index.suggest(search)}")
+
+
+def _benchmark_prefix_index(size, repeat):
+    """Time autocomplete lookups: cold (first keystroke for a prefix) and cached."""
+    rows = queries.get_business_search_rows()
+    start = time.perf_counter()
+    index = PrefixIndex()
+    index.load(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{size:>8} {'(build)':<18} {build_ms:>9.1f}")
+    for prefix in PREFIXES:
+        index._cache.clear()
+        start = time.perf_counter()
+        index.complete(prefix)
+        cold_ms = (time.perf_counter() - start) * 1000
+        warm_ms = _time_call(lambda: index.complete(prefix), repeat)
+        print(f"{size:>8} {prefix:<18} {cold_ms:>9.2f} {warm_ms:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LIKE vs FTS5 business search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'query':<14} {'LIKE ms':>9} {'FTS ms':>9} {'speedup':>8}")
+    trigram_sizes = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _prepare_database(os.path.join(temp_dir, "bench.db"), size)
+            if not queries.fulltext_available():
+                print("This SQLite build has no FTS5; nothing to compare.")
+                return
+            connection = db.get_connection()
+            for search in SEARCHES:
+                like_ms = _time_query(
+                    connection,
+                    "SELECT * FROM businesses WHERE lower(name) LIKE ? ORDER BY name LIMIT ?",
+                    ("%" + search.lower() + "%", RESULT_LIMIT),
+                    args.repeat,
+                )
+                fts_ms = _time_query(
+                    connection,
+                    "SELECT b.* FROM businesses_fts JOIN businesses b ON b.id = businesses_fts.rowid "
+                    f"WHERE businesses_fts MATCH ? ORDER BY {queries.FTS_RANK}, b.id LIMIT ?",
+                    (queries.build_fts_query(search), RESULT_LIMIT),
+                    args.repeat,
+                )
+                print(f"{size:>8} {search:<14} {like_ms:>9.2f} {fts_ms:>9.2f} {like_ms / fts_ms:>7.1f}x")
+            connection.close()
+            trigram_sizes.append(size)
+            db.close_all_connections()
+
+    print()
+    print(f"{'rows':>8} {'typo query':<14} {'fuzzy ms':>9} {'suggest':>9}")
+    for size in trigram_sizes:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _prepare_database(os.path.join(temp_dir, "bench.db"), size)
+            _benchmark_trigram_index(size, args.repeat)
+            print(f"{'':>8} {'prefix':<18} {'cold ms':>9} {'warm ms':>9}")
+            _benchmark_prefix_index(size, args.repeat)
+            db.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
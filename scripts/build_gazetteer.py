@@ -0,0 +1,73 @@
+"""
+Build the offline gazetteer - Pack the Richmond ZIP and street CSVs into one binary file
+
+Reads data/gazetteer/richmond_zips.csv (zip, latitude, longitude) and
+data/gazetteer/richmond_streets.csv (street, from/to house number, from/to
+latitude and longitude), normalizes the street names the same way the
+geocoder normalizes addresses, and writes the sorted, fixed-width records
+that src/logic/gazetteer.py memory-maps. Rerun it after editing the CSVs and
+commit the rebuilt file.
+
+Usage: python scripts/build_gazetteer.py [--output data/gazetteer/richmond.gaz]
+"""
+import sys
+import os
+import argparse
+import csv
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.logic import gazetteer
+from src.logic.geocoding import RICHMOND_VA_BOUNDS, normalize_address
+
+DATA_DIR = os.path.join(ROOT, "data", "gazetteer")
+
+
+def read_sources(data_dir=DATA_DIR):
+    """(zips, streets) record lists from the CSV sources."""
+    with open(os.path.join(data_dir, "richmond_zips.csv"), newline="") as zip_file:
+        zips = [(row["zip"], row["latitude"], row["longitude"]) for row in csv.DictReader(zip_file)]
+    with open(os.path.join(data_dir, "richmond_streets.csv"), newline="") as street_file:
+        streets = [
+            (normalize_address(row["street"]), row["from_number"], row["to_number"],
+             row["from_latitude"], row["from_longitude"], row["to_latitude"], row["to_longitude"])
+            for row in csv.DictReader(street_file)
+        ]
+    return zips, streets
+
+
+def _in_bounds(latitude, longitude):
+    southwest, northeast = RICHMOND_VA_BOUNDS["southwest"], RICHMOND_VA_BOUNDS["northeast"]
+    return southwest["lat"] <= float(latitude) <= northeast["lat"] and southwest["lng"] <= float(longitude) <= northeast["lng"]
+
+
+def build_gazetteer(output_path=gazetteer.GAZETTEER_PATH, data_dir=DATA_DIR):
+    """
+    Write the gazetteer file. Returns (ZIP count, street range count, size in bytes).
+
+    Raises:
+        ValueError: If a point lies outside RICHMOND_VA_BOUNDS; the geocoder
+                    rejects such positions, so those addresses would never resolve
+    """
+    zips, streets = read_sources(data_dir)
+    outside = [record[0] for record in zips if not _in_bounds(record[1], record[2])]
+    outside += [record[0] for record in streets if not (_in_bounds(*record[3:5]) and _in_bounds(*record[5:7]))]
+    if outside:
+        raise ValueError(f"Outside the Richmond bounds: {', '.join(map(str, outside))}")
+    size = gazetteer.write_gazetteer(output_path, zips, streets)
+    return len(zips), len(streets), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline Richmond gazetteer")
+    parser.add_argument("--output", default=gazetteer.GAZETTEER_PATH, help="gazetteer file to write")
+    args = parser.parse_args()
+    zip_count, street_count, size = build_gazetteer(args.output)
+    print(f"Wrote {args.output}: {zip_count} ZIP centroids, {street_count} street ranges, {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
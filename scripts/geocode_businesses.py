@@ -4,16 +4,34 @@ Database Geocoding Utility - Populate latitude/longitude for existing businesses
 This script geocodes all businesses without coordinates using the Google Geocoding API.
 Run this after setting up your GOOGLE_MAPS_API_KEY in config.py.
 
-Usage: python scripts/geocode_businesses.py
+Businesses are processed in ID-order batches. Each batch is geocoded by a
+bounded thread pool that shares one token bucket (so the run stays under the
+provider's requests-per-second quota), temporary failures are retried with
+backoff, and the batch's coordinates are committed in a single transaction.
+After every batch a checkpoint file records the last business ID finished,
+so an interrupted run picks up where it stopped; --restart ignores it.
+
+Set GEOCODING_API_URL to send requests to a local stand-in server instead
+of Google (e.g. for testing).
+
+With --queue the script instead runs the app's geocode_queue job once (see
+src/logic/geocode_worker.py), through the job table, so it can run while
+the app is up.
+
+Usage: python scripts/geocode_businesses.py [--workers 4] [--rate 10] [--batch-size 50]
+                                            [--max-attempts 4] [--checkpoint PATH] [--restart]
+       python scripts/geocode_businesses.py --queue
 """
 import sys
 import os
+import argparse
+import json
+import time
 
 # Setup path to allow imports from root
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
-os.chdir(ROOT)
 
 # Load environment variables
 try:
@@ -22,96 +40,192 @@ try:
 except ImportError:
     pass
 
-from src.database.db import get_connection
-from src.logic.geocoding import geocode_address, validate_coordinates
+from src.database import db, queries
+from src.logic import geocoding, jobs
+from src.logic import geocode_worker  # noqa: F401 - registers the geocode_queue job
+from src.logic.geocoding import validate_coordinates
+from src.logic.throttle import TokenBucket
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def geocode_businesses():
+
+def default_checkpoint_path():
+    """Checkpoint file kept next to the database it belongs to."""
+    return f"{db.DATABASE_PATH}.geocode-checkpoint.json"
+
+
+def new_checkpoint():
+    """Progress for a job that has not started yet."""
+    return {"database": str(db.DATABASE_PATH), "last_id": 0, "geocoded": 0, "not_found": 0, "outside_area": 0, "failed": 0}
+
+
+def load_checkpoint(path):
+    """Progress saved by an earlier run against the current database, or a fresh start."""
+    fresh = new_checkpoint()
+    try:
+        with open(path) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return fresh
+    if saved.get("database") != fresh["database"]:
+        return fresh
+    return {**fresh, **saved}
+
+
+def save_checkpoint(path, state):
+    """Write the checkpoint atomically, so an interrupted write never leaves half a file."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump(state, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def geocode_businesses(workers=4, rate=10.0, batch_size=50, max_attempts=4, checkpoint_path=None, restart=False, max_batches=None):
     """
     Geocode all businesses in the database that don't have coordinates.
+
+    Args:
+        workers (int): Concurrent geocoding requests
+        rate (float): Requests per second allowed by the provider's quota
+        batch_size (int): Businesses per committed batch (and per checkpoint)
+        max_attempts (int): Attempts per address for temporary failures
+        checkpoint_path (str): Checkpoint file (default: next to the database)
+        restart (bool): Ignore any saved checkpoint
+        max_batches (int): Stop after this many batches (the checkpoint lets a rerun continue)
+
+    Returns:
+        dict: Totals for the whole job (including earlier resumed runs) plus
+              this run's processed count, elapsed seconds and addresses per second
     """
-    connection = get_connection()
-    cursor = connection.cursor()
-    
-    # Get all businesses without coordinates
-    cursor.execute("""
-        SELECT id, name, address, latitude, longitude 
-        FROM businesses 
-        WHERE (latitude IS NULL OR longitude IS NULL) 
-        AND address IS NOT NULL
-        ORDER BY id
-    """)
-    
-    businesses_to_geocode = cursor.fetchall()
-    
-    if not businesses_to_geocode:
+    checkpoint_path = checkpoint_path or default_checkpoint_path()
+    state = new_checkpoint() if restart else load_checkpoint(checkpoint_path)
+    if state["last_id"]:
+        logger.info(f"Resuming after business #{state['last_id']} (checkpoint {checkpoint_path})")
+
+    total = queries.count_businesses_missing_coordinates(after_id=state["last_id"])
+    if not total:
         logger.info("✓ All businesses already have coordinates!")
-        connection.close()
-        return
-    
-    logger.info(f"Found {len(businesses_to_geocode)} businesses needing geocoding")
-    
-    geocoded_count = 0
-    failed_count = 0
-    
-    for business_row in businesses_to_geocode:
-        business_id = business_row['id']
-        name = business_row['name']
-        address = business_row['address']
-        
-        if not address or not address.strip():
-            logger.warning(f"  ✗ Business #{business_id} ({name}): No address provided")
-            failed_count += 1
-            continue
-        
-        # Geocode this business
-        coords = geocode_address(address)
-        
-        if coords:
-            latitude, longitude = coords
-            
-            # Validate coordinates
-            if validate_coordinates(latitude, longitude):
-                # Update database
-                cursor.execute("""
-                    UPDATE businesses 
-                    SET latitude = ?, longitude = ? 
-                    WHERE id = ?
-                """, (latitude, longitude, business_id))
-                
-                connection.commit()
-                logger.info(f"  ✓ Business #{business_id} ({name}): ({latitude:.4f}, {longitude:.4f})")
-                geocoded_count += 1
+        return {**state, "processed": 0, "elapsed_seconds": 0.0, "per_second": 0.0}
+    logger.info(f"Found {total} businesses needing geocoding ({workers} workers, {rate:g} requests/s)")
+
+    # Burst of one second's quota at most, then `rate` per second across all workers
+    rate_limiter = TokenBucket(rate, capacity=max(1.0, rate))
+    started = time.perf_counter()
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = queries.get_businesses_missing_coordinates(after_id=state["last_id"], limit=batch_size)
+        if not batch:
+            break
+        results = geocoding.geocode_addresses(
+            {business["id"]: business["address"] for business in batch},
+            workers=workers, rate_limiter=rate_limiter, max_attempts=max_attempts
+        )
+        updates = []
+        for business in batch:
+            coords, status = results[business["id"]]
+            if coords and validate_coordinates(*coords):
+                updates.append((business["id"], *coords))
+                state["geocoded"] += 1
+            elif coords:
+                logger.warning(f"  ✗ Business #{business['id']} ({business['name']}): Coordinates outside Richmond area")
+                state["outside_area"] += 1
+            elif status == geocoding.GEOCODE_NOT_FOUND:
+                logger.warning(f"  ✗ Business #{business['id']} ({business['name']}): No results for '{business['address']}'")
+                state["not_found"] += 1
             else:
-                logger.warning(f"  ✗ Business #{business_id} ({name}): Coordinates outside Richmond area")
-                failed_count += 1
-        else:
-            logger.warning(f"  ✗ Business #{business_id} ({name}): Geocoding failed for '{address}'")
-            failed_count += 1
-    
-    connection.close()
-    
+                logger.warning(f"  ✗ Business #{business['id']} ({business['name']}): Geocoding failed ({status})")
+                state["failed"] += 1
+
+        # One transaction per batch, then the checkpoint, so a crash repeats at most one batch
+        queries.set_business_coordinates(updates)
+        state["last_id"] = batch[-1]["id"]
+        save_checkpoint(checkpoint_path, state)
+
+        processed += len(batch)
+        batches += 1
+        elapsed = time.perf_counter() - started
+        per_second = processed / elapsed if elapsed else 0.0
+        remaining = max(0, total - processed)
+        eta = f"{remaining / per_second:.0f}s" if per_second else "?"
+        logger.info(f"  {processed}/{total} processed, {state['geocoded']} geocoded, {per_second:.1f} addresses/s, ETA {eta}")
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        **state,
+        "processed": processed,
+        "elapsed_seconds": round(elapsed, 3),
+        "per_second": round(processed / elapsed, 1) if elapsed else 0.0,
+    }
+
     # Print summary
     logger.info("")
     logger.info("=" * 50)
-    logger.info(f"Geocoding Complete:")
-    logger.info(f"  ✓ Successfully geocoded: {geocoded_count}")
-    logger.info(f"  ✗ Failed to geocode: {failed_count}")
-    logger.info(f"  Total: {geocoded_count + failed_count}")
+    logger.info("Geocoding Complete:" if processed == total else "Geocoding paused (rerun to resume):")
+    logger.info(f"  ✓ Successfully geocoded: {state['geocoded']}")
+    logger.info(f"  ✗ No results: {state['not_found']}")
+    logger.info(f"  ✗ Outside Richmond area: {state['outside_area']}")
+    logger.info(f"  ✗ Failed (rerun with --restart to retry): {state['failed']}")
+    logger.info(f"  This run: {processed} addresses in {elapsed:.1f}s ({summary['per_second']} addresses/s)")
     logger.info("=" * 50)
-    
-    if geocoded_count > 0:
+
+    if state["geocoded"] > 0:
         logger.info("You can now view businesses on the map at /map")
+    return summary
+
+
+def drain_geocode_queue():
+    """
+    Run the app's geocode_queue job here and now instead of the checkpointed backfill.
+
+    Goes through the job table, so it is safe while the app is running (the
+    queue rows are leased) and its run time shows up in the job stats.
+
+    Returns:
+        dict: Job runner counts - run, succeeded, retrying, failed
+    """
+    if jobs.enqueue("geocode_queue", unique_key="geocode_queue") is None:
+        logger.info("A geocode_queue job is already queued or running; running any that are due")
+    counts = jobs.run_pending(names=["geocode_queue"])
+    stats = queries.get_geocode_queue_stats()
+    logger.info(f"Geocode queue job: {counts}; {stats['pending']} addresses still queued ({stats['retrying']} retrying)")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocode businesses that have no coordinates")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second (provider quota)")
+    parser.add_argument("--batch-size", type=int, default=50, help="businesses per commit/checkpoint")
+    parser.add_argument("--max-attempts", type=int, default=4, help="attempts per address on temporary errors")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: next to the database)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first business")
+    parser.add_argument("--queue", action="store_true", help="run the app's geocode_queue job instead of the backfill")
+    args = parser.parse_args()
+    os.chdir(ROOT)
+    # Brings older databases up to date (the geocode cache table lives in a migration)
+    db.init_db()
+    if args.queue:
+        drain_geocode_queue()
+        return
+    geocode_businesses(
+        workers=args.workers,
+        rate=args.rate,
+        batch_size=args.batch_size,
+        max_attempts=args.max_attempts,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+    )
+
 
 if __name__ == "__main__":
     try:
-        geocode_businesses()
+        main()
     except KeyboardInterrupt:
-        logger.info("\nGeocoding cancelled by user")
+        logger.info("\nGeocoding cancelled by user (progress is saved; rerun to resume)")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Error during geocoding: {e}")
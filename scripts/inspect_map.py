@@ -24,10 +24,13 @@ with open("/tmp/map_page.html", "w") as f:
 print(f"Saved {len(response.text)} bytes to /tmp/map_page.html")
 
 # Check for key content
-if "businessesData" in response.text:
-    print("✅ Found businessesData")
+if "loadViewportMarkers" in response.text:
+    print("✅ Found viewport marker loading")
 else:
-    print("❌ NO businessesData found")
+    print("❌ NO viewport marker loading found")
+
+markers = session.get("http://localhost:5001/api/map/markers", params={"bbox": "37.40,-77.65,37.70,-77.30", "zoom": 12})
+print(f"Markers endpoint: {markers.status_code}, {len(markers.content)} bytes")
 
 if "Discover Businesses" in response.text:
     print("✅ Found hero section text")
@@ -0,0 +1,48 @@
+"""
+Yelp Replay Server - Serve recorded Yelp Business Search responses locally
+
+Record fixtures by running a sync with YELP_RECORD_DIR set, e.g.
+
+    YELP_RECORD_DIR=fixtures/yelp python -c "from src.database.seed import refresh_richmond_from_yelp; refresh_richmond_from_yelp()"
+
+then serve them and point the app (or scripts/benchmark_ingestion.py) at
+this server instead of api.yelp.com:
+
+    python scripts/yelp_replay_server.py fixtures/yelp --port 8765
+    YELP_API_URL=http://127.0.0.1:8765/v3/businesses/search YELP_CACHE_TTL_SECONDS=0 python -m web.app
+
+Requests are matched on their query parameters; anything not recorded gets a 404.
+
+Usage: python scripts/yelp_replay_server.py FIXTURE_DIR [--host 127.0.0.1] [--port 8765]
+"""
+import sys
+import os
+import argparse
+
+# Setup path to allow imports from root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.logic.response_cache import make_replay_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded Yelp responses")
+    parser.add_argument("fixtures", help="directory of recorded fixtures (YELP_RECORD_DIR)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    fixture_count = len([name for name in os.listdir(args.fixtures) if name.endswith(".json")])
+    server = make_replay_server(args.fixtures, args.host, args.port)
+    print(f"Replaying {fixture_count} fixtures at http://{args.host}:{server.server_port}/v3/businesses/search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,200 +1,338 @@
 """
 Database Layer - SQLite Connection and Schema Management
 
-Handles database connection pooling, table creation, and schema migrations.
+Handles database connection pooling and schema initialization (see migrations.py).
 All state is persisted in a local SQLite database for development.
 
 Hidden Gems | FBLA 2026
 """
 import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    from flask import g, has_app_context
+except ImportError:
+    g = None
+
+    def has_app_context():
+        return False
+
 # Database configuration
 DATABASE_DIRECTORY = Path(__file__).resolve().parent.parent.parent  # Project root
 DATABASE_PATH = DATABASE_DIRECTORY / "hidden_gems.db"
 
+# Pool sizing: idle connections kept open, plus extra connections allowed under burst load
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# Runtime PRAGMA profiles applied to every new connection.
+# "tuned": WAL so readers never block the writer, NORMAL sync (safe under WAL),
+#          a busy timeout instead of immediate "database is locked" errors,
+#          memory-mapped reads and a larger page cache.
+# "legacy": SQLite defaults (rollback journal, no busy timeout) for comparison.
+SQLITE_PROFILES = {
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,          # milliseconds
+        "mmap_size": 256 * 1024 * 1024,  # bytes
+        "cache_size": -32000,          # negative = KiB (~32 MB)
+        "temp_store": "MEMORY",
+    },
+    "legacy": {},
+}
+DB_PROFILE = os.environ.get("DB_PROFILE", "tuned").strip().lower()
+
+
+def _parse_pragma_overrides(raw_value):
+    """Parse DB_PRAGMAS ("busy_timeout=10000,cache_size=-64000") into a dict."""
+    overrides = {}
+    for item in (raw_value or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        name = name.strip().lower()
+        if name.isidentifier():
+            overrides[name] = value.strip()
+    return overrides
+
+
+def get_profile_pragmas(profile_name=None):
+    """
+    Resolve the PRAGMA settings for a profile, including DB_PRAGMAS overrides.
+
+    Unknown profile names fall back to "tuned".
+    """
+    name = (profile_name or DB_PROFILE or "tuned").lower()
+    pragmas = dict(SQLITE_PROFILES.get(name, SQLITE_PROFILES["tuned"]))
+    pragmas.update(_parse_pragma_overrides(os.environ.get("DB_PRAGMAS")))
+    return pragmas
+
+
+def apply_profile(connection, profile_name=None):
+    """Apply a runtime PRAGMA profile to a freshly opened connection."""
+    for name, value in get_profile_pragmas(profile_name).items():
+        value = str(value)
+        # PRAGMA arguments cannot be bound as parameters; only allow plain tokens
+        if not value.lstrip("-").replace("_", "").isalnum():
+            continue
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    SQLite connection that returns itself to its pool when closed.
+
+    Query helpers keep calling close() after each statement; for pooled
+    connections that hands the connection back instead of tearing it down.
+    Inside a Flask request the connection is pinned to `g` and close() is a
+    no-op until the request ends.
+    """
+
+    pool = None
+    request_scoped = False
+    checked_out = False
+
+    def close(self):
+        if self.request_scoped:
+            return
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def close_for_real(self):
+        """Close the underlying SQLite handle (bypasses the pool)."""
+        self.pool = None
+        self.request_scoped = False
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections for one database file.
+
+    Keeps up to `size` idle connections; up to `max_overflow` extra connections
+    may be opened under load and are closed when returned. When the pool is fully
+    checked out, callers wait up to `timeout` seconds for a connection.
+    """
+
+    def __init__(self, database_path, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, timeout=POOL_TIMEOUT, profile=None):
+        self.database_path = str(database_path)
+        self.profile = profile or DB_PROFILE
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._checkout_seconds_total = 0.0
+        self._checkout_seconds_max = 0.0
+
+    def _open(self):
+        connection = sqlite3.connect(
+            self.database_path,
+            factory=PooledConnection,
+            check_same_thread=False,  # connections move between threads via the pool
+        )
+        # Allow accessing columns by name instead of index (Row objects act like dicts)
+        connection.row_factory = sqlite3.Row
+        apply_profile(connection, self.profile)
+        connection.pool = self
+        return connection
+
+    def acquire(self):
+        """Check out a connection, opening a new one if the pool has room."""
+        started = time.perf_counter()
+        connection = None
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size + self.max_overflow
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    connection = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    connection = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"({self._opened} open, pool size {self.size})"
+                    )
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._checkout_seconds_total += elapsed
+            self._checkout_seconds_max = max(self._checkout_seconds_max, elapsed)
+        connection.checked_out = True
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool, discarding any uncommitted work. A second close() is a no-op."""
+        connection.request_scoped = False
+        with self._lock:
+            if not connection.checked_out:
+                return
+            connection.checked_out = False
+            self._in_use -= 1
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.put_nowait(connection)
+            return
+        except queue.Full:
+            pass  # overflow connection: close it below
+        except sqlite3.Error:
+            pass  # broken connection: drop it
+        with self._lock:
+            self._opened -= 1
+        connection.close_for_real()
+
+    def close_all(self):
+        """Close every idle connection (checked-out connections close when released)."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            connection.close_for_real()
+
+    def stats(self):
+        """Pool size and checkout latency counters."""
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "database": self.database_path,
+                "profile": self.profile,
+                "pool_size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": checkouts,
+                "avg_checkout_ms": round(self._checkout_seconds_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "max_checkout_ms": round(self._checkout_seconds_max * 1000, 3),
+            }
+
+
+# One pool per database file (DATABASE_PATH can be repointed, e.g. by scripts or tests)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the connection pool for the current DATABASE_PATH, creating it on first use."""
+    key = str(DATABASE_PATH)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(key)
+                _pools[key] = pool
+    return pool
+
 
 def get_connection():
     """
     Get a connection to the SQLite database.
     
+    Connections come from a shared pool. Inside a Flask request every call returns
+    the same request-scoped connection (stored on `g`), which is handed back to the
+    pool at teardown. Outside Flask (scripts, seed.py) each call checks out its own
+    connection and close() returns it to the pool.
+    
     Configures row factory to allow accessing columns by name (like dictionaries).
     
     Returns:
         sqlite3.Connection: Database connection with row access by column name
     """
-    connection = sqlite3.connect(DATABASE_PATH)
-    # Allow accessing columns by name instead of index (Row objects act like dicts)
-    connection.row_factory = sqlite3.Row
-    return connection
+    if has_app_context():
+        connection = g.get("db_connection")
+        if connection is None:
+            connection = get_pool().acquire()
+            connection.request_scoped = True
+            g.db_connection = connection
+        return connection
+    return get_pool().acquire()
+
+
+@contextmanager
+def connection_scope():
+    """
+    Check out a connection for one unit of work and always hand it back.
+
+    Background code calls query helpers in a loop; a helper that raises must
+    not keep its connection checked out (or hold SQLite's write lock). On an
+    exception the block's uncommitted work is rolled back, and the connection
+    is closed either way.
+
+    Yields:
+        sqlite3.Connection: Same connection get_connection() would return
+    """
+    connection = get_connection()
+    try:
+        yield connection
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def release_request_connection(exception=None):
+    """Flask teardown hook: return the request's connection to the pool."""
+    connection = g.pop("db_connection", None) if g is not None else None
+    if connection is not None:
+        connection.request_scoped = False
+        connection.close()
+
+
+def get_pool_stats():
+    """Report pool size and checkout latency for the current database."""
+    return get_pool().stats()
+
+
+def close_all_connections():
+    """Close idle pooled connections for every database (e.g. before deleting the file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
 
 
 def init_db():
     """
-    Initialize database tables if they don't exist.
+    Bring the database schema up to date.
     
-    Creates all required tables and performs schema migrations for backward compatibility.
+    Schema changes live in `migrations.py` as numbered migrations tracked with
+    `PRAGMA user_version`. When the schema is current this is a single version
+    read; otherwise all pending migrations run in one transaction.
     This function is idempotent - safe to call multiple times.
     """
-    connection = get_connection()
-    cursor = connection.cursor()
-
-    # Create users table with email, password, verification, and profile info
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            email_verified INTEGER NOT NULL DEFAULT 0,
-            created_at TEXT NOT NULL DEFAULT (datetime('now'))
-        )
-    """)
-    
-    # Schema migration: Add email verification status to existing databases
-    cursor.execute("PRAGMA table_info(users)")
-    existing_columns = [row[1] for row in cursor.fetchall()]
-    
-    if "email_verified" not in existing_columns:
-        # Add email_verified column and assume all existing users are verified
-        cursor.execute("ALTER TABLE users ADD COLUMN email_verified INTEGER NOT NULL DEFAULT 1")
-        connection.commit()
-    
-    # Schema migration: Add username field for user profiles
-    if "username" not in existing_columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN username TEXT")
-        connection.commit()
-        # Backfill usernames from email addresses (take part before @)
-        cursor.execute("""
-            UPDATE users 
-            SET username = lower(
-                replace(
-                    replace(
-                        substr(email, 1, instr(email || '@', '@') - 1), 
-                    '.', '_'), 
-                '+', '_')
-            ) 
-            WHERE username IS NULL
-        """)
-        connection.commit()
-    
-    # Schema migration: Add user preferences storage
-    if "user_preferences" not in existing_columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN user_preferences TEXT")
-        connection.commit()
-    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username) WHERE username IS NOT NULL")
-
-    # Email verification codes (sent to user / shown in demo)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS email_verification_codes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            code TEXT NOT NULL,
-            created_at TEXT NOT NULL DEFAULT (datetime('now')),
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
-
-    # Verification attempts - visible table for verification records
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS verification_attempts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT,
-            verification_type TEXT NOT NULL,
-            question TEXT NOT NULL,
-            correct_answer TEXT NOT NULL,
-            user_answer TEXT,
-            success INTEGER NOT NULL DEFAULT 0,
-            attempted_at TEXT NOT NULL DEFAULT (datetime('now')),
-            context TEXT NOT NULL
-        )
-    """)
-
-    # Businesses - Enhanced with Yelp data and AI summary
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS businesses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            category TEXT NOT NULL,
-            description TEXT NOT NULL,
-            address TEXT,
-            average_rating REAL NOT NULL DEFAULT 0,
-            total_reviews INTEGER NOT NULL DEFAULT 0,
-            phone TEXT,
-            website TEXT,
-            yelp_url TEXT,
-            latitude REAL,
-            longitude REAL,
-            price_range TEXT,
-            hours TEXT,
-            photo_url TEXT,
-            attributes TEXT,
-            summary TEXT,
-            yelp_id TEXT UNIQUE
-        )
-    """)
-    cursor.execute("PRAGMA table_info(businesses)")
-    business_columns = [row[1] for row in cursor.fetchall()]
-    
-    # Add missing columns if they don't exist
-    if "address" not in business_columns:
-        cursor.execute("ALTER TABLE businesses ADD COLUMN address TEXT")
-        connection.commit()
-    
-    new_columns = {
-        "phone": "TEXT",
-        "website": "TEXT",
-        "yelp_url": "TEXT",
-        "latitude": "REAL",
-        "longitude": "REAL",
-        "price_range": "TEXT",
-        "hours": "TEXT",
-        "photo_url": "TEXT",
-        "attributes": "TEXT",
-        "summary": "TEXT",
-        "yelp_id": "TEXT"
-    }
-    for col_name, col_type in new_columns.items():
-        if col_name not in business_columns:
-            cursor.execute(f"ALTER TABLE businesses ADD COLUMN {col_name} {col_type}")
-            connection.commit()
-
-    # Deals
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS deals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            business_id INTEGER NOT NULL,
-            description TEXT NOT NULL,
-            FOREIGN KEY (business_id) REFERENCES businesses(id)
-        )
-    """)
-
-    # Reviews - linked to user and business
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            business_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            rating INTEGER NOT NULL,
-            review_text TEXT NOT NULL,
-            created_date TEXT NOT NULL,
-            created_time TEXT NOT NULL,
-            FOREIGN KEY (business_id) REFERENCES businesses(id),
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
-
-    # Favorites - user bookmarks
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS favorites (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            business_id INTEGER NOT NULL,
-            UNIQUE(user_id, business_id),
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (business_id) REFERENCES businesses(id)
-        )
-    """)
+    from .migrations import migrate
 
-    connection.commit()
-    connection.close()
+    connection = get_connection()
+    try:
+        migrate(connection)
+    finally:
+        connection.close()
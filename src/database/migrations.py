@@ -0,0 +1,668 @@
+"""
+Schema Migrations - Numbered, PRAGMA user_version-driven schema changes
+
+Each migration is a function that receives a cursor and applies one schema
+step. The database records the last applied step in `PRAGMA user_version`;
+`migrate()` applies every newer migration inside a single transaction, so a
+current database costs one version read at startup.
+
+To change the schema, append a new function and register it in MIGRATIONS with
+the next version number. Never edit a migration that has already shipped.
+
+Hidden Gems | FBLA 2026
+"""
+import sqlite3
+
+# The job, geocode and email queues claim and enqueue with UPDATE/INSERT ... RETURNING
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+def _migration_001_baseline_schema(cursor):
+    """
+    Baseline schema: every table the app had before versioned migrations.
+
+    Uses CREATE TABLE IF NOT EXISTS plus column probes so databases created by
+    the old init_db() (user_version 0, possibly missing later columns) are
+    upgraded in place.
+    """
+    # Create users table with email, password, verification, and profile info
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            email_verified INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    
+    # Schema migration: Add email verification status to existing databases
+    cursor.execute("PRAGMA table_info(users)")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    
+    if "email_verified" not in existing_columns:
+        # Add email_verified column and assume all existing users are verified
+        cursor.execute("ALTER TABLE users ADD COLUMN email_verified INTEGER NOT NULL DEFAULT 1")
+    
+    # Schema migration: Add username field for user profiles
+    if "username" not in existing_columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN username TEXT")
+        # Backfill usernames from email addresses (take part before @)
+        cursor.execute("""
+            UPDATE users 
+            SET username = lower(
+                replace(
+                    replace(
+                        substr(email, 1, instr(email || '@', '@') - 1), 
+                    '.', '_'), 
+                '+', '_')
+            ) 
+            WHERE username IS NULL
+        """)
+    
+    # Schema migration: Add user preferences storage
+    if "user_preferences" not in existing_columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN user_preferences TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username) WHERE username IS NOT NULL")
+
+    # Email verification codes (sent to user / shown in demo)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_verification_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Verification attempts - visible table for verification records
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS verification_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT,
+            verification_type TEXT NOT NULL,
+            question TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            user_answer TEXT,
+            success INTEGER NOT NULL DEFAULT 0,
+            attempted_at TEXT NOT NULL DEFAULT (datetime('now')),
+            context TEXT NOT NULL
+        )
+    """)
+
+    # Businesses - Enhanced with Yelp data and AI summary
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS businesses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            address TEXT,
+            average_rating REAL NOT NULL DEFAULT 0,
+            total_reviews INTEGER NOT NULL DEFAULT 0,
+            phone TEXT,
+            website TEXT,
+            yelp_url TEXT,
+            latitude REAL,
+            longitude REAL,
+            price_range TEXT,
+            hours TEXT,
+            photo_url TEXT,
+            attributes TEXT,
+            summary TEXT,
+            yelp_id TEXT UNIQUE
+        )
+    """)
+    cursor.execute("PRAGMA table_info(businesses)")
+    business_columns = [row[1] for row in cursor.fetchall()]
+    
+    # Add missing columns if they don't exist
+    if "address" not in business_columns:
+        cursor.execute("ALTER TABLE businesses ADD COLUMN address TEXT")
+    
+    new_columns = {
+        "phone": "TEXT",
+        "website": "TEXT",
+        "yelp_url": "TEXT",
+        "latitude": "REAL",
+        "longitude": "REAL",
+        "price_range": "TEXT",
+        "hours": "TEXT",
+        "photo_url": "TEXT",
+        "attributes": "TEXT",
+        "summary": "TEXT",
+        "yelp_id": "TEXT"
+    }
+    for col_name, col_type in new_columns.items():
+        if col_name not in business_columns:
+            cursor.execute(f"ALTER TABLE businesses ADD COLUMN {col_name} {col_type}")
+
+    # Deals
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            business_id INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            FOREIGN KEY (business_id) REFERENCES businesses(id)
+        )
+    """)
+
+    # Reviews - linked to user and business
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            business_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL,
+            review_text TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            created_time TEXT NOT NULL,
+            FOREIGN KEY (business_id) REFERENCES businesses(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Favorites - user bookmarks
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS favorites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            business_id INTEGER NOT NULL,
+            UNIQUE(user_id, business_id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (business_id) REFERENCES businesses(id)
+        )
+    """)
+
+
+def _migration_002_hot_lookup_indexes(cursor):
+    """
+    Indexes for every hot lookup in queries.py.
+
+    favorites(user_id) is already served by the UNIQUE(user_id, business_id)
+    index, so only the reverse business_id lookup is added for that table.
+    """
+    # Very early files have no rating columns; the rating index needs them
+    cursor.execute("PRAGMA table_info(businesses)")
+    business_columns = [row[1] for row in cursor.fetchall()]
+    if "average_rating" not in business_columns:
+        cursor.execute("ALTER TABLE businesses ADD COLUMN average_rating REAL NOT NULL DEFAULT 0")
+    if "total_reviews" not in business_columns:
+        cursor.execute("ALTER TABLE businesses ADD COLUMN total_reviews INTEGER NOT NULL DEFAULT 0")
+
+    index_statements = [
+        # Business detail page and "My Reviews": filter + ORDER BY date/time straight from the index
+        "CREATE INDEX IF NOT EXISTS idx_reviews_business ON reviews(business_id, created_date, created_time)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews(user_id, created_date, created_time)",
+        "CREATE INDEX IF NOT EXISTS idx_favorites_business ON favorites(business_id)",
+        "CREATE INDEX IF NOT EXISTS idx_deals_business ON deals(business_id)",
+        # Category filter sorted by name; also covers SELECT DISTINCT category
+        "CREATE INDEX IF NOT EXISTS idx_businesses_category ON businesses(category, name)",
+        # Trending / recommendations ordering
+        "CREATE INDEX IF NOT EXISTS idx_businesses_rating ON businesses(average_rating, total_reviews)",
+        "CREATE INDEX IF NOT EXISTS idx_email_codes_user ON email_verification_codes(user_id, created_at)",
+        # Case-insensitive lookups (must match the expressions used in queries.py)
+        "CREATE INDEX IF NOT EXISTS idx_businesses_lower_name ON businesses(lower(name))",
+        "CREATE INDEX IF NOT EXISTS idx_users_lower_email ON users(lower(email))",
+        "CREATE INDEX IF NOT EXISTS idx_users_lower_username ON users(lower(username))",
+    ]
+    for statement in index_statements:
+        cursor.execute(statement)
+    # Refresh planner statistics so the new indexes are chosen immediately
+    cursor.execute("ANALYZE")
+
+
+def _migration_003_keyset_sort_indexes(cursor):
+    """Indexes matching the directory sort keys so keyset pages seek instead of sorting."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_businesses_rating_name ON businesses(average_rating, name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_businesses_reviews_name ON businesses(total_reviews, name)")
+
+
+def _migration_004_business_full_text_search(cursor):
+    """
+    FTS5 index over business name, category, description, summary and attributes.
+
+    External-content table (the text lives only in `businesses`), kept in sync by
+    triggers. Skipped when the SQLite build lacks FTS5; queries.py then falls back
+    to LIKE matching on names.
+    """
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if not cursor.fetchone()[0]:
+        return
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS businesses_fts USING fts5(
+            name, category, description, summary, attributes,
+            content='businesses',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS businesses_fts_after_insert AFTER INSERT ON businesses BEGIN
+            INSERT INTO businesses_fts (rowid, name, category, description, summary, attributes)
+            VALUES (new.id, new.name, new.category, new.description, new.summary, new.attributes);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS businesses_fts_after_delete AFTER DELETE ON businesses BEGIN
+            INSERT INTO businesses_fts (businesses_fts, rowid, name, category, description, summary, attributes)
+            VALUES ('delete', old.id, old.name, old.category, old.description, old.summary, old.attributes);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS businesses_fts_after_update
+        AFTER UPDATE OF name, category, description, summary, attributes ON businesses BEGIN
+            INSERT INTO businesses_fts (businesses_fts, rowid, name, category, description, summary, attributes)
+            VALUES ('delete', old.id, old.name, old.category, old.description, old.summary, old.attributes);
+            INSERT INTO businesses_fts (rowid, name, category, description, summary, attributes)
+            VALUES (new.id, new.name, new.category, new.description, new.summary, new.attributes);
+        END
+    """)
+    # Index every existing business
+    cursor.execute("INSERT INTO businesses_fts (businesses_fts) VALUES ('rebuild')")
+
+
+def _migration_005_app_meta_and_catalog_version(cursor):
+    """
+    Small key/value table for app-wide state, starting with a catalog version.
+
+    Triggers bump `catalog_version` whenever a business is added, removed, renamed
+    or recategorized, so in-memory search indexes in any process can tell that
+    their copy of the catalog is stale with one primary-key lookup.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('catalog_version', '0')")
+    bump = "UPDATE app_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'catalog_version';"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS businesses_catalog_after_insert AFTER INSERT ON businesses BEGIN {bump} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS businesses_catalog_after_delete AFTER DELETE ON businesses BEGIN {bump} END")
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS businesses_catalog_after_update AFTER UPDATE OF name, category ON businesses "
+        f"WHEN old.name IS NOT new.name OR old.category IS NOT new.category BEGIN {bump} END"
+    )
+
+
+def _migration_006_facet_index(cursor):
+    """Covering index for the directory's grouped facet-count query."""
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_businesses_facets ON businesses(category, price_range, average_rating)"
+    )
+
+
+def _migration_007_business_location_rtree(cursor):
+    """
+    R*Tree over business coordinates for bounding-box and radius searches.
+
+    Each business with both coordinates is one degenerate box (min = max).
+    Triggers keep the tree in step with inserts, coordinate changes and
+    deletes. Builds without R*Tree get a plain (latitude, longitude) index
+    instead, which queries.py uses for the same bounding-box filter.
+    """
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_RTREE')")
+    if not cursor.fetchone()[0]:
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_businesses_location ON businesses(latitude, longitude)")
+        return
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS businesses_rtree USING rtree(
+            id, min_lat, max_lat, min_lng, max_lng
+        )
+    """)
+    insert_point = """
+        INSERT INTO businesses_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    """
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS businesses_rtree_after_insert AFTER INSERT ON businesses BEGIN {insert_point} END")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS businesses_rtree_after_update
+        AFTER UPDATE OF latitude, longitude ON businesses BEGIN
+            DELETE FROM businesses_rtree WHERE id = old.id;
+            {insert_point}
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS businesses_rtree_after_delete AFTER DELETE ON businesses BEGIN
+            DELETE FROM businesses_rtree WHERE id = old.id;
+        END
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO businesses_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT id, latitude, latitude, longitude, longitude FROM businesses
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """)
+
+
+def _migration_008_location_version(cursor):
+    """
+    `location_version` counter in app_meta for the map's in-memory clusters.
+
+    Bumped whenever a business is added or removed, or its coordinates or
+    category change, so cluster grids in any process can tell their copy of
+    the map is stale with one primary-key lookup (catalog_version ignores
+    coordinate changes).
+    """
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('location_version', '0')")
+    bump = "UPDATE app_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'location_version';"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS businesses_location_after_insert AFTER INSERT ON businesses BEGIN {bump} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS businesses_location_after_delete AFTER DELETE ON businesses BEGIN {bump} END")
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS businesses_location_after_update AFTER UPDATE OF latitude, longitude, category ON businesses "
+        "WHEN old.latitude IS NOT new.latitude OR old.longitude IS NOT new.longitude OR old.category IS NOT new.category "
+        f"BEGIN {bump} END"
+    )
+
+
+def _migration_009_geocode_cache(cursor):
+    """
+    Persistent geocoding cache shared by every process.
+
+    Keyed by the normalized address string sent to the geocoder. Rows with
+    status 'not_found' are negative entries (the geocoder had no answer), so
+    a bad address is not retried until it expires either.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            address_key TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            expires_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_expires ON geocode_cache(expires_at)")
+
+
+def _migration_010_geocode_queue(cursor):
+    """
+    Queue of businesses waiting for server-side geocoding, filled by triggers.
+
+    A business is queued when it is inserted with an address but no
+    coordinates, when its coordinates are cleared, or when its address changes
+    without new coordinates in the same write. The queued address is kept so
+    the worker can tell a result is stale if the address changed meanwhile.
+    `next_attempt_at` doubles as a lease: claiming a row pushes it forward.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS geocode_queue (
+            business_id INTEGER PRIMARY KEY,
+            address TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            enqueued_at TEXT NOT NULL DEFAULT (datetime('now')),
+            next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY (business_id) REFERENCES businesses(id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_geocode_queue_due ON geocode_queue(next_attempt_at)")
+    enqueue = (
+        "INSERT INTO geocode_queue (business_id, address) VALUES (new.id, new.address) "
+        "ON CONFLICT(business_id) DO UPDATE SET address = excluded.address, attempts = 0, last_error = NULL, "
+        "enqueued_at = datetime('now'), next_attempt_at = datetime('now');"
+    )
+    has_address = "new.address IS NOT NULL AND trim(new.address) != ''"
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS businesses_geocode_after_insert AFTER INSERT ON businesses "
+        f"WHEN {has_address} AND (new.latitude IS NULL OR new.longitude IS NULL) BEGIN {enqueue} END"
+    )
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS businesses_geocode_after_update AFTER UPDATE OF address, latitude, longitude ON businesses "
+        f"WHEN {has_address} AND ("
+        "(new.latitude IS NULL OR new.longitude IS NULL) AND (old.latitude IS NOT NULL AND old.longitude IS NOT NULL OR old.address IS NOT new.address) "
+        "OR old.address IS NOT new.address AND old.latitude IS new.latitude AND old.longitude IS new.longitude"
+        f") BEGIN {enqueue} END"
+    )
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS businesses_geocode_after_delete AFTER DELETE ON businesses "
+        "BEGIN DELETE FROM geocode_queue WHERE business_id = old.id; END"
+    )
+    # Everything already waiting for coordinates
+    cursor.execute(
+        "INSERT OR IGNORE INTO geocode_queue (business_id, address) "
+        "SELECT id, address FROM businesses "
+        "WHERE address IS NOT NULL AND trim(address) != '' AND (latitude IS NULL OR longitude IS NULL)"
+    )
+
+
+def _migration_011_yelp_sync_keys(cursor):
+    """
+    Key the Yelp sync on yelp_id and remember each row's content hash.
+
+    Rows inserted without a Yelp ID used to store '' (so only one could
+    exist); those become NULL, duplicate IDs keep only their oldest row, and
+    a unique index backs `ON CONFLICT(yelp_id)` on databases whose column was
+    added by ALTER TABLE (which cannot add the UNIQUE constraint).
+    """
+    cursor.execute("PRAGMA table_info(businesses)")
+    if "content_hash" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE businesses ADD COLUMN content_hash TEXT")
+    cursor.execute("UPDATE businesses SET yelp_id = NULL WHERE trim(yelp_id) = ''")
+    cursor.execute(
+        "UPDATE businesses SET yelp_id = NULL WHERE yelp_id IS NOT NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM businesses WHERE yelp_id IS NOT NULL GROUP BY yelp_id)"
+    )
+    # Skip the index when the table's own UNIQUE constraint already covers yelp_id
+    cursor.execute("PRAGMA index_list(businesses)")
+    unique_indexes = [row[1] for row in cursor.fetchall() if row[2]]
+    covered = any(
+        [column[2] for column in cursor.execute(f'PRAGMA index_info("{index_name}")').fetchall()] == ["yelp_id"]
+        for index_name in unique_indexes
+    )
+    if not covered:
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_businesses_yelp_id ON businesses(yelp_id)")
+
+
+def _migration_012_jobs(cursor):
+    """
+    Persistent background jobs and their periodic schedules.
+
+    `run_at` doubles as the lease, as in geocode_queue: claiming a job marks
+    it running and pushes run_at past its timeout, so a job whose worker died
+    is claimed again once the lease runs out. `lease_owner` is a token per
+    claim; a late finish from a lost lease no longer matches and is ignored.
+    The partial unique index keeps at most one queued or running job per
+    unique_key (a schedule never piles up runs behind a slow one).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            unique_key TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            timeout_seconds INTEGER NOT NULL DEFAULT 300,
+            run_at TEXT NOT NULL DEFAULT (datetime('now')),
+            lease_owner TEXT,
+            last_error TEXT,
+            result TEXT,
+            duration_ms INTEGER,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_at)")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_unique_key ON jobs(unique_key) "
+        "WHERE unique_key IS NOT NULL AND status IN ('queued', 'running')"
+    )
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_schedules (
+            name TEXT PRIMARY KEY,
+            interval_seconds INTEGER NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            next_run_at TEXT NOT NULL DEFAULT (datetime('now')),
+            last_enqueued_at TEXT
+        )
+    """)
+
+
+def _migration_013_email_outbox(cursor):
+    """
+    Durable queue of outgoing email, drained by the email worker pool.
+
+    `next_attempt_at` is the lease while a row is being sent, as in
+    geocode_queue. Rows that run out of attempts stay as status 'dead' until
+    requeued. Times are kept to the millisecond so send latency can be measured.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+            sent_at TEXT,
+            send_ms INTEGER,
+            latency_ms INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, next_attempt_at)")
+
+
+def _migration_014_email_templates(cursor):
+    """
+    Templated outbox rows for batched sends.
+
+    A templated row stores only its template name and per-recipient
+    substitutions (JSON); the subject and body live once in email_templates.
+    The workers send due rows that share a template in one API call, and
+    each sent row keeps the size of the batch it went out in.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_templates (
+            name TEXT PRIMARY KEY,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    cursor.execute("PRAGMA table_info(email_outbox)")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    for column in ("template TEXT", "substitutions TEXT", "batch_size INTEGER"):
+        if column.split()[0] not in existing_columns:
+            cursor.execute(f"ALTER TABLE email_outbox ADD COLUMN {column}")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_email_outbox_template_due ON email_outbox(template, status, next_attempt_at)"
+    )
+
+
+def _migration_015_deal_digest_index(cursor):
+    """
+    Covering favorites(business_id, user_id) index for the deal digest.
+
+    The digest reads every follower of the businesses with new deals in
+    business order; with user_id in the index that is one index range per
+    business and no table lookups. It replaces the business_id-only index.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_favorites_business_user ON favorites(business_id, user_id)")
+    cursor.execute("DROP INDEX IF EXISTS idx_favorites_business")
+
+
+def _migration_016_business_closed_at(cursor):
+    """
+    `closed_at` on businesses, set when Yelp reports a business permanently closed.
+
+    Closed businesses are hidden from listings, search and the map but keep
+    their reviews and favorites. Closing or reopening one bumps
+    catalog_version and location_version so in-memory indexes drop or restore it.
+    """
+    cursor.execute("PRAGMA table_info(businesses)")
+    if "closed_at" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE businesses ADD COLUMN closed_at TEXT")
+    # Partial index so unfiltered directory counts over open businesses stay index-only
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_businesses_open ON businesses(category) WHERE closed_at IS NULL")
+    bump = (
+        "UPDATE app_meta SET value = CAST(value AS INTEGER) + 1 "
+        "WHERE key IN ('catalog_version', 'location_version');"
+    )
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS businesses_closed_after_update AFTER UPDATE OF closed_at ON businesses "
+        f"WHEN (old.closed_at IS NULL) IS NOT (new.closed_at IS NULL) BEGIN {bump} END"
+    )
+
+
+# (version, description, function) - versions must be consecutive, starting at 1
+MIGRATIONS = [
+    (1, "baseline schema", _migration_001_baseline_schema),
+    (2, "indexes for hot lookups", _migration_002_hot_lookup_indexes),
+    (3, "directory sort indexes for keyset pagination", _migration_003_keyset_sort_indexes),
+    (4, "FTS5 full-text search over businesses", _migration_004_business_full_text_search),
+    (5, "app_meta table and catalog version triggers", _migration_005_app_meta_and_catalog_version),
+    (6, "covering index for directory facet counts", _migration_006_facet_index),
+    (7, "R*Tree index over business coordinates", _migration_007_business_location_rtree),
+    (8, "location version triggers for map clusters", _migration_008_location_version),
+    (9, "geocode_cache table", _migration_009_geocode_cache),
+    (10, "geocode_queue table and enqueue triggers", _migration_010_geocode_queue),
+    (11, "yelp_id sync key and content hash", _migration_011_yelp_sync_keys),
+    (12, "jobs and job_schedules tables", _migration_012_jobs),
+    (13, "email_outbox table", _migration_013_email_outbox),
+    (14, "email templates and batched outbox rows", _migration_014_email_templates),
+    (15, "covering favorites index for the deal digest", _migration_015_deal_digest_index),
+    (16, "closed_at for businesses Yelp reports closed", _migration_016_business_closed_at),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection):
+    """Return the schema version recorded in the database (0 for a new/legacy file)."""
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def check_sqlite_version():
+    """Raise RuntimeError if the linked SQLite library is older than MIN_SQLITE_VERSION."""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(str(part) for part in MIN_SQLITE_VERSION)
+        raise RuntimeError(
+            f"SQLite {required} or newer is required (RETURNING support); "
+            f"this Python is linked against SQLite {sqlite3.sqlite_version}"
+        )
+
+
+def migrate(connection):
+    """
+    Apply all pending migrations in one transaction.
+
+    Takes the write lock up front (BEGIN IMMEDIATE) and re-reads the version
+    under it, so several app processes starting together migrate exactly once.
+    Fails first with a clear error if SQLite is too old for the queues.
+
+    Args:
+        connection (sqlite3.Connection): Open database connection
+
+    Returns:
+        int: Schema version after migrating
+    """
+    check_sqlite_version()
+    if get_schema_version(connection) >= LATEST_VERSION:
+        return LATEST_VERSION
+
+    if connection.in_transaction:
+        connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        current_version = get_schema_version(connection)
+        cursor = connection.cursor()
+        for version, _description, apply_migration in MIGRATIONS:
+            if version > current_version:
+                apply_migration(cursor)
+        # PRAGMA arguments cannot be bound; LATEST_VERSION is an int constant
+        cursor.execute(f"PRAGMA user_version = {int(LATEST_VERSION)}")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return LATEST_VERSION
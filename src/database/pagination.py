@@ -0,0 +1,181 @@
+"""
+Pagination - Keyset (cursor) pagination with page-number fallback
+
+A Listing describes one SQL listing: its columns, FROM/WHERE clause, named
+parameters and sort key. fetch_page() returns one page of it, either by
+seeking past an opaque cursor token (constant cost at any depth, served from
+the sort index) or, for legacy ?page= links, with LIMIT/OFFSET. Every page
+carries next/prev cursor tokens, so following links from any page switches
+to keyset seeking.
+
+Hidden Gems | FBLA 2026
+"""
+import base64
+import hashlib
+import json
+
+from .db import connection_scope
+
+
+class Listing:
+    """
+    A sortable SQL listing.
+
+    Args:
+        columns (str): SELECT list, e.g. "b.*"
+        from_sql (str): FROM clause body, e.g. "businesses b JOIN favorites f ON ..."
+        sort_keys (list): SQL expressions to order by; the last one must be unique
+                          (usually the primary key) so every row has a distinct key
+        where_sql (str): Optional WHERE condition (without the WHERE keyword)
+        parameters (dict): Named parameters (:name) used anywhere in the listing
+        descending (bool): Sort direction, shared by every key so (k1, k2, ...)
+                           row-value comparisons can seek through one index
+        max_items (int): Optional cap on how many rows the listing exposes
+    """
+
+    def __init__(self, columns, from_sql, sort_keys, where_sql="", parameters=None, descending=False, max_items=None):
+        self.columns = columns
+        self.from_sql = from_sql
+        self.sort_keys = list(sort_keys)
+        self.where_sql = where_sql
+        self.parameters = dict(parameters or {})
+        self.descending = descending
+        self.max_items = max_items
+
+    @property
+    def signature(self):
+        """Short fingerprint so a cursor from one listing is never applied to another."""
+        identity = json.dumps(
+            [self.from_sql, self.where_sql, self.sort_keys, self.descending, sorted(self.parameters.items())],
+            default=str,
+        )
+        return hashlib.sha1(identity.encode()).hexdigest()[:10]
+
+    def _order_by(self, descending):
+        direction = "DESC" if descending else "ASC"
+        return ", ".join(f"{key} {direction}" for key in self.sort_keys)
+
+    def _select(self, extra_where=None):
+        key_columns = ", ".join(f"{key} AS _sort_{index}" for index, key in enumerate(self.sort_keys))
+        conditions = [condition for condition in (self.where_sql, extra_where) if condition]
+        where = (" WHERE " + " AND ".join(f"({condition})" for condition in conditions)) if conditions else ""
+        return f"SELECT {self.columns}, {key_columns} FROM {self.from_sql}{where}"
+
+    def count_sql(self):
+        where = f" WHERE {self.where_sql}" if self.where_sql else ""
+        return f"SELECT COUNT(*) FROM {self.from_sql}{where}"
+
+
+def encode_cursor(state):
+    """Encode cursor state as an opaque, URL-safe token."""
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, signature):
+    """Decode a cursor token; returns None if it is malformed or belongs to another listing."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(state, dict) or state.get("s") != signature:
+        return None
+    if state.get("d") not in ("n", "p") or not isinstance(state.get("k"), list):
+        return None
+    if not isinstance(state.get("p"), int) or not isinstance(state.get("t"), int):
+        return None
+    return state
+
+
+def _page_window(total_items, page, per_page):
+    """Clamp a 1-indexed page number to the available pages; returns (page, total_pages)."""
+    try:
+        page = max(1, int(page))
+    except (ValueError, TypeError):
+        page = 1
+    total_pages = (total_items + per_page - 1) // per_page
+    if page > total_pages and total_pages > 0:
+        page = total_pages
+    return page, total_pages
+
+
+def fetch_page(listing, per_page=12, cursor=None, page=1):
+    """
+    Fetch one page of a listing.
+
+    With a valid cursor the page is found by seeking past the cursor's sort key
+    (no OFFSET, no COUNT - the total rides along in the token). Without one,
+    `page` is used with LIMIT/OFFSET so old ?page= links keep working.
+
+    Args:
+        listing (Listing): What to list
+        per_page (int): Page size
+        cursor (str): Opaque token from a previous page's next_cursor/prev_cursor
+        page (int): 1-indexed page number (used only when no valid cursor is given)
+
+    Returns:
+        dict: Contains 'items', 'page', 'total_pages', 'total_items',
+              'next_cursor' and 'prev_cursor' (None when there is no such page)
+    """
+    per_page = max(1, int(per_page))
+    state = decode_cursor(cursor, listing.signature)
+    parameters = dict(listing.parameters)
+    with connection_scope() as conn:
+        cur = conn.cursor()
+
+        if state and len(state["k"]) == len(listing.sort_keys):
+            total_items = state["t"]
+            page, total_pages = _page_window(total_items, state["p"], per_page)
+            # Seeking forward follows the listing order; seeking backward walks it in reverse
+            forward = state["d"] == "n"
+            scan_descending = listing.descending if forward else not listing.descending
+            operator = "<" if scan_descending else ">"
+            placeholders = []
+            for index, value in enumerate(state["k"]):
+                parameters[f"_cursor_{index}"] = value
+                placeholders.append(f":_cursor_{index}")
+            seek = f"({', '.join(listing.sort_keys)}) {operator} ({', '.join(placeholders)})"
+            limit = max(0, min(per_page, total_items - (page - 1) * per_page))
+            cur.execute(
+                listing._select(seek) + f" ORDER BY {listing._order_by(scan_descending)} LIMIT :_limit",
+                dict(parameters, _limit=limit),
+            )
+            rows = cur.fetchall()
+            if not forward:
+                rows.reverse()
+        else:
+            cur.execute(listing.count_sql(), parameters)
+            total_items = cur.fetchone()[0]
+            if listing.max_items is not None:
+                total_items = min(total_items, listing.max_items)
+            page, total_pages = _page_window(total_items, page, per_page)
+            offset = (page - 1) * per_page
+            limit = max(0, min(per_page, total_items - offset))
+            cur.execute(
+                listing._select() + f" ORDER BY {listing._order_by(listing.descending)} LIMIT :_limit OFFSET :_offset",
+                dict(parameters, _limit=limit, _offset=offset),
+            )
+            rows = cur.fetchall()
+
+    key_count = len(listing.sort_keys)
+    items = []
+    keys = []
+    for row in rows:
+        values = tuple(row)
+        items.append({name: value for name, value in zip(row.keys()[:-key_count], values[:-key_count])})
+        keys.append(list(values[-key_count:]))
+
+    def make_cursor(direction, key, target_page):
+        return encode_cursor({"s": listing.signature, "d": direction, "k": key, "p": target_page, "t": total_items})
+
+    return {
+        "items": items,
+        "page": page,
+        "total_pages": total_pages,
+        "total_items": total_items,
+        "next_cursor": make_cursor("n", keys[-1], page + 1) if keys and page < total_pages else None,
+        "prev_cursor": make_cursor("p", keys[0], page - 1) if keys and page > 1 else None,
+    }
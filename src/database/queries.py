@@ -3,8 +3,15 @@ Data access layer - all SQL operations.
 Hidden Gems | FBLA 2026
 """
 import sqlite3
+import hashlib
 import json
-from .db import get_connection
+import heapq
+import math
+import re
+from datetime import datetime, timezone
+from . import db
+from .db import connection_scope, get_connection
+from .pagination import Listing, fetch_page
 
 # ===== USER MANAGEMENT ===== 
 # All functions for retrieving and managing user account data
@@ -22,16 +29,15 @@ def user_by_email(email_address):
         dict: User record with keys (id, email, password_hash, email_verified, username)
         None: If no user found with this email
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Normalize email: trim whitespace and convert to lowercase
-    normalized_email = email_address.strip().lower()
-    cur.execute(
-        "SELECT id, email, password_hash, email_verified, username FROM users WHERE email = ?",
-        (normalized_email,)
-    )
-    user_row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Normalize email: trim whitespace and convert to lowercase
+        normalized_email = email_address.strip().lower()
+        cur.execute(
+            "SELECT id, email, password_hash, email_verified, username FROM users WHERE email = ?",
+            (normalized_email,)
+        )
+        user_row = cur.fetchone()
     # Convert SQLite Row object to dictionary for easier access
     return dict(user_row) if user_row else None
 
@@ -54,16 +60,15 @@ def user_by_username(username_input):
     if not username_input or not str(username_input).strip():
         return None
     
-    conn = get_connection()
-    cur = conn.cursor()
-    # Normalize username: trim whitespace and convert to lowercase
-    normalized_username = username_input.strip().lower()
-    cur.execute(
-        "SELECT id, email, password_hash, email_verified, username FROM users WHERE username = ?",
-        (normalized_username,)
-    )
-    user_row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Normalize username: trim whitespace and convert to lowercase
+        normalized_username = username_input.strip().lower()
+        cur.execute(
+            "SELECT id, email, password_hash, email_verified, username FROM users WHERE username = ?",
+            (normalized_username,)
+        )
+        user_row = cur.fetchone()
     # Convert SQLite Row object to dictionary
     return dict(user_row) if user_row else None
 
@@ -89,15 +94,14 @@ def user_by_email_or_username(user_identifier):
     # Normalize identifier: trim and lowercase for case-insensitive matching
     normalized_key = user_identifier.strip().lower()
     
-    conn = get_connection()
-    cur = conn.cursor()
-    # Query uses OR condition: match by email OR username (both case-insensitive)
-    cur.execute(
-        "SELECT id, email, password_hash, email_verified, username FROM users WHERE lower(email) = ? OR lower(username) = ?",
-        (normalized_key, normalized_key)
-    )
-    user_row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Query uses OR condition: match by email OR username (both case-insensitive)
+        cur.execute(
+            "SELECT id, email, password_hash, email_verified, username FROM users WHERE lower(email) = ? OR lower(username) = ?",
+            (normalized_key, normalized_key)
+        )
+        user_row = cur.fetchone()
     # Convert SQLite Row object to dictionary
     return dict(user_row) if user_row else None
 
@@ -116,15 +120,14 @@ def get_user_by_id(user_id_value):
         dict: User record with keys (id, email, password_hash, email_verified, username)
         None: If no user found with this ID
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Query by primary key (fastest database lookup)
-    cur.execute(
-        "SELECT id, email, password_hash, email_verified, username FROM users WHERE id = ?",
-        (user_id_value,)
-    )
-    user_row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Query by primary key (fastest database lookup)
+        cur.execute(
+            "SELECT id, email, password_hash, email_verified, username FROM users WHERE id = ?",
+            (user_id_value,)
+        )
+        user_row = cur.fetchone()
     # Convert SQLite Row object to dictionary
     return dict(user_row) if user_row else None
 
@@ -145,24 +148,21 @@ def create_user(username_new, email_new, password_hash_value):
         int: New user ID if creation successful
         None: If username or email already exists (IntegrityError)
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        # Insert new user with email_verified=0 (unverified)
-        cur.execute(
-            "INSERT INTO users (username, email, password_hash, email_verified) VALUES (?, ?, ?, 0)",
-            (username_new.strip().lower(), email_new.strip().lower(), password_hash_value)
-        )
-        conn.commit()
-        # Get the auto-generated user ID (primary key)
-        new_user_id = cur.lastrowid
-        conn.close()
-        return new_user_id
-    except sqlite3.IntegrityError:
-        # Unique constraint violated (email or username already exists)
-        conn.rollback()
-        conn.close()
-        return None  # Signal creation failed due to duplicate
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        try:
+            # Insert new user with email_verified=0 (unverified)
+            cur.execute(
+                "INSERT INTO users (username, email, password_hash, email_verified) VALUES (?, ?, ?, 0)",
+                (username_new.strip().lower(), email_new.strip().lower(), password_hash_value)
+            )
+            conn.commit()
+            # Get the auto-generated user ID (primary key)
+            return cur.lastrowid
+        except sqlite3.IntegrityError:
+            # Unique constraint violated (email or username already exists)
+            conn.rollback()
+            return None  # Signal creation failed due to duplicate
 
 
 def set_email_verified(user_id_to_mark, is_verified_flag=1):
@@ -179,15 +179,14 @@ def set_email_verified(user_id_to_mark, is_verified_flag=1):
     Returns:
         None (database is updated immediately)
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Update email_verified flag in users table
-    cur.execute(
-        "UPDATE users SET email_verified = ? WHERE id = ?",
-        (is_verified_flag, user_id_to_mark)
-    )
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Update email_verified flag in users table
+        cur.execute(
+            "UPDATE users SET email_verified = ? WHERE id = ?",
+            (is_verified_flag, user_id_to_mark)
+        )
+        conn.commit()
 
 
 def update_user_username(user_id_to_update, new_username_value):
@@ -204,42 +203,56 @@ def update_user_username(user_id_to_update, new_username_value):
     Returns:
         None (database is updated immediately)
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Normalize username and update in database
-    cur.execute(
-        "UPDATE users SET username = ? WHERE id = ?",
-        (new_username_value.strip().lower(), user_id_to_update)
-    )
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Normalize username and update in database
+        cur.execute(
+            "UPDATE users SET username = ? WHERE id = ?",
+            (new_username_value.strip().lower(), user_id_to_update)
+        )
+        conn.commit()
 
 
 def update_user_password(user_id, new_password_hash):
     """Update user's password hash."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_password_hash, user_id))
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_password_hash, user_id))
+        conn.commit()
 
 
 def save_user_preferences(user_id, preferences_json):
-    """Save user preferences (as JSON string) to database."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET user_preferences = ? WHERE id = ?", (preferences_json, user_id))
-    conn.commit()
-    conn.close()
+    """
+    Merge preferences (a JSON object string) into the user's saved preferences.
+    
+    Each settings form saves only its own keys, so keys it does not send
+    (e.g. the deal_notifications opt-out when privacy is saved) are kept.
+    """
+    with connection_scope() as conn:
+        if conn.in_transaction:
+            conn.commit()
+        cur = conn.cursor()
+        # Read and write under the write lock, so two forms saved at once both stick
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT user_preferences FROM users WHERE id = ?", (user_id,))
+        row = cur.fetchone()
+        try:
+            preferences = json.loads(row[0]) if row and row[0] else {}
+        except (json.JSONDecodeError, TypeError):
+            preferences = {}
+        if not isinstance(preferences, dict):
+            preferences = {}
+        preferences.update(json.loads(preferences_json))
+        cur.execute("UPDATE users SET user_preferences = ? WHERE id = ?", (json.dumps(preferences), user_id))
+        conn.commit()
 
 
 def get_user_preferences(user_id):
     """Get user preferences (returns dict with favorite_categories, default_sort, etc.)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT user_preferences FROM users WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT user_preferences FROM users WHERE id = ?", (user_id,))
+        row = cur.fetchone()
     
     if not row or not row[0]:
         # Return defaults if no preferences saved
@@ -253,27 +266,26 @@ def get_user_preferences(user_id):
 
 def get_user_stats(user_id):
     """Get user statistics: total reviews, favorites, average rating given."""
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Count reviews
-    cur.execute("SELECT COUNT(*) FROM reviews WHERE user_id = ?", (user_id,))
-    review_count = cur.fetchone()[0]
-    
-    # Count favorites
-    cur.execute("SELECT COUNT(*) FROM favorites WHERE user_id = ?", (user_id,))
-    favorite_count = cur.fetchone()[0]
-    
-    # Average rating given
-    cur.execute("SELECT AVG(rating) FROM reviews WHERE user_id = ?", (user_id,))
-    avg_rating = cur.fetchone()[0] or 0
-    
-    # Get user info with creation date
-    cur.execute("SELECT created_date FROM users WHERE id = ?", (user_id,))
-    user_row = cur.fetchone()
-    created_date = user_row[0] if user_row else None
-    
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        
+        # Count reviews
+        cur.execute("SELECT COUNT(*) FROM reviews WHERE user_id = ?", (user_id,))
+        review_count = cur.fetchone()[0]
+        
+        # Count favorites
+        cur.execute("SELECT COUNT(*) FROM favorites WHERE user_id = ?", (user_id,))
+        favorite_count = cur.fetchone()[0]
+        
+        # Average rating given
+        cur.execute("SELECT AVG(rating) FROM reviews WHERE user_id = ?", (user_id,))
+        avg_rating = cur.fetchone()[0] or 0
+        
+        # Get user info with creation date
+        cur.execute("SELECT created_date FROM users WHERE id = ?", (user_id,))
+        user_row = cur.fetchone()
+        created_date = user_row[0] if user_row else None
+        
     
     return {
         "review_count": review_count,
@@ -285,70 +297,64 @@ def get_user_stats(user_id):
 
 def create_email_verification_code(user_id, code):
     """Store a verification code for the user (whitespace trimmed for consistency)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    # Strip code to handle any whitespace issues
-    clean_code = str(code).strip()
-    cur.execute(
-        "INSERT INTO email_verification_codes (user_id, code) VALUES (?, ?)",
-        (user_id, clean_code)
-    )
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Strip code to handle any whitespace issues
+        clean_code = str(code).strip()
+        cur.execute(
+            "INSERT INTO email_verification_codes (user_id, code) VALUES (?, ?)",
+            (user_id, clean_code)
+        )
+        conn.commit()
 
 
 def get_latest_verification_code(user_id):
     """Get the most recent verification code for user (trimmed), or None."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT code FROM email_verification_codes WHERE user_id = ? ORDER BY created_at DESC LIMIT 1",
-        (user_id,)
-    )
-    verification_row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT code FROM email_verification_codes WHERE user_id = ? ORDER BY created_at DESC LIMIT 1",
+            (user_id,)
+        )
+        verification_row = cur.fetchone()
     return str(verification_row[0]).strip() if verification_row else None
 
 
 def validate_email_code(user_id, code):
     """Check if code matches latest for user; if so set email_verified=1 and return True."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id FROM email_verification_codes WHERE user_id = ? AND code = ? ORDER BY created_at DESC LIMIT 1",
-        (user_id, code.strip())
-    )
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False
-    cur.execute("UPDATE users SET email_verified = 1 WHERE id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id FROM email_verification_codes WHERE user_id = ? AND code = ? ORDER BY created_at DESC LIMIT 1",
+            (user_id, code.strip())
+        )
+        row = cur.fetchone()
+        if not row:
+            return False
+        cur.execute("UPDATE users SET email_verified = 1 WHERE id = ?", (user_id,))
+        conn.commit()
     return True
 
 
 # ---- Verification (for you to see in DB) ----
 def log_verification_attempt(email, verification_type, question, correct_answer, user_answer, success, context):
     """Store every verification attempt in the verification_attempts table."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO verification_attempts
-        (email, verification_type, question, correct_answer, user_answer, success, context)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (email or "", verification_type, question, correct_answer, user_answer or "", 1 if success else 0, context))
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO verification_attempts
+            (email, verification_type, question, correct_answer, user_answer, success, context)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (email or "", verification_type, question, correct_answer, user_answer or "", 1 if success else 0, context))
+        conn.commit()
 
 
 def get_all_verification_attempts():
     """Return all verification attempts (for admin/view)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM verification_attempts ORDER BY attempted_at DESC")
-    attempt_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM verification_attempts ORDER BY attempted_at DESC")
+        attempt_rows = cur.fetchall()
     return [dict(r) for r in attempt_rows]
 
 
@@ -365,12 +371,11 @@ def get_all_businesses():
         list: List of business dictionaries, each with complete business data
         Returns [] if no businesses in database
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Query all businesses, sorted by name for consistent display
-    cur.execute("SELECT * FROM businesses ORDER BY name")
-    business_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Query all businesses, sorted by name for consistent display
+        cur.execute("SELECT * FROM businesses WHERE closed_at IS NULL ORDER BY name")
+        business_rows = cur.fetchall()
     # Convert SQLite Row objects to dictionaries
     return [dict(business_row) for business_row in business_rows]
 
@@ -388,25 +393,215 @@ def get_businesses_by_category(category_name):
         list: List of business dictionaries in that category, sorted by name
         Returns [] if no businesses in that category
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Filter by exact category match, sorted alphabetically
-    cur.execute(
-        "SELECT * FROM businesses WHERE category = ? ORDER BY name",
-        (category_name,)
-    )
-    business_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Filter by exact category match, sorted alphabetically
+        cur.execute(
+            "SELECT * FROM businesses WHERE category = ? AND closed_at IS NULL ORDER BY name",
+            (category_name,)
+        )
+        business_rows = cur.fetchall()
     # Convert SQLite Row objects to dictionaries
     return [dict(business_row) for business_row in business_rows]
 
 
+# BM25 column weights for businesses_fts: name, category, description, summary, attributes.
+# A hit in the name counts most; lower bm25() values are better matches.
+FTS_RANK = "bm25(businesses_fts, 10.0, 4.0, 1.0, 2.0, 1.0)"
+
+# (database path, table name) -> whether that optional table exists
+_optional_tables = {}
+
+
+def _optional_table_exists(table_name):
+    """Whether an optional virtual table (FTS5, R*Tree) was created; checked once per database."""
+    cache_key = (str(db.DATABASE_PATH), table_name)
+    if cache_key not in _optional_tables:
+        with connection_scope() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+            _optional_tables[cache_key] = cur.fetchone() is not None
+    return _optional_tables[cache_key]
+
+
+def fulltext_available():
+    """True if the current database has the FTS5 businesses index (migration 4 ran with FTS5 support)."""
+    return _optional_table_exists("businesses_fts")
+
+
+def build_fts_query(search_text, match_all=True):
+    """
+    Turn free text into an FTS5 MATCH expression of quoted prefix terms.
+    
+    "mario piz" becomes '"mario"* AND "piz"*', so partial words still match and
+    user input can never inject FTS5 query syntax.
+    
+    Args:
+        search_text (str): What the user typed
+        match_all (bool): AND the terms together (True) or OR them (False)
+    
+    Returns:
+        str: MATCH expression, or None if the text has no searchable words
+    """
+    terms = re.findall(r"\w+", str(search_text or "").lower())
+    if not terms:
+        return None
+    return (" AND " if match_all else " OR ").join(f'"{term}"*' for term in terms)
+
+
+# Sort key (SQL expressions, last one unique) and direction for each directory sort option.
+# Keys share one direction so keyset pagination can seek with a row-value comparison.
+DIRECTORY_SORT_KEYS = {
+    "name": (["lower(name)", "id"], False),
+    "relevance": ([FTS_RANK, "businesses.id"], False),
+    "rating_high": (["average_rating", "name", "id"], True),
+    "rating_low": (["average_rating", "name", "id"], False),
+    "reviews": (["total_reviews", "name", "id"], True),
+    "reviews_low": (["total_reviews", "name", "id"], False),
+}
+
+
+def _directory_order_sql(sort_by_option):
+    """ORDER BY clause for a directory sort option (defaults to name; relevance needs a search)."""
+    if sort_by_option == "relevance":
+        sort_by_option = "name"
+    sort_keys, descending = DIRECTORY_SORT_KEYS.get(sort_by_option, DIRECTORY_SORT_KEYS["name"])
+    direction = " DESC" if descending else " ASC"
+    return ", ".join(key + direction for key in sort_keys)
+
+
+# Minimum-rating choices offered as directory filters, best first
+RATING_FACET_THRESHOLDS = (4.5, 4.0, 3.0)
+HAS_DEALS_SQL = "EXISTS (SELECT 1 FROM deals WHERE deals.business_id = businesses.id)"
+
+
+def _directory_filters(category_filter=None, search_query=None, ranked=False, price_range=None, min_rating=None, has_deals=False):
+    """
+    Build the WHERE condition and named parameters shared by directory listing and counting.
+    
+    With ranked=True the full-text condition is written against a joined
+    businesses_fts table (so bm25() can rank rows) instead of as a subquery.
+    """
+    where_clauses = ["businesses.closed_at IS NULL"]
+    parameters = {}
+    if category_filter and str(category_filter).strip() and str(category_filter).strip().lower() != "all":
+        where_clauses.append("businesses.category = :category")
+        parameters["category"] = str(category_filter).strip()
+    if search_query and str(search_query).strip():
+        fts_query = build_fts_query(search_query)
+        if fts_query and fulltext_available():
+            if ranked:
+                where_clauses.append("businesses_fts MATCH :fts_query")
+            else:
+                where_clauses.append("businesses.id IN (SELECT rowid FROM businesses_fts WHERE businesses_fts MATCH :fts_query)")
+            parameters["fts_query"] = fts_query
+        else:
+            where_clauses.append("lower(businesses.name) LIKE :name_pattern")
+            parameters["name_pattern"] = "%" + str(search_query).strip().lower() + "%"
+    if price_range:
+        where_clauses.append("businesses.price_range = :price_range")
+        parameters["price_range"] = price_range
+    if min_rating is not None:
+        where_clauses.append("businesses.average_rating >= :min_rating")
+        parameters["min_rating"] = float(min_rating)
+    if has_deals:
+        where_clauses.append(HAS_DEALS_SQL)
+    return " AND ".join(where_clauses), parameters
+
+
+def get_directory_facets(category_filter=None, search_query=None, price_range=None, min_rating=None, has_deals=False):
+    """
+    Result counts for every directory filter option, from one grouped query.
+    
+    Businesses matching the search are grouped by (category, price range,
+    rating bucket, has deals); each facet's counts are then summed in Python
+    over the groups that pass every *other* active filter, so each number is
+    what the user would get by picking that option next.
+    
+    Args:
+        category_filter (str): Active category ("All"/None = any)
+        search_query (str): Active search text
+        price_range (str): Active price range (e.g. "$$")
+        min_rating (float): Active minimum rating
+        has_deals (bool): Whether only businesses with deals are shown
+    
+    Returns:
+        dict: 'categories' and 'price_ranges' (lists of {'value', 'count'}),
+              'ratings' (list of {'value', 'label', 'count'}), 'has_deals' (int),
+              'category_total' (count for "All" categories) and 'total'
+              (businesses matching every active filter)
+    """
+    if category_filter and str(category_filter).strip().lower() == "all":
+        category_filter = None
+    where_sql, parameters = _directory_filters(search_query=search_query)
+    rating_bucket = "CASE " + " ".join(
+        f"WHEN businesses.average_rating >= {threshold} THEN {threshold}" for threshold in RATING_FACET_THRESHOLDS
+    ) + " ELSE 0 END"
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""SELECT businesses.category AS category, businesses.price_range AS price_range,
+                       {rating_bucket} AS rating_bucket, {HAS_DEALS_SQL} AS has_deals, COUNT(*) AS business_count
+                FROM businesses{" WHERE " + where_sql if where_sql else ""}
+                GROUP BY businesses.category, businesses.price_range, rating_bucket, has_deals""",
+            parameters
+        )
+        groups = cur.fetchall()
+    
+    def passes(group, skip):
+        if skip != "category" and category_filter and group["category"] != category_filter:
+            return False
+        if skip != "price_range" and price_range and group["price_range"] != price_range:
+            return False
+        if skip != "rating" and min_rating is not None and group["rating_bucket"] < float(min_rating):
+            return False
+        if skip != "has_deals" and has_deals and not group["has_deals"]:
+            return False
+        return True
+    
+    category_counts = {}
+    price_counts = {}
+    rating_counts = dict.fromkeys(RATING_FACET_THRESHOLDS, 0)
+    deals_count = 0
+    total = 0
+    for group in groups:
+        count = group["business_count"]
+        if passes(group, "category") and group["category"]:
+            category_counts[group["category"]] = category_counts.get(group["category"], 0) + count
+        if passes(group, "price_range") and group["price_range"]:
+            price_counts[group["price_range"]] = price_counts.get(group["price_range"], 0) + count
+        if passes(group, "rating"):
+            for threshold in RATING_FACET_THRESHOLDS:
+                if group["rating_bucket"] >= threshold:
+                    rating_counts[threshold] += count
+        if passes(group, "has_deals") and group["has_deals"]:
+            deals_count += count
+        if passes(group, None):
+            total += count
+    
+    return {
+        "categories": [{"value": value, "count": category_counts[value]} for value in sorted(category_counts)],
+        "price_ranges": [
+            {"value": value, "count": price_counts[value]}
+            for value in sorted(price_counts, key=lambda value: (len(value), value))
+        ],
+        "ratings": [
+            {"value": threshold, "label": f"{threshold:g}+", "count": rating_counts[threshold]}
+            for threshold in RATING_FACET_THRESHOLDS
+        ],
+        "has_deals": deals_count,
+        "category_total": sum(category_counts.values()),
+        "total": total,
+    }
+
+
 def get_businesses_for_directory(category_filter=None, sort_by_option="name"):
     """
     Get businesses for directory page with optional filtering and sorting.
     
     Combines category filtering with multiple sort options to support
-    different ways users browse the business directory.
+    different ways users browse the business directory. Filtering and sorting
+    both happen in SQL.
     
     Args:
         category_filter (str): Optional category to filter by. If None, \"all\", or empty,
@@ -421,48 +616,57 @@ def get_businesses_for_directory(category_filter=None, sort_by_option="name"):
     Returns:
         list: List of business dictionaries, filtered and sorted as requested
     """
-    # Apply category filter if specified
-    if category_filter and str(category_filter).strip() and str(category_filter).strip().lower() != "all":
-        filtered_businesses = get_businesses_by_category(category_filter.strip())
-    else:
-        # No filter: retrieve all businesses
-        filtered_businesses = get_all_businesses()
-    
-    # Apply sort option
-    if sort_by_option == "rating_high":
-        # Highest rated first (4.5+ stars) - best businesses
-        filtered_businesses = sorted(
-            filtered_businesses,
-            key=lambda b: (float(b.get("average_rating") or 0), b.get("name") or ""),
-            reverse=True
-        )
-    elif sort_by_option == "rating_low":
-        # Lowest rated first - discover underrated businesses
-        filtered_businesses = sorted(
-            filtered_businesses,
-            key=lambda b: (float(b.get("average_rating") or 0), b.get("name") or "")
-        )
-    elif sort_by_option == "reviews":
-        # Most reviewed first - most popular/established businesses
-        filtered_businesses = sorted(
-            filtered_businesses,
-            key=lambda b: (int(b.get("total_reviews") or 0), b.get("name") or ""),
-            reverse=True
-        )
-    elif sort_by_option == "reviews_low":
-        # Least reviewed first - actually hidden gems
-        filtered_businesses = sorted(
-            filtered_businesses,
-            key=lambda b: (int(b.get("total_reviews") or 0), b.get("name") or "")
-        )
-    else:
-        # Default: alphabetical by name (case-insensitive)
-        filtered_businesses = sorted(
-            filtered_businesses,
-            key=lambda b: (b.get("name") or "").lower()
+    where_sql, parameters = _directory_filters(category_filter)
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM businesses" + (" WHERE " + where_sql if where_sql else "") + " ORDER BY " + _directory_order_sql(sort_by_option),
+            parameters
         )
+        business_rows = cur.fetchall()
+    return [dict(business_row) for business_row in business_rows]
+
+
+def get_directory_page(category_filter=None, search_query=None, sort_by_option="name", page=1, per_page=12, cursor=None,
+                       price_range=None, min_rating=None, has_deals=False):
+    """
+    One page of the business directory, filtered, sorted and windowed in SQL.
+    
+    Args:
+        category_filter (str): Optional category ("All"/None/empty = every category)
+        search_query (str): Optional full-text search over name, category, description,
+                            summary and attributes (name-only LIKE without FTS5)
+        sort_by_option (str): One of DIRECTORY_SORT_KEYS (defaults to 'name');
+                              'relevance' ranks full-text hits by BM25
+        page (int): Page number (1-indexed), used for legacy ?page= links
+        per_page (int): Businesses per page
+        cursor (str): Opaque cursor token from a previous page (takes precedence over page)
+        price_range (str): Optional exact price range (e.g. "$$")
+        min_rating (float): Optional minimum average rating
+        has_deals (bool): Only businesses with at least one deal
     
-    return filtered_businesses
+    Returns:
+        dict: Contains 'items', 'page', 'total_pages', 'total_items', 'next_cursor', 'prev_cursor'
+    """
+    ranked = sort_by_option == "relevance"
+    where_sql, parameters = _directory_filters(
+        category_filter, search_query, ranked=ranked,
+        price_range=price_range, min_rating=min_rating, has_deals=has_deals
+    )
+    if ranked and "fts_query" in parameters:
+        # Rank by BM25: join the FTS table so bm25() can be computed per row
+        sort_keys, descending = DIRECTORY_SORT_KEYS["relevance"]
+        listing = Listing(
+            "businesses.*",
+            "businesses JOIN businesses_fts ON businesses_fts.rowid = businesses.id",
+            sort_keys, where_sql=where_sql, parameters=parameters, descending=descending
+        )
+        return fetch_page(listing, per_page=per_page, cursor=cursor, page=page)
+    if sort_by_option not in DIRECTORY_SORT_KEYS or sort_by_option == "relevance":
+        sort_by_option = "name"
+    sort_keys, descending = DIRECTORY_SORT_KEYS[sort_by_option]
+    listing = Listing("*", "businesses", sort_keys, where_sql=where_sql, parameters=parameters, descending=descending)
+    return fetch_page(listing, per_page=per_page, cursor=cursor, page=page)
 
 
 def get_business_by_id(business_id_to_fetch):
@@ -478,45 +682,89 @@ def get_business_by_id(business_id_to_fetch):
         dict: Complete business record (name, category, rating, reviews, hours, photos, etc.)
         None: If no business found with this ID
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Query single business by primary key (fastest lookup)
-    cur.execute("SELECT * FROM businesses WHERE id = ?", (business_id_to_fetch,))
-    business_row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Query single business by primary key (fastest lookup)
+        cur.execute("SELECT * FROM businesses WHERE id = ?", (business_id_to_fetch,))
+        business_row = cur.fetchone()
     # Convert SQLite Row object to dictionary
     return dict(business_row) if business_row else None
 
 
+def search_businesses(search_query, category=None, min_rating=None, limit=None, match_all=True):
+    """
+    Full-text search over business name, category, description, summary and attributes.
+    
+    Uses the FTS5 index with BM25 ranking (name hits weigh most) and prefix
+    matching, so "coff" finds "Coffee House". Falls back to a name-only LIKE
+    search when the SQLite build has no FTS5.
+    
+    Args:
+        search_query (str): Free-text search (e.g., "vegan tacos", "bike repair")
+        category (str): Optional category to restrict results to
+        min_rating (float): Optional minimum average rating
+        limit (int): Optional maximum number of results
+        match_all (bool): Require every word (True) or any word (False)
+    
+    Returns:
+        list: Matching business dictionaries, best match first
+    """
+    fts_query = build_fts_query(search_query, match_all=match_all)
+    if not fts_query:
+        return []
+    
+    conditions = ["b.closed_at IS NULL"]
+    parameters = []
+    if category:
+        conditions.append("b.category = ?")
+        parameters.append(category)
+    if min_rating is not None:
+        conditions.append("b.average_rating >= ?")
+        parameters.append(min_rating)
+    
+    if fulltext_available():
+        sql = (
+            "SELECT b.* FROM businesses_fts JOIN businesses b ON b.id = businesses_fts.rowid "
+            "WHERE businesses_fts MATCH ?" + "".join(" AND " + condition for condition in conditions) +
+            f" ORDER BY {FTS_RANK}, b.id"
+        )
+        parameters.insert(0, fts_query)
+    else:
+        sql = (
+            "SELECT b.* FROM businesses b WHERE lower(b.name) LIKE ?" +
+            "".join(" AND " + condition for condition in conditions) + " ORDER BY b.name"
+        )
+        parameters.insert(0, "%" + str(search_query).strip().lower() + "%")
+    if limit is not None:
+        sql += " LIMIT ?"
+        parameters.append(int(limit))
+    
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, parameters)
+        business_rows = cur.fetchall()
+    return [dict(business_row) for business_row in business_rows]
+
+
 def search_businesses_by_name(search_query):
     """
     Search the business directory for businesses matching a search term.
     
-    Uses case-insensitive partial matching (LIKE query) so users can search
-    for "pizza" and find "Mario's Pizza Place", "Pizza Hut", etc.
+    Backed by the full-text index (see search_businesses), so users can search
+    for "pizza" and find "Mario's Pizza Place", "Pizza Hut", etc., plus
+    businesses whose description or attributes mention pizza.
     
     Args:
         search_query (str): Search term to find (e.g., "coffee", "pizza", "gym")
     
     Returns:
-        list: List of matching business dictionaries, sorted alphabetically by name
+        list: List of matching business dictionaries, best match first
         Returns all businesses if query is empty/None (no filter applied)
     """
     # If no search query provided, return all businesses
     if not search_query or not str(search_query).strip():
         return get_all_businesses()
-    
-    conn = get_connection()
-    cur = conn.cursor()
-    # Use LIKE with wildcards for partial, case-insensitive matching
-    cur.execute(
-        "SELECT * FROM businesses WHERE lower(name) LIKE ? ORDER BY name",
-        ("%" + search_query.strip().lower() + "%",)  # Wildcards on both sides
-    )
-    business_rows = cur.fetchall()
-    conn.close()
-    # Convert SQLite Row objects to dictionaries
-    return [dict(business_row) for business_row in business_rows]
+    return search_businesses(search_query)
 
 
 def get_categories():
@@ -530,185 +778,430 @@ def get_categories():
         list: List of unique category strings, sorted alphabetically
         Example: ["Entertainment", "Food", "Health and Wellness", "Retail", "Services"]
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Query all unique categories from businesses table, sorted
-    cur.execute("SELECT DISTINCT category FROM businesses ORDER BY category")
-    category_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Query all unique categories from businesses table, sorted
+        cur.execute("SELECT DISTINCT category FROM businesses ORDER BY category")
+        category_rows = cur.fetchall()
     # Extract category name from each row tuple (only first column)
     return [category_name[0] for category_name in category_rows]
 
 
 def get_all_business_names():
     """Set of lowercase business names (for dedupe when syncing from API)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM businesses")
-    rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT name FROM businesses")
+        rows = cur.fetchall()
     return {r[0].lower().strip() for r in rows}
 
 
+def get_business_search_rows():
+    """(id, name, category, total_reviews) for every business - the input for in-memory search indexes."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name, category, total_reviews FROM businesses WHERE closed_at IS NULL")
+        rows = [(r["id"], r["name"], r["category"], r["total_reviews"]) for r in cur.fetchall()]
+    return rows
+
+
+def get_businesses_by_ids(business_ids):
+    """
+    Fetch several businesses by primary key, keeping the order of `business_ids`.
+    
+    Args:
+        business_ids (list): Business IDs, e.g. ranked search results
+    
+    Returns:
+        list: Business dictionaries in the same order (unknown IDs are skipped)
+    """
+    business_ids = list(business_ids)
+    if not business_ids:
+        return []
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        placeholders = ",".join("?" for _ in business_ids)
+        cur.execute(f"SELECT * FROM businesses WHERE id IN ({placeholders})", business_ids)
+        by_id = {row["id"]: dict(row) for row in cur.fetchall()}
+    return [by_id[business_id] for business_id in business_ids if business_id in by_id]
+
+
 def get_business_id_by_name(name):
     """Get business id by exact name match (case-insensitive). Returns None if not found."""
     if not name or not str(name).strip():
         return None
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM businesses WHERE lower(trim(name)) = ?", (name.strip().lower(),))
-    row = cur.fetchone()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Matches the idx_businesses_lower_name expression index (names are stored trimmed)
+        cur.execute("SELECT id FROM businesses WHERE lower(name) = ?", (name.strip().lower(),))
+        row = cur.fetchone()
     return row[0] if row else None
 
 
-def update_business(business_id, category=None, description=None, address=None, average_rating=None, total_reviews=None, phone=None, website=None, yelp_url=None, latitude=None, longitude=None, price_range=None, hours=None, photo_url=None, attributes=None, summary=None, yelp_id=None):
-    """Update business fields. None means leave unchanged."""
-    conn = get_connection()
-    cur = conn.cursor()
-    # Build dynamic update
-    update_clauses = []
-    parameters = []
-    
-    field_mapping = {
-        'category': category,
-        'description': description,
-        'address': address,
-        'average_rating': average_rating,
-        'total_reviews': total_reviews,
-        'phone': phone,
-        'website': website,
-        'yelp_url': yelp_url,
-        'latitude': latitude,
-        'longitude': longitude,
-        'price_range': price_range,
-        'hours': hours,
-        'photo_url': photo_url,
-        'attributes': attributes,
-        'summary': summary,
-        'yelp_id': yelp_id,
-    }
-    
-    for field, value in field_mapping.items():
-        if value is not None:
-            update_clauses.append(f"{field} = ?")
-            parameters.append(value)
+# Callbacks run after insert_business/update_business, e.g. to keep in-memory indexes current
+_business_listeners = []
+
+
+def add_business_listener(callback):
+    """
+    Register a callback for business inserts and updates in this process.
     
-    if not update_clauses:
-        conn.close()
+    Args:
+        callback (callable): Called as callback(business) with the business's
+                             current row as a dictionary
+    """
+    if callback not in _business_listeners:
+        _business_listeners.append(callback)
+
+
+def _notify_business_listeners(business_id):
+    """Pass the fresh row for `business_id` to every registered listener."""
+    if not _business_listeners:
+        return
+    business = get_business_by_id(business_id)
+    if business is None:
         return
-    parameters.append(business_id)
-    cur.execute("UPDATE businesses SET " + ", ".join(update_clauses) + " WHERE id = ?", parameters)
-    conn.commit()
-    conn.close()
+    for callback in list(_business_listeners):
+        callback(business)
+
+
+def update_business(business_id, category=None, description=None, address=None, average_rating=None, total_reviews=None, phone=None, website=None, yelp_url=None, latitude=None, longitude=None, price_range=None, hours=None, photo_url=None, attributes=None, summary=None, yelp_id=None):
+    """Update business fields. None means leave unchanged."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        # Build dynamic update
+        update_clauses = []
+        parameters = []
+        
+        field_mapping = {
+            'category': category,
+            'description': description,
+            'address': address,
+            'average_rating': average_rating,
+            'total_reviews': total_reviews,
+            'phone': phone,
+            'website': website,
+            'yelp_url': yelp_url,
+            'latitude': latitude,
+            'longitude': longitude,
+            'price_range': price_range,
+            'hours': hours,
+            'photo_url': photo_url,
+            'attributes': attributes,
+            'summary': summary,
+            'yelp_id': yelp_id,
+        }
+        
+        for field, value in field_mapping.items():
+            if value is not None:
+                update_clauses.append(f"{field} = ?")
+                parameters.append(value)
+        
+        if not update_clauses:
+            return
+        parameters.append(business_id)
+        cur.execute("UPDATE businesses SET " + ", ".join(update_clauses) + " WHERE id = ?", parameters)
+        conn.commit()
+    _notify_business_listeners(business_id)
 
 
 def insert_business(name, category, description, average_rating=0, total_reviews=0, address=None, phone=None, website=None, yelp_url=None, latitude=None, longitude=None, price_range=None, hours=None, photo_url=None, attributes=None, summary=None, yelp_id=None):
     """Insert one business with all available fields. Returns new id."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO businesses (name, category, description, address, average_rating, total_reviews, 
-           phone, website, yelp_url, latitude, longitude, price_range, hours, photo_url, attributes, summary, yelp_id) 
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (name, category, description, address or "", average_rating, total_reviews, 
-         phone or "", website or "", yelp_url or "", latitude, longitude, price_range or "", 
-         hours or "", photo_url or "", attributes or "", summary or "", yelp_id or "")
-    )
-    conn.commit()
-    business_id = cur.lastrowid
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO businesses (name, category, description, address, average_rating, total_reviews, 
+               phone, website, yelp_url, latitude, longitude, price_range, hours, photo_url, attributes, summary, yelp_id) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (name, category, description, address or "", average_rating, total_reviews, 
+             phone or "", website or "", yelp_url or "", latitude, longitude, price_range or "", 
+             hours or "", photo_url or "", attributes or "", summary or "", yelp_id or None)
+        )
+        conn.commit()
+        business_id = cur.lastrowid
+    _notify_business_listeners(business_id)
     return business_id
 
 
-# ---- Deals ----
-def get_deals_by_business(business_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM deals WHERE business_id = ?", (business_id,))
-    deal_rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in deal_rows]
+# ---- Yelp sync ----
+# Business columns the Yelp sync owns; a row's content hash covers exactly these
+YELP_SYNC_FIELDS = (
+    "name", "category", "description", "address", "average_rating", "total_reviews",
+    "phone", "website", "yelp_url", "latitude", "longitude", "price_range",
+    "hours", "photo_url", "attributes", "summary",
+)
+_YELP_TEXT_FIELDS = {
+    "description", "address", "phone", "website", "yelp_url", "price_range",
+    "hours", "photo_url", "attributes", "summary",
+}
 
 
-def get_all_deals():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT d.*, b.name AS business_name
-        FROM deals d
-        JOIN businesses b ON d.business_id = b.id
-        ORDER BY b.name
-    """)
-    deal_rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in deal_rows]
+def _yelp_sync_values(row):
+    """Column values for a Yelp row, stored the way insert_business stores them."""
+    values = {field: row.get(field) for field in YELP_SYNC_FIELDS}
+    for field in _YELP_TEXT_FIELDS:
+        values[field] = values[field] or ""
+    values["average_rating"] = values["average_rating"] or 0
+    values["total_reviews"] = values["total_reviews"] or 0
+    return values
 
 
-# ---- Reviews ----
-def add_review(business_id, user_id, rating, review_text, created_date, created_time):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO reviews (business_id, user_id, rating, review_text, created_date, created_time)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (business_id, user_id, rating, review_text, created_date, created_time))
-    conn.commit()
-    review_id = cur.lastrowid
-    # Update business average rating and count
-    cur.execute("SELECT AVG(rating), COUNT(*) FROM reviews WHERE business_id = ?", (business_id,))
-    avg, count = cur.fetchone()
-    cur.execute("UPDATE businesses SET average_rating = ?, total_reviews = ? WHERE id = ?",
-                (round(avg, 2) if avg else 0, count or 0, business_id))
-    conn.commit()
-    conn.close()
-    return review_id
+def _hash_sync_values(values):
+    encoded = json.dumps([values[field] for field in YELP_SYNC_FIELDS], separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
 
 
-def get_reviews_for_business(business_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT r.*, u.email, u.username
-        FROM reviews r
-        JOIN users u ON r.user_id = u.id
-        WHERE r.business_id = ?
-        ORDER BY r.created_date DESC, r.created_time DESC
-    """, (business_id,))
-    review_rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in review_rows]
+def yelp_content_hash(row):
+    """Stable digest of the synced fields of a Yelp row, used to skip unchanged businesses."""
+    return _hash_sync_values(_yelp_sync_values(row))
 
 
-def get_reviews_by_user(user_id):
-    """All reviews written by this user (for My Reviews screen)."""
-    if not user_id:
-        return []
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT r.*, b.name AS business_name
-        FROM reviews r
-        JOIN businesses b ON r.business_id = b.id
-        WHERE r.user_id = ?
-        ORDER BY r.created_date DESC, r.created_time DESC
-    """, (user_id,))
-    review_rows = cur.fetchall()
-    conn.close()
+def upsert_yelp_businesses(rows):
+    """
+    Apply one batch of Yelp rows in a single transaction, keyed on yelp_id.
+    
+    Rows whose content hash matches the stored one are skipped; new and
+    changed rows are written with one `INSERT ... ON CONFLICT(yelp_id) DO
+    UPDATE`. A business without a yelp_id yet is adopted by exact name
+    (case-insensitive) first, so rows from older syncs are updated rather than
+    duplicated. Rows Yelp marks `is_closed` set the business's closed_at, which
+    hides it from listings, search and the map and drops its deals; its reviews
+    and favorites are kept, and an open row for it later clears the mark. Rows
+    without a yelp_id are ignored.
+    
+    Args:
+        rows (list): Business rows from yelp_api (dicts with yelp_id and YELP_SYNC_FIELDS)
+    
+    Returns:
+        dict: added, updated, unchanged and removed (newly closed) counts for this batch
+    """
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+    rows = [row for row in rows if row.get("yelp_id")]
+    if not rows:
+        return counts
+    closed_ids = list({row["yelp_id"] for row in rows if row.get("is_closed")})
+    open_rows = list({row["yelp_id"]: row for row in rows if not row.get("is_closed")}.values())
+    columns = YELP_SYNC_FIELDS + ("content_hash", "yelp_id")
+    upsert_sql = (
+        f"INSERT INTO businesses ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT(yelp_id) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in YELP_SYNC_FIELDS)}, "
+        "content_hash = excluded.content_hash "
+        "WHERE businesses.content_hash IS NOT excluded.content_hash"
+    )
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        # Adopt rows from syncs that predate yelp_id keys (matches idx_businesses_lower_name)
+        cur.executemany(
+            "UPDATE businesses SET yelp_id = ? WHERE NOT EXISTS (SELECT 1 FROM businesses WHERE yelp_id = ?) "
+            "AND id = (SELECT id FROM businesses WHERE yelp_id IS NULL AND lower(name) = ? ORDER BY id LIMIT 1)",
+            [(row["yelp_id"], row["yelp_id"], row["name"].strip().lower()) for row in open_rows]
+        )
+        stored_hashes = {}
+        all_ids = [row["yelp_id"] for row in open_rows] + closed_ids
+        for start in range(0, len(all_ids), 500):
+            chunk = all_ids[start:start + 500]
+            cur.execute(
+                f"SELECT yelp_id, content_hash FROM businesses WHERE yelp_id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            stored_hashes.update((yelp_id, content_hash) for yelp_id, content_hash in cur.fetchall())
+
+        changes = []
+        for row in open_rows:
+            values = _yelp_sync_values(row)
+            content_hash = _hash_sync_values(values)
+            if row["yelp_id"] not in stored_hashes:
+                counts["added"] += 1
+            elif stored_hashes[row["yelp_id"]] == content_hash:
+                counts["unchanged"] += 1
+                continue
+            else:
+                counts["updated"] += 1
+            changes.append([values[field] for field in YELP_SYNC_FIELDS] + [content_hash, row["yelp_id"]])
+        cur.executemany(upsert_sql, changes)
+
+        cur.executemany(
+            "UPDATE businesses SET closed_at = NULL WHERE yelp_id = ? AND closed_at IS NOT NULL",
+            [(row["yelp_id"],) for row in open_rows]
+        )
+        for yelp_id in closed_ids:
+            if yelp_id not in stored_hashes:
+                continue
+            cur.execute("UPDATE businesses SET closed_at = datetime('now') WHERE yelp_id = ? AND closed_at IS NULL", (yelp_id,))
+            if cur.rowcount:
+                counts["removed"] += 1
+                cur.execute("DELETE FROM deals WHERE business_id IN (SELECT id FROM businesses WHERE yelp_id = ?)", (yelp_id,))
+
+        changed_ids = []
+        for start in range(0, len(changes), 500):
+            chunk = [change[-1] for change in changes[start:start + 500]]
+            cur.execute(f"SELECT id FROM businesses WHERE yelp_id IN ({', '.join('?' for _ in chunk)})", chunk)
+            changed_ids.extend(row[0] for row in cur.fetchall())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    for business_id in changed_ids:
+        _notify_business_listeners(business_id)
+    return counts
+
+
+# ---- App metadata ----
+def get_meta(key, default=None):
+    """Read one value from the app_meta key/value table."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+        row = cur.fetchone()
+    return row[0] if row else default
+
+
+def set_meta(key, value):
+    """Insert or replace one value in the app_meta key/value table."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO app_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+        conn.commit()
+
+
+def get_catalog_version():
+    """Counter bumped by triggers whenever a business is added, removed, renamed or recategorized."""
+    return int(get_meta("catalog_version", 0))
+
+
+def get_location_version():
+    """Counter bumped by triggers whenever a business is added or removed or its coordinates or category change."""
+    return int(get_meta("location_version", 0))
+
+
+def record_yelp_sync(stats):
+    """Remember when the Yelp sync last finished (UTC, ISO 8601) and what it did."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO app_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [
+                ("yelp_last_sync_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+                ("yelp_last_sync_stats", json.dumps(stats)),
+            ]
+        )
+        conn.commit()
+
+
+def get_last_yelp_sync():
+    """
+    When the Yelp sync last finished, as stored by record_yelp_sync().
+    
+    Returns:
+        dict: at (aware datetime or None) and stats (dict or None)
+    """
+    synced_at = get_meta("yelp_last_sync_at")
+    stats = get_meta("yelp_last_sync_stats")
+    return {
+        "at": datetime.fromisoformat(synced_at) if synced_at else None,
+        "stats": json.loads(stats) if stats else None,
+    }
+
+
+def count_businesses():
+    """Number of businesses in the catalog."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM businesses")
+        total = cur.fetchone()[0]
+    return total
+
+
+# ---- Deals ----
+def get_deals_by_business(business_id):
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM deals WHERE business_id = ?", (business_id,))
+        deal_rows = cur.fetchall()
+    return [dict(r) for r in deal_rows]
+
+
+def get_all_deals():
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT d.*, b.name AS business_name
+            FROM deals d
+            JOIN businesses b ON d.business_id = b.id
+            ORDER BY b.name
+        """)
+        deal_rows = cur.fetchall()
+    return [dict(r) for r in deal_rows]
+
+
+# ---- Reviews ----
+def add_review(business_id, user_id, rating, review_text, created_date, created_time):
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO reviews (business_id, user_id, rating, review_text, created_date, created_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (business_id, user_id, rating, review_text, created_date, created_time))
+        conn.commit()
+        review_id = cur.lastrowid
+        # Update business average rating and count
+        cur.execute("SELECT AVG(rating), COUNT(*) FROM reviews WHERE business_id = ?", (business_id,))
+        avg, count = cur.fetchone()
+        cur.execute("UPDATE businesses SET average_rating = ?, total_reviews = ? WHERE id = ?",
+                    (round(avg, 2) if avg else 0, count or 0, business_id))
+        conn.commit()
+    return review_id
+
+
+def get_reviews_for_business(business_id):
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.*, u.email, u.username
+            FROM reviews r
+            JOIN users u ON r.user_id = u.id
+            WHERE r.business_id = ?
+            ORDER BY r.created_date DESC, r.created_time DESC
+        """, (business_id,))
+        review_rows = cur.fetchall()
+    return [dict(r) for r in review_rows]
+
+
+def get_reviews_by_user(user_id):
+    """All reviews written by this user (for My Reviews screen)."""
+    if not user_id:
+        return []
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.*, b.name AS business_name
+            FROM reviews r
+            JOIN businesses b ON r.business_id = b.id
+            WHERE r.user_id = ?
+            ORDER BY r.created_date DESC, r.created_time DESC
+        """, (user_id,))
+        review_rows = cur.fetchall()
     return [dict(r) for r in review_rows]
 
 
 def get_trending_businesses(limit=20):
     """Top businesses by rating and by review count (popular/trending)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT * FROM businesses
-        ORDER BY average_rating DESC, total_reviews DESC
-        LIMIT ?
-    """, (limit * 2,))
-    business_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT * FROM businesses
+            WHERE closed_at IS NULL
+            ORDER BY average_rating DESC, total_reviews DESC
+            LIMIT ?
+        """, (limit * 2,))
+        business_rows = cur.fetchall()
     seen_business_ids = set()
     trending_businesses = []
     for row in business_rows:
@@ -725,57 +1218,51 @@ def get_trending_businesses(limit=20):
 
 def get_business_ids_with_deals():
     """Set of business IDs that have at least one deal."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT business_id FROM deals")
-    deal_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT DISTINCT business_id FROM deals")
+        deal_rows = cur.fetchall()
     return {r[0] for r in deal_rows}
 
 
 # ---- Favorites ----
 def add_favorite(user_id, business_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO favorites (user_id, business_id) VALUES (?, ?)", (user_id, business_id))
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        conn.rollback()
-        conn.close()
-        return False  # already favorited
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT INTO favorites (user_id, business_id) VALUES (?, ?)", (user_id, business_id))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False  # already favorited
 
 
 def remove_favorite(user_id, business_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM favorites WHERE user_id = ? AND business_id = ?", (user_id, business_id))
-    conn.commit()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM favorites WHERE user_id = ? AND business_id = ?", (user_id, business_id))
+        conn.commit()
 
 
 def get_favorite_business_ids(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT business_id FROM favorites WHERE user_id = ?", (user_id,))
-    rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT business_id FROM favorites WHERE user_id = ?", (user_id,))
+        rows = cur.fetchall()
     return [r[0] for r in rows]
 
 
 def get_favorite_businesses(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT b.* FROM businesses b
-        JOIN favorites f ON b.id = f.business_id
-        WHERE f.user_id = ?
-        ORDER BY b.name
-    """, (user_id,))
-    favorite_rows = cur.fetchall()
-    conn.close()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT b.* FROM businesses b
+            JOIN favorites f ON b.id = f.business_id
+            WHERE f.user_id = ?
+            ORDER BY b.name
+        """, (user_id,))
+        favorite_rows = cur.fetchall()
     return [dict(r) for r in favorite_rows]
 
 
@@ -783,34 +1270,1173 @@ def get_recommended_businesses(user_id, limit=20):
     """Recommend businesses: from user's favorite categories (highest rated), then most popular overall."""
     favorites = get_favorite_businesses(user_id) if user_id else []
     categories = list({business["category"] for business in favorites if business.get("category")})
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        seen_business_ids = set()
+        recommended_businesses = []
+        if categories:
+            placeholders = ",".join("?" * len(categories))
+            cur.execute(f"""
+                SELECT * FROM businesses
+                WHERE category IN ({placeholders}) AND closed_at IS NULL AND id NOT IN (SELECT business_id FROM favorites WHERE user_id = ?)
+                ORDER BY average_rating DESC, total_reviews DESC
+                LIMIT ?
+            """, (*categories, user_id, limit))
+            for row in cur.fetchall():
+                business = dict(row)
+                if business["id"] not in seen_business_ids:
+                    seen_business_ids.add(business["id"])
+                    recommended_businesses.append(business)
+        if len(recommended_businesses) < limit:
+            cur.execute("""
+                SELECT * FROM businesses
+                WHERE closed_at IS NULL AND id NOT IN (SELECT business_id FROM favorites WHERE user_id = ?)
+                ORDER BY average_rating DESC, total_reviews DESC
+                LIMIT ?
+            """, (user_id, limit - len(recommended_businesses)))
+            for row in cur.fetchall():
+                business = dict(row)
+                if business["id"] not in seen_business_ids:
+                    seen_business_ids.add(business["id"])
+                    recommended_businesses.append(business)
+    return recommended_businesses[:limit]
+
+
+def get_trending_page(page=1, per_page=12, max_items=300, cursor=None):
+    """One page of trending businesses (top rated, then most reviewed), capped at max_items."""
+    listing = Listing(
+        "*", "businesses", ["average_rating", "total_reviews", "id"],
+        descending=True, max_items=max_items,
+    )
+    return fetch_page(listing, per_page=per_page, cursor=cursor, page=page)
+
+
+def get_recommended_page(user_id, page=1, per_page=12, max_items=300, cursor=None):
+    """
+    One page of recommendations: businesses in the user's favorite categories first
+    (highest rated), then the most popular overall. Already-favorited businesses are excluded.
+    """
+    favorite_category_match = """(category IN (
+        SELECT fb.category FROM favorites ff JOIN businesses fb ON fb.id = ff.business_id
+        WHERE ff.user_id = :user_id
+    ))"""
+    listing = Listing(
+        "*", "businesses",
+        [favorite_category_match, "average_rating", "total_reviews", "id"],
+        where_sql="id NOT IN (SELECT business_id FROM favorites WHERE user_id = :user_id)",
+        parameters={"user_id": user_id},
+        descending=True, max_items=max_items,
+    )
+    return fetch_page(listing, per_page=per_page, cursor=cursor, page=page)
+
+
+def get_favorites_page(user_id, page=1, per_page=12, cursor=None):
+    """One page of a user's favorite businesses, alphabetical."""
+    listing = Listing(
+        "b.*", "businesses b JOIN favorites f ON b.id = f.business_id",
+        ["lower(b.name)", "b.id"],
+        where_sql="f.user_id = :user_id",
+        parameters={"user_id": user_id},
+    )
+    return fetch_page(listing, per_page=per_page, cursor=cursor, page=page)
+
+
+def get_reviews_page(business_id, page=1, per_page=20, cursor=None):
+    """One page of a business's reviews, newest first."""
+    listing = Listing(
+        "r.*, u.email, u.username", "reviews r JOIN users u ON r.user_id = u.id",
+        ["r.created_date", "r.created_time", "r.id"],
+        where_sql="r.business_id = :business_id",
+        parameters={"business_id": business_id},
+        descending=True,
+    )
+    return fetch_page(listing, per_page=per_page, cursor=cursor, page=page)
+
+
+def get_review_summary(business_id):
+    """Average rating and count of community reviews for a business."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT AVG(rating), COUNT(*) FROM reviews WHERE business_id = ?", (business_id,))
+        avg, count = cur.fetchone()
+    return {"average_rating": round(avg, 1) if avg else 0, "count": count or 0}
+
+
+def get_deals_for_businesses(business_ids):
+    """Deals for several businesses in one query; returns {business_id: [deal, ...]}."""
+    business_ids = [business_id for business_id in business_ids if business_id is not None]
+    if not business_ids:
+        return {}
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        placeholders = ",".join("?" * len(business_ids))
+        cur.execute(f"SELECT * FROM deals WHERE business_id IN ({placeholders}) ORDER BY id", business_ids)
+        deal_rows = cur.fetchall()
+    deals_by_business = {}
+    for row in deal_rows:
+        deals_by_business.setdefault(row["business_id"], []).append(dict(row))
+    return deals_by_business
+
+
+# ---- Location ----
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = 111.32
+
+
+def location_index_available():
+    """True if the current database has the R*Tree location index (migration 7 ran with R*Tree support)."""
+    return _optional_table_exists("businesses_rtree")
+
+
+def haversine_km(latitude_a, longitude_a, latitude_b, longitude_b):
+    """Great-circle distance between two points in kilometers."""
+    latitude_a, longitude_a, latitude_b, longitude_b = map(math.radians, (latitude_a, longitude_a, latitude_b, longitude_b))
+    a = (math.sin((latitude_b - latitude_a) / 2) ** 2
+         + math.cos(latitude_a) * math.cos(latitude_b) * math.sin((longitude_b - longitude_a) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def get_businesses_in_bbox(south, west, north, east, category=None, limit=None, columns="b.*",
+                           min_rating=None, has_deals=False, order_by=None):
+    """
+    Businesses whose coordinates fall inside a bounding box.
+    
+    Served from the R*Tree index (or the latitude/longitude index on builds
+    without R*Tree), so cost follows the number of hits, not the catalog size.
+    
+    Args:
+        south, west, north, east (float): Box edges in degrees
+        category (str): Optional category filter
+        limit (int): Optional maximum number of rows
+        columns (str): SELECT list over businesses aliased as `b`
+        min_rating (float): Optional minimum average rating
+        has_deals (bool): Only businesses with at least one deal
+        order_by (str): Optional ORDER BY clause over `b` (fixed SQL, never user input)
+    
+    Returns:
+        list: Business dictionaries
+    """
+    parameters = {"south": south, "west": west, "north": north, "east": east}
+    if location_index_available():
+        # The R*Tree stores 32-bit floats, so match on box overlap and re-check the exact columns
+        sql = (
+            f"SELECT {columns} FROM businesses_rtree r JOIN businesses b ON b.id = r.id "
+            "WHERE r.max_lat >= :south AND r.min_lat <= :north AND r.max_lng >= :west AND r.min_lng <= :east "
+            "AND b.latitude BETWEEN :south AND :north AND b.longitude BETWEEN :west AND :east AND b.closed_at IS NULL"
+        )
+    else:
+        sql = (
+            f"SELECT {columns} FROM businesses b "
+            "WHERE b.latitude BETWEEN :south AND :north AND b.longitude BETWEEN :west AND :east AND b.closed_at IS NULL"
+        )
+    if category:
+        sql += " AND b.category = :category"
+        parameters["category"] = category
+    if min_rating is not None:
+        sql += " AND b.average_rating >= :min_rating"
+        parameters["min_rating"] = float(min_rating)
+    if has_deals:
+        sql += " AND EXISTS (SELECT 1 FROM deals WHERE deals.business_id = b.id)"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        parameters["limit"] = int(limit)
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, parameters)
+        business_rows = cur.fetchall()
+    return [dict(business_row) for business_row in business_rows]
+
+
+def get_businesses_nearby(latitude, longitude, radius_km=5.0, category=None, limit=50):
+    """
+    Businesses within `radius_km` of a point, nearest first.
+    
+    The index narrows the search to the radius's bounding box; exact
+    haversine distances are then computed only for those candidates.
+    
+    Args:
+        latitude, longitude (float): Center point in degrees
+        radius_km (float): Search radius in kilometers
+        category (str): Optional category filter
+        limit (int): Maximum number of businesses
+    
+    Returns:
+        list: Business dictionaries, each with a 'distance_km' key, nearest first
+    """
+    latitude_span = radius_km / KM_PER_DEGREE_LATITUDE
+    longitude_span = radius_km / (KM_PER_DEGREE_LATITUDE * max(math.cos(math.radians(latitude)), 1e-6))
+    candidates = get_businesses_in_bbox(
+        latitude - latitude_span, longitude - longitude_span,
+        latitude + latitude_span, longitude + longitude_span,
+        category=category
+    )
+    nearby = []
+    for business in candidates:
+        distance = haversine_km(latitude, longitude, business["latitude"], business["longitude"])
+        if distance <= radius_km:
+            nearby.append((distance, business["id"], business))
+    closest = heapq.nsmallest(limit, nearby, key=lambda match: match[:2])
+    for distance, _, business in closest:
+        business["distance_km"] = round(distance, 3)
+    return [business for _, _, business in closest]
+
+
+def get_business_locations():
+    """
+    Coordinates of every business that has them (for the map's cluster grids).
+    
+    Returns:
+        list: (id, latitude, longitude, category) tuples
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, latitude, longitude, category FROM businesses "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND closed_at IS NULL"
+        )
+        location_rows = cur.fetchall()
+    return [tuple(location_row) for location_row in location_rows]
+
+
+def get_businesses_missing_coordinates(after_id=0, limit=100):
+    """
+    Businesses with an address but no coordinates, in ID order (keyset batches for bulk geocoding).
+    
+    Args:
+        after_id (int): Only businesses with a larger ID
+        limit (int): Batch size
+    
+    Returns:
+        list: Dictionaries with id, name and address
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, name, address FROM businesses "
+            "WHERE (latitude IS NULL OR longitude IS NULL) AND address IS NOT NULL AND trim(address) != '' "
+            "AND id > ? ORDER BY id LIMIT ?",
+            (after_id, limit)
+        )
+        business_rows = cur.fetchall()
+    return [dict(business_row) for business_row in business_rows]
+
+
+def count_businesses_missing_coordinates(after_id=0):
+    """How many businesses after `after_id` still need geocoding."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT COUNT(*) FROM businesses "
+            "WHERE (latitude IS NULL OR longitude IS NULL) AND address IS NOT NULL AND trim(address) != '' AND id > ?",
+            (after_id,)
+        )
+        missing = cur.fetchone()[0]
+    return missing
+
+
+def set_business_coordinates(updates):
+    """
+    Store coordinates for many businesses in one transaction.
+    
+    Args:
+        updates (list): (business_id, latitude, longitude) tuples
+    """
+    updates = list(updates)
+    if not updates:
+        return
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "UPDATE businesses SET latitude = ?, longitude = ? WHERE id = ?",
+            [(latitude, longitude, business_id) for business_id, latitude, longitude in updates]
+        )
+        conn.commit()
+
+
+MAP_MARKER_FIELDS = ("id", "name", "category", "rating", "lat", "lng")
+MAP_MARKER_COLUMNS = "b.id, b.name, b.category, b.average_rating, b.latitude, b.longitude"
+MAP_MARKER_LIMIT = 500
+
+
+def get_map_markers(south, west, north, east, category=None, min_rating=None, has_deals=False, limit=MAP_MARKER_LIMIT):
+    """
+    Compact marker rows for the businesses inside a map viewport.
+    
+    Only the columns a marker needs are read, and each business comes back as
+    a list in MAP_MARKER_FIELDS order rather than a dictionary, so a viewport
+    of a few hundred markers stays a few kilobytes of JSON (coordinates are
+    rounded to 6 places, about 10 cm). When the viewport
+    holds more than `limit` businesses the best rated are kept.
+    
+    Args:
+        south, west, north, east (float): Viewport edges in degrees
+        category (str): Optional category filter
+        min_rating (float): Optional minimum average rating
+        has_deals (bool): Only businesses with at least one deal
+        limit (int): Maximum number of markers
+    
+    Returns:
+        dict: {"rows": [[id, name, category, rating, lat, lng], ...], "truncated": bool}
+    """
+    businesses = get_businesses_in_bbox(
+        south, west, north, east,
+        category=category,
+        min_rating=min_rating,
+        has_deals=has_deals,
+        limit=limit + 1,
+        columns=MAP_MARKER_COLUMNS,
+        order_by="b.average_rating DESC, b.id",
+    )
+    rows = [_map_marker_row(business) for business in businesses[:limit]]
+    return {"rows": rows, "truncated": len(businesses) > limit}
+
+
+def get_map_markers_by_ids(business_ids, limit=MAP_MARKER_LIMIT):
+    """
+    Compact marker rows (MAP_MARKER_FIELDS order) for specific businesses,
+    e.g. the single-business cells of a clustered map view.
+    
+    A wide viewport can hold thousands of lone businesses, so the IDs are
+    looked up in chunks and, as in get_map_markers(), only the best rated
+    `limit` are kept.
+    
+    Args:
+        business_ids (list): Business IDs
+        limit (int): Maximum number of markers
+    
+    Returns:
+        dict: {"rows": [[id, name, category, rating, lat, lng], ...], "truncated": bool},
+              rows best rated first
+    """
+    business_ids = list(business_ids)
+    if not business_ids:
+        return {"rows": [], "truncated": False}
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        best = []
+        truncated = False
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(business_ids), 500):
+            chunk = business_ids[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cur.execute(
+                f"SELECT {MAP_MARKER_COLUMNS} FROM businesses b "
+                f"WHERE b.id IN ({placeholders}) AND b.latitude IS NOT NULL AND b.longitude IS NOT NULL "
+                f"ORDER BY b.average_rating DESC, b.id LIMIT ?",
+                chunk + [limit + 1]
+            )
+            best.extend(_map_marker_row(business_row) for business_row in cur.fetchall())
+            if len(best) > limit:
+                best.sort(key=lambda row: (-(row[3] or 0), row[0]))
+                del best[limit:]
+                truncated = True
+    best.sort(key=lambda row: (-(row[3] or 0), row[0]))
+    return {"rows": best, "truncated": truncated}
+
+
+def _map_marker_row(business):
+    """One business as a compact [id, name, category, rating, lat, lng] marker row."""
+    return [business["id"], business["name"], business["category"], business["average_rating"],
+            round(business["latitude"], 6), round(business["longitude"], 6)]
+
+
+# ---- Geocode cache ----
+def get_cached_geocodes(address_keys):
+    """
+    Unexpired geocode_cache entries for normalized address keys.
+    
+    Args:
+        address_keys (list): Normalized address strings
+    
+    Returns:
+        dict: address_key -> (latitude, longitude), or None for a cached
+              "not found"; keys with no live entry are absent
+    """
+    address_keys = list(dict.fromkeys(address_keys))
+    if not address_keys:
+        return {}
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cached = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(address_keys), 500):
+            chunk = address_keys[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cur.execute(
+                f"SELECT address_key, status, latitude, longitude FROM geocode_cache "
+                f"WHERE address_key IN ({placeholders}) AND expires_at > datetime('now')",
+                chunk
+            )
+            for cache_row in cur.fetchall():
+                found = cache_row["status"] == "ok"
+                cached[cache_row["address_key"]] = (cache_row["latitude"], cache_row["longitude"]) if found else None
+    return cached
+
+
+def cache_geocodes(entries, ttl_seconds):
+    """
+    Store geocoding results, replacing any earlier entry for the same key.
+    
+    Args:
+        entries (list): (address_key, coordinates) pairs, where coordinates is
+                        (latitude, longitude) or None for "not found"
+        ttl_seconds (int): How long the entries stay valid
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            INSERT INTO geocode_cache (address_key, status, latitude, longitude, created_at, expires_at)
+            VALUES (?, ?, ?, ?, datetime('now'), datetime('now', ?))
+            ON CONFLICT(address_key) DO UPDATE SET
+                status = excluded.status, latitude = excluded.latitude, longitude = excluded.longitude,
+                created_at = excluded.created_at, expires_at = excluded.expires_at
+            """,
+            [
+                (address_key, "ok" if coordinates else "not_found",
+                 coordinates[0] if coordinates else None, coordinates[1] if coordinates else None,
+                 f"+{int(ttl_seconds)} seconds")
+                for address_key, coordinates in entries
+            ]
+        )
+        conn.commit()
+
+
+def prune_geocode_cache():
+    """Delete expired geocode_cache entries. Returns the number removed."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM geocode_cache WHERE expires_at <= datetime('now')")
+        removed = cur.rowcount
+        conn.commit()
+    return removed
+
+
+# ---- Leased claims ----
+def _claim_due_rows(cur, table, key, assignments, due, order_by, limit, returning, params=()):
+    """
+    Claim up to `limit` due rows of `table` with one UPDATE ... RETURNING.
+    
+    Shared by the geocode queue, jobs and the email outbox. `assignments` must
+    move the row's due time past the lease: a second worker's subquery then no
+    longer sees the row, and a worker that dies mid-batch only delays its rows
+    until the lease runs out.
+    
+    Args:
+        cur (sqlite3.Cursor): Cursor in the caller's transaction
+        table (str): Queue table
+        key (str): Its primary key column
+        assignments (str): SET clause for claimed rows
+        due (str): WHERE clause selecting claimable rows
+        order_by (str): Claim order
+        limit (int): Maximum rows to claim
+        returning (str): Columns to return
+        params (tuple): Values for the placeholders in `assignments`, then `due`
+    
+    Returns:
+        list: The claimed rows
+    """
+    cur.execute(
+        f"""
+        UPDATE {table}
+        SET {assignments}
+        WHERE {key} IN (
+            SELECT {key} FROM {table}
+            WHERE {due}
+            ORDER BY {order_by}
+            LIMIT ?
+        )
+        RETURNING {returning}
+        """,
+        (*params, limit)
+    )
+    return cur.fetchall()
+
+
+# ---- Geocode queue ----
+def claim_geocode_jobs(limit=25, lease_seconds=300):
+    """
+    Claim due geocode_queue rows for this worker.
+    
+    One UPDATE ... RETURNING pushes each claimed row's next_attempt_at past the
+    lease and counts the attempt, so two workers never claim the same row and
+    a worker that dies mid-batch only delays its rows by the lease.
+    
+    Args:
+        limit (int): Maximum rows to claim
+        lease_seconds (int): How long the claim lasts
+    
+    Returns:
+        list: Dictionaries with business_id, address and attempts (including this one)
+    """
+    with connection_scope() as conn:
+        job_rows = _claim_due_rows(
+            conn.cursor(), "geocode_queue", "business_id",
+            assignments="attempts = attempts + 1, next_attempt_at = datetime('now', ?)",
+            due="next_attempt_at <= datetime('now')",
+            order_by="next_attempt_at, business_id", limit=limit,
+            returning="business_id, address, attempts",
+            params=(f"+{int(lease_seconds)} seconds",)
+        )
+        claimed = [dict(job_row) for job_row in job_rows]
+        conn.commit()
+    return sorted(claimed, key=lambda job: job["business_id"])
+
+
+def complete_geocode_jobs(resolved, dropped=(), approximate=()):
+    """
+    Finish claimed geocode jobs in one transaction.
+    
+    Coordinates are written, and queue rows removed, only where the business
+    still has the address that was geocoded; if it changed meanwhile the
+    trigger has already re-queued the new address.
+    
+    Args:
+        resolved (list): (business_id, address, latitude, longitude) tuples
+        dropped (list): (business_id, address) pairs to give up on
+        approximate (list): (business_id, address, latitude, longitude) tuples
+                            written like `resolved`, but left in the queue so a
+                            precise geocoder can replace them later
+    
+    Returns:
+        int: Number of `resolved` businesses that received coordinates
+    """
+    resolved = list(resolved)
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        updated_ids = []
+        for business_id, address, latitude, longitude in resolved:
+            cur.execute(
+                "UPDATE businesses SET latitude = ?, longitude = ? WHERE id = ? AND address = ?",
+                (latitude, longitude, business_id, address)
+            )
+            if cur.rowcount:
+                updated_ids.append(business_id)
+        resolved_count = len(updated_ids)
+        for business_id, address, latitude, longitude in approximate:
+            # Rechecked on every pass until a key is configured; only write real changes
+            cur.execute(
+                "UPDATE businesses SET latitude = ?, longitude = ? "
+                "WHERE id = ? AND address = ? AND (latitude IS NOT ? OR longitude IS NOT ?)",
+                (latitude, longitude, business_id, address, latitude, longitude)
+            )
+            if cur.rowcount:
+                updated_ids.append(business_id)
+        cur.executemany(
+            "DELETE FROM geocode_queue WHERE business_id = ? AND address = ?",
+            [(business_id, address) for business_id, address, _, _ in resolved] + list(dropped)
+        )
+        conn.commit()
+    for business_id in updated_ids:
+        _notify_business_listeners(business_id)
+    return resolved_count
+
+
+def reschedule_geocode_job(business_id, delay_seconds, error=None, count_attempt=True):
+    """
+    Put a claimed geocode job back for a later attempt.
+    
+    Args:
+        business_id (int): Queued business
+        delay_seconds (int): Seconds until it is due again
+        error (str): Why this attempt did not finish
+        count_attempt (bool): False to hand back the attempt the claim counted
+                              (e.g. geocoding is not configured yet)
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE geocode_queue SET next_attempt_at = datetime('now', ?), last_error = ?, "
+            "attempts = attempts - ? WHERE business_id = ?",
+            (f"+{int(delay_seconds)} seconds", error, 0 if count_attempt else 1, business_id)
+        )
+        conn.commit()
+
+
+def get_geocode_queue_stats():
+    """
+    Geocode queue depth for status pages and scripts.
+    
+    Returns:
+        dict: pending (all queued), due (ready to claim now), retrying (attempted at least once)
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT COUNT(*) AS pending,
+                   COALESCE(SUM(next_attempt_at <= datetime('now')), 0) AS due,
+                   COALESCE(SUM(attempts > 0), 0) AS retrying
+            FROM geocode_queue
+            """
+        )
+        stats = dict(cur.fetchone())
+    return stats
+
+
+# ---- Jobs ----
+def insert_job(name, payload="{}", unique_key=None, max_attempts=3, timeout_seconds=300, delay_seconds=0):
+    """
+    Queue a background job (see logic.jobs).
+    
+    Args:
+        name (str): Registered job name
+        payload (str): JSON arguments for the handler
+        unique_key (str): If set, no second job with this key is queued while one is queued or running
+        max_attempts (int): Runs before the job is marked failed
+        timeout_seconds (int): Lease length per run
+        delay_seconds (float): Earliest start, from now
+    
+    Returns:
+        int: New job id, or None if a job with the same unique_key is already pending
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT OR IGNORE INTO jobs (name, payload, unique_key, max_attempts, timeout_seconds, run_at) "
+            "VALUES (?, ?, ?, ?, ?, datetime('now', ?)) RETURNING id",
+            (name, payload, unique_key, max_attempts, int(timeout_seconds), f"+{float(delay_seconds)} seconds")
+        )
+        job_row = cur.fetchone()
+        conn.commit()
+    return job_row[0] if job_row else None
+
+
+def upsert_job_schedule(name, interval_seconds, payload="{}"):
+    """
+    Run job `name` every `interval_seconds` (first run due now for a new schedule).
+    
+    Changing an existing schedule keeps its next run unless the new interval
+    brings it closer.
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO job_schedules (name, interval_seconds, payload) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                interval_seconds = excluded.interval_seconds,
+                payload = excluded.payload,
+                next_run_at = MIN(next_run_at, datetime('now', '+' || excluded.interval_seconds || ' seconds'))
+            """,
+            (name, int(interval_seconds), payload)
+        )
+        conn.commit()
+
+
+def delete_job_schedule(name):
+    """Stop scheduling job `name`. Returns True if a schedule was removed."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM job_schedules WHERE name = ?", (name,))
+        removed = cur.rowcount > 0
+        conn.commit()
+    return removed
+
+
+def enqueue_scheduled_jobs(job_options):
+    """
+    Queue a job for every due schedule among `job_options` and move the schedules on.
+    
+    Claiming the schedules and queueing their jobs is one transaction, so with
+    several processes each due run is queued exactly once. Scheduled jobs use
+    their name as unique_key: a run is skipped while the previous one is
+    still queued or running.
+    
+    Args:
+        job_options (dict): name -> (max_attempts, timeout_seconds) for the job names this process runs
+    
+    Returns:
+        list: Ids of the jobs queued
+    """
+    if not job_options:
+        return []
+    names = list(job_options)
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            UPDATE job_schedules
+            SET next_run_at = datetime('now', '+' || interval_seconds || ' seconds'), last_enqueued_at = datetime('now')
+            WHERE name IN ({",".join("?" * len(names))}) AND next_run_at <= datetime('now')
+            RETURNING name, payload
+            """,
+            names
+        )
+        due = cur.fetchall()
+        job_ids = []
+        for schedule_row in due:
+            max_attempts, timeout_seconds = job_options[schedule_row["name"]]
+            cur.execute(
+                "INSERT OR IGNORE INTO jobs (name, payload, unique_key, max_attempts, timeout_seconds) "
+                "VALUES (?, ?, ?, ?, ?) RETURNING id",
+                (schedule_row["name"], schedule_row["payload"], schedule_row["name"], max_attempts, int(timeout_seconds))
+            )
+            job_row = cur.fetchone()
+            if job_row:
+                job_ids.append(job_row[0])
+        conn.commit()
+    return job_ids
+
+
+def claim_jobs(names, owner, limit=1):
+    """
+    Claim due jobs for this worker.
+    
+    One UPDATE ... RETURNING marks each claimed job running, counts the
+    attempt and pushes run_at past the job's timeout, so two workers (in any
+    process) never run the same job and a job whose worker died is claimed
+    again after its lease. Expired leases that used up every attempt are
+    marked failed first.
+    
+    Args:
+        names (list): Job names this worker can run
+        owner (str): Token identifying this claim; finish_job() must present it
+        limit (int): Maximum jobs to claim
+    
+    Returns:
+        list: Dictionaries with id, name, payload (decoded), attempts (including this one) and max_attempts
+    """
+    names = list(names)
+    if not names:
+        return []
+    placeholders = ",".join("?" * len(names))
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            UPDATE jobs
+            SET status = 'failed', last_error = 'lease expired', lease_owner = NULL, finished_at = datetime('now')
+            WHERE status = 'running' AND run_at <= datetime('now') AND attempts >= max_attempts AND name IN ({placeholders})
+            """,
+            names
+        )
+        job_rows = _claim_due_rows(
+            cur, "jobs", "id",
+            assignments="status = 'running', attempts = attempts + 1, lease_owner = ?, started_at = datetime('now'), "
+                        "run_at = datetime('now', '+' || timeout_seconds || ' seconds')",
+            due=f"status IN ('queued', 'running') AND run_at <= datetime('now') AND name IN ({placeholders})",
+            order_by="run_at, id", limit=limit,
+            returning="id, name, payload, attempts, max_attempts",
+            params=(owner, *names)
+        )
+        claimed = [dict(job_row, payload=json.loads(job_row["payload"])) for job_row in job_rows]
+        conn.commit()
+    return sorted(claimed, key=lambda job: job["id"])
+
+
+def finish_job(job_id, owner, duration_ms, result=None, error=None, retry_delay_seconds=None, count_attempt=True):
+    """
+    Record the outcome of a claimed job.
+    
+    Args:
+        job_id (int): Job id
+        owner (str): Token the job was claimed with
+        duration_ms (int): Run time of this attempt
+        result (str): JSON result of a successful run
+        error (str): Error message if the run failed
+        retry_delay_seconds (float): For a failed run, queue it again after this
+                                     delay; None marks the job failed
+        count_attempt (bool): False to hand back the attempt the claim counted
+                              (the run could not start its work yet)
+    
+    Returns:
+        bool: False if the lease was lost (the job timed out and was claimed again)
+    """
+    if error is None:
+        status, delay = "succeeded", 0
+    elif retry_delay_seconds is not None:
+        status, delay = "queued", retry_delay_seconds
+    else:
+        status, delay = "failed", 0
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE jobs
+            SET status = ?, result = ?, last_error = ?, duration_ms = ?, lease_owner = NULL,
+                run_at = datetime('now', ?), attempts = attempts - ?,
+                finished_at = CASE WHEN ? = 'queued' THEN NULL ELSE datetime('now') END
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+            """,
+            (status, result, error, int(duration_ms), f"+{float(delay)} seconds", 0 if count_attempt else 1,
+             status, job_id, owner)
+        )
+        finished = cur.rowcount > 0
+        conn.commit()
+    return finished
+
+
+def get_job_stats():
+    """
+    Job counts and timings per job name, for status pages.
+    
+    Returns:
+        dict: name -> queued, running, succeeded, failed, avg_ms and max_ms
+              (over attempts with a recorded duration) and last_finished_at
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT name,
+                   SUM(status = 'queued') AS queued,
+                   SUM(status = 'running') AS running,
+                   SUM(status = 'succeeded') AS succeeded,
+                   SUM(status = 'failed') AS failed,
+                   ROUND(AVG(duration_ms)) AS avg_ms,
+                   MAX(duration_ms) AS max_ms,
+                   MAX(finished_at) AS last_finished_at
+            FROM jobs GROUP BY name ORDER BY name
+            """
+        )
+        stats = {job_row["name"]: {key: job_row[key] for key in job_row.keys() if key != "name"} for job_row in cur.fetchall()}
+    return stats
+
+
+def prune_jobs(older_than_days=7):
+    """Delete succeeded and failed jobs that finished more than `older_than_days` ago. Returns the number removed."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < datetime('now', ?)",
+            (f"-{int(older_than_days)} days",)
+        )
+        removed = cur.rowcount
+        conn.commit()
+    return removed
+
+
+# ---- Email outbox ----
+def insert_outbox_email(to_email, subject, body, max_pending=None):
+    """
+    Queue an email for the email workers.
+    
+    Args:
+        to_email (str): Recipient
+        subject (str): Subject line
+        body (str): Plain-text body
+        max_pending (int): Refuse the email if this many are already waiting or being sent
+    
+    Returns:
+        int: Outbox row id, or None if the outbox is full
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO email_outbox (to_email, subject, body)
+            SELECT ?, ?, ?
+            WHERE ? IS NULL OR (SELECT COUNT(*) FROM email_outbox WHERE status IN ('queued', 'sending')) < ?
+            RETURNING id
+            """,
+            (to_email, subject, body, max_pending, max_pending)
+        )
+        email_row = cur.fetchone()
+        conn.commit()
+    return email_row[0] if email_row else None
+
+
+def upsert_email_template(name, subject, body):
+    """Store (or replace) a template for batched emails; placeholders look like {{field}}."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO email_templates (name, subject, body) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET subject = excluded.subject, body = excluded.body, updated_at = datetime('now')",
+            (name, subject, body)
+        )
+        conn.commit()
+
+
+def get_email_template(name):
+    """Return the template as a dict (name, subject, body) or None."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT name, subject, body FROM email_templates WHERE name = ?", (name,))
+        template_row = cur.fetchone()
+    return dict(template_row) if template_row else None
+
+
+def insert_outbox_emails(template, recipients, max_pending=None):
+    """
+    Queue one templated email per recipient in a single transaction.
+    
+    Args:
+        template (str): Name of a stored email template
+        recipients (list): (to_email, substitutions JSON) tuples
+        max_pending (int): Queue only as many as fit under this many waiting or in-flight emails
+    
+    Returns:
+        int: Number of emails queued (the first ones in `recipients`)
+    """
+    recipients = list(recipients)
     conn = get_connection()
+    if conn.in_transaction:
+        conn.commit()
     cur = conn.cursor()
-    seen_business_ids = set()
-    recommended_businesses = []
-    if categories:
-        placeholders = ",".join("?" * len(categories))
-        cur.execute(f"""
-            SELECT * FROM businesses
-            WHERE category IN ({placeholders}) AND id NOT IN (SELECT business_id FROM favorites WHERE user_id = ?)
-            ORDER BY average_rating DESC, total_reviews DESC
-            LIMIT ?
-        """, (*categories, user_id, limit))
-        for row in cur.fetchall():
-            business = dict(row)
-            if business["id"] not in seen_business_ids:
-                seen_business_ids.add(business["id"])
-                recommended_businesses.append(business)
-    if len(recommended_businesses) < limit:
-        cur.execute("""
-            SELECT * FROM businesses
-            WHERE id NOT IN (SELECT business_id FROM favorites WHERE user_id = ?)
-            ORDER BY average_rating DESC, total_reviews DESC
-            LIMIT ?
-        """, (user_id, limit - len(recommended_businesses)))
-        for row in cur.fetchall():
-            business = dict(row)
-            if business["id"] not in seen_business_ids:
-                seen_business_ids.add(business["id"])
-                recommended_businesses.append(business)
-    conn.close()
-    return recommended_businesses[:limit]
+    # Take the write lock before counting, so concurrent batches cannot overfill the outbox
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        if max_pending is not None:
+            cur.execute("SELECT COUNT(*) FROM email_outbox WHERE status IN ('queued', 'sending')")
+            recipients = recipients[:max(0, max_pending - cur.fetchone()[0])]
+        cur.executemany(
+            "INSERT INTO email_outbox (to_email, subject, body, template, substitutions) VALUES (?, '', '', ?, ?)",
+            [(to_email, template, substitutions) for to_email, substitutions in recipients]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(recipients)
+
+
+def claim_outbox_emails(limit=1000, lease_seconds=120):
+    """
+    Claim due outbox rows that can go out in one API call.
+    
+    That is the oldest due row and, if it uses a template, up to `limit` due
+    rows with the same template. The claim itself is _claim_due_rows(), so two
+    workers never claim the same row.
+    
+    Returns:
+        list: Dictionaries with id, to_email, subject, body, template,
+              substitutions (decoded dict or None) and attempts (including this one)
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT template FROM email_outbox WHERE status IN ('queued', 'sending') AND next_attempt_at <= datetime('now') "
+            "ORDER BY next_attempt_at, id LIMIT 1"
+        )
+        oldest = cur.fetchone()
+        if oldest is None:
+            return []
+        template = oldest[0]
+        email_rows = _claim_due_rows(
+            cur, "email_outbox", "id",
+            assignments="status = 'sending', attempts = attempts + 1, next_attempt_at = datetime('now', ?)",
+            due="template IS ? AND status IN ('queued', 'sending') AND next_attempt_at <= datetime('now')",
+            order_by="next_attempt_at, id", limit=limit if template is not None else 1,
+            returning="id, to_email, subject, body, template, substitutions, attempts",
+            params=(f"+{int(lease_seconds)} seconds", template)
+        )
+        claimed = [
+            dict(email_row, substitutions=json.loads(email_row["substitutions"]) if email_row["substitutions"] else None)
+            for email_row in email_rows
+        ]
+        conn.commit()
+    return sorted(claimed, key=lambda email: email["id"])
+
+
+def mark_outbox_emails_sent(email_ids, send_ms):
+    """
+    Record emails delivered by one API call: its time, the batch size and each email's latency since it was queued.
+    
+    Bodies and substitutions are cleared, since they may hold a verification code or reset link.
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            UPDATE email_outbox
+            SET status = 'sent', body = '', substitutions = NULL, last_error = NULL, send_ms = ?, batch_size = ?,
+                sent_at = strftime('%Y-%m-%d %H:%M:%f', 'now'),
+                latency_ms = CAST((julianday('now') - julianday(created_at)) * 86400000 AS INTEGER)
+            WHERE id = ? AND status = 'sending'
+            """,
+            [(int(send_ms), len(email_ids), email_id) for email_id in email_ids]
+        )
+        conn.commit()
+
+
+def mark_outbox_emails_failed(email_ids, error, retry_delay_seconds=None):
+    """Queue failed emails again after `retry_delay_seconds`, or dead-letter them if that is None."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        if retry_delay_seconds is None:
+            cur.executemany(
+                "UPDATE email_outbox SET status = 'dead', last_error = ? WHERE id = ? AND status = 'sending'",
+                [(error, email_id) for email_id in email_ids]
+            )
+        else:
+            delay = f"+{float(retry_delay_seconds)} seconds"
+            cur.executemany(
+                "UPDATE email_outbox SET status = 'queued', last_error = ?, next_attempt_at = datetime('now', ?) "
+                "WHERE id = ? AND status = 'sending'",
+                [(error, delay, email_id) for email_id in email_ids]
+            )
+        conn.commit()
+
+
+def requeue_dead_emails():
+    """Give every dead-lettered email a fresh set of attempts. Returns the number requeued."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE email_outbox SET status = 'queued', attempts = 0, next_attempt_at = datetime('now') WHERE status = 'dead'"
+        )
+        requeued = cur.rowcount
+        conn.commit()
+    return requeued
+
+
+def get_email_outbox_stats(window_minutes=60):
+    """
+    Outbox depth and delivery times for status pages.
+    
+    Args:
+        window_minutes (int): How far back sent emails count towards the timings
+    
+    Returns:
+        dict: queued, due, sending, sent, dead counts, plus for emails sent in the
+              window: avg/max latency_ms (queued to sent), avg_send_ms (API call),
+              recent_sent, recent_http_calls and emails_per_call
+    """
+    window = f"-{int(window_minutes)} minutes"
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(status = 'queued'), 0) AS queued,
+                   COALESCE(SUM(status = 'queued' AND next_attempt_at <= datetime('now')), 0) AS due,
+                   COALESCE(SUM(status = 'sending'), 0) AS sending,
+                   COALESCE(SUM(status = 'sent'), 0) AS sent,
+                   COALESCE(SUM(status = 'dead'), 0) AS dead,
+                   ROUND(AVG(CASE WHEN status = 'sent' AND sent_at >= datetime('now', ?) THEN latency_ms END)) AS avg_latency_ms,
+                   MAX(CASE WHEN status = 'sent' AND sent_at >= datetime('now', ?) THEN latency_ms END) AS max_latency_ms,
+                   ROUND(AVG(CASE WHEN status = 'sent' AND sent_at >= datetime('now', ?) THEN send_ms END)) AS avg_send_ms,
+                   COALESCE(SUM(status = 'sent' AND sent_at >= datetime('now', ?)), 0) AS recent_sent,
+                   -- Each row of a batch of n is 1/n of an API call
+                   CAST(ROUND(COALESCE(SUM(CASE WHEN status = 'sent' AND sent_at >= datetime('now', ?) THEN 1.0 / COALESCE(batch_size, 1) END), 0)) AS INTEGER) AS recent_http_calls
+            FROM email_outbox
+            """,
+            (window,) * 5
+        )
+        stats = dict(cur.fetchone())
+        stats["emails_per_call"] = round(stats["recent_sent"] / stats["recent_http_calls"], 1) if stats["recent_http_calls"] else None
+    return stats
+
+
+def prune_email_outbox(sent_older_than_days=1, dead_older_than_days=30):
+    """Delete sent and dead-lettered emails past their retention. Returns the number removed."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DELETE FROM email_outbox
+            WHERE status = 'sent' AND sent_at < datetime('now', ?)
+               OR status = 'dead' AND created_at < datetime('now', ?)
+            """,
+            (f"-{int(sent_older_than_days)} days", f"-{int(dead_older_than_days)} days")
+        )
+        removed = cur.rowcount
+        conn.commit()
+    return removed
+
+
+# ---- Deal digest ----
+def get_max_deal_id():
+    """Highest deal id so far (0 if there are no deals); deal ids only grow."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM deals")
+        max_id = cur.fetchone()[0]
+    return max_id
+
+
+def get_deals_between(after_id, through_id):
+    """
+    Deals with after_id < id <= through_id, with their business names.
+    
+    Returns:
+        list: Dictionaries with id, business_id, business_name and description, by id
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT d.id, d.business_id, b.name AS business_name, d.description
+            FROM deals d JOIN businesses b ON b.id = d.business_id
+            WHERE d.id > ? AND d.id <= ?
+            ORDER BY d.id
+            """,
+            (after_id, through_id)
+        )
+        deals = [dict(deal_row) for deal_row in cur.fetchall()]
+    return deals
+
+
+def iter_deal_followers(after_id, through_id, fetch_size=10000):
+    """
+    Stream (business_id, user_id) for every favorite of a business with a deal in the id range.
+    
+    Rows come in business_id, user_id order straight from the covering
+    favorites index and are fetched `fetch_size` at a time, so memory does
+    not grow with the number of favorites.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT business_id, user_id FROM favorites
+            WHERE business_id IN (SELECT business_id FROM deals WHERE id > ? AND id <= ?)
+            ORDER BY business_id, user_id
+            """,
+            (after_id, through_id)
+        )
+        while True:
+            follower_rows = cur.fetchmany(fetch_size)
+            if not follower_rows:
+                break
+            for business_id, user_id in follower_rows:
+                yield business_id, user_id
+    finally:
+        conn.close()
+
+
+def get_users_for_digest(user_ids):
+    """
+    Verified users among `user_ids` who have an email address.
+    
+    Returns:
+        list: Dictionaries with id, username, email and preferences (decoded dict), by id
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        users = []
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            cur.execute(
+                f"""
+                SELECT id, username, email, user_preferences FROM users
+                WHERE id IN ({",".join("?" * len(chunk))}) AND email_verified = 1 AND email != ''
+                ORDER BY id
+                """,
+                chunk
+            )
+            for user_row in cur.fetchall():
+                try:
+                    preferences = json.loads(user_row["user_preferences"] or "{}")
+                except (json.JSONDecodeError, TypeError):
+                    preferences = {}
+                users.append({
+                    "id": user_row["id"],
+                    "username": user_row["username"],
+                    "email": user_row["email"],
+                    "preferences": preferences if isinstance(preferences, dict) else {},
+                })
+    return users
@@ -3,111 +3,135 @@ Seed database with default user and sample businesses/deals.
 Uses Yelp API for Richmond, VA businesses when YELP_API_KEY is set.
 Hidden Gems | FBLA 2026
 """
-from .db import get_connection
+import logging
+import time
+from itertools import chain, islice
+
+from .db import connection_scope
 from . import queries
 from ..logic.auth import hash_password
 
+logger = logging.getLogger(__name__)
+
 # Names of static seed businesses; removed when we have Yelp data so only real Richmond businesses show
 STATIC_BUSINESS_NAMES = {
     "Mama's Kitchen", "Tech Fix Pro", "Green Leaf Cafe", "Style Corner", "Sunset Cinema",
     "Wellness Plus", "Joe's Pizza", "Book Nook", "FitLife Gym", "Quick Clean",
 }
 
+# Yelp rows written per batch during a sync
+SYNC_CHUNK_SIZE = 50
+
 
 def _remove_static_seed_businesses():
     """Remove known static seed businesses so only Yelp (real Richmond) businesses remain."""
-    conn = get_connection()
-    cur = conn.cursor()
-    for name in STATIC_BUSINESS_NAMES:
-        cur.execute("DELETE FROM deals WHERE business_id IN (SELECT id FROM businesses WHERE name = ?)", (name,))
-        cur.execute("DELETE FROM reviews WHERE business_id IN (SELECT id FROM businesses WHERE name = ?)", (name,))
-        cur.execute("DELETE FROM favorites WHERE business_id IN (SELECT id FROM businesses WHERE name = ?)", (name,))
-        cur.execute("DELETE FROM businesses WHERE name = ?", (name,))
-    conn.commit()
-    conn.close()
-
-
-def _sync_richmond_from_yelp():
-    """Fetch Richmond, VA businesses from Yelp API; insert new ones and update existing (by name). Returns (added, updated)."""
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        for name in STATIC_BUSINESS_NAMES:
+            cur.execute("DELETE FROM deals WHERE business_id IN (SELECT id FROM businesses WHERE name = ?)", (name,))
+            cur.execute("DELETE FROM reviews WHERE business_id IN (SELECT id FROM businesses WHERE name = ?)", (name,))
+            cur.execute("DELETE FROM favorites WHERE business_id IN (SELECT id FROM businesses WHERE name = ?)", (name,))
+            cur.execute("DELETE FROM businesses WHERE name = ?", (name,))
+        conn.commit()
+
+
+def _chunks(rows, size):
+    """Lists of up to `size` items from an iterator, as they become available."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _sync_richmond_from_yelp(cache_max_age_seconds=None):
+    """
+    Fetch Richmond, VA businesses from Yelp API and apply them keyed on yelp_id.
+    
+    Each chunk of rows is written in one transaction while later Yelp pages are
+    still being fetched; rows whose content hash is unchanged are skipped and
+    businesses Yelp reports as permanently closed are hidden (see
+    queries.upsert_yelp_businesses).
+    
+    Args:
+        cache_max_age_seconds (float): Oldest cached Yelp page to reuse
+                                       (None: the cache TTL, 0: fetch everything)
+    
+    Returns:
+        dict: added, updated, unchanged and removed (newly closed) counts, and elapsed_seconds
+    """
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "elapsed_seconds": 0.0}
     try:
-        from ..logic.yelp_api import fetch_richmond_businesses, is_configured
+        from ..logic.yelp_api import iter_richmond_businesses, is_configured
     except ImportError:
-        return 0, 0
+        return stats
     if not is_configured():
-        return 0, 0
-    business_rows = fetch_richmond_businesses(max_per_category=50)
-    # When we have Yelp data, remove static seed businesses so only real Richmond businesses show
-    if business_rows:
-        _remove_static_seed_businesses()
-    added = 0
-    updated = 0
-    for row in business_rows:
-        business_id = queries.get_business_id_by_name(row["name"])
-        if business_id:
-            queries.update_business(
-                business_id,
-                category=row.get("category"),
-                description=row.get("description"),
-                address=row.get("address"),
-                average_rating=row.get("average_rating"),
-                total_reviews=row.get("total_reviews"),
-                phone=row.get("phone"),
-                website=row.get("website"),
-                yelp_url=row.get("yelp_url"),
-                latitude=row.get("latitude"),
-                longitude=row.get("longitude"),
-                price_range=row.get("price_range"),
-                hours=row.get("hours"),
-                photo_url=row.get("photo_url"),
-                attributes=row.get("attributes"),
-                summary=row.get("summary"),
-                yelp_id=row.get("yelp_id"),
-            )
-            updated += 1
-        else:
-            queries.insert_business(
-                name=row["name"],
-                category=row.get("category"),
-                description=row.get("description"),
-                average_rating=row.get("average_rating", 0),
-                total_reviews=row.get("total_reviews", 0),
-                address=row.get("address"),
-                phone=row.get("phone"),
-                website=row.get("website"),
-                yelp_url=row.get("yelp_url"),
-                latitude=row.get("latitude"),
-                longitude=row.get("longitude"),
-                price_range=row.get("price_range"),
-                hours=row.get("hours"),
-                photo_url=row.get("photo_url"),
-                attributes=row.get("attributes"),
-                summary=row.get("summary"),
-                yelp_id=row.get("yelp_id"),
+        return stats
+    started = time.perf_counter()
+    # Each sync is a good moment to drop geocode cache entries that have expired
+    queries.prune_geocode_cache()
+    for chunk_number, business_rows in enumerate(_chunks(iter_richmond_businesses(include_closed=True, cache_max_age_seconds=cache_max_age_seconds), SYNC_CHUNK_SIZE)):
+        # When we have Yelp data, remove static seed businesses so only real Richmond businesses show
+        if chunk_number == 0:
+            _remove_static_seed_businesses()
+        _remember_known_coordinates(business_rows)
+        for key, count in queries.upsert_yelp_businesses(business_rows).items():
+            stats[key] += count
+    stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    # Only a sync that actually got rows counts towards "synced recently"
+    if stats["added"] + stats["updated"] + stats["unchanged"]:
+        queries.record_yelp_sync(stats)
+    logger.info(
+        f"Yelp sync: {stats['added']} added, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+        f"{stats['removed']} removed in {stats['elapsed_seconds']}s"
+    )
+    return stats
+
+
+def _remember_known_coordinates(business_rows):
+    """
+    Prime the shared geocode cache with the coordinates Yelp already gave.
+    
+    Rows without coordinates are queued by the businesses triggers when they
+    are written, and the geocode worker resolves them (cache first).
+    """
+    try:
+        from ..logic.geocoding import remember_coordinates
+    except ImportError:
+        return
+    remember_coordinates(
+        (row["address"], row["latitude"], row["longitude"])
+        for row in business_rows
+        if row.get("address") and row.get("latitude") is not None and row.get("longitude") is not None
+    )
+
+
+def ensure_seed_data(sync_yelp=True):
+    """
+    Create demo user; fill businesses from Yelp (Richmond VA) if API key set, else static seed.
+    
+    With sync_yelp=False only local work is done (demo user, static seed for an
+    empty catalog), so a server can start right away and sync in the background
+    (see logic.catalog_sync); the sync replaces the static businesses.
+    """
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM users")
+        if cur.fetchone()[0] == 0:
+            cur.execute(
+                "INSERT INTO users (username, email, password_hash, email_verified) VALUES (?, ?, ?, 1)",
+                ("demo", "demo@hiddengems.local", hash_password("demo1234"))
             )
-            added += 1
-    return added, updated
-
-
-def ensure_seed_data():
-    """Create demo user; fill businesses from Yelp (Richmond VA) if API key set, else static seed."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM users")
-    if cur.fetchone()[0] == 0:
-        cur.execute(
-            "INSERT INTO users (username, email, password_hash, email_verified) VALUES (?, ?, ?, 1)",
-            ("demo", "demo@hiddengems.local", hash_password("demo1234"))
-        )
-        conn.commit()
-    conn.close()
+            conn.commit()
 
     # Businesses: try Yelp (Richmond, VA) first; add new and update existing
-    _sync_richmond_from_yelp()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM businesses")
-    business_count = cur.fetchone()[0]
-    conn.close()
+    if sync_yelp:
+        _sync_richmond_from_yelp()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM businesses")
+        business_count = cur.fetchone()[0]
     if business_count == 0:
         # Fallback: static seed when Yelp not configured or returned nothing
         _seed_static_businesses()
@@ -115,46 +139,45 @@ def ensure_seed_data():
 
 def _seed_static_businesses():
     """Static Richmond-style businesses when Yelp is not used."""
-    conn = get_connection()
-    cur = conn.cursor()
-    businesses = [
-        ("Mama's Kitchen", "Food", "Homestyle comfort food and daily specials.", 4.5, 12),
-        ("Tech Fix Pro", "Services", "Computer and phone repair, same-day service.", 4.8, 28),
-        ("Green Leaf Cafe", "Food", "Organic coffee and light bites.", 4.2, 8),
-        ("Style Corner", "Retail", "Trendy clothing and accessories.", 4.0, 15),
-        ("Sunset Cinema", "Entertainment", "Independent films and classic screenings.", 4.6, 22),
-        ("Wellness Plus", "Health and Wellness", "Massage, yoga, and nutrition counseling.", 4.7, 18),
-        ("Joe's Pizza", "Food", "New York-style pizza and subs.", 4.3, 31),
-        ("Book Nook", "Retail", "Used and new books, cozy reading space.", 4.4, 9),
-        ("FitLife Gym", "Health and Wellness", "24/7 gym with classes and personal training.", 4.1, 45),
-        ("Quick Clean", "Services", "Residential and commercial cleaning.", 4.5, 14),
-    ]
-    for name, category, desc, rating, count in businesses:
-        cur.execute(
-            "INSERT INTO businesses (name, category, description, address, average_rating, total_reviews) VALUES (?, ?, ?, ?, ?, ?)",
-            (name, category, desc, None, rating, count)
-        )
-    conn.commit()
-    # Add some deals
-    cur.execute("SELECT id FROM businesses WHERE name = 'Mama''s Kitchen'")
-    business_id = cur.fetchone()[0]
-    cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "10% off lunch Monday–Friday"))
-    cur.execute("SELECT id FROM businesses WHERE name = 'Tech Fix Pro'")
-    business_id = cur.fetchone()[0]
-    cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "Free diagnostic on first visit"))
-    cur.execute("SELECT id FROM businesses WHERE name = 'Green Leaf Cafe'")
-    business_id = cur.fetchone()[0]
-    cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "Buy 2 coffees, get 1 free"))
-    cur.execute("SELECT id FROM businesses WHERE name = 'Joe''s Pizza'")
-    business_id = cur.fetchone()[0]
-    cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "Large pizza for the price of medium on Tuesdays"))
-    conn.commit()
-    conn.close()
-
-
-def refresh_richmond_from_yelp():
-    """Fetch latest Richmond, VA businesses from Yelp; add new and update existing. Returns (added, updated)."""
-    return _sync_richmond_from_yelp()
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        businesses = [
+            ("Mama's Kitchen", "Food", "Homestyle comfort food and daily specials.", 4.5, 12),
+            ("Tech Fix Pro", "Services", "Computer and phone repair, same-day service.", 4.8, 28),
+            ("Green Leaf Cafe", "Food", "Organic coffee and light bites.", 4.2, 8),
+            ("Style Corner", "Retail", "Trendy clothing and accessories.", 4.0, 15),
+            ("Sunset Cinema", "Entertainment", "Independent films and classic screenings.", 4.6, 22),
+            ("Wellness Plus", "Health and Wellness", "Massage, yoga, and nutrition counseling.", 4.7, 18),
+            ("Joe's Pizza", "Food", "New York-style pizza and subs.", 4.3, 31),
+            ("Book Nook", "Retail", "Used and new books, cozy reading space.", 4.4, 9),
+            ("FitLife Gym", "Health and Wellness", "24/7 gym with classes and personal training.", 4.1, 45),
+            ("Quick Clean", "Services", "Residential and commercial cleaning.", 4.5, 14),
+        ]
+        for name, category, desc, rating, count in businesses:
+            cur.execute(
+                "INSERT INTO businesses (name, category, description, address, average_rating, total_reviews) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, category, desc, None, rating, count)
+            )
+        conn.commit()
+        # Add some deals
+        cur.execute("SELECT id FROM businesses WHERE name = 'Mama''s Kitchen'")
+        business_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "10% off lunch Monday–Friday"))
+        cur.execute("SELECT id FROM businesses WHERE name = 'Tech Fix Pro'")
+        business_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "Free diagnostic on first visit"))
+        cur.execute("SELECT id FROM businesses WHERE name = 'Green Leaf Cafe'")
+        business_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "Buy 2 coffees, get 1 free"))
+        cur.execute("SELECT id FROM businesses WHERE name = 'Joe''s Pizza'")
+        business_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, "Large pizza for the price of medium on Tuesdays"))
+        conn.commit()
+
+
+def refresh_richmond_from_yelp(cache_max_age_seconds=None):
+    """Fetch latest Richmond, VA businesses from Yelp; add new and update changed ones. Returns the sync stats dict."""
+    return _sync_richmond_from_yelp(cache_max_age_seconds=cache_max_age_seconds)
 
 
 def replace_all_with_yelp():
@@ -164,30 +187,24 @@ def replace_all_with_yelp():
     Returns (number_loaded, None) on success, or (0, error_message) on failure.
     """
     try:
-        from ..logic.yelp_api import fetch_richmond_businesses, is_configured, get_last_error
+        from ..logic.yelp_api import iter_richmond_businesses, is_configured, get_last_error
     except ImportError:
         return 0, "Yelp module not found"
     if not is_configured():
         return 0, "YELP_API_KEY not set in config.py"
-    business_rows = fetch_richmond_businesses(max_per_category=50)
-    error_message = get_last_error()
-    if not business_rows:
-        return 0, (error_message or "Yelp returned no businesses. Check your API key and internet.")
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM deals")
-    cur.execute("DELETE FROM reviews")
-    cur.execute("DELETE FROM favorites")
-    cur.execute("DELETE FROM businesses")
-    conn.commit()
-    conn.close()
-    for row in business_rows:
-        queries.insert_business(
-            name=row["name"],
-            category=row["category"],
-            description=row["description"],
-            average_rating=row["average_rating"],
-            total_reviews=row["total_reviews"],
-            address=row.get("address"),
-        )
-    return len(business_rows), None
+    business_rows = iter_richmond_businesses()
+    first_row = next(business_rows, None)
+    if first_row is None:
+        return 0, (get_last_error() or "Yelp returned no businesses. Check your API key and internet.")
+    with connection_scope() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM deals")
+        cur.execute("DELETE FROM reviews")
+        cur.execute("DELETE FROM favorites")
+        cur.execute("DELETE FROM businesses")
+        conn.commit()
+    loaded = 0
+    for chunk in _chunks(chain([first_row], business_rows), SYNC_CHUNK_SIZE):
+        _remember_known_coordinates(chunk)
+        loaded += queries.upsert_yelp_businesses(chunk)["added"]
+    return loaded, None
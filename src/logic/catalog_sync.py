@@ -0,0 +1,139 @@
+"""
+Catalog Sync - Yelp sync off the startup path, with status reporting
+
+run_web starts the server on whatever catalog the database already has and
+calls start_background_sync(), which queues the Yelp sync as a yelp_sync job
+for the job runner (logic.jobs) and schedules it to repeat. A sync that
+finished less than YELP_SYNC_MAX_AGE_HOURS ago (the time is kept in
+app_meta, so it survives restarts) is skipped, so frequent restarts do not
+refetch the catalog. get_sync_status() reports this process's progress for
+/api/status; the last sync time comes from the database.
+
+Hidden Gems | FBLA 2026
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from src.database import queries, seed
+from src.logic import jobs, yelp_api
+
+logger = logging.getLogger(__name__)
+
+# A sync newer than this is fresh enough to skip at startup
+SYNC_MAX_AGE_HOURS = float(os.getenv("YELP_SYNC_MAX_AGE_HOURS", "6"))
+# The schedule checks this many times per max age. The last-sync time is
+# stamped when a sync finishes, so checking only once per max age would
+# always land just short of it and refresh every other period
+SYNC_CHECKS_PER_MAX_AGE = 4
+
+_sync_lock = threading.Lock()
+_sync_state = {"state": "idle", "started_at": None, "finished_at": None, "stats": None, "error": None}
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _update_state(**changes):
+    with _sync_lock:
+        _sync_state.update(changes)
+
+
+def sync_is_due(max_age_hours=SYNC_MAX_AGE_HOURS):
+    """True if the catalog was never synced or the last sync is older than `max_age_hours`."""
+    synced_at = queries.get_last_yelp_sync()["at"]
+    return synced_at is None or _now() - synced_at >= timedelta(hours=max_age_hours)
+
+
+def _cache_max_age_seconds(force):
+    """
+    Oldest cached Yelp page a sync may reuse: only pages fetched since the last
+    completed sync (an interrupted or retried run), and none when forced.
+    """
+    if force:
+        return 0
+    synced_at = queries.get_last_yelp_sync()["at"]
+    return None if synced_at is None else max(0.0, (_now() - synced_at).total_seconds())
+
+
+def run_sync(force=False, max_age_hours=SYNC_MAX_AGE_HOURS):
+    """
+    Run the Yelp sync now (in this thread) unless it is not configured or not due.
+
+    Args:
+        force (bool): Sync even if the last one is recent
+        max_age_hours (float): How old the last sync may be before another is due
+
+    Returns:
+        dict: Sync stats, or None if skipped or failed (see get_sync_status())
+    """
+    if not yelp_api.is_configured():
+        _update_state(state="skipped", error="YELP_API_KEY not set", finished_at=_now())
+        return None
+    if not force and not sync_is_due(max_age_hours):
+        _update_state(state="skipped", error=None, finished_at=_now())
+        logger.info(f"Yelp sync skipped: last sync is under {max_age_hours:g} hours old")
+        return None
+    _update_state(state="running", started_at=_now(), finished_at=None, stats=None, error=None)
+    try:
+        stats = seed.refresh_richmond_from_yelp(cache_max_age_seconds=_cache_max_age_seconds(force))
+    except Exception as error:
+        logger.error(f"Yelp sync failed: {error}")
+        _update_state(state="failed", error=str(error), finished_at=_now())
+        return None
+    if not (stats["added"] + stats["updated"] + stats["unchanged"]):
+        _update_state(state="failed", stats=stats, error=yelp_api.get_last_error() or "Yelp returned no businesses", finished_at=_now())
+        return None
+    _update_state(state="succeeded", stats=stats, finished_at=_now())
+    return stats
+
+
+def _sync_job(payload):
+    """Job handler: run_sync(); a failed sync raises so the job runner retries it."""
+    stats = run_sync(force=payload.get("force", False), max_age_hours=payload.get("max_age_hours", SYNC_MAX_AGE_HOURS))
+    with _sync_lock:
+        failed = _sync_state["state"] == "failed"
+        error = _sync_state["error"]
+    if failed:
+        raise RuntimeError(error)
+    return stats
+
+
+jobs.register_job("yelp_sync", _sync_job, max_attempts=3, timeout_seconds=30 * 60, retry_base_seconds=60)
+
+
+def start_background_sync(force=False, max_age_hours=SYNC_MAX_AGE_HOURS):
+    """
+    Queue a yelp_sync job now and schedule one every `max_age_hours` / SYNC_CHECKS_PER_MAX_AGE.
+
+    The scheduled runs skip themselves while the catalog is fresh, so this
+    just keeps it from going stale on a long-running server: the catalog is
+    refreshed at most a quarter period after it reaches `max_age_hours`. Start the job
+    runner (jobs.start_job_runner()) to run them.
+
+    Returns:
+        int: Job id, or None if a sync is already queued or running
+    """
+    payload = {"force": force, "max_age_hours": max_age_hours}
+    jobs.schedule("yelp_sync", max_age_hours * 60 * 60 / SYNC_CHECKS_PER_MAX_AGE, {"max_age_hours": max_age_hours})
+    return jobs.enqueue("yelp_sync", payload, unique_key="yelp_sync")
+
+
+def get_sync_status():
+    """
+    Current sync state for status pages.
+
+    Returns:
+        dict: state (idle/running/succeeded/skipped/failed), started_at,
+              finished_at, stats and error for this process's last run, plus
+              last_sync_at from the database (ISO 8601 strings)
+    """
+    with _sync_lock:
+        status = dict(_sync_state)
+    last_sync = queries.get_last_yelp_sync()
+    status["last_sync_at"] = last_sync["at"]
+    if status["stats"] is None:
+        status["stats"] = last_sync["stats"]
+    return {key: value.isoformat(timespec="seconds") if isinstance(value, datetime) else value for key, value in status.items()}
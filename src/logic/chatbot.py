@@ -11,9 +11,11 @@ FBLA 2026 Hidden Gems
 """
 import os
 import json
+import re
 import urllib.request
 import urllib.error
 from src.database import queries
+from src.logic import search_index
 
 # ============================================
 # API CONFIGURATION
@@ -44,28 +46,35 @@ def get_api_keys():
     return groq_api_key, huggingface_api_key, cohere_api_key
 
 
-def get_business_context():
+def get_business_context(user_message=None):
     """
     Build system context for AI chatbot containing business knowledge.
     
     Creates a formatted string with:
     - Available business categories
-    - Top 50 businesses with key details (name, category, rating, reviews)
+    - Businesses relevant to the user's message (full-text search), or the
+      first few in the directory, with key details (name, category, rating)
     - Role description and response guidelines
     - Search capabilities and formatting instructions
     
     This context is passed to the AI model to help it provide relevant recommendations.
     
+    Args:
+        user_message (str): Optional current message, used to pick relevant businesses
+    
     Returns:
         str: System context prompt for AI model
     """
-    # Fetch all businesses from database
-    all_businesses = queries.get_all_businesses()
+    # Prefer businesses that match what the user asked about
+    search_words = extract_search_words(user_message or "")
+    context_businesses = search_businesses(" ".join(search_words)) if search_words else []
+    if not context_businesses:
+        context_businesses = queries.get_all_businesses()
     available_categories = queries.get_categories()
     
     # Format business data concisely (limit to 5 for maximum speed)
     formatted_businesses = []
-    for business in all_businesses[:5]:
+    for business in context_businesses[:5]:
         formatted_businesses.append({
             "name": business.get("name"),
             "category": business.get("category"),
@@ -135,9 +144,20 @@ def get_quick_actions(intent):
 
 
 def search_businesses(query, category=None, min_rating=None):
-    """Search businesses based on query parameters."""
+    """Search businesses based on query parameters (full-text when a query is given)."""
+    if query and str(query).strip():
+        # Full-text index ranks by relevance; any word may match
+        businesses = queries.search_businesses(query, category=category, min_rating=min_rating, limit=10, match_all=False)
+        if not businesses:
+            # Probably a typo ("pizzza") - fall back to trigram similarity
+            businesses = [
+                b for b in search_index.fuzzy_search(query, limit=10, category=category)
+                if not min_rating or b.get("average_rating", 0) >= min_rating
+            ]
+        return businesses
+    
     if category:
-        businesses = queries.get_businesses_for_directory(category=category)
+        businesses = queries.get_businesses_for_directory(category_filter=category, sort_by_option="rating_high")
     else:
         businesses = queries.get_all_businesses()
     
@@ -151,6 +171,21 @@ def search_businesses(query, category=None, min_rating=None):
     return businesses[:10]  # Return top 10
 
 
+# Words in a "find ..." request that say nothing about what to look for
+SEARCH_FILLER_WORDS = {
+    "find", "search", "searching", "look", "looking", "for", "show", "me", "where", "need",
+    "i", "a", "an", "the", "some", "any", "can", "you", "is", "are", "in", "near", "around",
+    "richmond", "place", "places", "to", "get", "want", "please", "good", "best", "top",
+    "what", "which", "who", "how", "do", "does", "of", "and", "with", "my", "there", "it",
+    "s", "hi", "hello", "hey", "thanks",
+}
+
+
+def extract_search_words(user_message):
+    """Words from a chat message worth searching the directory for (filler words dropped)."""
+    return [word for word in re.findall(r"\w+", user_message.lower()) if word not in SEARCH_FILLER_WORDS]
+
+
 def format_business_for_display(business):
     """Format a single business for chatbot display."""
     rating = business.get("average_rating", 0)
@@ -328,7 +363,7 @@ def rule_based_response(user_message):
                 break
         
         if detected_cat:
-            businesses = queries.get_businesses_for_directory(category=detected_cat, sort_by="rating_high")[:3]
+            businesses = queries.get_businesses_for_directory(category_filter=detected_cat, sort_by_option="rating_high")[:3]
             if businesses:
                 response = f"I found {len(businesses)} great {detected_cat} businesses:\n\n"
                 for business in businesses:
@@ -336,6 +371,17 @@ def rule_based_response(user_message):
                     response += f"   {business.get('category')}\n\n"
                 return (response + "Would you like more details?", ["Show More", "View Deals", "Different Category"])
         
+        # No category named - search names, descriptions and attributes for what they asked about
+        search_words = extract_search_words(normalized_message)
+        if search_words:
+            businesses = search_businesses(" ".join(search_words))[:3]
+            if businesses:
+                response = f"Here's what I found for \"{' '.join(search_words)}\":\n\n"
+                for business in businesses:
+                    response += f"⭐ {business.get('name')} - {business.get('average_rating')}★ ({business.get('total_reviews')} reviews)\n"
+                    response += f"   {business.get('category')}\n\n"
+                return (response + "Would you like more details?", ["Show More", "View Deals", "Different Category"])
+        
         # Ask for category
         return ("I can help you find businesses! What category interests you?",
                ["Food", "Retail", "Services", "Health & Wellness"])
@@ -380,7 +426,7 @@ def chat_with_ai(messages, user_message):
     intent = detect_intent(user_message)
     
     # Get business context
-    system_prompt = get_business_context()
+    system_prompt = get_business_context(user_message)
     
     # Get API keys
     groq_key, hf_key, cohere_key = get_api_keys()
@@ -0,0 +1,231 @@
+"""
+Map Clustering - Precomputed grid clusters for every map zoom level
+
+The world is projected to Web Mercator (the projection Leaflet and Google
+Maps draw in) and cut into square cells of CELL_PIXELS screen pixels at each
+zoom level, so one cell is roughly one marker's worth of screen space. Every
+cell keeps, per category, a count and running sums of latitude, longitude
+and business id: the centroid is sum / count, and a cell holding a single
+business gives that business's id back directly (the id sum of one).
+
+A cell at zoom z is exactly four cells at zoom z + 1, so the grids are built
+once from the finest level upwards. Adding, moving or removing a business
+touches one cell per zoom level, which keeps updates incremental. Like the
+search indexes, the grids are built once per process, updated in place when
+insert_business/update_business run here, and rebuilt when the
+location_version counter (bumped by triggers) shows another process moved
+businesses.
+
+Hidden Gems | FBLA 2026
+"""
+import math
+import threading
+import time
+
+from src.database import db, queries
+
+# Screen pixels per map tile and per cluster cell (cells are square)
+TILE_PIXELS = 256
+CELL_PIXELS = 64
+# Zoom levels with precomputed clusters; from MAX_CLUSTER_ZOOM in the map shows individual markers
+MIN_ZOOM = 0
+MAX_CLUSTER_ZOOM = 16
+# How often (seconds) to ask SQLite whether businesses moved in another process
+STALE_CHECK_SECONDS = 5.0
+# Web Mercator cannot show the poles
+MAX_LATITUDE = 85.05112878
+
+
+def project(latitude, longitude):
+    """Web Mercator position of a point in world units: x east and y south, both 0-1."""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    sin_latitude = math.sin(math.radians(latitude))
+    x = (longitude + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * math.pi)
+    return x, y
+
+
+def cells_per_world(zoom):
+    """Number of grid cells across the whole world at `zoom`."""
+    return TILE_PIXELS * (1 << zoom) // CELL_PIXELS
+
+
+def cell_key(x, y, zoom):
+    """Grid cell (column, row) holding the projected point (x, y) at `zoom`."""
+    scale = cells_per_world(zoom)
+    return min(int(x * scale), scale - 1), min(int(y * scale), scale - 1)
+
+
+class ClusterGrid:
+    """
+    Per-zoom grids of cells holding per-category totals.
+
+    Each cell maps category -> [count, latitude sum, longitude sum, id sum].
+    """
+
+    def __init__(self, min_zoom=MIN_ZOOM, max_zoom=MAX_CLUSTER_ZOOM - 1):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._points = {}  # business id -> (latitude, longitude, category, x, y)
+        self._cells = {zoom: {} for zoom in range(min_zoom, max_zoom + 1)}
+
+    def __len__(self):
+        return len(self._points)
+
+    def load(self, rows):
+        """
+        Build every zoom level from (id, latitude, longitude, category) rows.
+
+        The finest grid is filled point by point; each coarser grid is then
+        made by merging the four child cells of every parent cell.
+        """
+        self._points = {}
+        finest = {}
+        for business_id, latitude, longitude, category in rows:
+            if latitude is None or longitude is None:
+                continue
+            category = category or "Other"
+            x, y = project(latitude, longitude)
+            self._points[business_id] = (latitude, longitude, category, x, y)
+            _add_to_cell(finest.setdefault(cell_key(x, y, self.max_zoom), {}), category, 1, latitude, longitude, business_id)
+        self._cells = {self.max_zoom: finest}
+        for zoom in range(self.max_zoom - 1, self.min_zoom - 1, -1):
+            parents = {}
+            for (column, row), cell in self._cells[zoom + 1].items():
+                parent = parents.setdefault((column >> 1, row >> 1), {})
+                for category, totals in cell.items():
+                    _add_to_cell(parent, category, *totals)
+            self._cells[zoom] = parents
+
+    def add(self, business_id, latitude, longitude, category):
+        """Add a business, or move it if it is already in the grids (no coordinates removes it)."""
+        self.remove(business_id)
+        if latitude is None or longitude is None:
+            return
+        category = category or "Other"
+        x, y = project(latitude, longitude)
+        self._points[business_id] = (latitude, longitude, category, x, y)
+        for zoom, cells in self._cells.items():
+            _add_to_cell(cells.setdefault(cell_key(x, y, zoom), {}), category, 1, latitude, longitude, business_id)
+
+    def remove(self, business_id):
+        """Take a business out of every zoom level."""
+        point = self._points.pop(business_id, None)
+        if point is None:
+            return
+        latitude, longitude, category, x, y = point
+        for zoom, cells in self._cells.items():
+            key = cell_key(x, y, zoom)
+            cell = cells[key]
+            _add_to_cell(cell, category, -1, -latitude, -longitude, -business_id)
+            if not cell:
+                del cells[key]
+
+    def clusters(self, south, west, north, east, zoom, category=None):
+        """
+        Clusters for the cells a viewport overlaps.
+
+        Args:
+            south, west, north, east (float): Viewport edges in degrees
+            zoom (int): Map zoom level (clamped to the precomputed range)
+            category (str): Optional category filter
+
+        Returns:
+            list: {"lat", "lng", "count"} dictionaries, plus "id" when the
+                  cluster is a single business
+        """
+        zoom = max(self.min_zoom, min(self.max_zoom, int(zoom)))
+        cells = self._cells[zoom]
+        first_column, first_row = cell_key(*project(north, west), zoom)
+        last_column, last_row = cell_key(*project(south, east), zoom)
+        span = (last_column - first_column + 1) * (last_row - first_row + 1)
+        if span <= len(cells):
+            candidates = (
+                ((column, row), cells[(column, row)])
+                for column in range(first_column, last_column + 1)
+                for row in range(first_row, last_row + 1)
+                if (column, row) in cells
+            )
+        else:
+            # Zoomed-out viewport: fewer occupied cells than cells in view
+            candidates = (
+                (key, cell) for key, cell in cells.items()
+                if first_column <= key[0] <= last_column and first_row <= key[1] <= last_row
+            )
+        found = []
+        for key, cell in sorted(candidates):
+            if category:
+                totals = [cell[category]] if category in cell else []
+            else:
+                totals = cell.values()
+            count = latitude_sum = longitude_sum = id_sum = 0
+            for category_count, category_latitude, category_longitude, category_ids in totals:
+                count += category_count
+                latitude_sum += category_latitude
+                longitude_sum += category_longitude
+                id_sum += category_ids
+            if not count:
+                continue
+            cluster = {"lat": latitude_sum / count, "lng": longitude_sum / count, "count": count}
+            if count == 1:
+                cluster["id"] = id_sum
+            found.append(cluster)
+        return found
+
+
+def _add_to_cell(cell, category, count, latitude, longitude, business_id):
+    """Add (or with negative values subtract) totals for `category` in one cell."""
+    totals = cell.get(category)
+    if totals is None:
+        cell[category] = [count, latitude, longitude, business_id]
+        return
+    totals[0] += count
+    if totals[0] == 0:
+        del cell[category]
+        return
+    totals[1] += latitude
+    totals[2] += longitude
+    totals[3] += business_id
+
+
+_grid_lock = threading.RLock()
+_grid_state = {"grid": None, "database": None, "version": None, "checked_at": 0.0}
+
+
+def _on_business_changed(business):
+    """queries.py listener: move one business in the grids instead of rebuilding them."""
+    with _grid_lock:
+        if _grid_state["grid"] is None or _grid_state["database"] != str(db.DATABASE_PATH):
+            return
+        _grid_state["grid"].add(business["id"], business.get("latitude"), business.get("longitude"), business.get("category"))
+        # Our own write moved the location version by at most one; more means another process wrote too
+        current_version = queries.get_location_version()
+        if current_version - _grid_state["version"] <= 1:
+            _grid_state["version"] = current_version
+
+
+queries.add_business_listener(_on_business_changed)
+
+
+def _current_grid():
+    """Cluster grid for the current database, (re)built if missing or stale. Caller holds _grid_lock."""
+    database = str(db.DATABASE_PATH)
+    now = time.monotonic()
+    state = _grid_state
+    if state["grid"] is not None and state["database"] == database and now - state["checked_at"] < STALE_CHECK_SECONDS:
+        return state["grid"]
+    version = queries.get_location_version()
+    if state["grid"] is None or state["database"] != database or state["version"] != version:
+        grid = ClusterGrid()
+        grid.load(queries.get_business_locations())
+        state["grid"] = grid
+        state["database"] = database
+        state["version"] = version
+    state["checked_at"] = now
+    return state["grid"]
+
+
+def get_clusters(south, west, north, east, zoom, category=None):
+    """Clusters for a map viewport from the process-wide grids (see ClusterGrid.clusters)."""
+    with _grid_lock:
+        return _current_grid().clusters(south, west, north, east, zoom, category=category)
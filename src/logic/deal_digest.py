@@ -0,0 +1,203 @@
+"""
+Deal Digest - One email per user listing new deals at their favorite businesses
+
+The deal_digest job (scheduled every DIGEST_INTERVAL_HOURS on the job runner)
+looks at deals added since its last run; deal ids only grow, so the last
+deal id it covered is the watermark, kept in app_meta. It then:
+
+1. builds an inverted index from each business with a new deal to the users
+   who favorited it, as sorted arrays of 32-bit user ids (4 bytes per
+   favorite) streamed from the covering favorites index;
+2. merges those arrays in user id order, so each user's new deals come out
+   together without ever holding a user -> deals map for everyone;
+3. queues one "deal_digest" template email per opted-in user, DIGEST_CHUNK
+   users at a time (one SendGrid call each, see email_sender.send_batch_email).
+
+Memory is the index plus one chunk, however many users there are. Progress
+is saved after each chunk. When the outbox fills up (it holds
+EMAIL_OUTBOX_MAX_PENDING emails, so a digest for more users than that takes
+several runs) the job pauses with jobs.RetryLater and resumes with the next
+user once the workers have made room, without emailing anyone twice or
+using up its attempts. The first run only sets the watermark; older deals are not sent.
+scripts/benchmark_deal_digest.py measures time and peak memory at scale.
+
+Hidden Gems | FBLA 2026
+"""
+import heapq
+import json
+import logging
+import os
+from array import array
+from itertools import groupby, repeat
+
+from src.database import queries
+from src.logic import email_sender, jobs
+from src.logic.auth import is_valid_email
+from src.logic.email_transport import MAX_RECIPIENTS_PER_CALL
+
+logger = logging.getLogger(__name__)
+
+DIGEST_INTERVAL_HOURS = float(os.getenv("DEAL_DIGEST_INTERVAL_HOURS", "24"))
+# Users per queued batch: one provider API call
+DIGEST_CHUNK = MAX_RECIPIENTS_PER_CALL
+# Deals listed in one email; the rest are summed up as "and N more"
+MAX_DEALS_PER_EMAIL = 20
+
+TEMPLATE_NAME = "deal_digest"
+TEMPLATE_SUBJECT = "{{deal_count}} new deals at your favorite Richmond spots"
+TEMPLATE_BODY = """Hi {{username}},
+
+Businesses you favorited on Hidden Gems have new deals:
+
+{{deals}}
+
+Open Hidden Gems to see the details. You can turn these emails off under
+Settings > Notifications.
+
+— Hidden Gems Team
+Richmond, Virginia
+"""
+
+# Seconds a digest paused by a full outbox waits before it continues
+RESUME_DELAY_SECONDS = 60
+
+WATERMARK_KEY = "deal_digest_last_deal_id"
+PROGRESS_KEY = "deal_digest_progress"
+
+
+def build_interest_index(followers):
+    """
+    Inverted index from business id to the users who favorited it.
+
+    Args:
+        followers (iterable): (business_id, user_id) pairs in business_id, user_id order
+
+    Returns:
+        dict: business_id -> array('I') of user ids, ascending
+    """
+    return {
+        business_id: array("I", (user_id for _, user_id in pairs))
+        for business_id, pairs in groupby(followers, key=lambda pair: pair[0])
+    }
+
+
+def iter_user_deals(index, deals_by_business, start_user_id=0):
+    """
+    Walk the index in user id order.
+
+    Yields:
+        tuple: (user_id, deals) for every user following at least one business
+               with a new deal, deals in business order
+    """
+    streams = [zip(user_ids, repeat(business_id)) for business_id, user_ids in sorted(index.items())]
+    for user_id, pairs in groupby(heapq.merge(*streams), key=lambda pair: pair[0]):
+        if user_id < start_user_id:
+            continue
+        yield user_id, [deal for _, business_id in pairs for deal in deals_by_business.get(business_id, ())]
+
+
+def wants_deal_emails(preferences):
+    """Deal notifications are on unless the user turned them off in Settings."""
+    return preferences.get("deal_notifications", True) is not False
+
+
+def format_deals(deals):
+    """Plain-text list for the {{deals}} placeholder."""
+    lines = [f"- {deal['business_name']}: {deal['description']}" for deal in deals[:MAX_DEALS_PER_EMAIL]]
+    if len(deals) > MAX_DEALS_PER_EMAIL:
+        lines.append(f"...and {len(deals) - MAX_DEALS_PER_EMAIL} more")
+    return "\n".join(lines)
+
+
+def _chunks(user_deals, size):
+    chunk = []
+    for item in user_deals:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_deal_digest(chunk_size=DIGEST_CHUNK):
+    """
+    Queue digest emails for deals added since the last run.
+
+    Returns:
+        dict: deals, users (followers reached), emailed, skipped (opted out or
+              unverified), and through_deal_id (the new watermark)
+
+    Raises:
+        jobs.RetryLater: If the outbox is full; progress is saved and the
+                         next run continues from there
+        RuntimeError: If email is unavailable (progress is saved as well)
+    """
+    watermark = int(queries.get_meta(WATERMARK_KEY, "-1"))
+    if watermark < 0:
+        through = queries.get_max_deal_id()
+        queries.set_meta(WATERMARK_KEY, str(through))
+        logger.info(f"Deal digest starting after deal #{through}")
+        return {"deals": 0, "users": 0, "emailed": 0, "skipped": 0, "through_deal_id": through}
+
+    progress = json.loads(queries.get_meta(PROGRESS_KEY, "null") or "null")
+    if progress:
+        through, start_user_id = progress["through_deal_id"], progress["next_user_id"]
+    else:
+        through, start_user_id = queries.get_max_deal_id(), 0
+    counts = {"deals": 0, "users": 0, "emailed": 0, "skipped": 0, "through_deal_id": through}
+    deals = queries.get_deals_between(watermark, through)
+    counts["deals"] = len(deals)
+    if deals:
+        email_sender.register_email_template(TEMPLATE_NAME, TEMPLATE_SUBJECT, TEMPLATE_BODY)
+        deals_by_business = {}
+        for deal in deals:
+            deals_by_business.setdefault(deal["business_id"], []).append(deal)
+        index = build_interest_index(queries.iter_deal_followers(watermark, through))
+
+        for chunk in _chunks(iter_user_deals(index, deals_by_business, start_user_id), chunk_size):
+            counts["users"] += len(chunk)
+            user_deals = dict(chunk)
+            recipients = []
+            recipient_ids = []
+            for user in queries.get_users_for_digest(user_deals):
+                # Invalid addresses are skipped here so the resume point below stays right
+                if not wants_deal_emails(user["preferences"]) or not is_valid_email(user["email"]):
+                    continue
+                deals_for_user = user_deals[user["id"]]
+                recipients.append((user["email"], {
+                    "username": user["username"] or "there",
+                    "deal_count": len(deals_for_user),
+                    "deals": format_deals(deals_for_user),
+                }))
+                recipient_ids.append(user["id"])
+            counts["skipped"] += len(chunk) - len(recipients)
+            queued, error = email_sender.send_batch_email(TEMPLATE_NAME, recipients) if recipients else (0, None)
+            counts["emailed"] += queued
+            if error:
+                # Resume with the first user whose email was not queued
+                next_user_id = recipient_ids[queued] if queued < len(recipient_ids) else chunk[-1][0] + 1
+                queries.set_meta(PROGRESS_KEY, json.dumps({"through_deal_id": through, "next_user_id": next_user_id}))
+                message = f"Deal digest paused at user #{next_user_id}: {error}"
+                if email_sender.is_email_configured():
+                    raise jobs.RetryLater(message, RESUME_DELAY_SECONDS)
+                raise RuntimeError(message)
+            queries.set_meta(PROGRESS_KEY, json.dumps({"through_deal_id": through, "next_user_id": chunk[-1][0] + 1}))
+
+    queries.set_meta(WATERMARK_KEY, str(through))
+    queries.set_meta(PROGRESS_KEY, "")
+    logger.info(f"Deal digest: {counts}")
+    return counts
+
+
+jobs.register_job(
+    "deal_digest", lambda payload: run_deal_digest(), max_attempts=10, timeout_seconds=60 * 60, retry_base_seconds=120
+)
+
+
+def schedule_deal_digest(interval_hours=DIGEST_INTERVAL_HOURS):
+    """Run the digest every `interval_hours` on the job runner (when email is configured). Returns True if scheduled."""
+    if not email_sender.is_email_configured():
+        return False
+    jobs.schedule("deal_digest", interval_hours * 60 * 60)
+    return True
@@ -0,0 +1,205 @@
+"""
+Email Outbox - Durable email queue drained by a fixed pool of workers
+
+queue_email() stores a message in the email_outbox table and returns right
+away; EMAIL_WORKERS threads per process claim due rows with a lease and hand
+them to one shared transport (see email_transport.py). Emails queued with
+queue_template_emails() are grouped by template: a worker claims up to
+BATCH_SIZE due rows of one template and sends them in a single API call with
+per-recipient substitutions.
+
+A failure worth retrying is queued again with jittered exponential backoff.
+A batch SendGrid rejects for its content is split in half and each half sent
+again, so one bad recipient does not take the rest of the batch down with it.
+A permanent failure, or one that has used up MAX_ATTEMPTS, is dead-lettered
+(status 'dead') until requeue_dead_emails() gives it another go. Mail queued before a restart is
+sent by the next process, and the outbox refuses new mail once
+EMAIL_OUTBOX_MAX_PENDING messages are waiting, so a burst cannot grow it
+without bound. get_outbox_stats() reports depth and send latency.
+
+Hidden Gems | FBLA 2026
+"""
+import json
+import logging
+import os
+import time
+
+from src.database import queries
+from src.logic import jobs
+from src.logic.email_transport import MAX_RECIPIENTS_PER_CALL, REQUEST_CONTENT_STATUS_CODES, EmailSendError
+from src.logic.throttle import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Sending threads per process, and seconds an idle one waits before checking again
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+POLL_SECONDS = 5
+# Waiting or in-flight emails before queue_email() refuses more
+MAX_PENDING = int(os.getenv("EMAIL_OUTBOX_MAX_PENDING", "10000"))
+# Attempts before an email is dead-lettered; retry delays double up to the cap
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 30 * 60
+# Seconds a claim lasts before another worker may send the row
+LEASE_SECONDS = 120
+# Templated emails sent per API call
+BATCH_SIZE = MAX_RECIPIENTS_PER_CALL
+
+def queue_email(to_email, subject, body):
+    """
+    Add an email to the outbox.
+
+    Returns:
+        int: Outbox id, or None if the outbox is full
+    """
+    email_id = queries.insert_outbox_email(to_email, subject, body, max_pending=MAX_PENDING)
+    if email_id is None:
+        logger.warning(f"Email outbox full ({MAX_PENDING} pending); not queueing '{subject}' to {to_email}")
+    else:
+        _workers.wake()
+    return email_id
+
+
+def queue_template_emails(template, recipients):
+    """
+    Add one templated email per recipient to the outbox.
+
+    Args:
+        template (str): Name of a stored template (email_sender.register_email_template())
+        recipients (iterable): (to_email, substitutions dict) tuples
+
+    Returns:
+        int: Number queued; the first ones are kept if the outbox cannot take them all
+    """
+    recipients = [(to_email, json.dumps(substitutions or {})) for to_email, substitutions in recipients]
+    queued = queries.insert_outbox_emails(template, recipients, max_pending=MAX_PENDING)
+    if queued < len(recipients):
+        logger.warning(f"Email outbox full ({MAX_PENDING} pending); {len(recipients) - queued} '{template}' emails not queued")
+    if queued:
+        _workers.wake()
+    return queued
+
+
+def _send(transport, emails, template):
+    """One API call for claimed emails: a plain message, or a batch sharing a template."""
+    if template is None:
+        transport.send(emails[0])
+    else:
+        transport.send_batch(template, [(email["to_email"], email["substitutions"]) for email in emails])
+
+
+def _splits(error, emails):
+    """True if a failed batch should be halved: the request was rejected for something one recipient may have caused."""
+    return (
+        len(emails) > 1 and isinstance(error, EmailSendError) and not error.retryable
+        and error.status_code in REQUEST_CONTENT_STATUS_CODES
+    )
+
+
+def _deliver(transport, emails, template, counts):
+    """Send claimed emails with one call, halving a batch rejected for its content; updates `counts`."""
+    counts["calls"] += 1
+    started = time.perf_counter()
+    try:
+        _send(transport, emails, template)
+    except Exception as error:
+        if _splits(error, emails):
+            middle = len(emails) // 2
+            _deliver(transport, emails[:middle], template, counts)
+            _deliver(transport, emails[middle:], template, counts)
+            return
+        _fail(emails, error, counts)
+        return
+    queries.mark_outbox_emails_sent([email["id"] for email in emails], (time.perf_counter() - started) * 1000)
+    counts["sent"] += len(emails)
+
+
+def _fail(emails, error, counts):
+    """Queue failed emails for another attempt, or dead-letter them; updates `counts`."""
+    retryable = error.retryable if isinstance(error, EmailSendError) else True
+    retrying, dead = [], []
+    for email in emails:
+        (retrying if retryable and email["attempts"] < MAX_ATTEMPTS else dead).append(email)
+    if retrying:
+        attempts = max(email["attempts"] for email in retrying)
+        queries.mark_outbox_emails_failed(
+            [email["id"] for email in retrying], str(error),
+            backoff_delay(attempts, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS)
+        )
+    if dead:
+        logger.error(f"{len(dead)} email(s) to {dead[0]['to_email']}... dead-lettered: {error}")
+        queries.mark_outbox_emails_failed([email["id"] for email in dead], str(error))
+    counts["retrying"] += len(retrying)
+    counts["dead"] += len(dead)
+
+
+def deliver_next(transport):
+    """
+    Claim the next due email, or batch of emails sharing a template, and send it with one `transport` call.
+
+    A batch rejected for its content takes a few more calls while it is split.
+
+    Returns:
+        dict: Counts - sent, retrying, dead, calls - or None if nothing was due
+    """
+    emails = queries.claim_outbox_emails(limit=BATCH_SIZE, lease_seconds=LEASE_SECONDS)
+    if not emails:
+        return None
+    counts = {"sent": 0, "retrying": 0, "dead": 0, "calls": 0}
+    template_name = emails[0]["template"]
+    template = queries.get_email_template(template_name) if template_name is not None else None
+    if template_name is not None and template is None:
+        _fail(emails, EmailSendError(f"Unknown email template {template_name!r}", retryable=False), counts)
+        return counts
+    _deliver(transport, emails, template, counts)
+    return counts
+
+
+def process_outbox(transport, limit=None):
+    """
+    Send due emails in this thread until none are left (or about `limit` were tried).
+
+    For scripts and tests; the app uses start_email_workers().
+
+    Returns:
+        dict: Counts - sent, retrying, dead, and calls (API calls made)
+    """
+    counts = {"sent": 0, "retrying": 0, "dead": 0, "calls": 0}
+    while limit is None or counts["sent"] + counts["retrying"] + counts["dead"] < limit:
+        delivered = deliver_next(transport)
+        if delivered is None:
+            break
+        for key, value in delivered.items():
+            counts[key] += value
+    return counts
+
+
+# Queueing mail wakes idle workers so it goes out right away
+_workers = jobs.WorkerPool("email-worker", deliver_next)
+
+
+def start_email_workers(transport, workers=EMAIL_WORKERS, poll_seconds=POLL_SECONDS):
+    """Start the sending threads for this process (once), all sharing `transport`. Returns the threads."""
+    jobs.schedule("prune_email_outbox", 24 * 60 * 60)
+    return _workers.start(workers, poll_seconds, transport)
+
+
+def stop_email_workers(timeout=5):
+    """Ask the sending threads to finish their current email and exit; unsent mail stays queued."""
+    _workers.stop(timeout)
+
+
+def requeue_dead_emails():
+    """Retry every dead-lettered email. Returns the number requeued."""
+    requeued = queries.requeue_dead_emails()
+    if requeued:
+        _workers.wake()
+    return requeued
+
+
+def get_outbox_stats():
+    """Outbox depth and send latency (see queries.get_email_outbox_stats())."""
+    return queries.get_email_outbox_stats()
+
+
+jobs.register_job("prune_email_outbox", lambda payload: queries.prune_email_outbox(), max_attempts=1)
@@ -5,19 +5,29 @@ Handles sending transactional emails (verification, password reset) via SendGrid
 Configuration can come from environment variables or config.py file.
 Falls back gracefully if SendGrid is not configured (for development).
 
-Emails are sent asynchronously in background threads to avoid blocking the request.
+Emails are written to the durable email outbox and sent by a fixed pool of
+background workers sharing one SendGrid client (see email_outbox.py), so the
+request never waits on SendGrid. send_batch_email() queues one template for
+many users; the workers send those 1000 recipients per API call using
+SendGrid personalizations. Set EMAIL_TRANSPORT=local to use the local
+stand-in transport instead of SendGrid (EMAIL_LOCAL_DIR saves each message
+as a file).
 
 Hidden Gems | FBLA 2026
 """
 import os
 import threading
 
-try:
-    from sendgrid import SendGridAPIClient
-    from sendgrid.helpers.mail import Mail
-    SENDGRID_AVAILABLE = True
-except ImportError:
-    SENDGRID_AVAILABLE = False
+from src.database import queries
+from src.logic import email_outbox
+from src.logic.auth import is_valid_email
+from src.logic.email_transport import SENDGRID_AVAILABLE, LocalTransport, SendGridTransport
+
+EMAIL_TRANSPORT = os.environ.get("EMAIL_TRANSPORT", "sendgrid").strip().lower()
+EMAIL_LOCAL_DIR = os.environ.get("EMAIL_LOCAL_DIR", "").strip() or None
+
+_transport_lock = threading.Lock()
+_transport_state = {"transport": None}
 
 # ============================================
 # EMAIL CONFIGURATION
@@ -59,11 +69,14 @@ def is_email_configured():
     """
     Check if SendGrid is properly configured and ready to send emails.
     
-    Requires SendGrid library and API key to be present.
+    Requires SendGrid library and API key to be present, unless the local
+    stand-in transport is selected (EMAIL_TRANSPORT=local).
     
     Returns:
         bool: True if SendGrid can be used, False if not configured
     """
+    if EMAIL_TRANSPORT == "local":
+        return True
     if not SENDGRID_AVAILABLE:
         return False
     
@@ -71,50 +84,67 @@ def is_email_configured():
     return bool(email_config["api_key"] and email_config["from_email"])
 
 
+def get_transport():
+    """
+    The transport every email worker in this process shares, built on first use.
+    
+    Returns:
+        SendGridTransport or LocalTransport, or None if email is not configured
+    """
+    if not is_email_configured():
+        return None
+    with _transport_lock:
+        if _transport_state["transport"] is None:
+            if EMAIL_TRANSPORT == "local":
+                _transport_state["transport"] = LocalTransport(directory=EMAIL_LOCAL_DIR)
+            else:
+                email_config = _load_email_configuration()
+                _transport_state["transport"] = SendGridTransport(
+                    email_config["api_key"], email_config["from_email"], email_config["from_name"]
+                )
+        return _transport_state["transport"]
+
+
+def start_email_delivery():
+    """Start the email workers if email is configured (sends mail left queued by an earlier run). Returns True if started."""
+    transport = get_transport()
+    if transport is None:
+        return False
+    email_outbox.start_email_workers(transport)
+    return True
+
+
 # ============================================
 # EMAIL SENDING FUNCTIONS
 # ============================================
 
-def _send_email_async(to_email, subject, body, email_config):
+def _queue_email(to_email, subject, body):
     """
-    Send email asynchronously in a background thread.
+    Put an email in the outbox for the background workers.
     
     Args:
         to_email (str): Recipient email address
         subject (str): Email subject
         body (str): Email body text
-        email_config (dict): Email configuration with api_key, from_email, from_name
     
     Returns:
-        None (runs in background)
+        tuple: (success: bool, error_message: str or None)
     """
-    try:
-        message = Mail(
-            from_email=(email_config["from_email"], email_config["from_name"]),
-            to_emails=to_email,
-            subject=subject,
-            plain_text_content=body
-        )
-        
-        sg = SendGridAPIClient(email_config["api_key"])
-        response = sg.send(message)
-        
-        if response.status_code in [200, 201, 202]:
-            print(f"✓ Email sent successfully to {to_email}")
-        else:
-            print(f"✗ Email failed to {to_email} - SendGrid status {response.status_code}")
-            
-    except Exception as e:
-        print(f"✗ Email error sending to {to_email}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    if not start_email_delivery():
+        return False, "Email service not configured"
+    # A malformed address would only come back as a permanent failure from SendGrid
+    if not is_valid_email(to_email):
+        return False, "Invalid email address"
+    if email_outbox.queue_email(to_email.strip(), subject, body) is None:
+        return False, "Too many emails are waiting to be sent. Please try again in a few minutes."
+    return True, None
 
 
 def send_verification_email(recipient_email, verification_code):
     """
     Send email verification code to user during registration.
     
-    ASYNC: Email is sent in background thread - returns immediately without blocking.
+    ASYNC: Email is queued in the outbox - returns immediately without blocking.
     
     Args:
         recipient_email (str): Email address to send to
@@ -123,15 +153,8 @@ def send_verification_email(recipient_email, verification_code):
     Returns:
         tuple: (success: bool, error_message: str or None)
             - Immediate: (True, None) - email queued for background sending
-            - If not configured: (False, error_description)
+            - If not configured or the outbox is full: (False, error_description)
     """
-    # Check if email is configured
-    if not is_email_configured():
-        return False, "Email service not configured"
-    
-    # Load email configuration
-    email_config = _load_email_configuration()
-    
     # Build email subject and body
     email_subject = "Your Hidden Gems Verification Code"
     email_body = f"""Hello,
@@ -148,24 +171,15 @@ If you didn't create a Hidden Gems account, you can ignore this email.
 Richmond, Virginia
 """
     
-    # Send email in background thread (non-blocking)
-    # daemon=False ensures thread completes even if main process exits
-    thread = threading.Thread(
-        target=_send_email_async,
-        args=(recipient_email, email_subject, email_body, email_config),
-        daemon=False
-    )
-    thread.start()
-    
-    # Return immediately - email is being sent in background
-    return True, None
+    # Queue for the email workers and return immediately
+    return _queue_email(recipient_email, email_subject, email_body)
 
 
 def send_password_reset_email(recipient_email, password_reset_link):
     """
     Send password reset link to user via email.
     
-    ASYNC: Email is sent in background thread - returns immediately without blocking.
+    ASYNC: Email is queued in the outbox - returns immediately without blocking.
     
     Args:
         recipient_email (str): Email address to send to
@@ -174,15 +188,8 @@ def send_password_reset_email(recipient_email, password_reset_link):
     Returns:
         tuple: (success: bool, error_message: str or None)
             - Immediate: (True, None) - email queued for background sending
-            - If not configured: (False, error_description)
+            - If not configured or the outbox is full: (False, error_description)
     """
-    # Check if email is configured
-    if not is_email_configured():
-        return False, "Email service not configured"
-    
-    # Load email configuration
-    email_config = _load_email_configuration()
-    
     # Build email subject and body with reset link
     email_subject = "Reset Your Hidden Gems Password"
     email_body = f"""Hello,
@@ -197,14 +204,60 @@ This link is valid for 1 hour. If you didn't request this, you can ignore this e
 Richmond, Virginia
 """
     
-    # Send email in background thread (non-blocking)
-    # daemon=False ensures thread completes even if main process exits
-    thread = threading.Thread(
-        target=_send_email_async,
-        args=(recipient_email, email_subject, email_body, email_config),
-        daemon=False
-    )
-    thread.start()
+    # Queue for the email workers and return immediately
+    return _queue_email(recipient_email, email_subject, email_body)
+
+
+# ============================================
+# BATCHED (NOTIFICATION) EMAILS
+# ============================================
+
+def register_email_template(template_name, subject, body):
+    """
+    Save a template for send_batch_email().
+    
+    Placeholders are written {{field}} and filled per recipient, e.g.
+    "Hi {{username}}, {{business}} has a new deal".
     
-    # Return immediately - email is being sent in background
-    return True, None
+    Args:
+        template_name (str): Name used when sending
+        subject (str): Subject line (may use placeholders)
+        body (str): Plain-text body (may use placeholders)
+    """
+    queries.upsert_email_template(template_name, subject, body)
+
+
+def send_batch_email(template_name, recipients):
+    """
+    Send a saved template to many users, each with their own substitutions.
+    
+    ASYNC: Emails are queued in the outbox; the workers send up to
+    MAX_RECIPIENTS_PER_CALL of them per SendGrid API call (one personalization
+    each), so N emails take about N / 1000 HTTP calls. get_email_outbox_stats()
+    reports the calls made and emails per call.
+    
+    Args:
+        template_name (str): Template saved with register_email_template()
+        recipients (iterable): (email, substitutions dict) tuples
+    
+    Recipients with a malformed address are left out, so one bad address
+    cannot get a whole batch rejected.
+    
+    Returns:
+        tuple: (queued: int, error_message: str or None)
+            - (N, None) when every email was queued
+            - If not configured, the template is unknown or the outbox is full: (queued so far, error_description)
+            - If some addresses were invalid: (N valid ones queued, error_description)
+    """
+    recipients = list(recipients)
+    if not start_email_delivery():
+        return 0, "Email service not configured"
+    if queries.get_email_template(template_name) is None:
+        return 0, f"Unknown email template '{template_name}'"
+    valid_recipients = [(to_email.strip(), substitutions) for to_email, substitutions in recipients if is_valid_email(to_email)]
+    queued = email_outbox.queue_template_emails(template_name, valid_recipients)
+    if queued < len(valid_recipients):
+        return queued, f"Email outbox full; {len(valid_recipients) - queued} emails were not queued"
+    if len(valid_recipients) < len(recipients):
+        return queued, f"{len(recipients) - len(valid_recipients)} emails have an invalid address and were not queued"
+    return queued, None
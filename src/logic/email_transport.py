@@ -0,0 +1,170 @@
+"""
+Email Transport - Delivery backends for the email outbox
+
+A transport delivers one message (to_email, subject, body) with send(), or a
+template to many recipients with send_batch(), and raises EmailSendError
+saying whether a failure is worth retrying. A batch is one API call of up to
+MAX_RECIPIENTS_PER_CALL personalizations, each with its own {{field}}
+substitutions; `calls` counts API calls made.
+
+SendGridTransport builds one SendGridAPIClient and reuses it for every
+call; LocalTransport is a stand-in that keeps messages in memory (and
+optionally writes them to a directory) so the outbox can be run and tested
+without SendGrid. Select it with EMAIL_TRANSPORT=local.
+
+Hidden Gems | FBLA 2026
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail
+    SENDGRID_AVAILABLE = True
+except ImportError:
+    SENDGRID_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Provider statuses that are worth another attempt (rate limited, server trouble)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# SendGrid accepts at most this many personalizations in one mail/send request
+MAX_RECIPIENTS_PER_CALL = 1000
+# Statuses that reject a request for its content (e.g. one malformed address
+# among a batch's personalizations) rather than for the account or key
+REQUEST_CONTENT_STATUS_CODES = {400, 413}
+
+
+def placeholder(field):
+    """The text a template uses for substitution `field`."""
+    return "{{" + field + "}}"
+
+
+def render(text, substitutions):
+    """Fill a template's {{field}} placeholders from `substitutions`."""
+    for field, value in (substitutions or {}).items():
+        text = text.replace(placeholder(field), str(value))
+    return text
+
+
+class EmailSendError(Exception):
+    """
+    A message was not delivered; `retryable` says whether trying again may help.
+
+    `status_code` is the provider's HTTP status, if it answered.
+    """
+
+    def __init__(self, message, retryable=True, status_code=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+class SendGridTransport:
+    """Deliver through the SendGrid v3 API with one shared client."""
+
+    def __init__(self, api_key, from_email, from_name="Hidden Gems"):
+        if not SENDGRID_AVAILABLE:
+            raise RuntimeError("The sendgrid package is not installed")
+        self.from_email = from_email
+        self.from_name = from_name
+        self.calls = 0
+        self._client = SendGridAPIClient(api_key)
+        self._calls_lock = threading.Lock()
+
+    def send(self, message):
+        mail = Mail(
+            from_email=(self.from_email, self.from_name),
+            to_emails=message["to_email"],
+            subject=message["subject"],
+            plain_text_content=message["body"]
+        )
+        self._call(lambda: self._client.send(mail))
+
+    def send_batch(self, template, recipients):
+        """
+        Send `template` (subject, body) to up to MAX_RECIPIENTS_PER_CALL recipients in one call.
+
+        Args:
+            template (dict): subject and body with {{field}} placeholders
+            recipients (list): (to_email, substitutions dict) tuples
+        """
+        if len(recipients) > MAX_RECIPIENTS_PER_CALL:
+            raise ValueError(f"At most {MAX_RECIPIENTS_PER_CALL} recipients per call")
+        request_body = {
+            "personalizations": [
+                {
+                    "to": [{"email": to_email}],
+                    "substitutions": {placeholder(field): str(value) for field, value in (substitutions or {}).items()},
+                }
+                for to_email, substitutions in recipients
+            ],
+            "from": {"email": self.from_email, "name": self.from_name},
+            "subject": template["subject"],
+            "content": [{"type": "text/plain", "value": template["body"]}],
+        }
+        # SendGridAPIClient.send() takes a raw v3 request body as well as a Mail
+        self._call(lambda: self._client.send(request_body))
+
+    def _call(self, request):
+        with self._calls_lock:
+            self.calls += 1
+        try:
+            response = request()
+        except Exception as error:
+            # python_http_client raises HTTPError (with status_code) for non-2xx answers
+            status_code = getattr(error, "status_code", None)
+            retryable = status_code is None or status_code in RETRYABLE_STATUS_CODES
+            raise EmailSendError(f"SendGrid {status_code or 'error'}: {error}", retryable=retryable,
+                                 status_code=status_code) from error
+        if response.status_code not in (200, 201, 202):
+            raise EmailSendError(f"SendGrid status {response.status_code}",
+                                 retryable=response.status_code in RETRYABLE_STATUS_CODES, status_code=response.status_code)
+
+
+class LocalTransport:
+    """
+    Stand-in transport: records messages instead of sending them.
+
+    Args:
+        directory (str): If set, also write each message there as a JSON file
+                         (handy for reading verification codes in development)
+        delay_seconds (float): Pause per message, to imitate an API call
+    """
+
+    def __init__(self, directory=None, delay_seconds=0.0):
+        self.directory = directory
+        self.delay_seconds = delay_seconds
+        self.sent = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        self._deliver([message])
+
+    def send_batch(self, template, recipients):
+        """Render `template` for each (to_email, substitutions) recipient, as one call."""
+        if len(recipients) > MAX_RECIPIENTS_PER_CALL:
+            raise ValueError(f"At most {MAX_RECIPIENTS_PER_CALL} recipients per call")
+        self._deliver([
+            {"to_email": to_email, "subject": render(template["subject"], substitutions), "body": render(template["body"], substitutions)}
+            for to_email, substitutions in recipients
+        ])
+
+    def _deliver(self, messages):
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        with self._lock:
+            self.calls += 1
+            first = len(self.sent)
+            self.sent.extend(dict(message) for message in messages)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            for number, message in enumerate(messages, start=first + 1):
+                path = os.path.join(self.directory, f"{time.time_ns()}-{number}.json")
+                with open(path, "w") as message_file:
+                    json.dump(message, message_file, indent=2)
+        logger.info(f"Local email transport: '{messages[0]['subject']}' to {len(messages)} recipient(s)")
@@ -0,0 +1,212 @@
+"""
+Gazetteer - Offline approximate geocoding for the Richmond area
+
+A small binary file (built from the CSVs in data/gazetteer by
+scripts/build_gazetteer.py) holds Richmond-area ZIP code centroids and house
+number ranges for the main streets. The file is memory-mapped and searched
+with binary search, so a lookup touches a few pages and makes no network
+call. geocoding.py uses it when no Google API key is configured.
+
+Positions are approximate: a street range is interpolated between its two
+end points, and an address on an unknown street falls back to its ZIP
+centroid.
+
+File layout (little endian):
+    header   magic "HGGZ", format version, ZIP count, street range count
+    ZIPs     (zip, latitude, longitude), sorted by zip
+    streets  (normalized street name padded to 32 bytes, from number, to number,
+              from latitude, from longitude, to latitude, to longitude),
+              sorted by street name and from number
+    Coordinates are signed 32-bit microdegrees.
+
+Hidden Gems | FBLA 2026
+"""
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(ROOT, "data", "gazetteer", "richmond.gaz"))
+
+MAGIC = b"HGGZ"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIII")
+ZIP_RECORD = struct.Struct("<Iii")
+STREET_RECORD = struct.Struct("<32sIIiiii")
+STREET_NAME_BYTES = 32
+# Coordinates are stored as whole microdegrees (about 0.1 m)
+MICRODEGREES = 1_000_000
+
+# Last word of a street name, as written by geocoding.normalize_address()
+STREET_SUFFIXES = {
+    "st", "ave", "rd", "blvd", "dr", "ln", "pl", "ct", "pkwy", "hwy",
+    "tpke", "cir", "sq", "ter", "way", "aly", "row",
+}
+
+
+def _street_key(street):
+    """Fixed-width record key; zero padding keeps byte order equal to name order."""
+    key = street.encode("ascii")
+    if len(key) > STREET_NAME_BYTES:
+        raise ValueError(f"Street name longer than {STREET_NAME_BYTES} bytes: {street!r}")
+    return key.ljust(STREET_NAME_BYTES, b"\0")
+
+
+def _microdegrees(value):
+    return round(float(value) * MICRODEGREES)
+
+
+def write_gazetteer(path, zips, streets):
+    """
+    Write a gazetteer file.
+
+    Args:
+        path (str): Output file (replaced atomically)
+        zips (iterable): (zip, latitude, longitude) tuples
+        streets (iterable): (normalized street name, from number, to number,
+                             from latitude, from longitude, to latitude, to longitude) tuples
+
+    Returns:
+        int: Size of the file in bytes
+    """
+    zips = sorted((int(zip_code), _microdegrees(lat), _microdegrees(lng)) for zip_code, lat, lng in zips)
+    streets = sorted((_street_key(street), int(start), int(end), *map(_microdegrees, points))
+                     for street, start, end, *points in streets)
+    chunks = [HEADER.pack(MAGIC, FORMAT_VERSION, len(zips), len(streets))]
+    chunks.extend(ZIP_RECORD.pack(*record) for record in zips)
+    chunks.extend(STREET_RECORD.pack(*record) for record in streets)
+    data = b"".join(chunks)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as gazetteer_file:
+        gazetteer_file.write(data)
+    os.replace(temporary_path, path)
+    return len(data)
+
+
+def parse_address(normalized_address):
+    """
+    Split a normalized address into (house number, street, zip); missing parts are None.
+
+    Example:
+        >>> parse_address("500 e broad st richmond va 23219")
+        (500, 'e broad st', 23219)
+    """
+    words = normalized_address.split()
+    number = street = zip_code = None
+    if words and words[0].isdigit():
+        number = int(words[0])
+        for end, word in enumerate(words[1:], start=2):
+            if word in STREET_SUFFIXES:
+                street = " ".join(words[1:end])
+                break
+    zip_codes = [word for word in words[1:] if re.fullmatch(r"\d{5}", word)]
+    if zip_codes:
+        zip_code = int(zip_codes[-1])
+    return number, street, zip_code
+
+
+def _lower_bound(count, target, key_at):
+    """
+    First index in 0..count whose key is >= target, for keys sorted ascending.
+
+    Written out by hand because bisect's key= argument needs Python 3.10.
+    """
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if key_at(middle) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class Gazetteer:
+    """Read-only view of a gazetteer file, memory-mapped for the life of the object."""
+
+    def __init__(self, path):
+        with open(path, "rb") as gazetteer_file:
+            self._map = mmap.mmap(gazetteer_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.zip_count, self.street_count = HEADER.unpack_from(self._map, 0)
+        expected_size = HEADER.size + self.zip_count * ZIP_RECORD.size + self.street_count * STREET_RECORD.size
+        if magic != MAGIC or version != FORMAT_VERSION or len(self._map) != expected_size:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} gazetteer file")
+        self._streets_offset = HEADER.size + self.zip_count * ZIP_RECORD.size
+
+    def close(self):
+        self._map.close()
+
+    def _zip_record(self, index):
+        return ZIP_RECORD.unpack_from(self._map, HEADER.size + index * ZIP_RECORD.size)
+
+    def _street_record(self, index):
+        return STREET_RECORD.unpack_from(self._map, self._streets_offset + index * STREET_RECORD.size)
+
+    def zip_centroid(self, zip_code):
+        """(latitude, longitude) of a ZIP code's centroid, or None."""
+        index = _lower_bound(self.zip_count, zip_code, lambda i: self._zip_record(i)[0])
+        if index < self.zip_count:
+            found, latitude, longitude = self._zip_record(index)
+            if found == zip_code:
+                return (latitude / MICRODEGREES, longitude / MICRODEGREES)
+        return None
+
+    def street_position(self, street, number):
+        """House `number` on `street`, interpolated along its range, or None."""
+        key = _street_key(street)
+        index = _lower_bound(self.street_count, key, lambda i: self._street_record(i)[0])
+        while index < self.street_count:
+            name, start, end, from_lat, from_lng, to_lat, to_lng = self._street_record(index)
+            if name != key or start > number:
+                break
+            if number <= end:
+                fraction = (number - start) / (end - start) if end > start else 0.0
+                return (round((from_lat + (to_lat - from_lat) * fraction) / MICRODEGREES, 6),
+                        round((from_lng + (to_lng - from_lng) * fraction) / MICRODEGREES, 6))
+            index += 1
+        return None
+
+    def locate(self, normalized_address):
+        """
+        Approximate position of an address normalized by geocoding.normalize_address().
+
+        Returns:
+            tuple: (latitude, longitude) from the street range if the street and
+                   number are known, else the ZIP centroid, else None
+        """
+        number, street, zip_code = parse_address(normalized_address)
+        if street:
+            position = self.street_position(street, number)
+            if position:
+                return position
+        if zip_code:
+            return self.zip_centroid(zip_code)
+        return None
+
+
+_gazetteer_lock = threading.Lock()
+_gazetteer_state = {"gazetteer": None, "loaded": False}
+
+
+def get_gazetteer():
+    """The bundled gazetteer, opened on first use; None if the file is missing or invalid."""
+    with _gazetteer_lock:
+        if not _gazetteer_state["loaded"]:
+            try:
+                _gazetteer_state["gazetteer"] = Gazetteer(GAZETTEER_PATH)
+            except (OSError, ValueError) as error:
+                logger.warning(f"Offline gazetteer unavailable ({error}); run scripts/build_gazetteer.py")
+            _gazetteer_state["loaded"] = True
+        return _gazetteer_state["gazetteer"]
+
+
+def locate(normalized_address):
+    """Approximate (latitude, longitude) from the bundled gazetteer, or None."""
+    gazetteer = get_gazetteer()
+    return gazetteer.locate(normalized_address) if gazetteer else None
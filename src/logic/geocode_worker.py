@@ -0,0 +1,114 @@
+"""
+Geocode Worker - Background job that drains the geocode queue
+
+Triggers on the businesses table queue every business that needs
+coordinates (new, moved or cleared). The geocode_queue job, scheduled on the
+job runner (logic.jobs), claims due queue rows in batches, resolves them
+through geocoding.geocode_addresses (cache first, rate limited, retried with
+backoff) and writes the coordinates back, so the map only ever receives
+coordinates that were resolved on the server.
+
+Addresses the geocoder cannot place, or that land outside Richmond, are
+dropped from the queue; temporary failures are retried later with growing
+delays until MAX_ATTEMPTS. Without an API key, rows the cache cannot answer
+get the offline gazetteer's approximate position and stay queued (rows it
+cannot place simply wait), so a key configured later refines them.
+
+Hidden Gems | FBLA 2026
+"""
+import logging
+import os
+
+from src.database import queries
+from src.logic import geocoding, jobs
+from src.logic.throttle import TokenBucket, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Queue rows claimed per pass, and seconds between passes when the queue is drained
+BATCH_SIZE = 25
+POLL_SECONDS = 30
+# Attempts before a job that keeps failing is dropped; retry delays are jittered and double up to the cap
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+# Seconds a claim lasts before another worker may pick the row up again
+LEASE_SECONDS = 300
+# Full batches one job run works through before leaving the rest to the next run
+MAX_PASSES_PER_RUN = 10
+
+# Shared by every pass so the process stays under the provider's quota
+_rate_limiter = TokenBucket(float(os.getenv("GEOCODING_RATE_PER_SECOND", "10")))
+
+
+def process_geocode_queue(batch_size=BATCH_SIZE, workers=4):
+    """
+    Run one pass over the geocode queue.
+
+    Args:
+        batch_size (int): Maximum queue rows to claim
+        workers (int): Concurrent geocoding requests
+
+    Returns:
+        dict: Counts for this pass - claimed, geocoded, approximate, dropped, retrying, waiting
+    """
+    counts = {"claimed": 0, "geocoded": 0, "approximate": 0, "dropped": 0, "retrying": 0, "waiting": 0}
+    claimed = queries.claim_geocode_jobs(limit=batch_size, lease_seconds=LEASE_SECONDS)
+    if not claimed:
+        return counts
+    counts["claimed"] = len(claimed)
+
+    results = geocoding.geocode_addresses(
+        {job["business_id"]: job["address"] for job in claimed},
+        workers=workers, rate_limiter=_rate_limiter, max_attempts=2
+    )
+    resolved = []
+    approximate = []
+    dropped = []
+    for job in claimed:
+        coords, status = results[job["business_id"]]
+        if status in (geocoding.GEOCODE_SKIPPED, geocoding.GEOCODE_APPROXIMATE):
+            # Not configured yet: show any offline position now, hand the attempt
+            # back and keep the job queued for a precise answer later
+            placed = bool(coords) and geocoding.validate_coordinates(*coords)
+            if placed:
+                approximate.append((job["business_id"], job["address"], *coords))
+            error = "approximate position" if placed else "geocoding not configured"
+            queries.reschedule_geocode_job(job["business_id"], POLL_SECONDS * 10, error=error, count_attempt=False)
+            counts["approximate" if placed else "waiting"] += 1
+        elif coords and geocoding.validate_coordinates(*coords):
+            resolved.append((job["business_id"], job["address"], *coords))
+        elif status in (geocoding.GEOCODE_RETRY, geocoding.GEOCODE_FAILED) and job["attempts"] < MAX_ATTEMPTS:
+            delay = backoff_delay(job["attempts"], RETRY_BASE_SECONDS, RETRY_MAX_SECONDS)
+            queries.reschedule_geocode_job(job["business_id"], delay, error=status)
+            counts["retrying"] += 1
+        else:
+            logger.warning(f"Giving up geocoding business #{job['business_id']} ('{job['address']}'): {status}")
+            dropped.append((job["business_id"], job["address"]))
+    counts["geocoded"] = queries.complete_geocode_jobs(resolved, dropped, approximate)
+    counts["dropped"] = len(dropped) + len(resolved) - counts["geocoded"]
+    return counts
+
+
+def _drain_geocode_queue(payload):
+    """Job handler: passes until the queue has nothing due (or MAX_PASSES_PER_RUN). Returns summed counts."""
+    totals = dict.fromkeys(("claimed", "geocoded", "approximate", "dropped", "retrying", "waiting"), 0)
+    for _ in range(MAX_PASSES_PER_RUN):
+        counts = process_geocode_queue()
+        for key, value in counts.items():
+            totals[key] += value
+        if counts["claimed"]:
+            logger.info(f"Geocode queue pass: {counts}")
+        # A full batch means more rows are probably due; go again right away
+        if counts["claimed"] < BATCH_SIZE:
+            break
+    return totals
+
+
+jobs.register_job("geocode_queue", _drain_geocode_queue, max_attempts=1, timeout_seconds=LEASE_SECONDS)
+
+
+def start_geocode_worker(poll_seconds=POLL_SECONDS):
+    """Schedule the geocode_queue job every `poll_seconds` and make sure this process runs jobs."""
+    jobs.schedule("geocode_queue", poll_seconds)
+    jobs.start_job_runner()
@@ -4,12 +4,32 @@ Geocoding Module - Convert Addresses to Coordinates
 Utilizes Google Geocoding API to convert business addresses into latitude/longitude
 coordinates for map display and location-based queries.
 
+Answers are kept in the geocode_cache table under a normalized form of the
+address ("500 East Broad Street" and "500 E. Broad St" share one entry), so
+every process reuses them: found addresses for GEOCODE_CACHE_TTL_SECONDS and
+addresses the geocoder could not place for GEOCODE_NEGATIVE_TTL_SECONDS.
+Network errors and quota responses are never cached.
+
+Without an API key, addresses the cache cannot answer are placed
+approximately by the offline gazetteer (street ranges and ZIP centroids, see
+gazetteer.py). Those positions are not cached, so configuring a key later
+gives precise results.
+
 Hidden Gems | FBLA 2026
 """
 import requests
-from typing import Optional, Dict, Tuple
+from typing import Iterable, Optional, Dict, Tuple
 import os
 import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from src.database import queries
+from src.logic import gazetteer
+from src.logic.throttle import retry_with_backoff
 
 logger = logging.getLogger(__name__)
 
@@ -19,19 +39,105 @@ try:
 except ImportError:
     GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 
-GEOCODING_API_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+# Overridable so bulk runs and tests can point at a local stand-in server
+GEOCODING_API_URL = os.getenv("GEOCODING_API_URL", "https://maps.googleapis.com/maps/api/geocode/json")
 RICHMOND_VA_BOUNDS = {
     "northeast": {"lat": 37.6, "lng": -77.3},
     "southwest": {"lat": 37.4, "lng": -77.5}
 }
 
+# Outcome of one geocoding request: only FOUND and NOT_FOUND are cached, only RETRY is retried
+GEOCODE_FOUND = "found"
+GEOCODE_NOT_FOUND = "not_found"
+GEOCODE_RETRY = "retry"
+GEOCODE_FAILED = "failed"
+GEOCODE_SKIPPED = "skipped"  # no API key configured, nothing was sent
+GEOCODE_APPROXIMATE = "approximate"  # no API key, placed by the offline gazetteer
+# Google statuses that mean "try again later" rather than "bad request"
+RETRYABLE_API_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+# How long geocode_cache entries stay valid
+GEOCODE_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+GEOCODE_NEGATIVE_TTL_SECONDS = 24 * 60 * 60
+
+# Spelled-out address words and their USPS abbreviations, so both spellings share a cache key
+ADDRESS_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "road": "rd", "boulevard": "blvd", "drive": "dr",
+    "lane": "ln", "place": "pl", "court": "ct", "parkway": "pkwy", "highway": "hwy",
+    "turnpike": "tpke", "circle": "cir", "square": "sq", "terrace": "ter", "suite": "ste",
+    "north": "n", "south": "s", "east": "e", "west": "w", "virginia": "va",
+}
+
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for an address: lowercase, accent- and punctuation-free words
+    with common street words abbreviated.
+    
+    Example:
+        >>> normalize_address("500 East Broad Street, Richmond, Virginia")
+        '500 e broad st richmond va'
+    """
+    text = unicodedata.normalize("NFKD", str(address or "")).encode("ascii", "ignore").decode().lower()
+    return " ".join(ADDRESS_ABBREVIATIONS.get(word, word) for word in re.findall(r"[a-z0-9]+", text))
+
+
+_thread_local = threading.local()
+
+
+def _http_session() -> requests.Session:
+    """Per-thread HTTP session, so repeated calls reuse a kept-alive connection."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
+
+
+def _geocoding_query(address: str) -> str:
+    """The address as sent to the geocoder, with Richmond, VA context added for bias."""
+    return f"{address}, Richmond, VA" if "Richmond" not in address else address
+
+
+def _read_cache(address_keys: Iterable[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+    """Live cache entries for `address_keys`; an unreadable cache just means no hits."""
+    try:
+        return queries.get_cached_geocodes(list(address_keys))
+    except sqlite3.Error as error:
+        logger.warning(f"Geocode cache unavailable: {error}")
+        return {}
+
+
+def _write_cache(results: Dict[str, Optional[Tuple[float, float]]]) -> None:
+    """Store definitive answers: found addresses and negative entries get their own TTLs."""
+    try:
+        queries.cache_geocodes([(key, coords) for key, coords in results.items() if coords], GEOCODE_CACHE_TTL_SECONDS)
+        queries.cache_geocodes([(key, coords) for key, coords in results.items() if not coords], GEOCODE_NEGATIVE_TTL_SECONDS)
+    except sqlite3.Error as error:
+        logger.warning(f"Could not write geocode cache: {error}")
+
+
+def remember_coordinates(known: Iterable[Tuple[str, float, float]]) -> None:
+    """
+    Prime the cache with coordinates already known for addresses (e.g. from Yelp),
+    so those addresses are never sent to the geocoder.
+    
+    Parameters:
+        known (iterable): (address, latitude, longitude) tuples
+    """
+    _write_cache({
+        normalize_address(_geocoding_query(address)): (latitude, longitude)
+        for address, latitude, longitude in known
+        if address and address.strip() and latitude is not None and longitude is not None
+    })
+
 
 def geocode_address(address: str) -> Optional[Tuple[float, float]]:
     """
     Convert an address to latitude and longitude coordinates.
     
-    Uses Google Geocoding API to find coordinates for a given address string.
-    Results are biased toward Richmond, VA area.
+    Uses Google Geocoding API to find coordinates for a given address string,
+    checking the geocode_cache table first. Results are biased toward Richmond, VA area.
+    Without an API key the offline gazetteer gives an approximate position.
     
     Parameters:
         address (str): Full address string (e.g., "123 Main St, Richmond, VA 23219")
@@ -44,18 +150,39 @@ def geocode_address(address: str) -> Optional[Tuple[float, float]]:
         >>> if coords:
         ...     lat, lng = coords
     """
-    if not GOOGLE_MAPS_API_KEY:
-        logger.warning("GOOGLE_MAPS_API_KEY not configured. Skipping geocoding.")
-        return None
-    
     if not address or not address.strip():
         logger.warning("Empty address provided to geocoding function")
         return None
     
+    # Ensure Richmond, VA context for biased results
+    geocoding_address = _geocoding_query(address)
+    address_key = normalize_address(geocoding_address)
+    cached = _read_cache([address_key])
+    if address_key in cached:
+        return cached[address_key]
+    
+    if not GOOGLE_MAPS_API_KEY:
+        coords = gazetteer.locate(address_key)
+        if coords is None:
+            logger.warning("GOOGLE_MAPS_API_KEY not configured and address not in the offline gazetteer. Skipping geocoding.")
+        return coords
+    
+    coords, status = _request_geocode(geocoding_address)
+    if status in (GEOCODE_FOUND, GEOCODE_NOT_FOUND):
+        _write_cache({address_key: coords})
+    return coords
+
+
+def _request_geocode(geocoding_address: str) -> Tuple[Optional[Tuple[float, float]], str]:
+    """
+    One Geocoding API call.
+    
+    Returns:
+        tuple: (coordinates or None, status) - GEOCODE_RETRY for errors worth
+               retrying later (network, HTTP errors, quota), GEOCODE_FAILED for
+               requests the API rejected
+    """
     try:
-        # Ensure Richmond, VA context for biased results
-        geocoding_address = f"{address}, Richmond, VA" if "Richmond" not in address else address
-        
         payload = {
             "address": geocoding_address,
             "key": GOOGLE_MAPS_API_KEY,
@@ -63,7 +190,7 @@ def geocode_address(address: str) -> Optional[Tuple[float, float]]:
         }
         
         # Make request with 5-second timeout
-        response = requests.get(GEOCODING_API_URL, params=payload, timeout=5)
+        response = _http_session().get(GEOCODING_API_URL, params=payload, timeout=5)
         response.raise_for_status()
         
         data = response.json()
@@ -75,32 +202,37 @@ def geocode_address(address: str) -> Optional[Tuple[float, float]]:
             longitude = location.get("lng")
             
             if latitude is not None and longitude is not None:
-                logger.info(f"Geocoded '{address}' -> ({latitude}, {longitude})")
-                return (latitude, longitude)
+                logger.info(f"Geocoded '{geocoding_address}' -> ({latitude}, {longitude})")
+                return (latitude, longitude), GEOCODE_FOUND
         elif data.get("status") == "ZERO_RESULTS":
-            logger.warning(f"No geocoding results for address: {address}")
+            logger.warning(f"No geocoding results for address: {geocoding_address}")
+            return None, GEOCODE_NOT_FOUND
         else:
             logger.error(f"Geocoding API error: {data.get('status')} - {data.get('error_message', 'Unknown error')}")
+            if data.get("status") in RETRYABLE_API_STATUSES:
+                return None, GEOCODE_RETRY
         
-        return None
+        return None, GEOCODE_FAILED
         
     except requests.exceptions.RequestException as error:
-        logger.error(f"Geocoding request failed for '{address}': {error}")
-        return None
+        logger.error(f"Geocoding request failed for '{geocoding_address}': {error}")
+        return None, GEOCODE_RETRY
     except (KeyError, ValueError) as error:
-        logger.error(f"Error parsing geocoding response for '{address}': {error}")
-        return None
+        logger.error(f"Error parsing geocoding response for '{geocoding_address}': {error}")
+        return None, GEOCODE_FAILED
 
 
-def geocode_batch(addresses: Dict[int, str]) -> Dict[int, Optional[Tuple[float, float]]]:
+def geocode_batch(addresses: Dict[int, str], **options) -> Dict[int, Optional[Tuple[float, float]]]:
     """
     Geocode multiple addresses in bulk.
     
     Converts a dictionary of business IDs to addresses and returns coordinates
-    for each address. Handles errors gracefully without stopping on individual failures.
+    for each address. Cached addresses are read in one query and duplicates are
+    geocoded once. Handles errors gracefully without stopping on individual failures.
     
     Parameters:
         addresses (dict): Mapping of business_id -> address_string
+        **options: workers / rate_limiter / max_attempts, see geocode_addresses()
     
     Returns:
         dict: Mapping of business_id -> (latitude, longitude) or None
@@ -112,10 +244,71 @@ def geocode_batch(addresses: Dict[int, str]) -> Dict[int, Optional[Tuple[float,
         ... }
         >>> results = geocode_batch(to_geocode)
     """
-    results = {}
-    for business_id, address in addresses.items():
-        results[business_id] = geocode_address(address)
-    return results
+    return {business_id: coords for business_id, (coords, _) in geocode_addresses(addresses, **options).items()}
+
+
+def geocode_addresses(addresses: Dict[int, str], workers: int = 1, rate_limiter=None,
+                      max_attempts: int = 1) -> Dict[int, Tuple[Optional[Tuple[float, float]], str]]:
+    """
+    Geocode many addresses, reporting how each one went (the engine behind geocode_batch).
+    
+    Addresses that normalize to the same key are looked up and geocoded once;
+    cache hits cost no request. Misses are requested by up to `workers`
+    threads, each taking a token from `rate_limiter` (a throttle.TokenBucket)
+    before every request and retrying GEOCODE_RETRY outcomes with backoff.
+    
+    Parameters:
+        addresses (dict): Mapping of business_id -> address_string
+        workers (int): Concurrent requests
+        rate_limiter (TokenBucket): Shared request budget, or None for no limit
+        max_attempts (int): Attempts per address for temporary failures
+    
+    Returns:
+        dict: business_id -> (coordinates or None, status), where status is
+              GEOCODE_FOUND / GEOCODE_NOT_FOUND (also for cache hits),
+              GEOCODE_RETRY (still failing after every attempt), GEOCODE_FAILED,
+              GEOCODE_APPROXIMATE (no API key, placed by the offline gazetteer)
+              or GEOCODE_SKIPPED (no API key, and found in neither)
+    """
+    keys = {
+        business_id: normalize_address(_geocoding_query(address))
+        for business_id, address in addresses.items()
+        if address and address.strip()
+    }
+    cached = _read_cache(keys.values())
+    answers = {key: (coords, GEOCODE_FOUND if coords else GEOCODE_NOT_FOUND) for key, coords in cached.items()}
+    queries_by_key = {
+        key: _geocoding_query(addresses[business_id])
+        for business_id, key in keys.items()
+        if key not in answers
+    }
+    if queries_by_key and not GOOGLE_MAPS_API_KEY:
+        logger.warning("GOOGLE_MAPS_API_KEY not configured. Using the offline gazetteer.")
+        for key in queries_by_key:
+            coords = gazetteer.locate(key)
+            answers[key] = (coords, GEOCODE_APPROXIMATE) if coords else (None, GEOCODE_SKIPPED)
+    elif queries_by_key:
+        def request(geocoding_address):
+            def attempt():
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+                return _request_geocode(geocoding_address)
+            return retry_with_backoff(attempt, lambda result: result[1] == GEOCODE_RETRY, max_attempts=max_attempts)
+        
+        if workers > 1 and len(queries_by_key) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = dict(zip(queries_by_key, pool.map(request, queries_by_key.values())))
+        else:
+            outcomes = {key: request(geocoding_address) for key, geocoding_address in queries_by_key.items()}
+        answers.update(outcomes)
+        _write_cache({
+            key: coords for key, (coords, status) in outcomes.items()
+            if status in (GEOCODE_FOUND, GEOCODE_NOT_FOUND)
+        })
+    return {
+        business_id: answers.get(keys.get(business_id), (None, GEOCODE_FAILED))
+        for business_id in addresses
+    }
 
 
 def validate_coordinates(latitude: float, longitude: float) -> bool:
@@ -0,0 +1,276 @@
+"""
+Jobs - Persistent background jobs, schedules and a worker pool
+
+Work that should not run inside a request (Yelp sync, the geocode queue,
+housekeeping) is registered here by name with register_job() and queued as
+rows in the `jobs` table with enqueue(), or run periodically with schedule().
+start_job_runner() starts a fixed number of worker threads that claim due
+jobs with a lease, run their handlers and record the outcome: a handler that
+raises is retried with jittered exponential backoff until its attempts run
+out, and every attempt's run time is stored for get_job_stats(). A handler
+that cannot make progress yet raises RetryLater to run again after a delay
+without using up an attempt.
+
+The table is the only shared state, so several app processes on one SQLite
+file can run workers side by side: a claim is one UPDATE, each due schedule
+is queued once, and a process only claims jobs it has handlers for. A job
+that outlives its timeout is not interrupted, but its lease expires and
+another worker may run it again, so handlers should be safe to repeat.
+
+WorkerPool is the thread pool behind start_job_runner(); the email outbox
+runs its sending threads on one as well.
+
+Hidden Gems | FBLA 2026
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from src.database import queries
+from src.logic.throttle import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Worker threads per process, and seconds an idle worker waits before checking again
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# Defaults for register_job()
+MAX_ATTEMPTS = 3
+TIMEOUT_SECONDS = 300
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+# Finished jobs are kept this long for get_job_stats()
+RETENTION_DAYS = 7
+
+_job_types = {}
+
+
+class RetryLater(Exception):
+    """
+    Raised by a handler that cannot make progress yet (e.g. the email outbox is full).
+
+    The job is queued again after `delay_seconds` and the attempt is not
+    counted, so a job that pauses many times is not failed for it.
+    """
+
+    def __init__(self, message, delay_seconds):
+        super().__init__(message)
+        self.delay_seconds = delay_seconds
+
+
+class WorkerPool:
+    """
+    Fixed set of daemon threads that each call `work_once(*args)` until stopped.
+
+    work_once() claims and handles one leased unit of work, returning None when
+    nothing was due; an idle thread then waits `poll_seconds`, or until wake()
+    is called. An exception is logged and counts as idle, so one failed pass
+    (e.g. the database is briefly locked) does not end the thread.
+    """
+
+    def __init__(self, name, work_once):
+        self.name = name
+        self._work_once = work_once
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop = None
+        self._wakeup = threading.Event()
+
+    def wake(self):
+        """Let idle threads look for work right away (e.g. after queueing some)."""
+        self._wakeup.set()
+
+    def start(self, workers, poll_seconds, *args):
+        """Start `workers` threads calling work_once(*args), unless already running. Returns the threads."""
+        with self._lock:
+            threads = [thread for thread in self._threads if thread.is_alive()]
+            if threads:
+                return threads
+            stop = threading.Event()
+            threads = [
+                threading.Thread(target=self._work, args=(stop, poll_seconds, args), name=f"{self.name}-{index}", daemon=True)
+                for index in range(workers)
+            ]
+            self._threads, self._stop = threads, stop
+            for thread in threads:
+                thread.start()
+            return threads
+
+    def stop(self, timeout=5):
+        """Ask the threads to finish their current unit of work and exit."""
+        with self._lock:
+            threads, stop = self._threads, self._stop
+            self._threads, self._stop = [], None
+        if stop is not None:
+            stop.set()
+            self._wakeup.set()
+            for thread in threads:
+                thread.join(timeout)
+
+    def _work(self, stop, poll_seconds, args):
+        while not stop.is_set():
+            try:
+                outcome = self._work_once(*args)
+            except Exception as error:
+                logger.error(f"{self.name} pass failed: {error}")
+                outcome = None
+            if outcome is None and self._wakeup.wait(poll_seconds):
+                self._wakeup.clear()
+
+
+def register_job(name, handler, max_attempts=MAX_ATTEMPTS, timeout_seconds=TIMEOUT_SECONDS,
+                 retry_base_seconds=RETRY_BASE_SECONDS, retry_max_seconds=RETRY_MAX_SECONDS):
+    """
+    Make job `name` runnable in this process.
+
+    Args:
+        name (str): Job name used by enqueue() and schedule()
+        handler (callable): Called with the job's payload dict; its return value
+                            (JSON-serializable) is stored as the job's result
+        max_attempts (int): Runs before the job is marked failed
+        timeout_seconds (int): Lease per run; after it another worker may take the job over
+        retry_base_seconds, retry_max_seconds (float): Backoff bounds between attempts
+    """
+    _job_types[name] = {
+        "handler": handler,
+        "max_attempts": max_attempts,
+        "timeout_seconds": timeout_seconds,
+        "retry_base_seconds": retry_base_seconds,
+        "retry_max_seconds": retry_max_seconds,
+    }
+
+
+def _job_type(name):
+    try:
+        return _job_types[name]
+    except KeyError:
+        raise ValueError(f"No job registered as {name!r}") from None
+
+
+def enqueue(name, payload=None, delay_seconds=0, unique_key=None):
+    """
+    Queue one run of job `name`.
+
+    Args:
+        name (str): Registered job name
+        payload (dict): Arguments for the handler
+        delay_seconds (float): Earliest start, from now
+        unique_key (str): Skip queueing while a job with this key is queued or running
+
+    Returns:
+        int: Job id, or None if skipped because of unique_key
+    """
+    job_type = _job_type(name)
+    job_id = queries.insert_job(
+        name, json.dumps(payload or {}), unique_key=unique_key, max_attempts=job_type["max_attempts"],
+        timeout_seconds=job_type["timeout_seconds"], delay_seconds=delay_seconds
+    )
+    _runner.wake()
+    return job_id
+
+
+def schedule(name, interval_seconds, payload=None):
+    """Run job `name` every `interval_seconds` (the first run is due now). Stored in the database."""
+    _job_type(name)
+    queries.upsert_job_schedule(name, interval_seconds, json.dumps(payload or {}))
+    _runner.wake()
+
+
+def unschedule(name):
+    """Stop running job `name` periodically. Returns True if it was scheduled."""
+    return queries.delete_job_schedule(name)
+
+
+def _run_job(job, owner):
+    """Run one claimed job and record its outcome. Returns "succeeded", "retrying" or "failed"."""
+    job_type = _job_types[job["name"]]
+    started = time.perf_counter()
+    count_attempt = True
+    try:
+        result = job_type["handler"](job["payload"])
+        outcome, error, retry_delay = "succeeded", None, None
+    except RetryLater as pause:
+        result, outcome, retry_delay, count_attempt = None, "retrying", pause.delay_seconds, False
+        error = f"RetryLater: {pause}"
+        logger.info(f"Job {job['name']} #{job['id']} paused for {pause.delay_seconds:.0f} s: {pause}")
+    except Exception as handler_error:
+        result = None
+        error = f"{type(handler_error).__name__}: {handler_error}"
+        if job["attempts"] < job["max_attempts"]:
+            outcome = "retrying"
+            retry_delay = backoff_delay(job["attempts"], job_type["retry_base_seconds"], job_type["retry_max_seconds"])
+        else:
+            outcome, retry_delay = "failed", None
+        logger.warning(f"Job {job['name']} #{job['id']} attempt {job['attempts']} failed ({outcome}): {error}")
+    duration_ms = round((time.perf_counter() - started) * 1000)
+    finished = queries.finish_job(
+        job["id"], owner, duration_ms, result=json.dumps(result) if outcome == "succeeded" else None,
+        error=error, retry_delay_seconds=retry_delay, count_attempt=count_attempt
+    )
+    if not finished:
+        logger.warning(f"Job {job['name']} #{job['id']} finished after its lease expired; outcome not recorded")
+    return outcome
+
+
+def run_next(names=None):
+    """
+    Queue due scheduled jobs, then claim and run one due job in this thread.
+
+    Args:
+        names (list): Job names to consider (default: every registered job)
+
+    Returns:
+        str: "succeeded", "retrying" or "failed", or None if no job was due
+    """
+    names = list(names or _job_types)
+    queries.enqueue_scheduled_jobs({
+        name: (_job_types[name]["max_attempts"], _job_types[name]["timeout_seconds"]) for name in names
+    })
+    owner = uuid.uuid4().hex
+    jobs = queries.claim_jobs(names, owner, limit=1)
+    return _run_job(jobs[0], owner) if jobs else None
+
+
+def run_pending(names=None, limit=None):
+    """
+    Run due jobs in this thread until none are left (or `limit` have run).
+
+    For scripts and tests; the web app uses start_job_runner().
+
+    Returns:
+        dict: Counts - run, succeeded, retrying, failed
+    """
+    counts = {"run": 0, "succeeded": 0, "retrying": 0, "failed": 0}
+    while limit is None or counts["run"] < limit:
+        outcome = run_next(names)
+        if outcome is None:
+            break
+        counts["run"] += 1
+        counts[outcome] += 1
+    return counts
+
+
+# enqueue() and schedule() wake idle workers so new jobs start right away
+_runner = WorkerPool("job-worker", run_next)
+
+
+def start_job_runner(workers=JOB_WORKERS, poll_seconds=POLL_SECONDS):
+    """Start `workers` job threads for this process (once). Returns the threads."""
+    schedule("prune_jobs", 24 * 60 * 60)
+    return _runner.start(workers, poll_seconds)
+
+
+def stop_job_runner(timeout=5):
+    """Ask the job threads to finish their current job and exit."""
+    _runner.stop(timeout)
+
+
+def get_job_stats():
+    """Counts and run times per job name (see queries.get_job_stats())."""
+    return queries.get_job_stats()
+
+
+register_job("prune_jobs", lambda payload: queries.prune_jobs(RETENTION_DAYS), max_attempts=1)
@@ -0,0 +1,123 @@
+"""
+Response Cache - On-disk cache and replay fixtures for JSON API responses
+
+ResponseCache keeps one JSON file per request (URL plus query parameters)
+in a directory, so a restart can reuse answers fetched shortly before instead
+of calling the API again. Entries older than the TTL are ignored and
+overwritten on the next fetch.
+
+The same files double as fixtures: a cache created with match_url=False and
+no TTL is keyed by the parameters alone, so responses recorded against the
+real API can be served later by make_replay_server() on localhost (point the
+client's base URL at it) for offline tests and benchmarks.
+
+Hidden Gems | FBLA 2026
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(url, params):
+    """Stable file name for a request; parameter order and value types don't matter."""
+    canonical = json.dumps([url, sorted((str(name), str(value)) for name, value in params.items())])
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Directory of cached JSON responses.
+
+    Args:
+        directory (str): Where entries are stored (created on first write)
+        ttl_seconds (int): Entry lifetime, or None for entries that never expire (fixtures)
+        match_url (bool): False to key entries by parameters only, so fixtures
+                          recorded against one server can be replayed by another
+        clock (callable): Injected for tests
+    """
+
+    def __init__(self, directory, ttl_seconds=None, match_url=True, clock=time.time):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.match_url = match_url
+        self._clock = clock
+
+    def _path(self, url, params):
+        return os.path.join(self.directory, request_key(url if self.match_url else "", params) + ".json")
+
+    def get(self, url, params):
+        """Cached response data for this request, or None if missing or expired."""
+        try:
+            with open(self._path(url, params)) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if self.ttl_seconds is not None and self._clock() - entry.get("stored_at", 0) > self.ttl_seconds:
+            return None
+        return entry.get("data")
+
+    def put(self, url, params, data):
+        """Store response data; written atomically so readers never see half an entry."""
+        entry = {
+            "url": url,
+            "params": {str(name): str(value) for name, value in params.items()},
+            "stored_at": self._clock(),
+            "data": data,
+        }
+        path = self._path(url, params)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary_path, "w") as entry_file:
+                json.dump(entry, entry_file)
+            os.replace(temporary_path, path)
+        except OSError as error:
+            logger.warning(f"Could not write response cache entry {path}: {error}")
+
+
+def make_replay_server(fixture_directory, host="127.0.0.1", port=0):
+    """
+    Local HTTP server that answers GET requests from recorded fixtures.
+
+    A request is matched on its query parameters alone (path and headers are
+    ignored); unknown requests get a 404 with a Yelp-style error body.
+
+    Returns:
+        ThreadingHTTPServer: Not yet serving; call serve_forever() (e.g. in a
+                             thread) and shutdown() when done. `server_port`
+                             has the bound port.
+    """
+    fixtures = ResponseCache(fixture_directory, ttl_seconds=None, match_url=False)
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, kept-alive
+        # connections stall on delayed ACKs and timings measure TCP, not the client
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            params = dict(parse_qsl(urlparse(self.path).query, keep_blank_values=True))
+            data = fixtures.get("", params)
+            if data is None:
+                self._send(404, {"error": {"code": "NOT_RECORDED", "description": f"No fixture for {params}"}})
+            else:
+                self._send(200, data)
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), ReplayHandler)
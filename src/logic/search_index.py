@@ -0,0 +1,440 @@
+"""
+Search Index - In-memory indexes for typo-tolerant search and autocomplete
+
+Business names and categories are split into words and each word into
+trigrams ("pizza" -> "  p", " pi", "piz", "izz", "zza", "za "). A misspelled
+search word ("pizzza") shares most of its trigrams with the real word, so
+similar vocabulary words are found through a trigram -> words posting list
+and businesses through a word -> businesses posting list, without scanning
+the catalog. The same vocabulary powers "did you mean" suggestions.
+
+Autocomplete uses a sorted array of name keys searched with bisect, so
+search-as-you-type never touches SQLite.
+
+Both indexes are built together once per process from the businesses table,
+updated in place when insert_business/update_business run here, and rebuilt
+when the catalog_version counter (bumped by triggers, so it sees writes from
+other processes such as the seed script) moves.
+
+Hidden Gems | FBLA 2026
+"""
+import bisect
+import heapq
+import re
+import string
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from src.database import db, queries
+
+# Minimum trigram similarity (0-1) for a word or business to count as a match
+SIMILARITY_THRESHOLD = 0.3
+# How often (seconds) to ask SQLite whether the catalog changed in another process
+STALE_CHECK_SECONDS = 5.0
+
+
+def normalize_words(text):
+    """Lowercase, accent-free alphanumeric words of `text`."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def trigrams(word):
+    """Trigrams of one word, padded like PostgreSQL's pg_trgm so word starts weigh more."""
+    padded = f"  {word} "
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """
+    Trigram index over business names and categories.
+
+    Not thread-safe on its own; the module-level helpers guard it with a lock.
+    """
+
+    def __init__(self):
+        self._documents = {}                  # business_id -> (category, words)
+        self._category_documents = defaultdict(set)  # category -> business_ids
+        self._word_documents = defaultdict(set)  # word -> business_ids
+        self._word_trigrams = {}              # word -> trigrams
+        self._trigram_words = defaultdict(set)   # trigram -> words
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, business_id, name, category):
+        """Index (or re-index) one business."""
+        self.remove(business_id)
+        words = frozenset(normalize_words(name) + normalize_words(category))
+        self._documents[business_id] = (category, words)
+        self._category_documents[category].add(business_id)
+        for word in words:
+            if word not in self._word_trigrams:
+                grams = trigrams(word)
+                self._word_trigrams[word] = grams
+                for gram in grams:
+                    self._trigram_words[gram].add(word)
+            self._word_documents[word].add(business_id)
+
+    def remove(self, business_id):
+        """Drop one business; words no other business uses leave the vocabulary."""
+        document = self._documents.pop(business_id, None)
+        if document is None:
+            return
+        category_ids = self._category_documents[document[0]]
+        category_ids.discard(business_id)
+        if not category_ids:
+            del self._category_documents[document[0]]
+        for word in document[1]:
+            holders = self._word_documents[word]
+            holders.discard(business_id)
+            if not holders:
+                del self._word_documents[word]
+                for gram in self._word_trigrams.pop(word):
+                    self._trigram_words[gram].discard(word)
+                    if not self._trigram_words[gram]:
+                        del self._trigram_words[gram]
+
+    def similar_words(self, word, threshold=SIMILARITY_THRESHOLD):
+        """Vocabulary words whose trigram similarity to `word` is at least `threshold`."""
+        grams = trigrams(word)
+        shared_counts = Counter()
+        for gram in grams:
+            shared_counts.update(self._trigram_words.get(gram, ()))
+        matches = {}
+        for candidate, shared in shared_counts.items():
+            similarity = shared / (len(grams) + len(self._word_trigrams[candidate]) - shared)
+            if similarity >= threshold:
+                matches[candidate] = similarity
+        return matches
+
+    def search(self, query, limit=20, category=None, threshold=SIMILARITY_THRESHOLD):
+        """
+        Businesses ranked by how closely their words match the query's words.
+
+        Each query word scores its best-matching word in the business (0-1);
+        a business's score is the average over query words.
+
+        Scores only take a few distinct values (one per combination of matched
+        vocabulary words), so businesses are grouped by score with set
+        intersections instead of being scored one at a time.
+
+        Args:
+            query (str): Search text, typos welcome
+            limit (int): Maximum number of results
+            category (str): Optional category the results must be in
+            threshold (float): Minimum similarity for words and for results
+
+        Returns:
+            list: (business_id, score) tuples, best first (ties by lowest id)
+        """
+        query_words = normalize_words(query)
+        if not query_words:
+            return []
+
+        # Per query word: disjoint business sets, one per similarity level, best first
+        word_levels = []
+        for query_word in query_words:
+            matches = self.similar_words(query_word, threshold)
+            levels = []
+            seen = set()
+            for word in sorted(matches, key=matches.get, reverse=True):
+                new_ids = self._word_documents[word] - seen
+                if new_ids:
+                    levels.append((matches[word], new_ids))
+                    seen |= new_ids
+            word_levels.append((levels, seen))
+
+        candidates = set().union(*(seen for _, seen in word_levels))
+        if category is not None:
+            candidates &= self._category_documents.get(category, set())
+
+        # Split candidates into groups sharing one total score
+        partitions = [(0.0, candidates)] if candidates else []
+        for levels, _ in word_levels:
+            refined = []
+            for total, business_ids in partitions:
+                remaining = business_ids
+                for similarity, level_ids in levels:
+                    hits = remaining & level_ids
+                    if hits:
+                        refined.append((total + similarity, hits))
+                        remaining = remaining - hits
+                if remaining:
+                    refined.append((total, remaining))
+            partitions = refined
+
+        by_score = defaultdict(set)
+        for total, business_ids in partitions:
+            score = total / len(query_words)
+            if score >= threshold:
+                by_score[score] |= business_ids
+        results = []
+        for score in sorted(by_score, reverse=True):
+            for business_id in heapq.nsmallest(limit - len(results), by_score[score]):
+                results.append((business_id, round(score, 3)))
+            if len(results) >= limit:
+                break
+        return results
+
+    def suggest(self, query, threshold=SIMILARITY_THRESHOLD):
+        """
+        Spelling suggestion for a query, or None if every word is already known.
+
+        Unknown words are replaced with the most similar vocabulary word
+        (ties go to the word more businesses use).
+        """
+        query_words = normalize_words(query)
+        corrected = []
+        for query_word in query_words:
+            if query_word in self._word_documents:
+                corrected.append(query_word)
+                continue
+            matches = self.similar_words(query_word, threshold)
+            if matches:
+                corrected.append(max(matches, key=lambda word: (matches[word], len(self._word_documents[word]), word)))
+            else:
+                corrected.append(query_word)
+        return " ".join(corrected) if corrected != query_words else None
+
+
+def _has_word_prefix(text, normalized_prefix):
+    """True if `text`, from one of its word boundaries on, starts with the normalized prefix."""
+    words = normalize_words(text)
+    return any(" ".join(words[start:]).startswith(normalized_prefix) for start in range(len(words)))
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index for autocomplete over business names and categories.
+
+    Every business contributes one key per word position of its normalized
+    name ("joe s pizza", "s pizza", "pizza"), so "piz" finds "Joe's Pizza".
+    Keys live in one sorted list with a parallel list of precomputed rank
+    tuples, so a prefix lookup is two bisects plus a C-level slice of ranks.
+    Answers are memoized per prefix; a change only evicts the prefixes of the
+    business that changed.
+
+    Not thread-safe on its own; the module-level helpers guard it with a lock.
+    """
+
+    CACHE_SIZE = 4096
+
+    def __init__(self):
+        self._keys = []               # sorted (key, business_id)
+        self._ranks = []              # rank tuple for the entry at the same position in _keys
+        self._businesses = {}         # business_id -> (name, category, keys)
+        self._category_counts = Counter()
+        self._cache = {}              # normalized prefix -> {limit: result}
+
+    def __len__(self):
+        return len(self._businesses)
+
+    @staticmethod
+    def _entries(business_id, name, popularity):
+        """(key, business_id, rank) for each word position of a name; whole-name matches rank first."""
+        words = normalize_words(name)
+        keys = tuple(dict.fromkeys(" ".join(words[start:]) for start in range(len(words))))
+        name_order = str(name or "").lower()
+        return keys, [
+            (key, business_id, (0 if position == 0 else 1, -(popularity or 0), name_order, business_id))
+            for position, key in enumerate(keys)
+        ]
+
+    def load(self, rows):
+        """Bulk-build from (business_id, name, category, popularity) rows with a single sort."""
+        self.__init__()
+        entries = []
+        for business_id, name, category, popularity in rows:
+            keys, business_entries = self._entries(business_id, name, popularity)
+            entries.extend(business_entries)
+            self._businesses[business_id] = (name, category, keys)
+            if category:
+                self._category_counts[category] += 1
+        entries.sort()
+        self._keys = [(key, business_id) for key, business_id, _ in entries]
+        self._ranks = [rank for _, _, rank in entries]
+        # One-character prefixes match the largest slices; answer them up front
+        for character in string.ascii_lowercase + string.digits:
+            self.complete(character)
+
+    def add(self, business_id, name, category, popularity=0):
+        """Index (or re-index) one business."""
+        self.remove(business_id)
+        keys, entries = self._entries(business_id, name, popularity)
+        for key, _, rank in entries:
+            position = bisect.bisect_left(self._keys, (key, business_id))
+            self._keys.insert(position, (key, business_id))
+            self._ranks.insert(position, rank)
+        self._businesses[business_id] = (name, category, keys)
+        if category:
+            self._category_counts[category] += 1
+        self._evict(keys, category)
+
+    def remove(self, business_id):
+        """Drop one business from the index."""
+        entry = self._businesses.pop(business_id, None)
+        if entry is None:
+            return
+        _, category, keys = entry
+        for key in keys:
+            position = bisect.bisect_left(self._keys, (key, business_id))
+            if position < len(self._keys) and self._keys[position] == (key, business_id):
+                del self._keys[position]
+                del self._ranks[position]
+        if category:
+            self._category_counts[category] -= 1
+            if self._category_counts[category] <= 0:
+                del self._category_counts[category]
+        self._evict(keys, category)
+
+    def _evict(self, keys, category):
+        """Forget cached answers for every prefix a changed business could appear under."""
+        words = normalize_words(category)
+        for key in list(keys) + [" ".join(words[start:]) for start in range(len(words))]:
+            for length in range(1, len(key) + 1):
+                self._cache.pop(key[:length], None)
+
+    def complete(self, prefix, limit=8):
+        """
+        Top completions for what the user has typed so far.
+
+        Businesses whose name starts with the prefix come first, then names
+        with a later word starting with it; ties go to the most reviewed.
+
+        Args:
+            prefix (str): Partial search text
+            limit (int): Maximum businesses (and categories) to return
+
+        Returns:
+            dict: 'businesses' (list of {'id', 'name', 'category'}) and
+                  'categories' (list of {'name', 'count'})
+        """
+        normalized = " ".join(normalize_words(prefix))
+        if not normalized:
+            return {"businesses": [], "categories": []}
+        cached = self._cache.get(normalized, {}).get(limit)
+        if cached is not None:
+            return cached
+
+        start = bisect.bisect_left(self._keys, (normalized,))
+        end = bisect.bisect_left(self._keys, (normalized + "\uffff",))
+        ranks = self._ranks[start:end]
+        # A business can match through several of its words, so over-fetch and dedupe
+        top_ids = list(dict.fromkeys(rank[-1] for rank in heapq.nsmallest(limit * 3, ranks)))
+        if len(top_ids) < limit and len(ranks) > limit * 3:
+            top_ids = list(dict.fromkeys(rank[-1] for rank in sorted(ranks)))
+        top_ids = top_ids[:limit]
+
+        categories = [
+            {"name": category, "count": count}
+            for category, count in sorted(self._category_counts.items())
+            if _has_word_prefix(category, normalized)
+        ][:limit]
+
+        result = {
+            "businesses": [
+                {"id": business_id, "name": self._businesses[business_id][0], "category": self._businesses[business_id][1]}
+                for business_id in top_ids
+            ],
+            "categories": categories,
+        }
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache.setdefault(normalized, {})[limit] = result
+        return result
+
+
+# Shared indexes for this process, rebuilt when the catalog changes
+_index_lock = threading.RLock()
+_index_state = {"trigram": None, "prefix": None, "database": None, "version": None, "checked_at": 0.0}
+
+
+def _build_indexes():
+    rows = queries.get_business_search_rows()
+    trigram_index = TrigramIndex()
+    for business_id, name, category, _ in rows:
+        trigram_index.add(business_id, name, category)
+    prefix_index = PrefixIndex()
+    prefix_index.load(rows)
+    return trigram_index, prefix_index
+
+
+def _on_business_changed(business):
+    """queries.py listener: apply an insert/update from this process without a rebuild."""
+    with _index_lock:
+        if _index_state["trigram"] is None or _index_state["database"] != str(db.DATABASE_PATH):
+            return
+        _index_state["trigram"].add(business["id"], business.get("name"), business.get("category"))
+        _index_state["prefix"].add(business["id"], business.get("name"), business.get("category"), business.get("total_reviews"))
+        # Our own write moved the catalog version by at most one; anything more
+        # means another process changed the catalog too, so leave it to a rebuild
+        current_version = queries.get_catalog_version()
+        if current_version - _index_state["version"] <= 1:
+            _index_state["version"] = current_version
+
+
+queries.add_business_listener(_on_business_changed)
+
+
+def _current_indexes():
+    """Index state for the current database, (re)built if missing or stale. Caller holds _index_lock."""
+    database = str(db.DATABASE_PATH)
+    now = time.monotonic()
+    state = _index_state
+    if state["trigram"] is not None and state["database"] == database and now - state["checked_at"] < STALE_CHECK_SECONDS:
+        return state
+    version = queries.get_catalog_version()
+    if state["trigram"] is None or state["database"] != database or state["version"] != version:
+        state["trigram"], state["prefix"] = _build_indexes()
+        state["database"] = database
+        state["version"] = version
+    state["checked_at"] = now
+    return state
+
+
+def get_trigram_index():
+    """The process-wide TrigramIndex for the current database, built or refreshed as needed."""
+    with _index_lock:
+        return _current_indexes()["trigram"]
+
+
+def get_prefix_index():
+    """The process-wide PrefixIndex for the current database, built or refreshed as needed."""
+    with _index_lock:
+        return _current_indexes()["prefix"]
+
+
+def fuzzy_search(query, limit=12, category=None):
+    """
+    Typo-tolerant business search (e.g. "pizzza", "barbeque").
+
+    Args:
+        query (str): Search text
+        limit (int): Maximum number of businesses
+        category (str): Optional category filter
+
+    Returns:
+        list: Business dictionaries, most similar first, each with a 'similarity' score
+    """
+    with _index_lock:
+        matches = _current_indexes()["trigram"].search(query, limit=limit, category=category)
+    scores = dict(matches)
+    businesses = queries.get_businesses_by_ids([business_id for business_id, _ in matches])
+    for business in businesses:
+        business["similarity"] = scores[business["id"]]
+    return businesses
+
+
+def did_you_mean(query):
+    """Spelling suggestion for a search that found nothing, or None."""
+    with _index_lock:
+        return _current_indexes()["trigram"].suggest(query)
+
+
+def autocomplete(prefix, limit=8):
+    """Business and category completions for a search box prefix (see PrefixIndex.complete)."""
+    with _index_lock:
+        return _current_indexes()["prefix"].complete(prefix, limit=limit)
@@ -0,0 +1,90 @@
+"""
+Throttle - Rate limiting and retry helpers for calls to outside APIs
+
+TokenBucket keeps a pool of worker threads under a provider's quota
+(requests per second with a small burst allowance), and retry_with_backoff
+re-runs a call that failed for a temporary reason with exponentially growing,
+jittered pauses so retries from many workers do not arrive in lockstep.
+
+Hidden Gems | FBLA 2026
+"""
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+
+    Each call to acquire() takes one token, waiting for the bucket to refill
+    when it is empty, so any number of threads sharing a bucket make at most
+    `capacity` calls in a burst and `rate` calls per second after that.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available right now. Returns True on success."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Take a token, waiting as long as needed. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            # Sleep outside the lock so other threads can check the bucket too
+            self._sleep(delay)
+            waited += delay
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=8.0):
+    """Pause before retry number `attempt` (1-based): full jitter over an exponential cap."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+def retry_with_backoff(call, should_retry, max_attempts=4, base_delay=0.5, max_delay=8.0, sleep=time.sleep):
+    """
+    Run `call()` until `should_retry(result)` is False or attempts run out.
+
+    Args:
+        call (callable): No-argument function to run
+        should_retry (callable): Given the result, True if it failed temporarily
+        max_attempts (int): Total attempts, including the first
+        base_delay, max_delay (float): Backoff bounds in seconds
+        sleep (callable): Injected for tests
+
+    Returns:
+        The last result of `call()`
+    """
+    attempt = 1
+    result = call()
+    while should_retry(result) and attempt < max_attempts:
+        sleep(backoff_delay(attempt, base_delay, max_delay))
+        attempt += 1
+        result = call()
+    return result
@@ -1,16 +1,66 @@
 """
 Fetch small businesses in Richmond, VA from Yelp Fusion API.
+
+Searches run one category per worker thread on a bounded pool, paging
+through offsets up to a per-category cap. All workers share one token bucket
+(YELP_RATE_PER_SECOND) and retry throttled or failed requests with backoff,
+and each thread keeps one HTTP session so connections are reused. Rows are
+yielded as pages arrive (iter_richmond_businesses), so the sync can write
+the first page while later ones are still in flight.
+
+Responses are cached on disk (YELP_CACHE_DIR, YELP_CACHE_TTL_SECONDS), so a
+sync interrupted by a restart or retried after an error does not fetch
+everything again. A caller can accept only younger entries
+(cache_max_age_seconds); the catalog sync never reuses pages from before its
+last completed run, so the cache cannot hold the catalog back. With
+YELP_RECORD_DIR set they are also saved as fixtures that
+scripts/yelp_replay_server.py serves locally (set YELP_API_URL to it).
+
 Hidden Gems | FBLA 2026
 https://www.yelp.com/developers/v3/manage_app
 """
 import os
-import json
-import urllib.request
-import urllib.parse
-import urllib.error
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.logic.response_cache import ResponseCache
+from src.logic.throttle import TokenBucket, retry_with_backoff
 
 LOCATION = "Richmond, VA"
-BASE_URL = "https://api.yelp.com/v3/businesses/search"
+# Overridable so tests and local runs can point at a stand-in server
+BASE_URL = os.getenv("YELP_API_URL", "https://api.yelp.com/v3/businesses/search")
+# Yelp returns at most 50 results per page and 240 per search (offset + limit)
+PAGE_SIZE = 50
+MAX_SEARCH_RESULTS = 240
+# Results read per category on each sync
+MAX_PER_CATEGORY = int(os.getenv("YELP_MAX_PER_CATEGORY", str(MAX_SEARCH_RESULTS)))
+# Concurrent category searches, and attempts per page for 429 / 5xx / network errors
+WORKERS = 4
+MAX_ATTEMPTS = 4
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Category searches run for each sync: (Yelp category alias, app category)
+SEARCHES = [
+    ("restaurants", "Food"),
+    ("shopping", "Retail"),
+    ("localservices", "Services"),
+    ("nightlife", "Entertainment"),
+    ("gyms", "Health and Wellness"),
+]
+
+# On-disk response cache (Yelp's terms allow keeping content for up to 24 hours; 0 disables it)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESPONSE_CACHE_DIR = os.getenv("YELP_CACHE_DIR", os.path.join(ROOT, ".cache", "yelp"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("YELP_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# When set, every response is also saved here as a fixture for scripts/yelp_replay_server.py
+RECORD_DIR = os.getenv("YELP_RECORD_DIR") or None
+
+# Shared by every worker so a sync stays under Yelp's per-second limit
+_rate_limiter = TokenBucket(float(os.getenv("YELP_RATE_PER_SECOND", "5")))
+_thread_local = threading.local()
 
 # Map Yelp category aliases to our app categories (Food, Retail, Services, Entertainment, Health and Wellness)
 YELP_TO_APP_CATEGORY = {
@@ -63,10 +113,41 @@ def _get_api_key():
 _last_error = None
 
 
-def _request(offset=0, limit=50, term=None, categories=None):
-    """Make one request to Yelp Business Search. Returns (data, None) or (None, error_message)."""
+def _http_session():
+    """Per-thread HTTP session, so pages of a search reuse one kept-alive connection."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
+
+
+def _send(params, api_key):
+    """One HTTP request. Returns (data, error_message, retryable)."""
+    try:
+        response = _http_session().get(BASE_URL, params=params, headers={"Authorization": f"Bearer {api_key}"}, timeout=15)
+    except requests.exceptions.RequestException as e:
+        return None, f"Network error: {e}", True
+    if response.status_code != 200:
+        error = f"Yelp API error: {response.status_code} {response.reason}"
+        body = response.text[:200]
+        if body:
+            error += " — " + body
+        return None, error, response.status_code in RETRYABLE_STATUS_CODES
+    try:
+        return response.json(), None, False
+    except ValueError as e:
+        return None, f"Invalid Yelp response: {e}", False
+
+
+def _request(offset=0, limit=50, term=None, categories=None, cache_max_age_seconds=None):
+    """
+    Make one request to Yelp Business Search (rate limited, retried with backoff).
+    Answers come from the on-disk response cache while younger than
+    cache_max_age_seconds (default and upper bound: RESPONSE_CACHE_TTL_SECONDS;
+    0 always fetches), and are saved as replay fixtures when YELP_RECORD_DIR is set.
+    Returns (data, None) or (None, error_message).
+    """
     global _last_error
-    _last_error = None
     api_key = _get_api_key()
     if not api_key:
         _last_error = "YELP_API_KEY not set in config.py"
@@ -81,25 +162,23 @@ def _request(offset=0, limit=50, term=None, categories=None):
         params["term"] = term
     if categories:
         params["categories"] = categories
-    url = BASE_URL + "?" + urllib.parse.urlencode(params)
-    req = urllib.request.Request(url, headers={"Authorization": f"Bearer {api_key}"})
-    try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            return json.loads(resp.read().decode()), None
-    except urllib.error.HTTPError as e:
-        _last_error = f"Yelp API error: {e.code} {e.reason}"
-        try:
-            body = e.read().decode()[:200]
-            _last_error += " — " + body
-        except Exception:
-            pass
-        return None, _last_error
-    except urllib.error.URLError as e:
-        _last_error = f"Network error: {e.reason}"
-        return None, _last_error
-    except Exception as e:
-        _last_error = str(e)
-        return None, _last_error
+    cache = ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL_SECONDS) if RESPONSE_CACHE_TTL_SECONDS > 0 else None
+    max_age = RESPONSE_CACHE_TTL_SECONDS if cache_max_age_seconds is None else min(cache_max_age_seconds, RESPONSE_CACHE_TTL_SECONDS)
+    data = ResponseCache(RESPONSE_CACHE_DIR, max_age).get(BASE_URL, params) if cache and max_age > 0 else None
+    if data is None:
+        def attempt():
+            _rate_limiter.acquire()
+            return _send(params, api_key)
+
+        data, error, _ = retry_with_backoff(attempt, lambda result: result[2], max_attempts=MAX_ATTEMPTS)
+        if error:
+            _last_error = error
+            return None, error
+        if cache:
+            cache.put(BASE_URL, params, data)
+    if RECORD_DIR:
+        ResponseCache(RECORD_DIR, match_url=False).put(BASE_URL, params, data)
+    return data, None
 
 
 def get_last_error():
@@ -243,47 +322,91 @@ def _business_to_row(b):
         "photo_url": photo_url,
         "attributes": attributes_str[:500],
         "summary": summary,
-        "yelp_id": yelp_id
+        "yelp_id": yelp_id,
+        "is_closed": bool(b.get("is_closed")),
     }
 
 
-def fetch_richmond_businesses(max_per_category=50):
+def _search_category(yelp_category, max_results, pages, stop, cache_max_age_seconds=None):
+    """Page through one category search, putting each page's businesses on `pages`."""
+    try:
+        offset = 0
+        while offset < max_results and not stop.is_set():
+            limit = min(PAGE_SIZE, max_results - offset)
+            data, err = _request(offset=offset, limit=limit, categories=yelp_category,
+                                 cache_max_age_seconds=cache_max_age_seconds)
+            if err or not data:
+                # Give up on this category; the others may still work
+                break
+            businesses = data.get("businesses") or []
+            pages.put(businesses)
+            offset += len(businesses)
+            if len(businesses) < limit or offset >= data.get("total", 0):
+                break
+    finally:
+        pages.put(None)
+
+
+def iter_richmond_businesses(max_per_category=None, workers=WORKERS, include_closed=False, cache_max_age_seconds=None):
     """
-    Fetch businesses in Richmond, VA from Yelp across several categories.
-    Returns list of dicts with name, category, description, address, average_rating, total_reviews.
-    Returns [] if API key is missing or request fails. Use get_last_error() for failure reason.
+    Stream businesses in Richmond, VA from Yelp across several categories.
+
+    Category searches run concurrently on up to `workers` threads, each paging
+    through results until `max_per_category` (default MAX_PER_CATEGORY, capped
+    at Yelp's 240 per search). Rows are yielded as soon as their page arrives,
+    one per Yelp business (yelp_id), so chain locations sharing a name all
+    come through; rows without an id fall back to one per (name, category).
+    Permanently closed businesses are left out unless `include_closed` (their
+    rows have is_closed=True, so a sync can hide them). Cached pages older
+    than `cache_max_age_seconds` are fetched again (see _request). Yields
+    nothing if the API key is missing; use get_last_error() for the reason a
+    search stopped early.
+
+    Yields:
+        dict: Business row in our schema (see _business_to_row)
     """
     global _last_error
     _last_error = None
     if not _get_api_key():
         _last_error = "YELP_API_KEY not set in config.py"
-        return []
-    all_businesses = {}
-    searches = [
-        ("restaurants", "Food"),
-        ("shopping", "Retail"),
-        ("localservices", "Services"),
-        ("nightlife", "Entertainment"),
-        ("gyms", "Health and Wellness"),
-    ]
-    for yelp_category, _app_category in searches:
-        data, err = _request(limit=min(50, max_per_category), categories=yelp_category)
-        if err:
-            _last_error = err
-            # Continue to next category; maybe one will work
-            continue
-        if not data or "businesses" not in data:
-            continue
-        for business_data in data.get("businesses", []):
-            if business_data.get("is_closed"):
-                continue
-            row = _business_to_row(business_data)
-            if not row:
-                continue
-            key = (row["name"].lower(), row["category"])
-            if key not in all_businesses:
-                all_businesses[key] = row
-    return list(all_businesses.values())
+        return
+    max_results = min(max_per_category or MAX_PER_CATEGORY, MAX_SEARCH_RESULTS)
+    pages = queue.Queue()
+    stop = threading.Event()
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(SEARCHES)))) as pool:
+        try:
+            for yelp_category, _app_category in SEARCHES:
+                pool.submit(_search_category, yelp_category, max_results, pages, stop, cache_max_age_seconds)
+            remaining = len(SEARCHES)
+            while remaining:
+                businesses = pages.get()
+                if businesses is None:
+                    remaining -= 1
+                    continue
+                for business_data in businesses:
+                    if business_data.get("is_closed") and not include_closed:
+                        continue
+                    row = _business_to_row(business_data)
+                    if not row:
+                        continue
+                    # A business listed by several category searches comes through once
+                    key = row["yelp_id"] or (row["name"].lower(), row["category"])
+                    if key not in seen:
+                        seen.add(key)
+                        yield row
+        finally:
+            # Consumer stopped early (or failed): let workers finish their current page and exit
+            stop.set()
+
+
+def fetch_richmond_businesses(max_per_category=None, workers=WORKERS):
+    """
+    Fetch businesses in Richmond, VA from Yelp across several categories.
+    Returns list of dicts with name, category, description, address, average_rating, total_reviews.
+    Returns [] if API key is missing or request fails. Use get_last_error() for failure reason.
+    """
+    return list(iter_richmond_businesses(max_per_category=max_per_category, workers=workers))
 
 
 def is_configured():
@@ -0,0 +1,23 @@
+"""
+Shared pytest fixtures: point the database layer at a throwaway SQLite file.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.database import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Fresh, initialized database in a temp directory; yields its path."""
+    database_path = tmp_path / "hidden_gems_test.db"
+    monkeypatch.setattr(db, "DATABASE_PATH", database_path)
+    db.init_db()
+    yield database_path
+    db.close_all_connections()
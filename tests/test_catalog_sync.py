@@ -0,0 +1,102 @@
+"""
+Startup catalog sync: persisted last-sync time, skip window and background status.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.database import queries, seed
+from src.logic import catalog_sync, jobs, yelp_api
+
+STATS = {"added": 2, "updated": 0, "unchanged": 0, "removed": 0, "elapsed_seconds": 0.1}
+
+
+@pytest.fixture
+def fake_refresh(temp_db, monkeypatch):
+    """seed.refresh_richmond_from_yelp stand-in that records the sync."""
+    calls = []
+
+    def refresh_richmond_from_yelp(cache_max_age_seconds=None):
+        calls.append(cache_max_age_seconds)
+        queries.record_yelp_sync(STATS)
+        return dict(STATS)
+
+    monkeypatch.setattr(yelp_api, "is_configured", lambda: True)
+    monkeypatch.setattr(seed, "refresh_richmond_from_yelp", refresh_richmond_from_yelp)
+    monkeypatch.setitem(catalog_sync._sync_state, "state", "idle")
+    return calls
+
+
+def test_last_sync_is_persisted(temp_db):
+    assert queries.get_last_yelp_sync() == {"at": None, "stats": None}
+    assert catalog_sync.sync_is_due()
+    queries.record_yelp_sync(STATS)
+    last_sync = queries.get_last_yelp_sync()
+    assert last_sync["stats"] == STATS
+    assert datetime.now(timezone.utc) - last_sync["at"] < timedelta(minutes=1)
+    assert not catalog_sync.sync_is_due(max_age_hours=6)
+    assert catalog_sync.sync_is_due(max_age_hours=0)
+
+
+def test_recent_sync_is_skipped_unless_forced(fake_refresh):
+    calls = fake_refresh
+    assert catalog_sync.run_sync() == STATS
+    assert catalog_sync.run_sync() is None
+    assert catalog_sync.get_sync_status()["state"] == "skipped"
+    assert catalog_sync.run_sync(force=True) == STATS
+    # The first sync may use the whole response cache, a forced one none of it
+    assert calls == [None, 0]
+
+
+def test_background_sync_runs_as_a_job(fake_refresh, monkeypatch):
+    calls = fake_refresh
+    states = []
+    refresh = seed.refresh_richmond_from_yelp
+    monkeypatch.setattr(seed, "refresh_richmond_from_yelp",
+                        lambda **kwargs: states.append(catalog_sync.get_sync_status()["state"]) or refresh(**kwargs))
+    assert catalog_sync.start_background_sync() is not None
+    # One sync at a time: a second start while it is queued is a no-op
+    assert catalog_sync.start_background_sync() is None
+    assert jobs.run_pending(names=["yelp_sync"])["succeeded"] == 1
+    assert states == ["running"]
+    status = catalog_sync.get_sync_status()
+    assert status["state"] == "succeeded"
+    assert status["stats"] == STATS
+    assert status["last_sync_at"] is not None
+    assert len(calls) == 1
+    # The schedule's next run is hours away
+    assert jobs.run_pending(names=["yelp_sync"])["run"] == 0
+
+
+def test_failed_background_sync_is_retried(fake_refresh, monkeypatch):
+    monkeypatch.setattr(seed, "refresh_richmond_from_yelp", lambda cache_max_age_seconds=None: dict(STATS, added=0))
+    monkeypatch.setattr(jobs, "backoff_delay", lambda attempt, base, cap: 0)
+    catalog_sync.start_background_sync()
+    counts = jobs.run_pending(names=["yelp_sync"])
+    assert counts == {"run": 3, "succeeded": 0, "retrying": 2, "failed": 1}
+    assert catalog_sync.get_sync_status()["state"] == "failed"
+
+
+def test_status_endpoint_needs_no_login(fake_refresh):
+    from web.app import app
+
+    seed.ensure_seed_data(sync_yelp=False)
+    response = app.test_client().get("/api/status")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["businesses"] == queries.count_businesses() > 0
+    assert body["yelp_sync"]["state"] == "idle"
+    assert set(body["geocode_queue"]) == {"pending", "due", "retrying"}
+
+
+def test_scheduled_checks_refresh_within_a_check_of_max_age(fake_refresh, monkeypatch):
+    catalog_sync.start_background_sync(max_age_hours=6)
+    jobs.run_pending(names=["yelp_sync"])
+    finished = datetime.now(timezone.utc)
+    interval = timedelta(hours=6) / catalog_sync.SYNC_CHECKS_PER_MAX_AGE
+    # The scheduled checks after the sync; the first that finds it due refreshes the catalog
+    checks = 1
+    monkeypatch.setattr(catalog_sync, "_now", lambda: finished + checks * interval)
+    while not catalog_sync.sync_is_due(max_age_hours=6):
+        checks += 1
+    assert checks * interval <= timedelta(hours=6) + interval
@@ -0,0 +1,79 @@
+"""
+Map clustering: grid cells per zoom level, incremental moves and staleness.
+"""
+import pytest
+
+from src.database import db, queries
+from src.logic import clustering
+from src.logic.clustering import ClusterGrid
+
+RICHMOND = (37.40, -77.70, 37.70, -77.30)
+CAPITOL = (37.5387, -77.4336)
+MONROE_PARK = (37.5420, -77.4380)      # ~500 m away
+SHORT_PUMP = (37.6504, -77.6128)
+
+
+def _grid():
+    grid = ClusterGrid()
+    grid.load([
+        (1, *CAPITOL, "Food"),
+        (2, *MONROE_PARK, "Retail"),
+        (3, *SHORT_PUMP, "Food"),
+        (4, None, None, "Food"),
+    ])
+    return grid
+
+
+def test_zoomed_out_merges_and_zoomed_in_splits():
+    grid = _grid()
+    assert [cluster["count"] for cluster in grid.clusters(*RICHMOND, zoom=3)] == [3]
+    city = grid.clusters(*RICHMOND, zoom=12)
+    assert sorted(cluster["count"] for cluster in city) == [1, 2]
+    downtown = next(cluster for cluster in city if cluster["count"] == 2)
+    assert downtown["lat"] == pytest.approx((CAPITOL[0] + MONROE_PARK[0]) / 2)
+    assert next(cluster for cluster in city if cluster["count"] == 1)["id"] == 3
+    assert sorted(cluster["id"] for cluster in grid.clusters(*RICHMOND, zoom=15)) == [1, 2, 3]
+    # A viewport only sees the cells it overlaps
+    assert [cluster["id"] for cluster in grid.clusters(37.6, -77.7, 37.7, -77.6, zoom=12)] == [3]
+
+
+def test_category_filter_uses_per_category_totals():
+    grid = _grid()
+    city = grid.clusters(*RICHMOND, zoom=12, category="Food")
+    assert sorted(cluster["id"] for cluster in city) == [1, 3]
+    assert grid.clusters(*RICHMOND, zoom=12, category="Services") == []
+
+
+def test_incremental_moves_match_a_rebuild():
+    grid = _grid()
+    grid.add(3, *CAPITOL, "Food")        # move Short Pump downtown
+    grid.add(5, *SHORT_PUMP, "Services")
+    grid.remove(2)
+    rebuilt = ClusterGrid()
+    rebuilt.load([(1, *CAPITOL, "Food"), (3, *CAPITOL, "Food"), (5, *SHORT_PUMP, "Services")])
+    for zoom in (0, 8, 12, 15):
+        moved, fresh = grid.clusters(*RICHMOND, zoom=zoom), rebuilt.clusters(*RICHMOND, zoom=zoom)
+        assert [(c["count"], c.get("id")) for c in moved] == [(c["count"], c.get("id")) for c in fresh]
+        assert [c["lat"] for c in moved] == pytest.approx([c["lat"] for c in fresh])
+    grid.remove(1)
+    grid.remove(3)
+    grid.remove(5)
+    assert len(grid) == 0 and grid.clusters(*RICHMOND, zoom=0) == []
+
+
+def test_shared_grid_follows_catalog_changes(temp_db):
+    first_id = queries.insert_business("Capitol Cafe", "Food", "d", latitude=CAPITOL[0], longitude=CAPITOL[1], yelp_id="y1")
+    assert [cluster["id"] for cluster in clustering.get_clusters(*RICHMOND, zoom=12)] == [first_id]
+
+    # Writes through queries.py move the business in place
+    second_id = queries.insert_business("Monroe Park Books", "Retail", "d", yelp_id="y2")
+    queries.update_business(second_id, latitude=MONROE_PARK[0], longitude=MONROE_PARK[1])
+    assert [cluster["count"] for cluster in clustering.get_clusters(*RICHMOND, zoom=12)] == [2]
+
+    # Writes from elsewhere (another process) are caught by the location version
+    conn = db.get_connection()
+    conn.execute("UPDATE businesses SET latitude = ?, longitude = ? WHERE id = ?", (*SHORT_PUMP, first_id))
+    conn.commit()
+    conn.close()
+    clustering._grid_state["checked_at"] = 0.0
+    assert sorted(cluster["id"] for cluster in clustering.get_clusters(*RICHMOND, zoom=12)) == [first_id, second_id]
@@ -0,0 +1,150 @@
+"""
+Connection pool: reuse outside Flask, one connection per request inside Flask.
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from src.database import db, queries
+
+
+def test_connections_are_reused_outside_flask(temp_db):
+    first = db.get_connection()
+    first.close()
+    second = db.get_connection()
+    second.close()
+    assert first is second
+
+    queries.get_all_businesses()
+    stats = db.get_pool_stats()
+    assert stats["in_use"] == 0
+    assert stats["open"] == 1
+    assert stats["checkouts"] >= 3
+    assert stats["avg_checkout_ms"] >= 0
+
+
+def test_nested_checkouts_get_distinct_connections(temp_db):
+    outer = db.get_connection()
+    inner = db.get_connection()
+    assert outer is not inner
+    inner.close()
+    outer.close()
+    assert db.get_pool_stats()["in_use"] == 0
+
+
+def test_overflow_connections_are_closed_on_release(temp_db):
+    pool = db.ConnectionPool(temp_db, size=1, max_overflow=1, timeout=0.05)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert pool.stats()["open"] == 2
+    second.close()
+    first.close()
+    assert pool.stats()["open"] == 1
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out(temp_db):
+    pool = db.ConnectionPool(temp_db, size=1, max_overflow=0, timeout=0.05)
+    held = pool.acquire()
+    try:
+        pool.acquire()
+        raised = False
+    except TimeoutError:
+        raised = True
+    held.close()
+    pool.close_all()
+    assert raised
+
+
+def test_release_rolls_back_uncommitted_work(temp_db):
+    connection = db.get_connection()
+    connection.execute("INSERT INTO deals (business_id, description) VALUES (1, 'dangling')")
+    connection.close()
+    connection = db.get_connection()
+    count = connection.execute("SELECT COUNT(*) FROM deals").fetchone()[0]
+    connection.close()
+    assert count == 0
+
+
+def test_double_close_releases_once(temp_db):
+    pool = db.ConnectionPool(temp_db, size=2, max_overflow=0, timeout=0.05)
+    connection = pool.acquire()
+    connection.close()
+    connection.close()
+    assert (pool.stats()["in_use"], pool.stats()["idle"]) == (0, 1)
+    # Handed out once, not twice
+    assert pool.acquire() is connection
+    assert pool.acquire() is not connection
+    pool.close_all()
+
+
+def test_raising_helpers_do_not_leak_connections(temp_db):
+    business_id = queries.insert_business("Spot", "Food", "d")
+    for _ in range(db.POOL_SIZE * 3):
+        with pytest.raises(sqlite3.Error):
+            # A dict cannot be bound as a parameter
+            queries.update_business(business_id, description={"not": "a string"})
+    assert db.get_pool_stats()["in_use"] == 0
+    assert queries.get_meta("missing", "default") == "default"
+
+
+def test_flask_request_shares_one_connection(temp_db):
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.teardown_appcontext(db.release_request_connection)
+    seen = []
+
+    @app.route("/probe")
+    def probe():
+        seen.append(db.get_connection())
+        queries.get_all_businesses()
+        queries.get_categories()
+        seen.append(db.get_connection())
+        return "ok"
+
+    before = db.get_pool_stats()["checkouts"]
+    response = app.test_client().get("/probe")
+    assert response.status_code == 200
+    assert seen[0] is seen[1]
+    stats = db.get_pool_stats()
+    assert stats["checkouts"] - before == 1
+    assert stats["in_use"] == 0
+
+
+def test_pool_is_thread_safe(temp_db):
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                queries.get_all_businesses()
+        except Exception as error:  # pragma: no cover - surfaced below
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert db.get_pool_stats()["in_use"] == 0
+
+
+def test_tuned_profile_is_applied_to_new_connections(temp_db):
+    connection = db.get_connection()
+    journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+    busy_timeout = connection.execute("PRAGMA busy_timeout").fetchone()[0]
+    connection.close()
+    assert journal_mode == "wal"
+    assert busy_timeout == 5000
+
+
+def test_legacy_profile_keeps_sqlite_defaults(temp_db):
+    pool = db.ConnectionPool(temp_db, profile="legacy")
+    connection = pool.acquire()
+    cache_size = connection.execute("PRAGMA cache_size").fetchone()[0]
+    connection.close()
+    pool.close_all()
+    assert cache_size == -2000
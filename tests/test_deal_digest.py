@@ -0,0 +1,150 @@
+"""
+Deal digest: inverted index, watermark, opt-outs and resuming after a full outbox.
+"""
+import json
+import re
+
+import pytest
+
+from src.database import db, queries
+from src.logic import deal_digest, email_outbox, email_sender, jobs
+from src.logic.email_transport import LocalTransport
+
+
+@pytest.fixture
+def digest_db(temp_db, monkeypatch):
+    """Three businesses and four users; the local transport collects the digests."""
+    transport = LocalTransport()
+    monkeypatch.setattr(email_sender, "EMAIL_TRANSPORT", "local")
+    monkeypatch.setitem(email_sender._transport_state, "transport", transport)
+    monkeypatch.setattr(email_outbox, "start_email_workers", lambda transport: [])
+    conn = db.get_connection()
+    for business_id in (1, 2, 3):
+        conn.execute(
+            "INSERT INTO businesses (id, name, category, description) VALUES (?, ?, 'Food', 'd')",
+            (business_id, f"Spot {business_id}")
+        )
+    users = [
+        (1, "ann", 1, None),
+        (2, "bo", 1, json.dumps({"deal_notifications": False})),
+        (3, "cy", 0, None),
+        (4, "di", 1, json.dumps({"profile_visibility": "public"})),
+    ]
+    for user_id, username, verified, preferences in users:
+        conn.execute(
+            "INSERT INTO users (id, username, email, password_hash, email_verified, user_preferences) VALUES (?, ?, ?, 'x', ?, ?)",
+            (user_id, username, f"{username}@example.com", verified, preferences)
+        )
+    for user_id, business_id in ((1, 1), (1, 2), (2, 1), (3, 1), (4, 2), (4, 3)):
+        conn.execute("INSERT INTO favorites (user_id, business_id) VALUES (?, ?)", (user_id, business_id))
+    conn.execute("INSERT INTO deals (business_id, description) VALUES (1, 'old deal')")
+    conn.commit()
+    conn.close()
+    return transport
+
+
+def _add_deal(business_id, description):
+    conn = db.get_connection()
+    conn.execute("INSERT INTO deals (business_id, description) VALUES (?, ?)", (business_id, description))
+    conn.commit()
+    conn.close()
+
+
+def test_interest_index_merges_in_user_order():
+    index = deal_digest.build_interest_index(iter([(1, 2), (1, 5), (2, 1), (2, 5)]))
+    assert {business_id: list(user_ids) for business_id, user_ids in index.items()} == {1: [2, 5], 2: [1, 5]}
+    deals = {1: ["a"], 2: ["b", "c"]}
+    assert list(deal_digest.iter_user_deals(index, deals)) == [(1, ["b", "c"]), (2, ["a"]), (5, ["a", "b", "c"])]
+    assert list(deal_digest.iter_user_deals(index, deals, start_user_id=2)) == [(2, ["a"]), (5, ["a", "b", "c"])]
+
+
+def test_one_digest_per_user_for_new_deals_only(digest_db):
+    # The first run only sets the watermark, so existing deals are not sent
+    assert deal_digest.run_deal_digest()["through_deal_id"] == 1
+    _add_deal(1, "free coffee")
+    _add_deal(2, "half-price pizza")
+    _add_deal(2, "kids eat free")
+
+    counts = deal_digest.run_deal_digest()
+    assert counts == {"deals": 3, "users": 4, "emailed": 2, "skipped": 2, "through_deal_id": 4}
+    email_outbox.process_outbox(digest_db)
+    assert digest_db.calls == 1
+    by_recipient = {message["to_email"]: message for message in digest_db.sent}
+    # bo opted out and cy is not verified
+    assert set(by_recipient) == {"ann@example.com", "di@example.com"}
+    assert by_recipient["ann@example.com"]["subject"] == "3 new deals at your favorite Richmond spots"
+    assert "- Spot 1: free coffee\n- Spot 2: half-price pizza\n- Spot 2: kids eat free" in by_recipient["ann@example.com"]["body"]
+    assert "free coffee" not in by_recipient["di@example.com"]["body"]
+    assert "old deal" not in by_recipient["ann@example.com"]["body"]
+
+    assert deal_digest.run_deal_digest()["deals"] == 0
+
+
+def test_full_outbox_pauses_and_resumes_without_duplicates(digest_db, monkeypatch):
+    deal_digest.run_deal_digest()
+    _add_deal(2, "half-price pizza")
+    monkeypatch.setattr(email_outbox, "MAX_PENDING", 1)
+    with pytest.raises(jobs.RetryLater):
+        deal_digest.run_deal_digest(chunk_size=1)
+    assert json.loads(queries.get_meta(deal_digest.PROGRESS_KEY)) == {"through_deal_id": 2, "next_user_id": 4}
+    email_outbox.process_outbox(digest_db)
+    # A deal added meanwhile waits for the next run
+    _add_deal(3, "late deal")
+    counts = deal_digest.run_deal_digest(chunk_size=1)
+    assert (counts["emailed"], counts["through_deal_id"]) == (1, 2)
+    email_outbox.process_outbox(digest_db)
+    assert [message["to_email"] for message in digest_db.sent] == ["ann@example.com", "di@example.com"]
+    assert deal_digest.run_deal_digest()["deals"] == 1
+
+
+def test_invalid_addresses_are_skipped_without_pausing(digest_db):
+    deal_digest.run_deal_digest()
+    conn = db.get_connection()
+    conn.execute("UPDATE users SET email = 'di@localhost' WHERE id = 4")
+    conn.commit()
+    conn.close()
+    _add_deal(2, "half-price pizza")
+    counts = deal_digest.run_deal_digest()
+    assert (counts["users"], counts["emailed"], counts["skipped"]) == (2, 1, 1)
+    assert queries.get_meta(deal_digest.PROGRESS_KEY) == ""
+
+
+def test_saving_other_settings_keeps_the_deal_opt_out(digest_db):
+    from web.app import app
+
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session.update(user_id=2, email="bo@example.com")
+    client.post("/save-privacy", data={"profile_visibility": "private"})
+    client.post("/save-preferences", data={"favorite_categories": ["Food"], "default_sort": "rating_high"})
+    preferences = queries.get_user_preferences(2)
+    assert preferences == {
+        "deal_notifications": False, "profile_visibility": "private",
+        "favorite_categories": ["Food"], "default_sort": "rating_high",
+    }
+    assert not deal_digest.wants_deal_emails(preferences)
+    # The settings page shows the saved opt-out instead of a pre-ticked box
+    assert re.search(r'name="deal_notifications"\s+style', client.get("/settings").get_data(as_text=True))
+
+
+def test_paused_digest_job_keeps_its_attempts(digest_db, monkeypatch):
+    deal_digest.run_deal_digest()
+    _add_deal(2, "half-price pizza")
+    monkeypatch.setattr(email_outbox, "MAX_PENDING", 1)
+    monkeypatch.setitem(jobs._job_types["deal_digest"], "handler", lambda payload: deal_digest.run_deal_digest(chunk_size=1))
+    job_id = jobs.enqueue("deal_digest")
+    for _ in range(3):
+        assert jobs.run_pending(names=["deal_digest"]) == {"run": 1, "succeeded": 0, "retrying": 1, "failed": 0}
+        conn = db.get_connection()
+        conn.execute("UPDATE jobs SET run_at = datetime('now') WHERE id = ?", (job_id,))
+        conn.commit()
+        conn.close()
+    conn = db.get_connection()
+    job = dict(conn.execute("SELECT status, attempts, last_error FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    conn.close()
+    assert (job["status"], job["attempts"]) == ("queued", 0)
+    assert job["last_error"].startswith("RetryLater: Deal digest paused at user #4")
+    email_outbox.process_outbox(digest_db)
+    assert jobs.run_pending(names=["deal_digest"])["succeeded"] == 1
+    email_outbox.process_outbox(digest_db)
+    assert [message["to_email"] for message in digest_db.sent] == ["ann@example.com", "di@example.com"]
@@ -0,0 +1,119 @@
+"""
+SQL-windowed listings return what the old load-everything-and-slice path did.
+
+Each reference below is the Python the routes used before filtering, sorting
+and paging moved into SQL: load the rows, filter, sort, then slice 12 at a time.
+"""
+import pytest
+
+from src.database import db, queries
+
+PER_PAGE = 12
+CATEGORIES = ["Food", "Retail", "Services"]
+
+
+@pytest.fixture
+def catalog(temp_db):
+    """41 businesses: names out of id order, shared ratings, distinct review counts."""
+    connection = db.get_connection()
+    connection.executemany(
+        "INSERT INTO businesses (name, category, description, average_rating, total_reviews) VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                f"{'Corner Cafe' if i % 4 == 0 else 'Shop'} {(i * 29) % 41:02d}",
+                CATEGORIES[i % 3],
+                f"Spot number {i}",
+                [2.0, 3.5, 4.0, 4.5, 5.0][i % 5],
+                (i * 17) % 97,
+            )
+            for i in range(41)
+        ],
+    )
+    connection.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'demo', 'demo@example.com', 'x')")
+    connection.commit()
+    connection.close()
+    return temp_db
+
+
+def _old_directory(category=None, search=None, sort_by_option="name", min_rating=None):
+    """The directory route before user-005: every row, filtered and sorted in Python."""
+    businesses = queries.get_all_businesses()
+    if search:
+        # search_businesses_by_name(): LIKE on the name, ORDER BY name
+        businesses = sorted((b for b in businesses if search.lower() in b["name"].lower()), key=lambda b: b["name"])
+    if category:
+        businesses = [b for b in businesses if b["category"] == category]
+    if min_rating is not None:
+        businesses = [b for b in businesses if b["average_rating"] >= min_rating]
+    if search:
+        return businesses
+    if sort_by_option == "rating_high":
+        return sorted(businesses, key=lambda b: (b["average_rating"], b["name"]), reverse=True)
+    if sort_by_option == "rating_low":
+        return sorted(businesses, key=lambda b: (b["average_rating"], b["name"]))
+    if sort_by_option == "reviews":
+        return sorted(businesses, key=lambda b: (b["total_reviews"], b["name"]), reverse=True)
+    if sort_by_option == "reviews_low":
+        return sorted(businesses, key=lambda b: (b["total_reviews"], b["name"]))
+    return sorted(businesses, key=lambda b: b["name"].lower())
+
+
+def _pages(rows):
+    return [[b["id"] for b in rows[start:start + PER_PAGE]] for start in range(0, len(rows), PER_PAGE)]
+
+
+def _sql_pages(fetch_page, **kwargs):
+    """Every page by number, plus the same listing walked with cursors."""
+    first = fetch_page(per_page=PER_PAGE, **kwargs)
+    numbered = [[b["id"] for b in fetch_page(per_page=PER_PAGE, page=page, **kwargs)["items"]]
+                for page in range(1, first["total_pages"] + 1)]
+    walked, result = [[b["id"] for b in first["items"]]], first
+    while result["next_cursor"]:
+        result = fetch_page(per_page=PER_PAGE, cursor=result["next_cursor"], **kwargs)
+        walked.append([b["id"] for b in result["items"]])
+    assert walked == numbered
+    assert first["total_items"] == sum(len(page) for page in numbered)
+    return numbered
+
+
+@pytest.mark.parametrize("category", [None, "Food"])
+@pytest.mark.parametrize("sort_by_option", ["name", "rating_high", "rating_low", "reviews", "reviews_low"])
+@pytest.mark.parametrize("min_rating", [None, 4.0])
+def test_directory_pages_match_python_path(catalog, category, sort_by_option, min_rating):
+    expected = _pages(_old_directory(category, sort_by_option=sort_by_option, min_rating=min_rating))
+    assert _sql_pages(queries.get_directory_page, category_filter=category, sort_by_option=sort_by_option,
+                      min_rating=min_rating) == expected
+
+
+@pytest.mark.parametrize("category", [None, "Retail"])
+@pytest.mark.parametrize("fulltext", [True, False])
+def test_directory_search_pages_match_python_path(catalog, monkeypatch, category, fulltext):
+    if not fulltext:
+        monkeypatch.setattr(queries, "fulltext_available", lambda: False)
+    expected = _pages(_old_directory(category, search="cafe"))
+    assert expected
+    assert _sql_pages(queries.get_directory_page, category_filter=category, search_query="cafe") == expected
+
+
+def test_last_partial_page_and_out_of_range_page(catalog):
+    rows = _old_directory(sort_by_option="reviews")
+    last = queries.get_directory_page(sort_by_option="reviews", page=99, per_page=PER_PAGE)
+    assert (last["page"], last["total_pages"], last["total_items"]) == (4, 4, 41)
+    assert [b["id"] for b in last["items"]] == [b["id"] for b in rows[36:]]
+    assert last["next_cursor"] is None
+
+
+@pytest.mark.parametrize("max_items", [300, 30])
+def test_trending_pages_match_python_path(catalog, max_items):
+    expected = _pages(queries.get_trending_businesses(limit=max_items))
+    assert _sql_pages(queries.get_trending_page, max_items=max_items) == expected
+
+
+@pytest.mark.parametrize("max_items", [300, 20])
+def test_recommended_pages_match_python_path(catalog, max_items):
+    for business_id in (1, 4, 7):
+        queries.add_favorite(1, business_id)
+    # Capped from the full list: with a small limit the old fill-up query could
+    # return fewer rows, because it re-read favorite-category rows it then skipped
+    expected = _pages(queries.get_recommended_businesses(1, limit=300)[:max_items])
+    assert _sql_pages(lambda **kwargs: queries.get_recommended_page(1, **kwargs), max_items=max_items) == expected
@@ -0,0 +1,233 @@
+"""
+Email outbox: queueing, the worker pool, retries and dead letters, via the local transport.
+"""
+import threading
+import time
+
+import pytest
+
+from src.database import db, queries
+from src.logic import email_outbox, email_sender
+from src.logic.email_transport import EmailSendError, LocalTransport, SendGridTransport
+
+
+@pytest.fixture
+def local_email(temp_db, monkeypatch):
+    """Local transport selected, workers not started (tests drain the outbox themselves), no backoff."""
+    transport = LocalTransport()
+    monkeypatch.setattr(email_sender, "EMAIL_TRANSPORT", "local")
+    monkeypatch.setitem(email_sender._transport_state, "transport", transport)
+    monkeypatch.setattr(email_outbox, "start_email_workers", lambda transport: [])
+    monkeypatch.setattr(email_outbox, "backoff_delay", lambda attempt, base, cap: 0)
+    return transport
+
+
+def _outbox():
+    conn = db.get_connection()
+    rows = conn.execute("SELECT * FROM email_outbox ORDER BY id").fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+class FlakyTransport:
+    """Fails each recipient with its queued errors, in order, then delivers."""
+
+    def __init__(self, errors):
+        self.errors = {to_email: list(queued) for to_email, queued in errors.items()}
+        self.sent = []
+
+    def send(self, message):
+        queued = self.errors.get(message["to_email"])
+        if queued:
+            raise queued.pop(0)
+        self.sent.append(message["to_email"])
+
+
+def test_emails_are_queued_then_sent(local_email):
+    assert email_sender.send_verification_email("new@example.com", "123456") == (True, None)
+    assert email_sender.send_password_reset_email("old@example.com", "https://example.com/reset") == (True, None)
+    assert local_email.sent == []
+    assert [email["status"] for email in _outbox()] == ["queued", "queued"]
+
+    assert email_outbox.process_outbox(local_email) == {"sent": 2, "retrying": 0, "dead": 0, "calls": 2}
+    assert [message["to_email"] for message in local_email.sent] == ["new@example.com", "old@example.com"]
+    assert "123456" in local_email.sent[0]["body"]
+    sent = _outbox()
+    assert all(email["status"] == "sent" and email["body"] == "" for email in sent)
+    assert all(email["latency_ms"] >= 0 and email["send_ms"] >= 0 for email in sent)
+    stats = email_outbox.get_outbox_stats()
+    assert (stats["queued"], stats["sent"], stats["dead"]) == (0, 2, 0)
+    assert stats["avg_latency_ms"] is not None
+
+
+def test_failures_retry_then_dead_letter(local_email, monkeypatch):
+    monkeypatch.setattr(email_outbox, "MAX_ATTEMPTS", 3)
+    email_outbox.queue_email("flaky@example.com", "Hi", "body")
+    email_outbox.queue_email("bounced@example.com", "Hi", "body")
+    transport = FlakyTransport({
+        "flaky@example.com": [EmailSendError("429")],
+        "bounced@example.com": [EmailSendError("400 bad address", retryable=False)],
+    })
+    assert email_outbox.process_outbox(transport) == {"sent": 1, "retrying": 1, "dead": 1, "calls": 3}
+    assert transport.sent == ["flaky@example.com"]
+    dead = [email for email in _outbox() if email["status"] == "dead"]
+    assert [(email["to_email"], email["last_error"]) for email in dead] == [("bounced@example.com", "400 bad address")]
+
+    # Temporary errors dead-letter once attempts run out; requeueing gives fresh attempts
+    email_outbox.queue_email("down@example.com", "Hi", "body")
+    transport = FlakyTransport({"down@example.com": [EmailSendError("503")] * 3})
+    assert email_outbox.process_outbox(transport) == {"sent": 0, "retrying": 2, "dead": 1, "calls": 3}
+    assert email_outbox.requeue_dead_emails() == 2
+    assert email_outbox.process_outbox(transport) == {"sent": 2, "retrying": 0, "dead": 0, "calls": 2}
+
+
+def test_full_outbox_refuses_new_mail(local_email, monkeypatch):
+    monkeypatch.setattr(email_outbox, "MAX_PENDING", 2)
+    assert email_sender.send_verification_email("a@example.com", "1")[0]
+    assert email_sender.send_verification_email("b@example.com", "2")[0]
+    ok, error = email_sender.send_verification_email("c@example.com", "3")
+    assert not ok and "try again" in error
+    email_outbox.process_outbox(local_email)
+    assert email_sender.send_verification_email("c@example.com", "3") == (True, None)
+
+
+def test_worker_pool_shares_one_transport(temp_db):
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+
+    class CountingTransport(LocalTransport):
+        def send(self, message):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            super().send(message)
+            with lock:
+                in_flight["now"] -= 1
+
+    transport = CountingTransport(delay_seconds=0.01)
+    for index in range(12):
+        email_outbox.queue_email(f"user{index}@example.com", "Hi", "body")
+    email_outbox.start_email_workers(transport, workers=3, poll_seconds=0.05)
+    try:
+        deadline = time.monotonic() + 5
+        while len(transport.sent) < 12 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        email_outbox.stop_email_workers()
+    assert sorted(message["to_email"] for message in transport.sent) == sorted(f"user{index}@example.com" for index in range(12))
+    assert in_flight["peak"] <= 3
+    assert queries.get_email_outbox_stats()["sent"] == 12
+
+
+def test_batches_group_by_template(local_email):
+    email_sender.register_email_template("deal_alert", "New at {{business}}", "Hi {{username}}, {{business}}: {{deal}}")
+    email_sender.register_email_template("welcome", "Welcome {{username}}", "Hello {{username}}")
+    recipients = [(f"user{index}@example.com", {"username": f"user{index}", "business": "Cafe", "deal": "2 for 1"}) for index in range(2500)]
+    assert email_sender.send_batch_email("deal_alert", recipients) == (2500, None)
+    assert email_sender.send_batch_email("welcome", [("new@example.com", {"username": "new"})]) == (1, None)
+    assert email_sender.send_verification_email("verify@example.com", "123456") == (True, None)
+    assert email_sender.send_batch_email("missing", recipients)[0] == 0
+
+    counts = email_outbox.process_outbox(local_email)
+    # 2500 deal alerts in 1000 + 1000 + 500, then one welcome and one plain email
+    assert counts == {"sent": 2502, "retrying": 0, "dead": 0, "calls": 5}
+    assert local_email.calls == 5
+    by_recipient = {message["to_email"]: message for message in local_email.sent}
+    assert by_recipient["user7@example.com"] == {
+        "to_email": "user7@example.com", "subject": "New at Cafe", "body": "Hi user7, Cafe: 2 for 1"
+    }
+    assert by_recipient["new@example.com"]["subject"] == "Welcome new"
+    stats = email_outbox.get_outbox_stats()
+    assert (stats["recent_sent"], stats["recent_http_calls"]) == (2502, 5)
+    assert stats["emails_per_call"] == 500.4
+    assert {email["batch_size"] for email in _outbox() if email["template"] == "deal_alert"} == {1000, 500}
+
+
+def test_failed_batch_retries_together(local_email):
+    email_sender.register_email_template("deal_alert", "New deal", "Hi {{username}}")
+    email_sender.send_batch_email("deal_alert", [(f"user{index}@example.com", {"username": index}) for index in range(3)])
+
+    class DownTransport:
+        def send_batch(self, template, recipients):
+            raise EmailSendError("503")
+
+    assert email_outbox.process_outbox(DownTransport(), limit=3) == {"sent": 0, "retrying": 3, "dead": 0, "calls": 1}
+    assert email_outbox.process_outbox(local_email) == {"sent": 3, "retrying": 0, "dead": 0, "calls": 1}
+
+
+def test_rejected_batch_is_split_to_find_the_bad_recipient(local_email):
+    email_sender.register_email_template("deal_alert", "New deal", "Hi {{username}}")
+    email_sender.send_batch_email("deal_alert", [(f"user{index}@example.com", {"username": index}) for index in range(8)])
+
+    class PickyTransport(LocalTransport):
+        """Rejects any call that includes user5, the way SendGrid rejects a batch with one bad address."""
+
+        def send_batch(self, template, recipients):
+            if any(to_email == "user5@example.com" for to_email, _ in recipients):
+                raise EmailSendError("SendGrid 400: bad address", retryable=False, status_code=400)
+            super().send_batch(template, recipients)
+
+    transport = PickyTransport()
+    # 8 fail -> 4 sent, 4 fail -> 2 fail -> user4 sent, user5 dead; 2 sent
+    assert email_outbox.process_outbox(transport) == {"sent": 7, "retrying": 0, "dead": 1, "calls": 7}
+    assert transport.calls == 3
+    dead = [email["to_email"] for email in _outbox() if email["status"] == "dead"]
+    assert dead == ["user5@example.com"]
+
+
+def test_account_errors_do_not_split_batches(local_email):
+    email_sender.register_email_template("deal_alert", "New deal", "Hi {{username}}")
+    email_sender.send_batch_email("deal_alert", [(f"user{index}@example.com", {"username": index}) for index in range(4)])
+
+    class RevokedKeyTransport:
+        def send_batch(self, template, recipients):
+            raise EmailSendError("SendGrid 401: unauthorized", retryable=False, status_code=401)
+
+    assert email_outbox.process_outbox(RevokedKeyTransport()) == {"sent": 0, "retrying": 0, "dead": 4, "calls": 1}
+
+
+def test_invalid_addresses_are_not_queued(local_email):
+    assert email_sender.send_verification_email("not-an-address", "123456") == (False, "Invalid email address")
+    email_sender.register_email_template("welcome", "Welcome {{username}}", "Hello {{username}}")
+    queued, error = email_sender.send_batch_email("welcome", [
+        ("a@example.com", {"username": "a"}), ("b@example", {"username": "b"}), (" c@example.com ", {"username": "c"}),
+    ])
+    assert queued == 2 and "1 emails have an invalid address" in error
+    assert [email["to_email"] for email in _outbox()] == ["a@example.com", "c@example.com"]
+
+
+def test_sendgrid_batch_uses_personalizations(monkeypatch):
+    transport = SendGridTransport("test-key", "from@example.com")
+    requests = []
+
+    class Response:
+        status_code = 202
+
+    monkeypatch.setattr(transport._client, "send", lambda request_body: requests.append(request_body) or Response())
+    transport.send_batch({"subject": "Hi {{name}}", "body": "Deal for {{name}}"}, [("a@example.com", {"name": "Ann"}), ("b@example.com", {"name": "Bo"})])
+    assert transport.calls == 1
+    body = requests[0]
+    assert body["personalizations"] == [
+        {"to": [{"email": "a@example.com"}], "substitutions": {"{{name}}": "Ann"}},
+        {"to": [{"email": "b@example.com"}], "substitutions": {"{{name}}": "Bo"}},
+    ]
+    assert body["content"] == [{"type": "text/plain", "value": "Deal for {{name}}"}]
+    with pytest.raises(ValueError):
+        transport.send_batch({"subject": "s", "body": "b"}, [("x@example.com", {})] * 1001)
+
+
+def test_sendgrid_errors_are_classified(monkeypatch):
+    transport = SendGridTransport("test-key", "from@example.com")
+
+    class HTTPError(Exception):
+        def __init__(self, status_code):
+            super().__init__(f"HTTP {status_code}")
+            self.status_code = status_code
+
+    for status_code, retryable in ((429, True), (503, True), (400, False), (401, False)):
+        def send(mail, status_code=status_code):
+            raise HTTPError(status_code)
+        monkeypatch.setattr(transport._client, "send", send)
+        with pytest.raises(EmailSendError) as raised:
+            transport.send({"to_email": "to@example.com", "subject": "Hi", "body": "body"})
+        assert (raised.value.retryable, raised.value.status_code) == (retryable, status_code)
@@ -0,0 +1,59 @@
+"""
+Directory facets: counts per filter option and the matching filters.
+"""
+import pytest
+
+from src.database import db, queries
+
+
+@pytest.fixture
+def catalog(temp_db):
+    rows = [
+        ("Pizza Palace", "Food", "$", 4.6),
+        ("Taco Stand", "Food", "$", 3.5),
+        ("Steak House", "Food", "$$$", 4.1),
+        ("Book Nook", "Retail", "$$", 4.8),
+        ("Quick Clean", "Services", "", 2.9),
+    ]
+    ids = {}
+    for index, (name, category, price, rating) in enumerate(rows):
+        ids[name] = queries.insert_business(name, category, "d", rating, 10, price_range=price, yelp_id=f"y{index}")
+    conn = db.get_connection()
+    conn.executemany("INSERT INTO deals (business_id, description) VALUES (?, 'deal')",
+                     [(ids["Pizza Palace"],), (ids["Book Nook"],), (ids["Book Nook"],)])
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def _counts(facet):
+    return {entry["value"]: entry["count"] for entry in facet}
+
+
+def test_unfiltered_counts(catalog):
+    facets = queries.get_directory_facets()
+    assert _counts(facets["categories"]) == {"Food": 3, "Retail": 1, "Services": 1}
+    assert _counts(facets["price_ranges"]) == {"$": 2, "$$": 1, "$$$": 1}
+    assert _counts(facets["ratings"]) == {4.5: 2, 4.0: 3, 3.0: 4}
+    assert facets["has_deals"] == 2
+    assert facets["category_total"] == facets["total"] == 5
+
+
+def test_each_facet_ignores_its_own_filter(catalog):
+    facets = queries.get_directory_facets(category_filter="Food", min_rating=4.0)
+    # Categories are counted with only the rating filter applied...
+    assert _counts(facets["categories"]) == {"Food": 2, "Retail": 1}
+    # ...and ratings with only the category filter applied
+    assert _counts(facets["ratings"]) == {4.5: 1, 4.0: 2, 3.0: 3}
+    assert _counts(facets["price_ranges"]) == {"$": 1, "$$$": 1}
+    assert facets["has_deals"] == 1
+    assert facets["total"] == 2
+
+
+def test_facet_filters_apply_to_the_listing(catalog):
+    page = queries.get_directory_page(category_filter="Food", price_range="$", has_deals=True)
+    assert [b["name"] for b in page["items"]] == ["Pizza Palace"]
+    page = queries.get_directory_page(min_rating=4.0, sort_by_option="rating_high")
+    assert [b["name"] for b in page["items"]] == ["Book Nook", "Pizza Palace", "Steak House"]
+    facets = queries.get_directory_facets(search_query="pizza")
+    assert facets["total"] == 1 and _counts(facets["categories"]) == {"Food": 1}
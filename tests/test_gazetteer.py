@@ -0,0 +1,95 @@
+"""
+Offline gazetteer: packed file lookups and the no-API-key geocoding fallback.
+"""
+import importlib.util
+import os
+
+import pytest
+
+from src.logic import gazetteer, geocoding
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ZIPS = [(23220, 37.5496, -77.4597), (23219, 37.5407, -77.4360)]
+STREETS = [
+    ("e broad st", 1, 999, 37.5450, -77.4400, 37.5400, -77.4300),
+    ("e broad st", 1000, 1999, 37.5400, -77.4300, 37.5350, -77.4200),
+]
+
+
+@pytest.fixture
+def small_gazetteer(tmp_path):
+    path = tmp_path / "test.gaz"
+    gazetteer.write_gazetteer(path, ZIPS, STREETS)
+    opened = gazetteer.Gazetteer(path)
+    yield opened
+    opened.close()
+
+
+def test_street_ranges_interpolate_then_fall_back_to_zip(small_gazetteer):
+    assert small_gazetteer.zip_centroid(23219) == (37.5407, -77.436)
+    assert small_gazetteer.zip_centroid(23221) is None
+    assert small_gazetteer.street_position("e broad st", 1) == (37.545, -77.44)
+    assert small_gazetteer.street_position("e broad st", 1500) == pytest.approx((37.5375, -77.425), abs=1e-4)
+    assert small_gazetteer.street_position("e broad st", 5000) is None
+    assert small_gazetteer.street_position("w broad st", 10) is None
+
+    locate = lambda address: small_gazetteer.locate(geocoding.normalize_address(address))
+    assert locate("1 East Broad Street, Richmond, VA 23219") == (37.545, -77.44)
+    assert locate("12 Unknown Road, Richmond, VA 23220") == (37.5496, -77.4597)
+    assert locate("12 Unknown Road") is None
+
+
+def test_every_record_is_found_by_binary_search(tmp_path):
+    zips = [(23000 + 3 * number, 37.5, -77.4) for number in range(37)]
+    path = tmp_path / "many.gaz"
+    gazetteer.write_gazetteer(path, zips, [])
+    opened = gazetteer.Gazetteer(path)
+    try:
+        assert all(opened.zip_centroid(zip_code) == (37.5, -77.4) for zip_code, _, _ in zips)
+        assert not any(opened.zip_centroid(zip_code) for zip_code in (22999, 23001, 23200))
+    finally:
+        opened.close()
+
+
+def test_invalid_file_is_rejected(tmp_path):
+    path = tmp_path / "broken.gaz"
+    path.write_bytes(b"not a gazetteer file")
+    with pytest.raises(ValueError):
+        gazetteer.Gazetteer(path)
+
+
+def _build_script():
+    spec = importlib.util.spec_from_file_location("build_gazetteer", os.path.join(ROOT, "scripts", "build_gazetteer.py"))
+    build_script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(build_script)
+    return build_script
+
+
+def test_bundled_file_matches_sources(tmp_path):
+    build_script = _build_script()
+    rebuilt = tmp_path / "rebuilt.gaz"
+    build_script.build_gazetteer(rebuilt)
+    with open(gazetteer.GAZETTEER_PATH, "rb") as bundled:
+        assert bundled.read() == rebuilt.read_bytes(), "run scripts/build_gazetteer.py after editing the CSVs"
+
+
+def test_build_rejects_points_the_geocoder_would_reject(tmp_path):
+    (tmp_path / "richmond_zips.csv").write_text("zip,latitude,longitude\n23219,37.5407,-77.4360\n23236,37.4780,-77.5850\n")
+    (tmp_path / "richmond_streets.csv").write_text(
+        "street,from_number,to_number,from_latitude,from_longitude,to_latitude,to_longitude\n"
+    )
+    with pytest.raises(ValueError, match="23236"):
+        _build_script().build_gazetteer(tmp_path / "out.gaz", data_dir=str(tmp_path))
+
+
+def test_geocoding_falls_back_without_api_key(temp_db, monkeypatch):
+    monkeypatch.setattr(geocoding, "GOOGLE_MAPS_API_KEY", "")
+    coords = geocoding.geocode_address("500 East Broad Street, Richmond, VA 23219")
+    assert coords and geocoding.validate_coordinates(*coords)
+
+    results = geocoding.geocode_addresses({1: "500 E Broad St", 2: "1 Nowhere Ln"})
+    assert results[1] == (coords, geocoding.GEOCODE_APPROXIMATE)
+    assert results[2] == (None, geocoding.GEOCODE_SKIPPED)
+    # Approximate positions are never cached
+    assert geocoding._read_cache([geocoding.normalize_address("500 E Broad St, Richmond, VA")]) == {}
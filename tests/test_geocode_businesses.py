@@ -0,0 +1,100 @@
+"""
+Bulk geocoder: concurrent requests against a local stand-in geocoding
+server, retry on throttling, batched commits and checkpoint resume.
+"""
+import importlib.util
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.database import queries
+from src.logic import geocoding, throttle
+from src.logic.throttle import TokenBucket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("geocode_businesses", os.path.join(ROOT, "scripts", "geocode_businesses.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def stand_in_geocoder(monkeypatch):
+    """Local HTTP server speaking the Geocoding API: '<n> Main St' -> a Richmond point, first call throttled."""
+    requests_seen = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            address = parse_qs(urlparse(self.path).query)["address"][0]
+            with lock:
+                requests_seen.append(address)
+                first_request = len(requests_seen) == 1
+            if first_request:
+                self.send_response(429)
+                self.end_headers()
+                return
+            number = address.split()[0]
+            if "Main St" in address:
+                body = {"status": "OK", "results": [{"geometry": {"location": {"lat": 37.5 + int(number) / 10000, "lng": -77.4}}}]}
+            else:
+                body = {"status": "ZERO_RESULTS", "results": []}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(geocoding, "GEOCODING_API_URL", f"http://127.0.0.1:{server.server_port}/geocode/json")
+    monkeypatch.setattr(geocoding, "GOOGLE_MAPS_API_KEY", "test-key")
+    monkeypatch.setattr(throttle, "backoff_delay", lambda *args: 0)
+    yield requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_limits_rate_after_burst():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0, 0]
+    assert now[0] == pytest.approx(1.0)
+    assert not bucket.try_acquire()
+
+
+def test_bulk_run_resumes_from_checkpoint(temp_db, tmp_path, stand_in_geocoder):
+    for number in range(1, 8):
+        queries.insert_business(f"Shop {number}", "Retail", "d", address=f"{number} Main St", yelp_id=f"y{number}")
+    queries.insert_business("Lost Shop", "Retail", "d", address="1 Nowhere Rd", yelp_id="y8")
+    script = _load_script()
+    checkpoint = str(tmp_path / "checkpoint.json")
+
+    # Interrupted after two batches of three
+    first = script.geocode_businesses(workers=4, rate=1000, batch_size=3, checkpoint_path=checkpoint, max_batches=2)
+    assert first["processed"] == 6 and first["geocoded"] == 6
+    assert queries.count_businesses_missing_coordinates() == 2
+    with open(checkpoint) as checkpoint_file:
+        assert json.load(checkpoint_file)["last_id"] == 6
+
+    # The rerun only sends the remaining addresses
+    sent_before = len(stand_in_geocoder)
+    second = script.geocode_businesses(workers=4, rate=1000, batch_size=3, checkpoint_path=checkpoint)
+    assert second["processed"] == 2
+    assert (second["geocoded"], second["not_found"], second["failed"]) == (7, 1, 0)
+    assert sorted(stand_in_geocoder[sent_before:]) == ["1 Nowhere Rd, Richmond, VA", "7 Main St, Richmond, VA"]
+    # The throttled first request was retried, not counted as a failure
+    assert len(stand_in_geocoder) == 9
+    assert queries.get_business_by_id(7)["latitude"] == pytest.approx(37.5007)
@@ -0,0 +1,112 @@
+"""
+Geocode-on-write queue: triggers, leased claims and the worker pass.
+"""
+import pytest
+
+from src.database import db, queries
+from src.logic import geocode_worker, geocoding
+
+
+def _queued():
+    conn = db.get_connection()
+    rows = conn.execute("SELECT business_id, address FROM geocode_queue ORDER BY business_id").fetchall()
+    conn.close()
+    return [tuple(row) for row in rows]
+
+
+@pytest.fixture
+def fake_geocoder(temp_db, monkeypatch):
+    """geocode_addresses stand-in: 'Main St' addresses resolve, 'flaky' ones need a retry, others are unknown."""
+    sent = []
+
+    def geocode_addresses(addresses, **options):
+        sent.extend(addresses.values())
+        results = {}
+        for business_id, address in addresses.items():
+            if "Main St" in address:
+                results[business_id] = ((37.55, -77.45), geocoding.GEOCODE_FOUND)
+            elif "flaky" in address:
+                results[business_id] = (None, geocoding.GEOCODE_RETRY)
+            else:
+                results[business_id] = (None, geocoding.GEOCODE_NOT_FOUND)
+        return results
+
+    monkeypatch.setattr(geocoding, "geocode_addresses", geocode_addresses)
+    # Full jitter could draw a zero delay; pin retries to the base so they are never due at once
+    monkeypatch.setattr(geocode_worker, "backoff_delay", lambda attempt, base, cap: base)
+    return sent
+
+
+def test_triggers_queue_addresses_without_coordinates(temp_db):
+    placed = queries.insert_business("Placed", "Food", "d", address="1 Main St", latitude=37.5, longitude=-77.4, yelp_id="y1")
+    unplaced = queries.insert_business("Unplaced", "Food", "d", address="2 Main St", yelp_id="y2")
+    queries.insert_business("No Address", "Food", "d", yelp_id="y3")
+    assert _queued() == [(unplaced, "2 Main St")]
+
+    # Moving a placed business without new coordinates queues it; a sync that sends both does not
+    queries.update_business(placed, address="9 Main St")
+    queries.update_business(unplaced, address="3 Main St", latitude=37.51, longitude=-77.41)
+    assert _queued() == [(placed, "9 Main St"), (unplaced, "2 Main St")]
+
+    conn = db.get_connection()
+    conn.execute("DELETE FROM businesses WHERE id = ?", (placed,))
+    conn.commit()
+    conn.close()
+    assert _queued() == [(unplaced, "2 Main St")]
+
+
+def test_worker_pass_resolves_drops_and_retries(fake_geocoder):
+    found = queries.insert_business("Found", "Food", "d", address="5 Main St", yelp_id="y1")
+    unknown = queries.insert_business("Unknown", "Food", "d", address="1 Nowhere Rd", yelp_id="y2")
+    flaky = queries.insert_business("Flaky", "Food", "d", address="7 flaky Ave", yelp_id="y3")
+
+    counts = geocode_worker.process_geocode_queue()
+    assert counts == {"claimed": 3, "geocoded": 1, "approximate": 0, "dropped": 1, "retrying": 1, "waiting": 0}
+    assert queries.get_business_by_id(found)["latitude"] == 37.55
+    assert queries.get_business_by_id(unknown)["latitude"] is None
+    assert _queued() == [(flaky, "7 flaky Ave")]
+    assert queries.get_geocode_queue_stats() == {"pending": 1, "due": 0, "retrying": 1}
+
+    # The retry is scheduled in the future, so the next pass claims nothing
+    assert geocode_worker.process_geocode_queue()["claimed"] == 0
+    assert queries.claim_geocode_jobs() == []
+
+
+def test_stale_result_does_not_overwrite_new_address(fake_geocoder):
+    business_id = queries.insert_business("Mover", "Food", "d", address="5 Main St", yelp_id="y1")
+    job = queries.claim_geocode_jobs()[0]
+    queries.update_business(business_id, address="8 Main St")
+    assert queries.complete_geocode_jobs([(business_id, job["address"], 37.55, -77.45)]) == 0
+    assert _queued() == [(business_id, "8 Main St")]
+
+
+def test_failed_completion_rolls_back_and_releases_its_connection(temp_db):
+    first = queries.insert_business("First", "Food", "d", address="5 Main St", yelp_id="y1")
+    second = queries.insert_business("Second", "Food", "d", address="6 Main St", yelp_id="y2")
+    queries.claim_geocode_jobs()
+    # The first row is written before the malformed second one raises
+    with pytest.raises(ValueError):
+        queries.complete_geocode_jobs([(first, "5 Main St", 37.55, -77.45), (second, "6 Main St")])
+    assert db.get_pool_stats()["in_use"] == 0
+    assert queries.get_business_by_id(first)["latitude"] is None
+    assert _queued() == [(first, "5 Main St"), (second, "6 Main St")]
+    assert queries.complete_geocode_jobs([(first, "5 Main St", 37.55, -77.45)]) == 1
+
+
+def test_jobs_wait_without_api_key(temp_db, monkeypatch):
+    monkeypatch.setattr(geocoding, "GOOGLE_MAPS_API_KEY", "")
+    business_id = queries.insert_business("Waiting", "Food", "d", address="5 Main St", yelp_id="y1")
+    counts = geocode_worker.process_geocode_queue()
+    assert counts["waiting"] == 1
+    assert _queued() == [(business_id, "5 Main St")]
+    assert queries.get_geocode_queue_stats()["retrying"] == 0
+
+
+def test_offline_positions_stay_queued_for_a_precise_answer(temp_db, monkeypatch):
+    monkeypatch.setattr(geocoding, "GOOGLE_MAPS_API_KEY", "")
+    business_id = queries.insert_business("Offline", "Food", "d", address="500 E Broad St, Richmond, VA 23219", yelp_id="y1")
+    counts = geocode_worker.process_geocode_queue()
+    assert counts["approximate"] == 1
+    business = queries.get_business_by_id(business_id)
+    assert geocoding.validate_coordinates(business["latitude"], business["longitude"])
+    assert _queued() == [(business_id, "500 E Broad St, Richmond, VA 23219")]
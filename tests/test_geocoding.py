@@ -0,0 +1,74 @@
+"""
+Geocoding cache: address normalization, positive/negative entries and TTL.
+"""
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from src.database import db
+from src.logic import geocoding
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture
+def geocoder(temp_db, monkeypatch):
+    """Stand-in Geocoding API that records the addresses it is asked for."""
+    calls = []
+    places = {"500 e broad st richmond va": (37.5407, -77.4330)}
+
+    def fake_get(url, params, timeout):
+        calls.append(params["address"])
+        address = geocoding.normalize_address(params["address"])
+        if address.startswith("timeout"):
+            raise requests.exceptions.Timeout("slow")
+        if address in places:
+            lat, lng = places[address]
+            return _FakeResponse({"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]})
+        return _FakeResponse({"status": "ZERO_RESULTS", "results": []})
+
+    monkeypatch.setattr(geocoding, "GOOGLE_MAPS_API_KEY", "test-key")
+    monkeypatch.setattr(geocoding, "_http_session", lambda: SimpleNamespace(get=fake_get))
+    return calls
+
+
+def test_normalize_address_merges_spellings():
+    assert geocoding.normalize_address("500 East Broad Street, Richmond, Virginia") == "500 e broad st richmond va"
+    assert geocoding.normalize_address("500 E. BROAD ST.  Richmond VA") == "500 e broad st richmond va"
+
+
+def test_results_are_cached_across_spellings(geocoder):
+    assert geocoding.geocode_address("500 E Broad St") == (37.5407, -77.4330)
+    assert geocoding.geocode_address("500 East Broad Street, Richmond, VA") == (37.5407, -77.4330)
+    assert geocoding.geocode_address("1 Nowhere Ln") is None
+    assert geocoding.geocode_address("1 Nowhere Lane") is None
+    assert geocoder == ["500 E Broad St, Richmond, VA", "1 Nowhere Ln, Richmond, VA"]
+
+    # Errors worth retrying are not cached
+    assert geocoding.geocode_address("timeout") is None
+    assert geocoding.geocode_address("timeout") is None
+    assert geocoder.count("timeout, Richmond, VA") == 2
+
+
+def test_batch_dedupes_and_expired_entries_are_refetched(geocoder):
+    geocoding.remember_coordinates([("9 Known Pl", 37.55, -77.45)])
+    results = geocoding.geocode_batch({1: "500 E Broad St", 2: "500 East Broad Street", 3: "9 Known Place", 4: ""})
+    assert results == {1: (37.5407, -77.4330), 2: (37.5407, -77.4330), 3: (37.55, -77.45), 4: None}
+    assert len(geocoder) == 1
+
+    conn = db.get_connection()
+    conn.execute("UPDATE geocode_cache SET expires_at = datetime('now', '-1 seconds')")
+    conn.commit()
+    conn.close()
+    assert geocoding.geocode_batch({1: "500 E Broad St"}) == {1: (37.5407, -77.4330)}
+    assert len(geocoder) == 2
@@ -8,10 +8,12 @@ import json
 import subprocess
 import time
 
-# Add src to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+# Add the project root to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
 
-from database import queries
+from src.database import queries
 
 def test_geocoding_integration():
     """Test that all necessary components are present"""
@@ -37,54 +39,51 @@ def test_geocoding_integration():
         print(f"❌ Database error: {e}")
         return False
     
-    # Test 2: Check map.html has geocoding functions
-    print("\n2️⃣ Checking map.html has geocoding code...")
+    # Test 2: Check map.html no longer geocodes in the browser
+    print("\n2️⃣ Checking map.html leaves geocoding to the server...")
     try:
         with open('web/templates/map.html', 'r') as f:
             content = f.read()
-            
+
         checks = {
-            'geocodeCache': 'const geocodeCache' in content,
-            'geocodeAddress function': 'async function geocodeAddress(' in content,
-            'geocodeAllBusinesses function': 'async function geocodeAllBusinesses(' in content,
-            'geocodingchain in initMap': 'geocodeAllBusinesses(allBusinesses).then' in content,
+            'no geocodeCache': 'geocodeCache' not in content,
+            'no geocodeAddress function': 'function geocodeAddress(' not in content,
+            'no geocodeAllBusinesses function': 'function geocodeAllBusinesses(' not in content,
+            'markers loaded from /api/map/markers': 'api_map_markers' in content,
         }
-        
+
         all_passed = True
         for check_name, passed in checks.items():
             status = "✅" if passed else "❌"
             print(f"   {status} {check_name}")
             if not passed:
                 all_passed = False
-        
+
         if not all_passed:
             return False
-            
+
     except Exception as e:
         print(f"❌ File read error: {e}")
         return False
-    
-    # Test 3: Check app.py passes all businesses to map template
-    print("\n3️⃣ Checking app.py map_view passes all businesses...")
+
+    # Test 3: Check the geocode queue is wired up
+    print("\n3️⃣ Checking the geocode queue and worker...")
     try:
+        stats = queries.get_geocode_queue_stats()
+        print(f"   ✅ Geocode queue: {stats['pending']} pending, {stats['due']} due, {stats['retrying']} retrying")
+
         with open('web/app.py', 'r') as f:
             content = f.read()
-        
-        # Look for the map_view function
-        if 'businesses=all_businesses' in content and 'def map_view()' in content:
-            # Check it's NOT filtering by coordinates
-            if 'if b.get("latitude")' not in content or 'map_businesses' not in content:
-                print("   ✅ Map view passes all businesses (not filtered by coordinates)")
-            else:
-                print("   ⚠️  Map view might still be filtering businesses")
+        if 'start_geocode_worker()' in content:
+            print("   ✅ run_web starts the geocode worker")
         else:
-            print("   ❌ Map view doesn't pass all_businesses")
+            print("   ❌ run_web doesn't start the geocode worker")
             return False
-            
+
     except Exception as e:
-        print(f"❌ File read error: {e}")
+        print(f"❌ Geocode queue error: {e}")
         return False
-    
+
     # Test 4: Check Flask server is running
     print("\n4️⃣ Checking Flask server is running on port 5001...")
     try:
@@ -116,12 +115,8 @@ def test_geocoding_integration():
     print("\n📋 Next steps:")
     print("1. Open http://localhost:5001/map in your browser")
     print("2. Log in with your account")
-    print("3. Open browser DevTools Console (F12)")
-    print("4. Watch for:")
-    print("   - '🔄 Starting geocoding for X businesses...'")
-    print("   - '✅ Geocoded: [address] -> {lat, lng}'")
-    print("   - '✅ Geocoded X businesses'")
-    print("5. Markers should appear on map after geocoding completes")
+    print("3. Businesses without coordinates appear once the geocode worker places them")
+    print("   (watch the server log for 'Geocode queue pass' lines)")
     
     return True
 
@@ -0,0 +1,159 @@
+"""
+Job subsystem: leased claims, retries, schedules and the worker pool.
+"""
+import threading
+import time
+
+import pytest
+
+from src.database import db, queries
+from src.logic import jobs
+
+
+@pytest.fixture
+def registry(temp_db, monkeypatch):
+    """Fresh job registry with no backoff, so retries are due right away."""
+    monkeypatch.setattr(jobs, "_job_types", {})
+    monkeypatch.setattr(jobs, "backoff_delay", lambda attempt, base, cap: 0)
+    return jobs._job_types
+
+
+def _job(job_id):
+    conn = db.get_connection()
+    job_row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return dict(job_row)
+
+
+def test_jobs_run_once_and_record_results(registry):
+    seen = []
+    jobs.register_job("echo", lambda payload: seen.append(payload["word"]) or len(seen))
+    job_id = jobs.enqueue("echo", {"word": "hi"}, unique_key="echo")
+    assert jobs.enqueue("echo", {"word": "again"}, unique_key="echo") is None
+    assert jobs.run_pending() == {"run": 1, "succeeded": 1, "retrying": 0, "failed": 0}
+    assert seen == ["hi"]
+    job = _job(job_id)
+    assert (job["status"], job["result"], job["attempts"], job["lease_owner"]) == ("succeeded", "1", 1, None)
+    assert job["duration_ms"] is not None
+    # Finished jobs free their unique key
+    assert jobs.enqueue("echo", {"word": "again"}, unique_key="echo") is not None
+    with pytest.raises(ValueError):
+        jobs.enqueue("unknown")
+
+
+def test_failures_retry_then_fail(registry):
+    calls = []
+
+    def flaky(payload):
+        calls.append(1)
+        if len(calls) < 2:
+            raise RuntimeError("temporary")
+        return "ok"
+
+    jobs.register_job("flaky", flaky, max_attempts=3)
+    jobs.register_job("broken", lambda payload: 1 / 0, max_attempts=2)
+    flaky_id = jobs.enqueue("flaky")
+    broken_id = jobs.enqueue("broken")
+    assert jobs.run_pending() == {"run": 4, "succeeded": 1, "retrying": 2, "failed": 1}
+    assert _job(flaky_id)["status"] == "succeeded"
+    broken = _job(broken_id)
+    assert (broken["status"], broken["attempts"]) == ("failed", 2)
+    assert broken["last_error"].startswith("ZeroDivisionError")
+    stats = jobs.get_job_stats()
+    assert stats["broken"]["failed"] == 1 and stats["flaky"]["succeeded"] == 1
+
+
+def test_expired_lease_is_taken_over(registry):
+    jobs.register_job("slow", lambda payload: None, max_attempts=2, timeout_seconds=0)
+    job_id = jobs.enqueue("slow")
+    first = queries.claim_jobs(["slow"], "first")
+    # A zero-second lease is already expired: another worker claims the job again
+    second = queries.claim_jobs(["slow"], "second")
+    assert [job["id"] for job in first] == [job["id"] for job in second] == [job_id]
+    assert second[0]["attempts"] == 2
+    assert not queries.finish_job(job_id, "first", 10)
+    # Out of attempts with the lease expired again: marked failed instead of claimed
+    assert queries.claim_jobs(["slow"], "third") == []
+    assert not queries.finish_job(job_id, "second", 10)
+    job = _job(job_id)
+    assert (job["status"], job["last_error"]) == ("failed", "lease expired")
+    # Only jobs this process has handlers for are claimed
+    jobs.enqueue("slow")
+    assert queries.claim_jobs(["other"], "fourth") == []
+
+
+def test_failing_helper_rolls_back_and_releases_its_connection(registry):
+    jobs.register_job("echo", lambda payload: None)
+    job_id = queries.insert_job("echo", payload="{not json")
+    # The claim UPDATE runs, then decoding the payload raises
+    with pytest.raises(ValueError):
+        queries.claim_jobs(["echo"], "worker")
+    assert db.get_pool_stats()["in_use"] == 0
+    job = _job(job_id)
+    assert (job["status"], job["attempts"], job["lease_owner"]) == ("queued", 0, None)
+    # No write lock left behind
+    assert jobs.enqueue("echo") is not None
+
+
+def test_schedules_queue_one_run_at_a_time(registry):
+    jobs.register_job("tick", lambda payload: payload["n"])
+    jobs.schedule("tick", 3600, {"n": 1})
+    options = {"tick": (1, 60)}
+    job_ids = queries.enqueue_scheduled_jobs(options)
+    assert len(job_ids) == 1
+    # A second process checking now finds the schedule already moved on
+    assert queries.enqueue_scheduled_jobs(options) == []
+    assert jobs.run_pending() == {"run": 1, "succeeded": 1, "retrying": 0, "failed": 0}
+    assert _job(job_ids[0])["result"] == "1"
+    assert jobs.unschedule("tick")
+
+
+def test_runner_respects_worker_limit(registry):
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0, "done": 0}
+
+    def work(payload):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.02)
+        with lock:
+            running["now"] -= 1
+            running["done"] += 1
+
+    jobs.register_job("work", work)
+    jobs.register_job("prune_jobs", lambda payload: 0)
+    for _ in range(8):
+        jobs.enqueue("work")
+    jobs.start_job_runner(workers=2, poll_seconds=0.05)
+    try:
+        deadline = time.monotonic() + 5
+        while running["done"] < 8 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        jobs.stop_job_runner()
+    assert running["done"] == 8
+    assert running["peak"] <= 2
+    assert jobs.get_job_stats()["work"]["succeeded"] == 8
+
+
+def test_worker_pool_survives_a_failing_pass():
+    passes = []
+
+    def work_once(word):
+        passes.append(word)
+        if len(passes) == 1:
+            raise RuntimeError("database is locked")
+        return None if len(passes) > 3 else "worked"
+
+    pool = jobs.WorkerPool("test-worker", work_once)
+    threads = pool.start(1, 0.01, "hi")
+    try:
+        assert pool.start(1, 0.01, "hi") == threads
+        deadline = time.monotonic() + 5
+        while len(passes) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.stop()
+    assert passes[:5] == ["hi"] * 5
+    assert not threads[0].is_alive()
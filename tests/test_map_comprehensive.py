@@ -30,27 +30,30 @@ def test_map_pagination():
         return False
     print("   ✅ Map page loaded")
     
-    # Extract businessesData
-    print("\n3️⃣ Extracting businessesData...")
-    match = re.search(r'const businessesData = (\[.*?\]);', response.text, re.DOTALL)
-    if not match:
-        print("   ❌ Could not find businessesData")
+    # The page no longer embeds businesses; markers come from the viewport endpoint
+    print("\n3️⃣ Fetching markers for the Richmond viewport...")
+    if 'const businessesData' in response.text:
+        print("   ❌ Map page still embeds businessesData")
+        return False
+    markers_response = session.get(
+        f"{BASE_URL}/api/map/markers",
+        params={"bbox": "37.40,-77.65,37.70,-77.30", "zoom": 12}
+    )
+    if markers_response.status_code != 200:
+        print(f"   ❌ Failed to get markers: {markers_response.status_code}")
         return False
     
     try:
-        all_businesses = json.loads(match.group(1))
-        print(f"   ✅ Found {len(all_businesses)} total businesses")
-        
-        # Filter to only those with coordinates (same as backend does)
-        with_coords = [b for b in all_businesses if b.get('latitude') and b.get('longitude')]
-        print(f"   ✅ {len(with_coords)} businesses have coordinates")
+        payload = markers_response.json()
+        with_coords = [dict(zip(payload["fields"], row)) for row in payload["rows"]]
+        print(f"   ✅ {len(with_coords)} markers in viewport ({len(markers_response.content)} bytes)")
         
         if len(with_coords) == 0:
             print("   ❌ No businesses with coordinates found!")
             return False
             
-    except json.JSONDecodeError as e:
-        print(f"   ❌ Failed to parse businessesData: {e}")
+    except (ValueError, KeyError) as e:
+        print(f"   ❌ Failed to parse markers payload: {e}")
         return False
     
     # Check for page structure
@@ -80,6 +83,7 @@ def test_map_pagination():
         'function updateMapMarkers',
         'function addGoogleMarkers',
         'function applyFilters',
+        'function loadViewportMarkers',
     ]
     
     for func in functions:
@@ -49,33 +49,28 @@ def test_map_page():
     print("\n4️⃣ Checking for businesses data in HTML...")
     html = map_response.text
     
-    # Look for businessesData in the HTML
-    if "businessesData" in html:
-        print("   ✅ Found businessesData variable")
+    # Markers are loaded per viewport from /api/map/markers
+    if "loadViewportMarkers" in html:
+        print("   ✅ Found viewport marker loading")
         
-        # Try to extract the JSON
-        import re
-        match = re.search(r'const businessesData = (\[.*?\]);', html, re.DOTALL)
-        if match:
-            try:
-                businesses = json.loads(match.group(1))
-                print(f"   ✅ Found {len(businesses)} businesses in page")
-                
-                # Show first few business names
-                if businesses:
-                    for i, b in enumerate(businesses[:3]):
-                        print(f"      {i+1}. {b.get('name', 'N/A')} - {b.get('category', 'N/A')}")
-                    if len(businesses) > 3:
-                        print(f"      ... and {len(businesses) - 3} more")
-                        
-                    # Check for coordinates
-                    with_coords = sum(1 for b in businesses if b.get('latitude') and b.get('longitude'))
-                    print(f"   ✅ {with_coords}/{len(businesses)} businesses have coordinates")
-                    return True
-            except json.JSONDecodeError as e:
-                print(f"   ⚠️ Could not parse businesses JSON: {e}")
+        markers_response = session.get(
+            f"{BASE_URL}/api/map/markers",
+            params={"bbox": "37.40,-77.65,37.70,-77.30", "zoom": 12}
+        )
+        if markers_response.status_code == 200:
+            payload = markers_response.json()
+            businesses = [dict(zip(payload["fields"], row)) for row in payload["rows"]]
+            print(f"   ✅ Found {len(businesses)} businesses in the Richmond viewport")
+            
+            # Show first few business names
+            for i, b in enumerate(businesses[:3]):
+                print(f"      {i+1}. {b.get('name', 'N/A')} - {b.get('category', 'N/A')}")
+            if len(businesses) > 3:
+                print(f"      ... and {len(businesses) - 3} more")
+            return True
+        print(f"   ⚠️ Markers endpoint returned {markers_response.status_code}")
     else:
-        print("   ❌ businessesData not found in HTML")
+        print("   ❌ loadViewportMarkers not found in HTML")
     
     # Check for map script
     if "initMapCallback" in html:
@@ -86,7 +81,7 @@ def test_map_page():
     if "leaflet" in html.lower():
         print("   ✅ Found Leaflet library reference")
     
-    return "businessesData" in html
+    return "loadViewportMarkers" in html
 
 if __name__ == "__main__":
     print("🗺️  Testing Hidden Gems Map Page\n")
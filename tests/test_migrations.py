@@ -0,0 +1,108 @@
+"""
+Schema migrations: fresh installs, legacy upgrades and the fast startup path.
+"""
+import sqlite3
+
+import pytest
+
+from src.database import db, migrations
+
+
+def test_fresh_database_is_migrated_to_latest(temp_db):
+    connection = db.get_connection()
+    version = migrations.get_schema_version(connection)
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    connection.close()
+    assert version == migrations.LATEST_VERSION
+    assert {"users", "businesses", "deals", "reviews", "favorites"} <= tables
+
+
+def test_current_schema_startup_is_a_single_version_read(temp_db):
+    connection = db.get_connection()
+    statements = []
+    connection.set_trace_callback(statements.append)
+    migrations.migrate(connection)
+    connection.set_trace_callback(None)
+    connection.close()
+    assert statements == ["PRAGMA user_version"]
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path, monkeypatch):
+    legacy_path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(legacy_path)
+    legacy.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL)")
+    legacy.execute("CREATE TABLE businesses (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, category TEXT NOT NULL, description TEXT NOT NULL)")
+    legacy.execute("INSERT INTO users (email, password_hash) VALUES ('first.last@example.com', 'x')")
+    legacy.commit()
+    legacy.close()
+
+    monkeypatch.setattr(db, "DATABASE_PATH", legacy_path)
+    db.init_db()
+    connection = db.get_connection()
+    user = dict(connection.execute("SELECT username, email_verified FROM users").fetchone())
+    business_columns = {row[1] for row in connection.execute("PRAGMA table_info(businesses)")}
+    version = migrations.get_schema_version(connection)
+    connection.close()
+    db.close_all_connections()
+
+    assert user == {"username": "first_last", "email_verified": 1}
+    assert {"address", "latitude", "longitude", "yelp_id", "average_rating", "total_reviews"} <= business_columns
+    assert version == migrations.LATEST_VERSION
+
+
+def test_failed_migration_rolls_back_everything(temp_db, monkeypatch):
+    def broken_migration(cursor):
+        cursor.execute("CREATE TABLE half_applied (id INTEGER)")
+        raise RuntimeError("boom")
+
+    next_version = migrations.LATEST_VERSION + 1
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(next_version, "broken", broken_migration)])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", next_version)
+
+    connection = db.get_connection()
+    try:
+        migrations.migrate(connection)
+        raised = False
+    except RuntimeError:
+        raised = True
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    version = migrations.get_schema_version(connection)
+    connection.close()
+    assert raised
+    assert "half_applied" not in tables
+    assert version == next_version - 1
+
+
+def test_blank_and_duplicate_yelp_ids_are_cleared(tmp_path, monkeypatch):
+    legacy_path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(legacy_path)
+    legacy.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL)")
+    legacy.execute("CREATE TABLE businesses (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, category TEXT NOT NULL, description TEXT NOT NULL, average_rating REAL NOT NULL DEFAULT 0, total_reviews INTEGER NOT NULL DEFAULT 0)")
+    # Added later by ALTER TABLE, so without the UNIQUE constraint
+    legacy.execute("ALTER TABLE businesses ADD COLUMN yelp_id TEXT")
+    legacy.executemany("INSERT INTO businesses (name, category, description, yelp_id) VALUES (?, 'Food', 'd', ?)",
+                       [("A", ""), ("B", ""), ("C", "dup"), ("D", "dup")])
+    legacy.commit()
+    legacy.close()
+
+    monkeypatch.setattr(db, "DATABASE_PATH", legacy_path)
+    db.init_db()
+    connection = db.get_connection()
+    yelp_ids = [row[0] for row in connection.execute("SELECT yelp_id FROM businesses ORDER BY id")]
+    with pytest.raises(sqlite3.IntegrityError):
+        connection.execute("UPDATE businesses SET yelp_id = 'dup' WHERE name = 'D'")
+    connection.close()
+    db.close_all_connections()
+
+    assert yelp_ids == [None, None, "dup", None]
+
+
+def test_old_sqlite_is_rejected_before_migrating(temp_db, monkeypatch):
+    monkeypatch.setattr(migrations.sqlite3, "sqlite_version_info", (3, 31, 1))
+    monkeypatch.setattr(migrations.sqlite3, "sqlite_version", "3.31.1")
+    connection = db.get_connection()
+    try:
+        with pytest.raises(RuntimeError, match="3.35.0 or newer"):
+            migrations.migrate(connection)
+    finally:
+        connection.close()
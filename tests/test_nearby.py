@@ -0,0 +1,80 @@
+"""
+Location search: R*Tree sync, bounding boxes and radius queries.
+"""
+import pytest
+
+from src.database import db, queries
+
+# Richmond, VA landmarks
+CAPITOL = (37.5387, -77.4336)
+CARYTOWN = (37.5535, -77.4817)        # ~4.5 km from the Capitol
+SHORT_PUMP = (37.6504, -77.6128)      # ~20 km from the Capitol
+
+
+@pytest.fixture
+def catalog(temp_db):
+    ids = {}
+    for index, (name, category, point) in enumerate((
+        ("Capitol Cafe", "Food", CAPITOL),
+        ("Carytown Books", "Retail", CARYTOWN),
+        ("Short Pump Tacos", "Food", SHORT_PUMP),
+        ("Nowhere Yet", "Food", (None, None)),
+    )):
+        ids[name] = queries.insert_business(name, category, "d", latitude=point[0], longitude=point[1], yelp_id=f"y{index}")
+    return ids
+
+
+def _names(businesses):
+    return [business["name"] for business in businesses]
+
+
+def test_haversine_matches_known_distance():
+    assert queries.haversine_km(*CAPITOL, *CARYTOWN) == pytest.approx(4.5, abs=0.2)
+
+
+def test_nearby_sorted_by_distance_within_radius(catalog):
+    nearby = queries.get_businesses_nearby(*CAPITOL, radius_km=10)
+    assert _names(nearby) == ["Capitol Cafe", "Carytown Books"]
+    assert nearby[0]["distance_km"] == 0
+    assert _names(queries.get_businesses_nearby(*CARYTOWN, radius_km=30, category="Food")) == ["Capitol Cafe", "Short Pump Tacos"]
+    assert _names(queries.get_businesses_nearby(*CAPITOL, radius_km=30, limit=1)) == ["Capitol Cafe"]
+
+
+def test_index_follows_coordinate_changes(catalog):
+    queries.update_business(catalog["Nowhere Yet"], latitude=37.5390, longitude=-77.4340)
+    queries.update_business(catalog["Capitol Cafe"], latitude=SHORT_PUMP[0], longitude=SHORT_PUMP[1])
+    assert _names(queries.get_businesses_nearby(*CAPITOL, radius_km=1)) == ["Nowhere Yet"]
+
+    conn = db.get_connection()
+    conn.execute("DELETE FROM businesses WHERE id = ?", (catalog["Nowhere Yet"],))
+    conn.commit()
+    conn.close()
+    assert queries.get_businesses_nearby(*CAPITOL, radius_km=1) == []
+    assert sorted(_names(queries.get_businesses_in_bbox(37.6, -77.7, 37.7, -77.6))) == ["Capitol Cafe", "Short Pump Tacos"]
+
+
+def test_map_markers_are_compact_viewport_rows(catalog):
+    queries.update_business(catalog["Carytown Books"], average_rating=4.9)
+    markers = queries.get_map_markers(37.50, -77.50, 37.60, -77.40)
+    assert markers["truncated"] is False
+    # Best rated first, one short row per marker
+    assert [row[:3] for row in markers["rows"]] == [
+        [catalog["Carytown Books"], "Carytown Books", "Retail"],
+        [catalog["Capitol Cafe"], "Capitol Cafe", "Food"],
+    ]
+    assert len(markers["rows"][0]) == len(queries.MAP_MARKER_FIELDS)
+    assert queries.get_map_markers(37.50, -77.50, 37.60, -77.40, category="Food", limit=1)["rows"][0][0] == catalog["Capitol Cafe"]
+    capped = queries.get_map_markers(37.0, -78.0, 38.0, -77.0, limit=2)
+    assert len(capped["rows"]) == 2 and capped["truncated"] is True
+    assert queries.get_map_markers(37.50, -77.50, 37.60, -77.40, min_rating=4.95)["rows"] == []
+
+
+def test_markers_by_ids_are_capped_best_rated_first(catalog):
+    queries.update_business(catalog["Short Pump Tacos"], average_rating=4.8)
+    ids = list(catalog.values()) + list(range(1000, 1700))
+    markers = queries.get_map_markers_by_ids(ids, limit=2)
+    assert [row[0] for row in markers["rows"]] == [catalog["Short Pump Tacos"], catalog["Capitol Cafe"]]
+    assert markers["truncated"] is True
+    # Businesses without coordinates never become markers
+    assert len(queries.get_map_markers_by_ids(ids)["rows"]) == 3
+    assert queries.get_map_markers_by_ids([]) == {"rows": [], "truncated": False}
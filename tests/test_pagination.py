@@ -0,0 +1,132 @@
+"""
+Keyset pagination: cursor walks match OFFSET pages, in both directions.
+"""
+import pytest
+
+from src.database import db, queries
+from src.database.pagination import encode_cursor
+
+
+@pytest.fixture
+def catalog(temp_db):
+    connection = db.get_connection()
+    connection.executemany(
+        "INSERT INTO businesses (name, category, description, average_rating, total_reviews) VALUES (?, ?, 'd', ?, ?)",
+        # Repeated ratings/names make sure ties are broken by id
+        [(f"Shop {i % 7}", "Food" if i % 2 else "Retail", float(i % 5), i % 3) for i in range(53)],
+    )
+    connection.commit()
+    connection.close()
+    return temp_db
+
+
+def _ids(result):
+    return [business["id"] for business in result["items"]]
+
+
+@pytest.mark.parametrize("sort_by_option", sorted(queries.DIRECTORY_SORT_KEYS))
+def test_cursor_walk_matches_offset_pages(catalog, sort_by_option):
+    offset_pages = []
+    for page in range(1, 6):
+        offset_pages.append(_ids(queries.get_directory_page(sort_by_option=sort_by_option, page=page, per_page=12)))
+
+    cursor_pages = []
+    result = queries.get_directory_page(sort_by_option=sort_by_option, per_page=12)
+    cursor_pages.append(_ids(result))
+    while result["next_cursor"]:
+        result = queries.get_directory_page(sort_by_option=sort_by_option, per_page=12, cursor=result["next_cursor"])
+        cursor_pages.append(_ids(result))
+
+    assert cursor_pages == offset_pages
+    assert result["page"] == result["total_pages"] == 5
+    assert sum(len(page) for page in cursor_pages) == 53
+
+
+def test_prev_cursor_returns_the_previous_page(catalog):
+    first = queries.get_directory_page(sort_by_option="rating_high", per_page=10)
+    second = queries.get_directory_page(sort_by_option="rating_high", per_page=10, cursor=first["next_cursor"])
+    back = queries.get_directory_page(sort_by_option="rating_high", per_page=10, cursor=second["prev_cursor"])
+    assert back["page"] == 1
+    assert _ids(back) == _ids(first)
+    assert back["prev_cursor"] is None
+
+
+def test_cursor_pages_skip_the_count_query(catalog):
+    first = queries.get_directory_page(category_filter="Food", per_page=5)
+    statements = []
+    connection = db.get_connection()
+    connection.set_trace_callback(statements.append)
+    connection.close()
+    queries.get_directory_page(category_filter="Food", per_page=5, cursor=first["next_cursor"])
+    connection = db.get_connection()
+    connection.set_trace_callback(None)
+    connection.close()
+    assert statements and not any("COUNT(*)" in statement for statement in statements)
+    assert not any("OFFSET" in statement for statement in statements)
+
+
+def test_cursor_from_another_listing_falls_back_to_page(catalog):
+    food = queries.get_directory_page(category_filter="Food", per_page=5)
+    retail = queries.get_directory_page(category_filter="Retail", per_page=5, cursor=food["next_cursor"], page=2)
+    assert retail["page"] == 2
+    assert _ids(retail) == _ids(queries.get_directory_page(category_filter="Retail", per_page=5, page=2))
+
+
+def test_garbage_cursor_is_ignored(catalog):
+    for token in ("not-a-cursor", encode_cursor({"s": "x"}), "%%%"):
+        result = queries.get_directory_page(per_page=5, cursor=token)
+        assert result["page"] == 1
+
+
+def test_trending_cap_is_respected_when_seeking(catalog):
+    result = queries.get_trending_page(per_page=4, max_items=10)
+    pages = [_ids(result)]
+    while result["next_cursor"]:
+        result = queries.get_trending_page(per_page=4, max_items=10, cursor=result["next_cursor"])
+        pages.append(_ids(result))
+    assert [len(page) for page in pages] == [4, 4, 2]
+
+
+def test_favorites_and_reviews_pages(catalog):
+    connection = db.get_connection()
+    connection.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'demo', 'demo@example.com', 'x')")
+    connection.commit()
+    connection.close()
+    for business_id in range(1, 8):
+        queries.add_favorite(1, business_id)
+        queries.add_review(1, 1, 5, f"review {business_id}", "2026-01-0%d" % business_id, "12:00")
+
+    favorites = queries.get_favorites_page(1, per_page=5)
+    more = queries.get_favorites_page(1, per_page=5, cursor=favorites["next_cursor"])
+    assert favorites["total_items"] == 7
+    assert len(favorites["items"]) + len(more["items"]) == 7
+    assert more["next_cursor"] is None
+
+    reviews = queries.get_reviews_page(1, per_page=3)
+    assert [review["review_text"] for review in reviews["items"]] == ["review 7", "review 6", "review 5"]
+
+
+def test_reviews_endpoint_cursor_walk_returns_every_review(catalog):
+    from web.app import app
+
+    connection = db.get_connection()
+    connection.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'demo', 'demo@example.com', 'x')")
+    connection.executemany(
+        "INSERT INTO reviews (business_id, user_id, rating, review_text, created_date, created_time) VALUES (1, 1, 4, ?, ?, '12:00')",
+        [(f"review {day}", f"2026-02-{day:02d}") for day in range(1, 28)] * 2,
+    )
+    connection.commit()
+    connection.close()
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session.update(user_id=1, email="demo@example.com")
+
+    body = client.get("/get-reviews/1").get_json()
+    pages = [body["reviews"]]
+    while body["next_cursor"]:
+        body = client.get("/get-reviews/1", query_string={"cursor": body["next_cursor"]}).get_json()
+        pages.append(body["reviews"])
+
+    review_ids = [review["id"] for page in pages for review in page]
+    assert [len(page) for page in pages] == [20, 20, 14]
+    assert len(set(review_ids)) == body["count"] == 54
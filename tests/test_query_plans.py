@@ -0,0 +1,142 @@
+"""
+Every hot query in queries.py must be answered from an index.
+
+Each helper is run against a small seeded database with statement tracing on;
+every SELECT/UPDATE/DELETE it issues is then checked with EXPLAIN QUERY PLAN.
+A bare "SCAN <table>" (no index) fails the test.
+"""
+import re
+
+import pytest
+
+from src.database import db, queries
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+def _seed(connection):
+    connection.execute(
+        "INSERT INTO users (id, username, email, password_hash, email_verified) VALUES (1, 'demo', 'demo@example.com', 'x', 1)"
+    )
+    for business_id, category in ((1, "Food"), (2, "Retail"), (3, "Food")):
+        connection.execute(
+            "INSERT INTO businesses (id, name, category, description, average_rating, total_reviews, latitude, longitude) "
+            "VALUES (?, ?, ?, 'd', 4.0, 3, ?, -77.43)",
+            (business_id, f"Business {business_id}", category, 37.5 + business_id / 100),
+        )
+    connection.execute("INSERT INTO deals (business_id, description) VALUES (1, 'deal')")
+    connection.execute("INSERT INTO favorites (user_id, business_id) VALUES (1, 1)")
+    connection.execute(
+        "INSERT INTO reviews (business_id, user_id, rating, review_text, created_date, created_time) VALUES (1, 1, 5, 'great', '2026-01-01', '10:00')"
+    )
+    connection.execute("INSERT INTO email_verification_codes (user_id, code) VALUES (1, '123456')")
+    connection.execute("INSERT INTO job_schedules (name, interval_seconds) VALUES ('tick', 60)")
+    connection.commit()
+
+
+HOT_QUERIES = {
+    "user_by_email": lambda: queries.user_by_email("demo@example.com"),
+    "user_by_username": lambda: queries.user_by_username("demo"),
+    "user_by_email_or_username": lambda: queries.user_by_email_or_username("demo"),
+    "get_user_by_id": lambda: queries.get_user_by_id(1),
+    "get_latest_verification_code": lambda: queries.get_latest_verification_code(1),
+    "validate_email_code": lambda: queries.validate_email_code(1, "123456"),
+    "get_businesses_by_category": lambda: queries.get_businesses_by_category("Food"),
+    "get_business_by_id": lambda: queries.get_business_by_id(1),
+    "get_business_id_by_name": lambda: queries.get_business_id_by_name("business 2"),
+    "get_categories": lambda: queries.get_categories(),
+    "get_deals_by_business": lambda: queries.get_deals_by_business(1),
+    "get_business_ids_with_deals": lambda: queries.get_business_ids_with_deals(),
+    "get_reviews_for_business": lambda: queries.get_reviews_for_business(1),
+    "get_reviews_by_user": lambda: queries.get_reviews_by_user(1),
+    "get_trending_businesses": lambda: queries.get_trending_businesses(limit=5),
+    "get_favorite_business_ids": lambda: queries.get_favorite_business_ids(1),
+    "get_favorite_businesses": lambda: queries.get_favorite_businesses(1),
+    "get_recommended_businesses": lambda: queries.get_recommended_businesses(1, limit=5),
+    "add_review": lambda: queries.add_review(2, 1, 4, "solid spot", "2026-01-02", "11:00"),
+    "remove_favorite": lambda: queries.remove_favorite(1, 3),
+    "get_directory_page (category)": lambda: queries.get_directory_page(category_filter="Food", per_page=2),
+    "get_directory_page (cursor)": lambda: _walk(queries.get_directory_page, sort_by_option="rating_high"),
+    "get_trending_page (cursor)": lambda: _walk(queries.get_trending_page),
+    "get_favorites_page": lambda: queries.get_favorites_page(1),
+    "get_reviews_page": lambda: queries.get_reviews_page(1),
+    "get_review_summary": lambda: queries.get_review_summary(1),
+    "get_deals_for_businesses": lambda: queries.get_deals_for_businesses([1, 2]),
+    "get_directory_facets": lambda: queries.get_directory_facets(category_filter="Food", has_deals=True),
+    "get_directory_page (facets)": lambda: queries.get_directory_page(min_rating=3.0, has_deals=True, per_page=2),
+    "get_businesses_nearby": lambda: queries.get_businesses_nearby(37.54, -77.43, radius_km=5, category="Food"),
+    "get_map_markers": lambda: queries.get_map_markers(37.4, -77.6, 37.7, -77.3, min_rating=3.0, has_deals=True),
+    "search_businesses": lambda: queries.search_businesses("busi", category="Food", limit=5),
+    "get_directory_page (search)": lambda: queries.get_directory_page(search_query="business", per_page=2),
+    "get_directory_page (relevance)": lambda: _walk(queries.get_directory_page, search_query="business", sort_by_option="relevance"),
+    "upsert_yelp_businesses": lambda: queries.upsert_yelp_businesses([
+        {"yelp_id": "y1", "name": "Business 1", "category": "Food"},
+        {"yelp_id": "y9", "name": "New Business", "category": "Food"},
+        {"yelp_id": "y1", "name": "Business 1", "category": "Food", "is_closed": True},
+    ]),
+    "enqueue_scheduled_jobs": lambda: queries.enqueue_scheduled_jobs({"tick": (1, 60)}),
+    "claim_jobs": lambda: queries.claim_jobs(["tick"], "owner"),
+    "finish_job": lambda: queries.finish_job(1, "owner", 5),
+    "claim_outbox_emails": lambda: queries.claim_outbox_emails(),
+    "mark_outbox_emails_sent": lambda: queries.mark_outbox_emails_sent([1], 5),
+    "get_deals_between": lambda: queries.get_deals_between(0, 1),
+    "iter_deal_followers": lambda: list(queries.iter_deal_followers(0, 1)),
+    "get_users_for_digest": lambda: queries.get_users_for_digest([1, 2]),
+}
+
+
+def _walk(fetch_page, **kwargs):
+    """Fetch a first page and then seek to the next one with its cursor."""
+    first = fetch_page(per_page=1, **kwargs)
+    return fetch_page(per_page=1, cursor=first["next_cursor"], **kwargs)
+
+
+def _capture_statements(run_query):
+    """Run one helper and return the (parameter-expanded) SQL it executed."""
+    statements = []
+
+    original_get_connection = db.get_connection
+
+    def traced_connection():
+        connection = original_get_connection()
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    # db.get_connection covers helpers that use db.connection_scope()
+    queries.get_connection = db.get_connection = traced_connection
+    try:
+        run_query()
+    finally:
+        queries.get_connection = db.get_connection = original_get_connection
+    return [
+        statement for statement in statements
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE")
+    ]
+
+
+@pytest.fixture
+def seeded_db(temp_db):
+    connection = db.get_connection()
+    _seed(connection)
+    connection.close()
+    # The FTS5/R*Tree availability probes read sqlite_master once per database; warm them outside tracing
+    queries.fulltext_available()
+    queries.location_index_available()
+    yield temp_db
+    # Don't leak trace callbacks into other tests through the pool
+    db.close_all_connections()
+
+
+@pytest.mark.parametrize("query_name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(seeded_db, query_name):
+    statements = _capture_statements(HOT_QUERIES[query_name])
+    assert statements, f"{query_name} issued no SQL"
+
+    connection = db.get_connection()
+    try:
+        for statement in statements:
+            plan = [row["detail"] for row in connection.execute("EXPLAIN QUERY PLAN " + statement)]
+            full_scans = [detail for detail in plan if FULL_SCAN.match(detail)]
+            assert not full_scans, f"{query_name}: full table scan in {statement!r}: {plan}"
+    finally:
+        connection.close()
@@ -0,0 +1,56 @@
+"""
+Full-text business search: FTS5 index sync, prefix matching and BM25 ranking.
+"""
+import pytest
+
+from src.database import db, queries
+
+
+@pytest.fixture
+def catalog(temp_db):
+    if not queries.fulltext_available():
+        pytest.skip("SQLite build without FTS5")
+    queries.insert_business("Mario's Pizza Place", "Food", "Wood-fired pies downtown", 4.5, 120, yelp_id="y1")
+    queries.insert_business("Corner Books", "Retail", "Used books and a small pizza counter", 4.8, 40, yelp_id="y2")
+    queries.insert_business("Fan Cycle Repair", "Services", "Bike tune-ups", 4.2, 15, yelp_id="y3",
+                            attributes='["wheelchair accessible"]')
+    return temp_db
+
+
+def _names(businesses):
+    return [business["name"] for business in businesses]
+
+
+def test_search_covers_descriptions_and_ranks_name_hits_first(catalog):
+    assert _names(queries.search_businesses("pizza")) == ["Mario's Pizza Place", "Corner Books"]
+
+
+def test_prefix_and_accent_insensitive_matching(catalog):
+    assert _names(queries.search_businesses("piz")) == ["Mario's Pizza Place", "Corner Books"]
+    assert _names(queries.search_businesses("wheelchair")) == ["Fan Cycle Repair"]
+    assert _names(queries.search_businesses("BIKE tüne")) == ["Fan Cycle Repair"]
+    assert queries.search_businesses('"; DROP TABLE businesses; --') == []
+
+
+def test_triggers_keep_index_in_sync(catalog):
+    business_id = queries.get_business_id_by_name("Corner Books")
+    queries.update_business(business_id, description="Rare maps and prints")
+    assert _names(queries.search_businesses("pizza")) == ["Mario's Pizza Place"]
+    assert _names(queries.search_businesses("maps")) == ["Corner Books"]
+
+    conn = db.get_connection()
+    conn.execute("DELETE FROM businesses WHERE id = ?", (business_id,))
+    conn.commit()
+    conn.close()
+    assert queries.search_businesses("maps") == []
+
+
+def test_directory_relevance_sort_pages_with_cursor(catalog):
+    first = queries.get_directory_page(search_query="pizza", sort_by_option="relevance", per_page=1)
+    assert first["total_items"] == 2
+    assert _names(first["items"]) == ["Mario's Pizza Place"]
+    second = queries.get_directory_page(search_query="pizza", sort_by_option="relevance", per_page=1, cursor=first["next_cursor"])
+    assert _names(second["items"]) == ["Corner Books"]
+
+    by_name = queries.get_directory_page(search_query="pizza", category_filter="Retail")
+    assert _names(by_name["items"]) == ["Corner Books"]
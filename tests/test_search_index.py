@@ -0,0 +1,97 @@
+"""
+Typo-tolerant search: trigram index ranking, suggestions and staleness.
+"""
+from src.database import db, queries
+from src.logic import search_index
+from src.logic.search_index import PrefixIndex, TrigramIndex
+
+
+def _catalog_index():
+    index = TrigramIndex()
+    index.add(1, "Mario's Pizza Place", "Food")
+    index.add(2, "Smokey's Barbecue Pit", "Food")
+    index.add(3, "Pizza Palace", "Food")
+    index.add(4, "Fan Cycle Repair", "Services")
+    return index
+
+
+def test_misspellings_find_similar_businesses():
+    index = _catalog_index()
+    assert [business_id for business_id, _ in index.search("pizzza")] == [1, 3]
+    assert [business_id for business_id, _ in index.search("barbeque")] == [2]
+    assert index.search("pizzza", category="Services") == []
+    assert index.search("zzzz qqq") == []
+
+
+def test_suggestion_only_for_unknown_words():
+    index = _catalog_index()
+    assert index.suggest("pizzza plase") == "pizza place"
+    assert index.suggest("barbeque") == "barbecue"
+    assert index.suggest("pizza") is None
+
+
+def test_remove_drops_words_from_vocabulary():
+    index = _catalog_index()
+    index.remove(2)
+    assert index.search("barbecue") == []
+    assert index.suggest("barbeque") is None
+    index.add(1, "Mario's Trattoria", "Food")
+    assert [business_id for business_id, _ in index.search("pizza")] == [3]
+
+
+def test_shared_index_follows_catalog_changes(temp_db):
+    first_id = queries.insert_business("Pizza Palace", "Food", "Slices", yelp_id="y1")
+    assert [b["id"] for b in search_index.fuzzy_search("pizzza")] == [first_id]
+
+    # Writes through queries.py update the index in place
+    second_id = queries.insert_business("Smokey's Barbecue", "Food", "Ribs", yelp_id="y2")
+    assert [b["id"] for b in search_index.fuzzy_search("barbeque")] == [second_id]
+    assert search_index.did_you_mean("barbeque") == "barbecue"
+
+    # Writes from elsewhere (another process) are caught by the catalog version
+    conn = db.get_connection()
+    conn.execute("UPDATE businesses SET name = 'Corner Books' WHERE id = ?", (first_id,))
+    conn.commit()
+    conn.close()
+    search_index._index_state["checked_at"] = 0.0
+    assert search_index.fuzzy_search("pizzza") == []
+    assert [b["id"] for b in search_index.fuzzy_search("bokks")] == [first_id]
+
+
+def test_prefix_index_ranks_name_starts_then_popularity():
+    index = PrefixIndex()
+    index.load([
+        (1, "Joe's Pizza", "Food", 10),
+        (2, "Pizza Palace", "Food", 5),
+        (3, "Pizzeria Uno", "Food", 50),
+        (4, "Fan Cycle Repair", "Services", 1),
+    ])
+    completions = index.complete("piz")
+    assert [b["id"] for b in completions["businesses"]] == [3, 2, 1]
+    assert index.complete("joe s p")["businesses"] == [{"id": 1, "name": "Joe's Pizza", "category": "Food"}]
+    assert index.complete("serv")["categories"] == [{"name": "Services", "count": 1}]
+    assert index.complete("   ") == {"businesses": [], "categories": []}
+
+
+def test_prefix_index_updates_evict_cached_answers():
+    index = PrefixIndex()
+    index.load([(1, "Pizza Palace", "Food", 5)])
+    assert [b["id"] for b in index.complete("pi")["businesses"]] == [1]
+    index.add(2, "Pie Shop", "Food", 99)
+    assert [b["id"] for b in index.complete("pi")["businesses"]] == [2, 1]
+    index.add(1, "Burger Barn", "Food", 5)
+    assert [b["id"] for b in index.complete("pi")["businesses"]] == [2]
+    index.remove(2)
+    assert index.complete("pi")["businesses"] == []
+
+
+def test_autocomplete_serves_keystrokes_without_sql(temp_db, monkeypatch):
+    queries.insert_business("Pizza Palace", "Food", "Slices", yelp_id="y1")
+    assert search_index.autocomplete("piz")["businesses"][0]["name"] == "Pizza Palace"
+    queries.insert_business("Pie Shop", "Food", "Pies", yelp_id="y2")
+
+    def no_sql():
+        raise AssertionError("autocomplete touched SQLite")
+
+    monkeypatch.setattr(queries, "get_connection", no_sql)
+    assert [b["name"] for b in search_index.autocomplete("pi")["businesses"]] == ["Pie Shop", "Pizza Palace"]
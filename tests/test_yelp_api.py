@@ -0,0 +1,172 @@
+"""
+Yelp ingestion: concurrent paginated category searches against a local
+stand-in server, retry on throttling, connection reuse, streaming sync, and
+the on-disk response cache with record/replay fixtures.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.database import queries, seed
+from src.logic import throttle, yelp_api
+from src.logic.response_cache import ResponseCache, make_replay_server
+
+# Businesses per category on the stand-in server
+CATALOG = {"restaurants": 120, "shopping": 30}
+
+
+def _business(category, number):
+    return {
+        "id": f"{category}-{number}",
+        "name": f"{category.title()} {number}",
+        "rating": 4.0,
+        "review_count": number,
+        "categories": [{"alias": category}],
+        "location": {"display_address": [f"{number} E Broad St", "Richmond, VA 23219"]},
+        "coordinates": {"latitude": 37.54, "longitude": -77.43},
+    }
+
+
+@pytest.fixture
+def stand_in_yelp(monkeypatch, tmp_path):
+    """Local HTTP/1.1 server speaking Business Search; the very first request is throttled."""
+    seen = {"requests": [], "connections": set()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+            with lock:
+                seen["requests"].append((params["categories"], int(params["offset"])))
+                seen["connections"].add(self.client_address)
+                first_request = len(seen["requests"]) == 1
+            if first_request:
+                self._send(429, {"error": {"code": "TOO_MANY_REQUESTS_PER_SECOND"}})
+                return
+            total = CATALOG.get(params["categories"], 0)
+            offset, limit = int(params["offset"]), int(params["limit"])
+            businesses = [_business(params["categories"], number) for number in range(offset, min(total, offset + limit))]
+            self._send(200, {"total": total, "businesses": businesses})
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(yelp_api, "BASE_URL", f"http://127.0.0.1:{server.server_port}/v3/businesses/search")
+    monkeypatch.setattr(yelp_api, "_get_api_key", lambda: "test-key")
+    monkeypatch.setattr(yelp_api, "RESPONSE_CACHE_DIR", str(tmp_path / "yelp-cache"))
+    monkeypatch.setattr(yelp_api, "RESPONSE_CACHE_TTL_SECONDS", 0)
+    monkeypatch.setattr(yelp_api, "_rate_limiter", throttle.TokenBucket(1000))
+    monkeypatch.setattr(throttle, "backoff_delay", lambda *args: 0)
+    yield seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_categories_are_paged_up_to_the_cap(stand_in_yelp):
+    rows = yelp_api.fetch_richmond_businesses(max_per_category=100, workers=3)
+    names = {row["name"] for row in rows}
+    assert len(rows) == len(names) == 100 + 30
+    assert yelp_api.get_last_error() is None
+
+    requests_seen = stand_in_yelp["requests"]
+    assert sorted(set(requests_seen)) == [
+        ("gyms", 0), ("localservices", 0), ("nightlife", 0),
+        ("restaurants", 0), ("restaurants", 50), ("shopping", 0),
+    ]
+    # The throttled request was retried, and pages reused kept-alive connections
+    assert len(requests_seen) == 7
+    assert len(stand_in_yelp["connections"]) <= 3
+
+
+def test_stream_keeps_one_row_per_yelp_id(monkeypatch):
+    chain = [dict(_business("restaurants", number), name="Chain Cafe") for number in (1, 2)]
+    closed = dict(_business("restaurants", 3), name="Chain Cafe", is_closed=True)
+    unnamed_id = dict(_business("restaurants", 4), id="")
+    search_pages = {
+        "restaurants": [[closed, chain[0]], [chain[1], chain[0], unnamed_id, unnamed_id]],
+        "nightlife": [[chain[1]]],
+    }
+
+    def search_category(yelp_category, max_results, pages, stop, cache_max_age_seconds):
+        for page in search_pages.get(yelp_category, []):
+            pages.put(page)
+        pages.put(None)
+
+    monkeypatch.setattr(yelp_api, "_get_api_key", lambda: "test-key")
+    monkeypatch.setattr(yelp_api, "_search_category", search_category)
+    rows = list(yelp_api.iter_richmond_businesses(workers=1, include_closed=True))
+    assert sorted(row["yelp_id"] for row in rows) == ["", "restaurants-1", "restaurants-2", "restaurants-3"]
+    assert [row["is_closed"] for row in rows if row["yelp_id"] == "restaurants-3"] == [True]
+    assert len(list(yelp_api.iter_richmond_businesses(workers=1))) == 3
+
+
+def test_sync_streams_rows_into_the_database(temp_db, stand_in_yelp, monkeypatch):
+    monkeypatch.setattr(yelp_api, "MAX_PER_CATEGORY", 60)
+    stats = seed._sync_richmond_from_yelp()
+    assert (stats["added"], stats["updated"], stats["unchanged"]) == (60 + 30, 0, 0)
+    assert queries.get_business_id_by_name("Restaurants 59")
+    stats = seed._sync_richmond_from_yelp()
+    assert (stats["added"], stats["updated"], stats["unchanged"]) == (0, 0, 90)
+
+
+def test_response_cache_serves_fresh_entries_only(tmp_path):
+    now = [1000.0]
+    cache = ResponseCache(str(tmp_path), ttl_seconds=60, clock=lambda: now[0])
+    cache.put("https://api.example/search", {"offset": 0, "limit": 50}, {"total": 1})
+    assert cache.get("https://api.example/search", {"limit": "50", "offset": "0"}) == {"total": 1}
+    assert cache.get("http://127.0.0.1:1/search", {"limit": 50, "offset": 0}) is None
+    now[0] += 61
+    assert cache.get("https://api.example/search", {"offset": 0, "limit": 50}) is None
+
+
+def test_recorded_responses_replay_offline(temp_db, stand_in_yelp, monkeypatch, tmp_path):
+    # A cached sync does not go back to the network
+    monkeypatch.setattr(yelp_api, "RESPONSE_CACHE_TTL_SECONDS", 3600)
+    monkeypatch.setattr(yelp_api, "RECORD_DIR", str(tmp_path / "fixtures"))
+    recorded = yelp_api.fetch_richmond_businesses(max_per_category=60)
+    request_count = len(stand_in_yelp["requests"])
+    cached = yelp_api.fetch_richmond_businesses(max_per_category=60)
+    assert sorted(cached, key=lambda row: row["yelp_id"]) == sorted(recorded, key=lambda row: row["yelp_id"])
+    assert len(stand_in_yelp["requests"]) == request_count
+
+    # The fixtures alone reproduce the fetch from a replay server
+    monkeypatch.setattr(yelp_api, "RECORD_DIR", None)
+    monkeypatch.setattr(yelp_api, "RESPONSE_CACHE_TTL_SECONDS", 0)
+    server = make_replay_server(str(tmp_path / "fixtures"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(yelp_api, "BASE_URL", f"http://127.0.0.1:{server.server_port}/v3/businesses/search")
+    try:
+        replayed = yelp_api.fetch_richmond_businesses(max_per_category=60)
+        missing = yelp_api.fetch_richmond_businesses(max_per_category=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert sorted(row["yelp_id"] for row in replayed) == sorted(row["yelp_id"] for row in recorded)
+    assert len(stand_in_yelp["requests"]) == request_count
+    assert missing == [] and "404" in yelp_api.get_last_error()
+
+
+def test_sync_ignores_cached_pages_older_than_it_allows(temp_db, stand_in_yelp, monkeypatch):
+    monkeypatch.setattr(yelp_api, "RESPONSE_CACHE_TTL_SECONDS", 3600)
+    yelp_api.fetch_richmond_businesses(max_per_category=60)
+    request_count = len(stand_in_yelp["requests"])
+    list(yelp_api.iter_richmond_businesses(max_per_category=60, cache_max_age_seconds=3600))
+    assert len(stand_in_yelp["requests"]) == request_count
+    list(yelp_api.iter_richmond_businesses(max_per_category=60, cache_max_age_seconds=0))
+    assert set(stand_in_yelp["requests"][request_count:]) == set(stand_in_yelp["requests"][:request_count])
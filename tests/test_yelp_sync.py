@@ -0,0 +1,60 @@
+"""
+Incremental Yelp sync: yelp_id upserts, content-hash skips, adoption of
+older rows by name and hiding of closed businesses.
+"""
+from src.database import db, queries
+
+
+def _row(yelp_id, name, rating=4.0, **fields):
+    return {"yelp_id": yelp_id, "name": name, "category": "Food", "description": f"{name} in Richmond",
+            "average_rating": rating, "total_reviews": 10, "address": "1 E Broad St",
+            "latitude": 37.54, "longitude": -77.43, **fields}
+
+
+def test_upsert_adds_skips_updates_and_removes(temp_db):
+    legacy_id = queries.insert_business("Old Diner", "Food", "From an older sync")
+    assert queries.upsert_yelp_businesses([_row("a", "Cafe A"), _row("b", "Cafe B"), _row("c", "old diner")]) == {
+        "added": 2, "updated": 1, "unchanged": 0, "removed": 0,
+    }
+    assert queries.get_business_by_id(legacy_id)["yelp_id"] == "c"
+
+    cafe_b = queries.get_business_id_by_name("Cafe B")
+    queries.add_favorite(1, cafe_b)
+    counts = queries.upsert_yelp_businesses([
+        _row("a", "Cafe A"), _row("b", "Cafe B", is_closed=True), _row("c", "old diner", rating=4.5), {"name": "No Id"},
+    ])
+    assert counts == {"added": 0, "updated": 1, "unchanged": 1, "removed": 1}
+    assert queries.get_business_by_id(cafe_b)["closed_at"] is not None
+    assert queries.get_favorite_business_ids(1) == [cafe_b]
+    assert "Cafe B" not in [business["name"] for business in queries.get_all_businesses()]
+    assert queries.search_businesses("cafe b") == []
+    assert queries.get_business_by_id(legacy_id)["average_rating"] == 4.5
+    assert queries.get_business_id_by_name("No Id") is None
+
+
+def test_blank_yelp_ids_no_longer_collide(temp_db):
+    first = queries.insert_business("First", "Food", "d")
+    second = queries.insert_business("Second", "Food", "d")
+    assert queries.get_business_by_id(first)["yelp_id"] is None
+    assert queries.get_business_by_id(second)["yelp_id"] is None
+
+
+
+def test_closed_business_keeps_reviews_and_reopens(temp_db):
+    queries.upsert_yelp_businesses([_row("a", "Cafe A")])
+    cafe_a = queries.get_business_id_by_name("Cafe A")
+    queries.add_favorite(1, cafe_a)
+    conn = db.get_connection()
+    conn.execute("INSERT INTO deals (business_id, description) VALUES (?, 'Free cookie')", (cafe_a,))
+    conn.commit()
+    conn.close()
+
+    closed = [_row("a", "Cafe A", is_closed=True)]
+    assert queries.upsert_yelp_businesses(closed)["removed"] == 1
+    assert queries.upsert_yelp_businesses(closed)["removed"] == 0
+    assert queries.get_deals_by_business(cafe_a) == []
+    assert [business["id"] for business in queries.get_favorite_businesses(1)] == [cafe_a]
+
+    assert queries.upsert_yelp_businesses([_row("a", "Cafe A")])["unchanged"] == 1
+    assert queries.get_business_by_id(cafe_a)["closed_at"] is None
+    assert [business["id"] for business in queries.get_all_businesses()] == [cafe_a]
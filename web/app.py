@@ -28,13 +28,14 @@ from flask import Flask, render_template, request, redirect, url_for, session, f
 from datetime import datetime
 
 # Application module imports
-from src.database.db import init_db
+from src.database.db import init_db, release_request_connection
 from src.database import queries
 from src.logic.auth import (
     hash_password, validate_login, register_user, is_valid_username, 
     is_valid_email, is_valid_password, generate_verification_code
 )
 from src.logic.chatbot import chat_with_ai, get_welcome_message
+from src.logic import clustering, search_index
 from src.logic.email_sender import send_verification_email, is_email_configured, send_password_reset_email
 
 # Initialize Flask application
@@ -47,6 +48,9 @@ app.config["SESSION_COOKIE_HTTPONLY"] = True  # Prevent JavaScript access to ses
 app.config["SESSION_COOKIE_SAMESITE"] = "Lax"  # CSRF protection
 app.config["PERMANENT_SESSION_LIFETIME"] = 86400  # 24-hour session timeout
 
+# Return each request's pooled database connection when the request ends
+app.teardown_appcontext(release_request_connection)
+
 
 # Register custom Jinja2 filters
 @app.template_filter('from_json')
@@ -90,42 +94,31 @@ def current_user():
     }
 
 
-def get_paginated_items(items, page=1, items_per_page=12):
+def get_page_args():
     """
-    Calculate pagination for a list of items.
+    Read pagination arguments from the query string.
     
-    Args:
-        items (list): The complete list of items to paginate
-        page (int): Current page number (1-indexed)
-        items_per_page (int): Number of items per page
+    Pages are addressed by an opaque ?cursor= token (from the previous page's
+    next/prev links); legacy ?page= numbers still work and are used when no
+    valid cursor is given.
     
     Returns:
-        dict: Contains 'items', 'page', 'total_pages', 'total_items'
+        dict: 'cursor' and 'page' keyword arguments for the queries.*_page helpers
     """
-    # Validate page number
-    try:
-        page = max(1, int(page))
-    except (ValueError, TypeError):
-        page = 1
-    
-    # Calculate pagination bounds
-    total_items = len(items)
-    total_pages = (total_items + items_per_page - 1) // items_per_page
-    
-    # Ensure page is within valid range
-    if page > total_pages and total_pages > 0:
-        page = total_pages
-    
-    # Get slice of items for current page
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    paginated_items = items[start_idx:end_idx]
-    
     return {
-        "items": paginated_items,
-        "page": page,
-        "total_pages": total_pages,
-        "total_items": total_items
+        "cursor": request.args.get("cursor") or None,
+        "page": request.args.get("page", 1),
+    }
+
+
+def pagination_context(result):
+    """Template variables for a page returned by the queries.*_page helpers."""
+    return {
+        "page": result["page"],
+        "total_pages": result["total_pages"],
+        "total_businesses": result["total_items"],
+        "next_cursor": result["next_cursor"],
+        "prev_cursor": result["prev_cursor"],
     }
 
 
@@ -322,54 +315,167 @@ def directory():
         # Use first favorite category if available, otherwise "All"
         category_filter = saved_favorite_categories[0] if saved_favorite_categories else "All"
     
-    sort_by = request.args.get("sort", saved_sort)
     search = request.args.get("q", "").strip()
+    # Searches default to best-match order unless the user picked a sort
+    sort_by = request.args.get("sort", "relevance" if search else saved_sort)
+    category_filter = None if category_filter == "All" else category_filter
     
-    if search:
-        all_businesses = queries.search_businesses_by_name(search)
-        if category_filter and category_filter != "All":
-            all_businesses = [b for b in all_businesses if b.get("category") == category_filter]
-    else:
-        category_filter = None if category_filter == "All" else category_filter
-        all_businesses = queries.get_businesses_for_directory(category_filter=category_filter, sort_by_option=sort_by)
-    
-    # Pagination: 12 items per page (4 rows × 3 columns)
-    items_per_page = 12
+    # Facet filters: price range, minimum rating, has deals
+    price_filter = request.args.get("price", "").strip() or None
     try:
-        page = int(request.args.get("page", 1))
-        if page < 1:
-            page = 1
+        rating_filter = float(request.args.get("rating", ""))
     except ValueError:
-        page = 1
-    
-    total_businesses = len(all_businesses)
-    total_pages = (total_businesses + items_per_page - 1) // items_per_page
-    
-    # Ensure page is within valid range
-    if page > total_pages and total_pages > 0:
-        page = total_pages
-    
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    businesses = all_businesses[start_idx:end_idx]
+        rating_filter = None
+    if rating_filter not in queries.RATING_FACET_THRESHOLDS:
+        rating_filter = None
+    deals_filter = request.args.get("deals") == "1"
+    filters = dict(
+        category_filter=category_filter, search_query=search,
+        price_range=price_filter, min_rating=rating_filter, has_deals=deals_filter
+    )
     
-    # Use Quick Browse categories to match home page
-    categories = ["All", "Food", "Retail", "Services", "Entertainment", "Health and Wellness"]
+    # Pagination: 12 items per page (4 rows × 3 columns), windowed in SQL
+    result = queries.get_directory_page(sort_by_option=sort_by, per_page=12, **filters, **get_page_args())
+    # How many results each filter option would give (one grouped query)
+    facets = queries.get_directory_facets(**filters)
+    
+    # Nothing matched exactly: offer a spelling suggestion and typo-tolerant matches
+    suggestion = None
+    if search and not result["items"] and not (price_filter or rating_filter or deals_filter):
+        suggestion = search_index.did_you_mean(search)
+        close_matches = search_index.fuzzy_search(search, limit=12, category=category_filter)
+        if close_matches:
+            result = {
+                "items": close_matches, "page": 1, "total_pages": 1, "total_items": len(close_matches),
+                "next_cursor": None, "prev_cursor": None,
+            }
     
-    # Pass selected category and sort to template for display
+    # Pass selected filters and sort to template for display and for pagination links
     selected_cat = category_filter if category_filter else "All"
+    filter_args = {
+        "q": search, "category": selected_cat, "sort": sort_by,
+        "price": price_filter, "rating": rating_filter and f"{rating_filter:g}", "deals": "1" if deals_filter else None,
+    }
     return render_template(
         "directory.html", 
         user=user, 
-        businesses=businesses, 
-        categories=categories,
+        businesses=result["items"], 
+        facets=facets,
         selected_category=selected_cat,
         selected_sort=sort_by,
+        selected_price=price_filter,
+        selected_rating=rating_filter,
+        selected_deals=deals_filter,
+        filter_args=filter_args,
         saved_favorites=saved_favorite_categories,
-        page=page,
-        total_pages=total_pages,
-        total_businesses=total_businesses
+        suggestion=suggestion,
+        **pagination_context(result)
+    )
+
+
+@app.route("/api/autocomplete", methods=["GET"])
+def api_autocomplete():
+    """Search-as-you-type suggestions for the directory search box (served from memory, no SQL)."""
+    # Signed session cookie only - current_user() would cost a query per keystroke
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    try:
+        limit = max(1, min(20, int(request.args.get("limit", 8))))
+    except ValueError:
+        limit = 8
+    prefix = request.args.get("q", "")[:100]
+    return jsonify(search_index.autocomplete(prefix, limit=limit))
+
+
+@app.route("/api/businesses/nearby", methods=["GET"])
+def api_businesses_nearby():
+    """Businesses within a radius (km) of a point, nearest first: ?lat=&lng=&radius=&category=&limit="""
+    user = current_user()
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    try:
+        latitude = float(request.args["lat"])
+        longitude = float(request.args["lng"])
+        radius_km = float(request.args.get("radius", 5))
+        limit = int(request.args.get("limit", 50))
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lng are required numbers"}), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius_km <= 0:
+        return jsonify({"error": "Coordinates or radius out of range"}), 400
+    radius_km = min(radius_km, 50)
+    limit = max(1, min(200, limit))
+    
+    businesses = queries.get_businesses_nearby(
+        latitude, longitude, radius_km,
+        category=request.args.get("category") or None,
+        limit=limit
     )
+    fields = ("id", "name", "category", "average_rating", "total_reviews", "address", "latitude", "longitude", "distance_km")
+    return jsonify({
+        "center": {"lat": latitude, "lng": longitude},
+        "radius_km": radius_km,
+        "count": len(businesses),
+        "businesses": [{field: business.get(field) for field in fields} for business in businesses],
+    })
+
+
+@app.route("/api/status", methods=["GET"])
+def api_status():
+    """Health and background job status for deploy checks; no user data, so no login."""
+    from src.logic import catalog_sync
+    return jsonify({
+        "businesses": queries.count_businesses(),
+        "yelp_sync": catalog_sync.get_sync_status(),
+        "geocode_queue": queries.get_geocode_queue_stats(),
+        "email_outbox": queries.get_email_outbox_stats(),
+        "jobs": queries.get_job_stats(),
+    })
+
+
+@app.route("/api/map/markers", methods=["GET"])
+def api_map_markers():
+    """
+    Markers inside the map viewport: ?bbox=south,west,north,east&zoom=&category=&min_rating=&deals=1
+    
+    Below clustering.MAX_CLUSTER_ZOOM (and without rating/deals filters) nearby
+    businesses come back as [lat, lng, count] clusters instead of markers.
+    """
+    # Fired on every pan/zoom, so check the signed session cookie instead of loading the user
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    try:
+        south, west, north, east = (float(edge) for edge in request.args["bbox"].split(","))
+        zoom = int(request.args.get("zoom", 12))
+        min_rating = float(request.args.get("min_rating") or 0) or None
+    except (KeyError, ValueError):
+        return jsonify({"error": "bbox must be south,west,north,east"}), 400
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return jsonify({"error": "bbox out of range"}), 400
+    
+    zoom = max(0, min(22, zoom))
+    category = request.args.get("category") or None
+    has_deals = request.args.get("deals") == "1"
+    
+    clusters = []
+    if zoom < clustering.MAX_CLUSTER_ZOOM and min_rating is None and not has_deals:
+        # Zoomed out: precomputed grid clusters, with lone businesses sent as ordinary markers
+        cells = clustering.get_clusters(south, west, north, east, zoom, category=category)
+        clusters = [[round(cell["lat"], 6), round(cell["lng"], 6), cell["count"]] for cell in cells if cell["count"] > 1]
+        markers = queries.get_map_markers_by_ids([cell["id"] for cell in cells if cell["count"] == 1])
+    else:
+        markers = queries.get_map_markers(south, west, north, east, category=category, min_rating=min_rating, has_deals=has_deals)
+    return jsonify({
+        "bbox": [south, west, north, east],
+        "zoom": zoom,
+        "fields": queries.MAP_MARKER_FIELDS,
+        "rows": markers["rows"],
+        "cluster_fields": ("lat", "lng", "count"),
+        "clusters": clusters,
+        "truncated": markers["truncated"],
+    })
 
 
 @app.route("/business/<int:business_id>")
@@ -394,43 +500,18 @@ def favorites():
     if not user:
         return redirect(url_for("login"))
     
-    # Get favorite businesses
-    favorite_businesses = []
-    try:
-        result = queries.get_favorite_businesses(user["id"])
-        if result:
-            for biz in result:
-                if isinstance(biz, dict):
-                    biz_dict = biz.copy()
-                else:
-                    biz_dict = dict(biz) if hasattr(biz, 'keys') else {k: biz[k] for k in biz.keys()}
-                
-                deals = queries.get_deals_by_business(biz_dict.get("id")) or []
-                biz_dict["deals"] = deals
-                favorite_businesses.append(biz_dict)
-    except Exception as e:
-        print(f"Error getting favorites: {e}")
-        favorite_businesses = []
-    
-    # Pagination
-    items_per_page = 12
-    page = max(1, int(request.args.get("page", 1)))
-    
-    total_businesses = len(favorite_businesses)
-    total_pages = max(1, (total_businesses + items_per_page - 1) // items_per_page)
-    page = min(page, total_pages)
-    
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    businesses = favorite_businesses[start_idx:end_idx]
+    # One page of favorites, plus the deals for just those businesses
+    result = queries.get_favorites_page(user["id"], per_page=12, **get_page_args())
+    businesses = result["items"]
+    deals_by_business = queries.get_deals_for_businesses([biz["id"] for biz in businesses])
+    for biz in businesses:
+        biz["deals"] = deals_by_business.get(biz["id"], [])
     
     return render_template(
         "favorites.html",
         user=user,
         businesses=businesses,
-        page=page,
-        total_pages=total_pages,
-        total_businesses=total_businesses
+        **pagination_context(result)
     )
 
 
@@ -449,10 +530,7 @@ def map_view():
     if not user:
         return redirect(url_for("login"))
     
-    # Get all businesses for map display
-    # Note: Client-side JavaScript will geocode addresses to get coordinates
-    all_businesses = queries.get_all_businesses()
-    
+    # Markers are fetched per viewport from /api/map/markers as the user pans
     # Get Google Maps API key from config
     try:
         from config import GOOGLE_MAPS_API_KEY
@@ -462,9 +540,8 @@ def map_view():
     return render_template(
         "map.html", 
         user=user, 
-        businesses=all_businesses,
         google_maps_api_key=GOOGLE_MAPS_API_KEY,
-        categories=sorted(set([b.get("category", "Other") for b in all_businesses if b.get("category")]))
+        categories=queries.get_categories()
     )
 
 
@@ -473,28 +550,9 @@ def trending():
     user = current_user()
     if not user:
         return redirect(url_for("login"))
-    all_businesses = queries.get_trending_businesses(limit=300)
-    
-    # Pagination: 12 items per page
-    items_per_page = 12
-    try:
-        page = int(request.args.get("page", 1))
-        if page < 1:
-            page = 1
-    except ValueError:
-        page = 1
-    
-    total_businesses = len(all_businesses)
-    total_pages = (total_businesses + items_per_page - 1) // items_per_page
-    
-    if page > total_pages and total_pages > 0:
-        page = total_pages
-    
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    businesses = all_businesses[start_idx:end_idx]
-    
-    return render_template("trending.html", user=user, businesses=businesses, page=page, total_pages=total_pages, total_businesses=total_businesses)
+    # Pagination: 12 items per page, windowed in SQL
+    result = queries.get_trending_page(per_page=12, max_items=300, **get_page_args())
+    return render_template("trending.html", user=user, businesses=result["items"], **pagination_context(result))
 
 
 @app.route("/recommendations")
@@ -502,28 +560,9 @@ def recommendations():
     user = current_user()
     if not user:
         return redirect(url_for("login"))
-    all_businesses = queries.get_recommended_businesses(user["id"], limit=300)
-    
-    # Pagination: 12 items per page
-    items_per_page = 12
-    try:
-        page = int(request.args.get("page", 1))
-        if page < 1:
-            page = 1
-    except ValueError:
-        page = 1
-    
-    total_businesses = len(all_businesses)
-    total_pages = (total_businesses + items_per_page - 1) // items_per_page
-    
-    if page > total_pages and total_pages > 0:
-        page = total_pages
-    
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    businesses = all_businesses[start_idx:end_idx]
-    
-    return render_template("recommendations.html", user=user, businesses=businesses, page=page, total_pages=total_pages, total_businesses=total_businesses)
+    # Pagination: 12 items per page, windowed in SQL
+    result = queries.get_recommended_page(user["id"], per_page=12, max_items=300, **get_page_args())
+    return render_template("recommendations.html", user=user, businesses=result["items"], **pagination_context(result))
 
 
 @app.route("/help")
@@ -613,6 +652,11 @@ def settings():
     user_prefs = queries.get_user_preferences(user["id"])
     saved_favorites = user_prefs.get("favorite_categories", [])
     saved_sort = user_prefs.get("default_sort", "name")
+    saved_notifications = {
+        "deal_notifications": user_prefs.get("deal_notifications", True),
+        "recommendation_notifications": user_prefs.get("recommendation_notifications", False),
+        "review_responses": user_prefs.get("review_responses", False),
+    }
     
     if request.method == "POST":
         flash("Settings saved successfully!", "success")
@@ -622,7 +666,8 @@ def settings():
         "settings.html", 
         user=user,
         saved_favorites=saved_favorites,
-        saved_sort=saved_sort
+        saved_sort=saved_sort,
+        saved_notifications=saved_notifications
     )
 
 
@@ -1062,7 +1107,7 @@ def submit_review():
 
 @app.route("/get-reviews/<int:business_id>", methods=["GET"])
 def get_reviews(business_id):
-    """Get all reviews for a specific business."""
+    """Get reviews for a specific business, newest first (cursor-paginated)."""
     user = current_user()
     if not user:
         return jsonify({"error": "Not authenticated"}), 401
@@ -1073,19 +1118,21 @@ def get_reviews(business_id):
         return jsonify({"error": "Business not found"}), 404
     
     try:
-        reviews = queries.get_reviews_for_business(business_id)
-        
-        # Calculate average rating
-        if reviews:
-            avg_rating = sum(r.get("rating", 0) for r in reviews) / len(reviews)
-        else:
-            avg_rating = 0
+        # Newest first, 20 per page; follow next_cursor for older reviews
+        try:
+            per_page = max(1, min(100, int(request.args.get("limit", 20))))
+        except ValueError:
+            per_page = 20
+        result = queries.get_reviews_page(business_id, per_page=per_page, **get_page_args())
+        summary = queries.get_review_summary(business_id)
         
         return jsonify({
             "success": True,
-            "reviews": reviews or [],
-            "count": len(reviews) if reviews else 0,
-            "average_rating": round(avg_rating, 1)
+            "reviews": result["items"],
+            "count": summary["count"],
+            "average_rating": summary["average_rating"],
+            "next_cursor": result["next_cursor"],
+            "prev_cursor": result["prev_cursor"]
         }), 200
     except Exception as e:
         return jsonify({
@@ -1168,7 +1215,24 @@ def api_favorites():
 def run_web():
     init_db()
     from src.database import seed
-    seed.ensure_seed_data()
+    from src.logic import catalog_sync
+    # Bind the port on the catalog already in the database; STARTUP_SYNC picks
+    # when Yelp is synced: "background" (default), "blocking" or "off"
+    seed.ensure_seed_data(sync_yelp=False)
+    startup_sync = os.environ.get("STARTUP_SYNC", "background").lower()
+    if startup_sync == "blocking":
+        catalog_sync.run_sync()
+    elif startup_sync != "off":
+        catalog_sync.start_background_sync()
+    # Resolve coordinates for queued businesses in the background; this also
+    # starts the job runner that runs the sync queued above
+    from src.logic.geocode_worker import start_geocode_worker
+    start_geocode_worker()
+    # Send any email left in the outbox by an earlier run, and email new deals to their followers
+    from src.logic.email_sender import start_email_delivery
+    from src.logic.deal_digest import schedule_deal_digest
+    if start_email_delivery():
+        schedule_deal_digest()
     debug_mode = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
     port = int(os.environ.get("PORT", 5001))
     app.run(host="0.0.0.0", port=port, debug=debug_mode)
@@ -344,16 +344,49 @@ const Reviews = {
         }
     },
     
-    loadReviews: async function(businessId) {
+    loadReviews: async function(businessId, cursor = null) {
         try {
-            const response = await fetch(`/get-reviews/${businessId}`);
+            // Reviews come 20 at a time, newest first; next_cursor fetches the older ones
+            const url = cursor
+                ? `/get-reviews/${businessId}?cursor=${encodeURIComponent(cursor)}`
+                : `/get-reviews/${businessId}`;
+            const response = await fetch(url);
             const data = await response.json();
-            this.displayReviews(data.reviews, data.average_rating, data.count);
+            if (cursor) {
+                this.appendReviews(data.reviews);
+            } else {
+                this.displayReviews(data.reviews, data.average_rating, data.count);
+            }
+            this.showLoadMore(businessId, data.next_cursor);
         } catch (error) {
             console.error('Failed to load reviews:', error);
         }
     },
     
+    showLoadMore: function(businessId, nextCursor) {
+        const container = document.getElementById('reviews-container');
+        if (!container) return;
+        const existing = container.querySelector('.load-more-reviews');
+        if (existing) existing.remove();
+        if (!nextCursor) return;
+        
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'btn btn-primary load-more-reviews';
+        button.textContent = 'Load more reviews';
+        button.addEventListener('click', () => {
+            button.disabled = true;
+            this.loadReviews(businessId, nextCursor);
+        });
+        container.appendChild(button);
+    },
+    
+    appendReviews: function(reviews) {
+        const list = document.querySelector('#reviews-container .reviews-list');
+        if (!list || !reviews) return;
+        list.insertAdjacentHTML('beforeend', reviews.map(review => this.reviewCardHTML(review)).join(''));
+    },
+    
     displayReviews: function(reviews, avgRating, count) {
         const container = document.getElementById('reviews-container');
         if (!container) return;
@@ -371,7 +404,15 @@ const Reviews = {
         `;
         
         reviews.forEach(review => {
-            html += `
+            html += this.reviewCardHTML(review);
+        });
+        
+        html += '</div>';
+        container.innerHTML = html;
+    },
+    
+    reviewCardHTML: function(review) {
+        return `
                 <div class="review-card">
                     <div class="review-header">
                         <strong>${this.escapeHtml(review.user_name)}</strong>
@@ -382,10 +423,6 @@ const Reviews = {
                     ${review.verified ? '<span class="verified-badge">✓ Verified</span>' : ''}
                 </div>
             `;
-        });
-        
-        html += '</div>';
-        container.innerHTML = html;
     },
     
     getStarHTML: function(rating) {
@@ -505,7 +542,131 @@ const Help = {
 };
 
 // ============================================
-// PART 7: INITIALIZATION
+// PART 7: SEARCH AUTOCOMPLETE
+// ============================================
+
+const Autocomplete = {
+    delay: 120,
+    timer: null,
+    lastQuery: '',
+    cache: {},
+    activeIndex: -1,
+    
+    init: function() {
+        const input = document.getElementById('search-input');
+        if (!input) return;
+        
+        input.setAttribute('autocomplete', 'off');
+        input.setAttribute('aria-autocomplete', 'list');
+        input.setAttribute('aria-controls', 'search-suggestions');
+        input.parentElement.style.position = 'relative';
+        
+        const list = document.createElement('ul');
+        list.id = 'search-suggestions';
+        list.setAttribute('role', 'listbox');
+        list.style.cssText = 'display: none; position: absolute; left: 0; right: 0; top: 100%; z-index: 50; margin: 0.25rem 0 0; padding: 0.25rem 0; list-style: none; background: white; border: 2px solid #ddd; border-radius: 8px; box-shadow: 0 8px 20px rgba(0,0,0,0.08); max-height: 320px; overflow-y: auto;';
+        input.parentElement.appendChild(list);
+        
+        input.addEventListener('input', () => {
+            clearTimeout(this.timer);
+            this.timer = setTimeout(() => this.fetch(input.value.trim()), this.delay);
+        });
+        input.addEventListener('keydown', (e) => this.onKeyDown(e, input));
+        input.addEventListener('blur', () => setTimeout(() => this.hide(), 150));
+    },
+    
+    fetch: function(query) {
+        this.lastQuery = query;
+        if (!query) {
+            this.hide();
+            return;
+        }
+        if (this.cache[query]) {
+            this.render(this.cache[query]);
+            return;
+        }
+        fetch(`/api/autocomplete?q=${encodeURIComponent(query)}`)
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data) return;
+                this.cache[query] = data;
+                // Ignore answers for text the user has already typed past
+                if (query === this.lastQuery) this.render(data);
+            })
+            .catch(() => this.hide());
+    },
+    
+    render: function(data) {
+        const list = document.getElementById('search-suggestions');
+        if (!list) return;
+        list.innerHTML = '';
+        this.activeIndex = -1;
+        
+        const items = [
+            ...data.categories.map(c => ({ label: c.name, detail: `Category · ${c.count}`, url: `/directory?category=${encodeURIComponent(c.name)}` })),
+            ...data.businesses.map(b => ({ label: b.name, detail: b.category || '', url: `/business/${b.id}` }))
+        ];
+        if (!items.length) {
+            this.hide();
+            return;
+        }
+        
+        items.forEach(item => {
+            const li = document.createElement('li');
+            li.setAttribute('role', 'option');
+            li.dataset.url = item.url;
+            li.style.cssText = 'padding: 0.6rem 1rem; cursor: pointer; display: flex; justify-content: space-between; gap: 1rem;';
+            const label = document.createElement('span');
+            label.textContent = item.label;
+            const detail = document.createElement('span');
+            detail.textContent = item.detail;
+            detail.style.color = '#888';
+            detail.style.fontSize = '0.85rem';
+            li.append(label, detail);
+            li.addEventListener('mousedown', () => { window.location.href = item.url; });
+            li.addEventListener('mouseover', () => this.highlight(Array.from(list.children).indexOf(li)));
+            list.appendChild(li);
+        });
+        list.style.display = 'block';
+    },
+    
+    highlight: function(index) {
+        const list = document.getElementById('search-suggestions');
+        if (!list) return;
+        Array.from(list.children).forEach((li, i) => {
+            li.style.background = i === index ? '#eff6ff' : 'transparent';
+            li.setAttribute('aria-selected', i === index);
+        });
+        this.activeIndex = index;
+    },
+    
+    onKeyDown: function(e, input) {
+        const list = document.getElementById('search-suggestions');
+        if (!list || list.style.display === 'none') return;
+        const count = list.children.length;
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            this.highlight((this.activeIndex + 1) % count);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            this.highlight((this.activeIndex - 1 + count) % count);
+        } else if (e.key === 'Enter' && this.activeIndex >= 0) {
+            e.preventDefault();
+            window.location.href = list.children[this.activeIndex].dataset.url;
+        } else if (e.key === 'Escape') {
+            this.hide();
+        }
+    },
+    
+    hide: function() {
+        const list = document.getElementById('search-suggestions');
+        if (list) list.style.display = 'none';
+        this.activeIndex = -1;
+    }
+};
+
+// ============================================
+// PART 8: INITIALIZATION
 // ============================================
 
 document.addEventListener('DOMContentLoaded', () => {
@@ -521,6 +682,9 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     
+    // Search-as-you-type suggestions on the directory search box
+    Autocomplete.init();
+    
     // Close modals when clicking outside
     window.addEventListener('click', (e) => {
         const reviewModal = document.getElementById('review-modal');